@@ -0,0 +1,204 @@
+﻿# encoding: utf-8-sig
+
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastmcp import Client
+from fastmcp.client.transports import FastMCPTransport
+
+from credgen import profile_name, write_credentials_file
+from updsts.awsutil import set_cache_enabled
+from updsts.fakests import FakeStsServer
+from updsts.mcp_server import get_mcp
+
+# End-to-end load generator for the MCP server.
+# Mixed list / info / update tool calls are replayed through in-memory FastMCPTransport
+# clients (one client per simulated agent) against synthetic credential files and the
+# fake STS endpoint, and the latency percentiles are reported as JSON.
+#
+#   python bench/bench_mcp.py --concurrency 8 --requests 2000 --mix list=1,info=8,update=1
+
+OPERATIONS = ("list", "info", "update")
+
+# ----------------------------------------------------------------------------
+def parse_mix(spec: str) -> dict[str, float]:
+    """
+    Parse the workload mix (e.g. "list=1,info=8,update=1").
+    """
+    mix = {}
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation in mix: '{name}'")
+        mix[name] = float(weight) if weight else 1.0
+    if not any(mix.values()):
+        raise ValueError("The workload mix must have a positive weight.")
+    return mix
+
+# ----------------------------------------------------------------------------
+def percentile(sorted_values: list[float], p: float) -> float:
+    """
+    Nearest-rank percentile of the sorted values.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+# ----------------------------------------------------------------------------
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    """
+    Summarize the latencies (seconds) of one operation.
+    """
+    values = sorted(latencies)
+    count = len(values)
+    return {
+        "count": count,
+        "errors": errors,
+        "throughput_rps": round(count / elapsed, 2) if elapsed > 0 else 0.0,
+        "mean_ms": round(sum(values) / count * 1000, 3) if count else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if count else 0.0,
+    }
+
+# ----------------------------------------------------------------------------
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size of this process in MB.
+    """
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return round(maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024, 2)
+
+# ----------------------------------------------------------------------------
+def make_call(op: str, rng: random.Random, cred_file: str, num_profiles: int) -> tuple[str, dict]:
+    """
+    Build the tool name and the arguments of one request.
+    """
+    if op == "list":
+        return "updsts_get_credential_info_list", {"cred_file": cred_file}
+    name = profile_name(rng.randrange(num_profiles))
+    if op == "info":
+        return "updsts_get_credential_info", {"profile_name": name, "cred_file": cred_file}
+    return "updsts_update_sts_credential", {"profile_name": name,
+                                            "totp_token": f"{rng.randrange(10**6):06d}",
+                                            "cred_file": cred_file}
+
+# ----------------------------------------------------------------------------
+async def run_agent(mcp, plan: list[str], rng: random.Random, cred_file: str, num_profiles: int,
+                    results: dict[str, list[float]], errors: dict[str, int]):
+    """
+    One simulated agent: a dedicated MCP client which takes requests from the shared plan.
+    """
+    async with Client(transport=FastMCPTransport(mcp=mcp)) as client:
+        while plan:
+            op = plan.pop()
+            tool, arguments = make_call(op, rng, cred_file, num_profiles)
+            start = time.perf_counter()
+            try:
+                await client.call_tool(tool, arguments)
+                results[op].append(time.perf_counter() - start)
+            except Exception:
+                errors[op] += 1
+
+# ----------------------------------------------------------------------------
+async def run_benchmark(concurrency: int, requests: int, warmup: int, mix: dict[str, float],
+                        cred_file: str, num_profiles: int, seed: int) -> dict:
+    """
+    Run the warmup and the measured phase.
+    """
+    mcp = get_mcp()
+    rng = random.Random(seed)
+    ops = list(mix.keys())
+    weights = list(mix.values())
+
+    # warmup (not measured)
+    warm_plan = rng.choices(ops, weights=weights, k=warmup)
+    await asyncio.gather(*[run_agent(mcp, warm_plan, random.Random(seed + 1000 + i), cred_file, num_profiles,
+                                     {op: [] for op in OPERATIONS}, {op: 0 for op in OPERATIONS})
+                           for i in range(concurrency)])
+
+    plan = rng.choices(ops, weights=weights, k=requests)
+    results = {op: [] for op in OPERATIONS}
+    errors = {op: 0 for op in OPERATIONS}
+    start = time.perf_counter()
+    await asyncio.gather(*[run_agent(mcp, plan, random.Random(seed + i), cred_file, num_profiles, results, errors)
+                           for i in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    all_latencies = [v for op in OPERATIONS for v in results[op]]
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "total": summarize(all_latencies, sum(errors.values()), elapsed),
+        "operations": {op: summarize(results[op], errors[op], elapsed) for op in OPERATIONS if op in mix},
+    }
+
+# ----------------------------------------------------------------------------
+def main():
+    argp = argparse.ArgumentParser(description="MCP server load generator.",
+                                   formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    argp.add_argument('--concurrency', type=int, default=4, help='Number of concurrent MCP clients (agents).')
+    argp.add_argument('--requests', type=int, default=1000, help='Number of measured tool calls.')
+    argp.add_argument('--warmup', type=int, default=50, help='Number of tool calls before measuring.')
+    argp.add_argument('--mix', type=str, default="list=1,info=8,update=1", help='Weights of the operations.')
+    argp.add_argument('--profiles', type=int, default=100, help='Number of profiles in the synthetic credential file.')
+    argp.add_argument('--tag-blocks', type=int, default=10, help='Number of managed blocks in the credential file.')
+    argp.add_argument('--sts-latency', type=str, default="fixed:20", help='Latency spec of the stubbed STS (see updsts.fakests).')
+    argp.add_argument('--cache', action='store_true', help='Enable the in-process parse / client caches.')
+    argp.add_argument('--seed', type=int, default=0, help='Random seed.')
+    argp.add_argument('--output', type=str, default=None, help='Write the JSON result to the file instead of stdout.')
+    args = argp.parse_args()
+
+    mix = parse_mix(args.mix)
+    set_cache_enabled(args.cache)
+    sts = FakeStsServer(latency=args.sts_latency, reject_reused_mfa=False, seed=args.seed)
+    sts.start()
+    os.environ["UPDSTS_STS_ENDPOINT_URL"] = sts.endpoint_url
+    try:
+        with tempfile.TemporaryDirectory(prefix="updsts_bench_") as tmp_dir:
+            cred_file = write_credentials_file(Path(tmp_dir) / "credentials", args.profiles,
+                                               tag_blocks=args.tag_blocks, seed=args.seed)
+            # the update tool reports progress with print(), keep it out of the JSON output
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                result = asyncio.run(run_benchmark(args.concurrency, args.requests, args.warmup, mix,
+                                                   str(cred_file), args.profiles, args.seed))
+    finally:
+        sts.stop()
+
+    result["config"] = {
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "warmup": args.warmup,
+        "mix": mix,
+        "profiles": args.profiles,
+        "tag_blocks": args.tag_blocks,
+        "sts_latency": args.sts_latency,
+        "cache": args.cache,
+    }
+    result["peak_rss_mb"] = peak_rss_mb()
+    result["sts_stats"] = sts.stats
+    output = json.dumps(result, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+
+# ----------------------------------------------------------------------------
+if __name__ == "__main__":
+    main()
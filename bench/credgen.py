@@ -0,0 +1,76 @@
+﻿# encoding: utf-8-sig
+
+import random
+import string
+from pathlib import Path
+
+# Synthetic AWS credentials file generator for the benchmarks.
+
+# ----------------------------------------------------------------------------
+def profile_name(index: int) -> str:
+    """
+    Name of the index-th generated profile.
+    """
+    return f"profile_{index:06d}"
+
+# ----------------------------------------------------------------------------
+def generate_credentials(num_sections: int,
+                         *,
+                         comment_lines: int = 0,
+                         tag_blocks: int = 0,
+                         crlf: bool = False,
+                         seed: int = 0) -> str:
+    """
+    Generate the content of a synthetic credentials file.
+    Args:
+        num_sections (int): Number of base profiles.
+        comment_lines (int, optional): Comment lines written before every profile. Defaults to 0.
+        tag_blocks (int, optional): Number of profiles which have an updsts managed block. Defaults to 0.
+        crlf (bool, optional): Use CRLF line endings. Defaults to False.
+        seed (int, optional): Random seed. Defaults to 0.
+    Returns:
+        str: The file content.
+    """
+    rng = random.Random(seed)
+    alnum = string.ascii_uppercase + string.digits
+    secret = string.ascii_letters + string.digits + "/+"
+    lines = []
+    for i in range(num_sections):
+        name = profile_name(i)
+        for c in range(comment_lines):
+            lines.append(f"# comment {c} for {name}: " + "".join(rng.choice(string.ascii_lowercase) for _ in range(40)))
+        lines.append(f"[{name}]")
+        lines.append(f"aws_access_key_id = AKIA{''.join(rng.choice(alnum) for _ in range(16))}")
+        lines.append(f"aws_secret_access_key = {''.join(rng.choice(secret) for _ in range(40))}")
+        lines.append(f"mfa_device_arn = arn:aws:iam::{rng.randrange(10**11, 10**12)}:mfa/user{i}")
+        lines.append(f"totp_secret_name = totp_{name}")
+        lines.append("")
+        if i < tag_blocks:
+            lines.append(f"# ${{{{{{ key={name} [auto update by updsts]")
+            lines.append(f"[{name}_sts]")
+            lines.append(f"aws_access_key_id=ASIA{''.join(rng.choice(alnum) for _ in range(16))}")
+            lines.append(f"aws_secret_access_key={''.join(rng.choice(secret) for _ in range(40))}")
+            lines.append(f"aws_session_token=FwoGZXIvYXdzE{''.join(rng.choice(secret) for _ in range(300))}")
+            lines.append("expiration_datetime=2024-01-01T12:00:00+00:00")
+            lines.append("# $}}} [auto update by updsts]")
+            lines.append("")
+    newline = "\r\n" if crlf else "\n"
+    return newline.join(lines) + newline
+
+# ----------------------------------------------------------------------------
+def write_credentials_file(path: Path, num_sections: int, **kwargs) -> Path:
+    """
+    Write a synthetic credentials file.
+    Args:
+        path (Path): Output path.
+        num_sections (int): Number of base profiles.
+        **kwargs: Options of `generate_credentials`.
+    Returns:
+        Path: The written path.
+    """
+    content = generate_credentials(num_sections, **kwargs)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # newline='' keeps the generated line endings as is
+    with path.open(mode='w', encoding='utf-8', newline='') as f:
+        f.write(content)
+    return path
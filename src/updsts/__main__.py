@@ -1,18 +1,48 @@
 ﻿# encoding: utf-8-sig
 
+import json
 import os
 import sys
 from pathlib import Path
 from argparse import ArgumentParser
 
+from .timing import timing_session
 from .cmdparam import *
 from .cmd_handler import *
-from .logutil import get_logger
+from .logutil import get_logger, set_file_logging
+from .metrics import get_registry
+from .retry import get_circuit_states
+from .tracing import set_trace_file, start_trace
 
 # ---------------------------------------------------------------------------------------
-def main():
+def create_arg_parser() -> ArgumentParser:
+    """
+    Create the argument parser of the updsts command.
+
+    Returns:
+        ArgumentParser: The argument parser with all subcommands registered.
+    """
     argp = ArgumentParser(prog="updsts",
                           description="Get/Update profile of the aws sts security tokens.")
+    argp.add_argument(
+        '--profile',
+        type=str,
+        default=None,
+        metavar='FILE',
+        help='Write cProfile statistics of the command to FILE (view with "python -m pstats FILE").'
+    )
+    argp.add_argument(
+        '--stats',
+        action='store_true',
+        help='Dump the runtime metrics of the command to stderr as JSON.'
+    )
+    argp.add_argument(
+        '--trace',
+        type=str,
+        default=None,
+        metavar='FILE',
+        help='Append the trace spans of the command to FILE as OTLP/JSON lines (or set $UPDSTS_TRACE_FILE).'
+    )
     # Register common arguments
     common = ArgumentParser(add_help=False)
     common.add_argument(
@@ -32,26 +62,72 @@ def main():
         default=None,
         help='Path to the credetial file where profiles stored. (default: ~/.aws/credentials)'
     )
+    common.add_argument(
+        '--no_log_file',
+        action='store_true',
+        help='Do not write the log file (~/.awscm/log/awscm.log). Logs go to the console only.'
+    )
 
     subparsers = argp.add_subparsers(dest='command',
                                      help='Available commands')
     # Register subcommands
     register_sub_get(subparsers, handle_get, parent_parser=common)
     register_sub_list(subparsers, handle_list, parent_parser=common)
+    register_sub_watch(subparsers, handle_watch, parent_parser=common)
     register_sub_mcp(subparsers, handle_mcp, parent_parser=common)
+    register_sub_daemon(subparsers, handle_daemon, parent_parser=common)
+    register_sub_compile(subparsers, handle_compile, parent_parser=common)
+    register_sub_gc(subparsers, handle_gc, parent_parser=common)
+    register_sub_probe(subparsers, handle_probe, parent_parser=common)
+    return argp
+
+# ---------------------------------------------------------------------------------------
+def run_handler(args):
+    """
+    Execute the handler of the command, under cProfile if '--profile' is specified.
 
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+    """
+    profile_path = getattr(args, 'profile', None)
+    try:
+        if not profile_path:
+            args.handler(args)
+            return
+
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.runcall(args.handler, args)
+        finally:
+            profiler.dump_stats(profile_path)
+            print(f"Profile statistics written to '{profile_path}'", file=sys.stderr)
+    finally:
+        if getattr(args, 'stats', False):
+            stats = get_registry().snapshot()
+            stats["circuit_breakers"] = get_circuit_states()
+            print(json.dumps(stats, indent=2), file=sys.stderr)
+
+# ---------------------------------------------------------------------------------------
+def main(argv: list[str] | None = None):
+    argp = create_arg_parser()
     try:
         # Parse the command line arguments
-        args = argp.parse_args()
+        args = argp.parse_args(argv)
         # If no command is specified, show help
         if args.command is None:
             argp.print_help()
         else:
             # Initialize the logger with the specified verbosity level
-            _ = get_logger(verbose_level=args.verbose)
+            if getattr(args, 'no_log_file', False):
+                set_file_logging(False)
+            if getattr(args, 'trace', None):
+                set_trace_file(args.trace)
+            logger = get_logger(verbose_level=args.verbose)
             # Execute the handler for the specified command
             if hasattr(args, 'handler'):
-                args.handler(args)
+                with timing_session(args.command, logger, include_import=True), start_trace(f"updsts {args.command}"):
+                    run_handler(args)
             else:
                 argp.print_help()
 
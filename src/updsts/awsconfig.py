@@ -0,0 +1,139 @@
+﻿# encoding: utf-8-sig
+
+import os
+from configparser import ConfigParser, Error as ConfigParserError
+from pathlib import Path
+from typing import Any
+
+CONFIG_FILE_ENV = "AWS_CONFIG_FILE"
+# the settings of ~/.aws/config resolved for each profile
+# (only these keys are read: the keys and tokens that the config file may hold are never returned)
+RESOLVED_KEYS = ("region", "role_arn", "source_profile", "mfa_serial", "role_session_name", "duration_seconds")
+
+# ----------------------------------------------------------------------------
+def get_config_file_path(credential_file: Path) -> Path:
+    """
+    Get the path of the AWS config file paired with the credentials file.
+    Args:
+        credential_file (Path): Path to the AWS credentials file.
+    Returns:
+        Path: $AWS_CONFIG_FILE, or `config` in the directory of the credentials file
+            (~/.aws/config for the default credentials file).
+    """
+    env_path = os.environ.get(CONFIG_FILE_ENV)
+    if env_path:
+        return Path(os.path.expanduser(env_path))
+    return Path(credential_file).with_name("config")
+
+# ----------------------------------------------------------------------------
+def read_config_profiles(config_file: Path) -> dict[str, dict[str, str]]:
+    """
+    Parse the AWS config file.
+    The `[profile <name>]` and `[default]` sections are read, the others (e.g. `[sso-session <name>]`) are skipped.
+    Args:
+        config_file (Path): Path to the AWS config file.
+    Returns:
+        dict[str, dict[str, str]]: The RESOLVED_KEYS of each profile ({} if the file does not exist or is broken).
+    """
+    parser = ConfigParser(interpolation=None)
+    try:
+        parser.read(config_file, encoding="utf-8")
+    except ConfigParserError:
+        return {}
+    profiles = {}
+    for section in parser.sections():
+        if section == "default":
+            name = section
+        elif section.startswith("profile "):
+            name = section[len("profile "):].strip()
+        else:
+            continue
+        profiles[name] = {key: parser.get(section, key).strip()
+                          for key in RESOLVED_KEYS if parser.get(section, key, fallback="").strip()}
+    return profiles
+
+# ############################################################################
+class ProfileIndex:
+    """
+    Combined index of the AWS credentials file and config file.
+    The effective settings of a profile are resolved on the first lookup and kept,
+    so the index must be replaced when one of the files changes (see awsutil.read_profile_index).
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self, credentials: ConfigParser, config_profiles: dict[str, dict[str, str]] | None = None):
+        # the parsed credentials file is shared with read_credential_config (read-only)
+        self.credentials = credentials
+        self.config_profiles = config_profiles or {}
+        self._resolved: dict[str, dict[str, Any]] = {}
+
+    # ----------------------------------------------------------------------------
+    def profile_names(self) -> list[str]:
+        """
+        Get the profile names: the ones of the credentials file, then the ones only in the config file.
+        """
+        names = self.credentials.sections()
+        return names + [name for name in self.config_profiles if not self.credentials.has_section(name)]
+
+    # ----------------------------------------------------------------------------
+    def has_profile(self, profile_name: str) -> bool:
+        return self.credentials.has_section(profile_name) or profile_name in self.config_profiles
+
+    # ----------------------------------------------------------------------------
+    def _get_settings(self, profile_name: str) -> dict[str, str]:
+        """
+        Get the RESOLVED_KEYS of the profile: the config file, overridden by the credentials file
+        (with the `mfa_device_arn` of the credentials file).
+        """
+        settings = dict(self.config_profiles.get(profile_name, {}))
+        if self.credentials.has_section(profile_name):
+            # only the keys set in the section: most profiles have none of RESOLVED_KEYS
+            for key in self.credentials.options(profile_name):
+                if key in RESOLVED_KEYS or key == "mfa_device_arn":
+                    value = self.credentials.get(profile_name, key).strip()
+                    if value:
+                        settings[key] = value
+        return settings
+
+    # ----------------------------------------------------------------------------
+    def resolve(self, profile_name: str) -> dict[str, Any]:
+        """
+        Resolve the effective settings of the profile.
+        Args:
+            profile_name (str): The profile name.
+        Returns:
+            dict[str, Any]: The RESOLVED_KEYS set for the profile, and
+                - "role_chain" (list[str]): the `source_profile` links followed from the profile
+                  (the last one holds the long-term keys), empty if the profile has no `source_profile`.
+                - "mfa_serial": the `mfa_device_arn` of the credentials file, or the `mfa_serial`
+                  of the profile or of the first profile of the chain that has one.
+                - "role_chain_error" (str): set if the chain has a loop or a missing profile.
+        """
+        resolved = self._resolved.get(profile_name)
+        if resolved is not None:
+            return resolved
+        resolved = self._get_settings(profile_name)
+        mfa_serial = resolved.pop("mfa_device_arn", "")
+        chain = []
+        name = resolved.get("source_profile")
+        while name:
+            if name == profile_name or name in chain:
+                resolved["role_chain_error"] = f"source_profile loop at '{name}'"
+                break
+            if not self.has_profile(name):
+                resolved["role_chain_error"] = f"source_profile '{name}' not found"
+                break
+            chain.append(name)
+            name = self._get_settings(name).get("source_profile")
+        resolved["role_chain"] = chain
+
+        for name in [profile_name] + chain:
+            if mfa_serial:
+                break
+            mfa_serial = self._get_settings(name).get("mfa_serial", "")
+        if mfa_serial:
+            resolved["mfa_serial"] = mfa_serial
+        self._resolved[profile_name] = resolved
+        return resolved
+
+
+__all__ = ["CONFIG_FILE_ENV", "ProfileIndex", "RESOLVED_KEYS", "get_config_file_path", "read_config_profiles"]
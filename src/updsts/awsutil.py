@@ -1,18 +1,39 @@
 ﻿# encoding: utf-8-sig
 
+import logging
 import os
 import sys
-import boto3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
 from datetime import datetime, timezone
 
-from botocore.exceptions import BotoCoreError, ClientError
-from configparser import ConfigParser, NoSectionError, NoOptionError
+from configparser import ConfigParser, Error as ConfigParserError, NoSectionError, NoOptionError
 from pathlib import Path
-from typing import Optional, Dict, Any
+from contextvars import ContextVar
+from typing import Callable, Optional, Dict, Any
 
+from .awsconfig import ProfileIndex, get_config_file_path, read_config_profiles
+from .deadline import Deadline, current_deadline
+from .filewatch import get_file_watcher
 from .logutil import get_logger
+from .metrics import get_registry
+from .probe import AUTO_REGION, get_fastest_endpoint
+from .retry import RetryPolicy, StsRequestError, call_with_retry, call_with_retry_async, get_circuit_breaker
+from .stsclient import AsyncNativeStsClient, NativeStsClient, unsupported_reason
+from .suggest import suggest_profiles
+from .timing import phase
+from .tracing import current_span
 from .upcred import CredentialUpdater
 
+# ----------------------------------------------------------------------------
+def __getattr__(name: str):
+    # boto3 is imported on the first use, since the native STS backend does not need it
+    if name == "boto3":
+        import boto3
+        return boto3
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 # ----------------------------------------------------------------------------
 def mask_string(s: str, unmask_chars: int = 4, max_strlen = 16) -> str:
     """
@@ -77,14 +98,523 @@ def get_credential_file_path(credential_file: str | None = None) -> Path:
     else:
         credential_file_path = Path(cred_path)
     logger = get_logger()
-    logger.debug(f"Using credential file: {credential_file_path}")
+    logger.debug("Using credential file: %s", credential_file_path)
     return credential_file_path
 
+STS_ENDPOINT_URL_ENV = "UPDSTS_STS_ENDPOINT_URL"
+STS_REGION_ENV = "UPDSTS_STS_REGION"
+DEFAULT_STS_REGION = "us-east-1"
+STS_BACKEND_ENV = "UPDSTS_STS_BACKEND"
+# "boto3": the boto3 client, "native": the built-in client of stsclient.py (falls back to boto3 if unsupported)
+STS_BACKENDS = ("boto3", "native")
+DEFAULT_STS_BACKEND = "boto3"
+# MFA devices requested at the same time by update_credentials_batch
+DEFAULT_BATCH_WORKERS = 4
+
+# per-profile keys of the connection settings -> (option of botocore.config.Config, value type)
+CONNECTION_KEYS = {
+    'sts_region': ('region_name', str),
+    'sts_connect_timeout': ('connect_timeout', float),
+    'sts_read_timeout': ('read_timeout', float),
+    'sts_max_pool_connections': ('max_pool_connections', int),
+    'sts_tcp_keepalive': ('tcp_keepalive', bool),
+    # not a botocore option: selects the STS client
+    'sts_backend': ('sts_backend', str),
+}
+
+# ----------------------------------------------------------------------------
+# in-process caches (enabled by the resident daemon / long running servers)
+_cache_enabled: bool = False
+_cache_lock = threading.Lock()
+_config_cache: dict[str, tuple[tuple, ConfigParser]] = {}
+_profile_index_cache: dict[str, tuple[tuple, ProfileIndex]] = {}
+_sts_client_cache: dict[tuple, Any] = {}
+
+# connection settings of the process (e.g. the options of the mcp command), overridden by the profiles
+_default_connection_options: dict[str, Any] = {}
+
+# the classified error of the last failed STS request in the current context
+_last_sts_error: ContextVar[StsRequestError | None] = ContextVar("updsts_last_sts_error", default=None)
+
+# ----------------------------------------------------------------------------
+def set_cache_enabled(enabled: bool = True) -> None:
+    """
+    Enable or disable the in-process caches of parsed credential files and STS clients.
+    The caches are disabled by default, so that one-shot CLI runs always read the file.
+    Args:
+        enabled (bool, optional): True to enable the caches. Defaults to True.
+    """
+    global _cache_enabled
+    _cache_enabled = enabled
+    if not enabled:
+        clear_cache()
+
+# ----------------------------------------------------------------------------
+def clear_cache() -> None:
+    """
+    Drop all cached credential files and STS clients.
+    """
+    with _cache_lock:
+        _config_cache.clear()
+        _profile_index_cache.clear()
+        _sts_client_cache.clear()
+
+# ----------------------------------------------------------------------------
+def evict_cached_file(credential_file: str | os.PathLike) -> None:
+    """
+    Drop the cached parse of one credentials file (and of its AWS config file).
+    """
+    cache_key = str(Path(credential_file).resolve())
+    with _cache_lock:
+        _config_cache.pop(cache_key, None)
+        _profile_index_cache.pop(cache_key, None)
+
+# ----------------------------------------------------------------------------
+def set_default_connection_options(options: dict[str, Any] | None) -> None:
+    """
+    Set the connection settings of the STS clients for all profiles of this process.
+    Args:
+        options (dict[str, Any] | None): Options of botocore.config.Config
+            (region_name, connect_timeout, read_timeout, max_pool_connections, tcp_keepalive).
+    """
+    global _default_connection_options
+    _default_connection_options = {k: v for k, v in (options or {}).items() if v is not None}
+
+# ----------------------------------------------------------------------------
+def get_cache_stats() -> dict[str, Any]:
+    """
+    Get the state of the in-process caches.
+    Returns:
+        dict[str, Any]: Whether the caches are enabled and the number of cached entries.
+    """
+    with _cache_lock:
+        return {
+            "enabled": _cache_enabled,
+            "credential_files": len(_config_cache),
+            "profile_indexes": len(_profile_index_cache),
+            "sts_clients": len(_sts_client_cache),
+        }
+
+# ----------------------------------------------------------------------------
+def get_file_fingerprint(file_path: Path) -> tuple[int, int, int]:
+    """
+    Get the fingerprint of the file used to detect modifications.
+    Args:
+        file_path (Path): Path of the file.
+    Returns:
+        tuple[int, int, int]: (modification time in ns, size, inode number)
+    """
+    st = file_path.stat()
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+# ----------------------------------------------------------------------------
+def read_credential_config(credential_file: Path) -> ConfigParser:
+    """
+    Parse the credential file.
+    If the cache is enabled, the parsed result is reused while the file is unchanged: while the file watcher
+    (inotify) is running, by the generation of the file without calling stat(), otherwise by the fingerprint.
+    The returned ConfigParser is shared between callers, so it must be treated as read-only.
+    Args:
+        credential_file (Path): Path to the AWS credentials file.
+    Returns:
+        ConfigParser: The parsed credential file.
+    """
+    metrics = get_registry()
+    metrics.counter("credential_file_reads_total").inc()
+    with phase("parse"):
+        if not _cache_enabled:
+            metrics.counter("credential_file_parses_total").inc()
+            metrics.gauge("credential_file_bytes").set(Path(credential_file).stat().st_size)
+            config = ConfigParser()
+            config.read(credential_file)
+            return config
+
+        logger = get_logger()
+        cache_key = str(Path(credential_file).resolve())
+        watcher = get_file_watcher()
+        generation = watcher.generation(cache_key) if watcher is not None else None
+        if generation is not None:
+            # the generation is taken before the parse, so a change during the parse is not missed
+            fingerprint = ("generation", generation)
+        else:
+            fingerprint = get_file_fingerprint(Path(credential_file))
+            metrics.gauge("credential_file_bytes").set(fingerprint[1])
+        with _cache_lock:
+            cached = _config_cache.get(cache_key)
+        if cached and cached[0] == fingerprint:
+            metrics.counter("credential_file_cache_hits_total").inc()
+            logger.debug("Credential file cache hit: %s", cache_key)
+            return cached[1]
+
+        logger.debug("Credential file cache miss: %s", cache_key)
+        metrics.counter("credential_file_parses_total").inc()
+        if generation is not None:
+            metrics.gauge("credential_file_bytes").set(Path(cache_key).stat().st_size)
+        config = ConfigParser()
+        config.read(credential_file)
+        with _cache_lock:
+            _config_cache[cache_key] = (fingerprint, config)
+        return config
+
+# ----------------------------------------------------------------------------
+def read_profile_index(credential_file: Path) -> ProfileIndex:
+    """
+    Parse the credentials file and the paired AWS config file (see get_config_file_path) into one index.
+    If the cache is enabled, the index is reused while both files are unchanged, so that the settings
+    resolved for a profile (see ProfileIndex.resolve) are looked up without reading either file again.
+    Args:
+        credential_file (Path): Path to the AWS credentials file.
+    Returns:
+        ProfileIndex: The index of both files.
+    """
+    credentials = read_credential_config(credential_file)
+    config_file = get_config_file_path(Path(credential_file))
+    try:
+        config_fingerprint = get_file_fingerprint(config_file)
+    except OSError:
+        config_fingerprint = None
+    metrics = get_registry()
+    if not _cache_enabled:
+        metrics.counter("config_file_parses_total").inc()
+        return ProfileIndex(credentials, read_config_profiles(config_file) if config_fingerprint else None)
+
+    # the parsed credentials file is replaced by read_credential_config when the file changes,
+    # so its identity stands for the fingerprint of the credentials file
+    cache_key = str(Path(credential_file).resolve())
+    with _cache_lock:
+        cached = _profile_index_cache.get(cache_key)
+    if cached and cached[0][0] is credentials and cached[0][1] == config_fingerprint:
+        return cached[1]
+    if not cached or cached[0][1] != config_fingerprint:
+        metrics.counter("config_file_parses_total").inc()
+        config_profiles = read_config_profiles(config_file) if config_fingerprint else None
+    else:
+        config_profiles = cached[1].config_profiles
+    index = ProfileIndex(credentials, config_profiles)
+    with _cache_lock:
+        _profile_index_cache[cache_key] = ((credentials, config_fingerprint), index)
+    return index
+
+# ----------------------------------------------------------------------------
+def _record_sts_attempt(url: str) -> None:
+    """
+    Record each HTTP attempt (including the retries) on the current span.
+    """
+    current = current_span()
+    if current is not None:
+        attempt = current.attributes.get("sts.attempts", 0) + 1
+        current.set_attribute("sts.attempts", attempt)
+        current.add_event("sts.attempt", {"attempt": attempt, "url": url})
+
+# ----------------------------------------------------------------------------
+def _on_sts_attempt(request, **kwargs) -> None:
+    """
+    botocore 'before-send' handler (see _record_sts_attempt).
+    """
+    _record_sts_attempt(request.url)
+    # returning None lets botocore send the request
+    return None
+
+# ----------------------------------------------------------------------------
+def get_native_sts_client(access_key: str,
+                          secret_key: str,
+                          client_config: Dict[str, Any],
+                          botocore_options: Dict[str, Any] | None = None,
+                          asynchronous: bool = False) -> NativeStsClient | AsyncNativeStsClient:
+    """
+    Create the built-in STS client (the `native` backend) with the settings given to the boto3 client.
+    The client is cheap to create: its connections are pooled by endpoint in stsclient.py.
+    Args:
+        access_key (str): AWS access key id.
+        secret_key (str): AWS secret access key.
+        client_config (Dict[str, Any]): endpoint_url and region_name (see get_sts_client).
+        botocore_options (Dict[str, Any] | None, optional): Connection settings (see get_sts_client).
+            The retries are ignored (done by call_with_retry). Defaults to None.
+        asynchronous (bool, optional): Create the asyncio client. Defaults to False.
+    Returns:
+        NativeStsClient | AsyncNativeStsClient: The client.
+    """
+    options = botocore_options or {}
+    client_class = AsyncNativeStsClient if asynchronous else NativeStsClient
+    return client_class(access_key, secret_key,
+                        endpoint_url=client_config.get('endpoint_url'),
+                        region_name=client_config.get('region_name'),
+                        connect_timeout=options.get('connect_timeout'),
+                        read_timeout=options.get('read_timeout'),
+                        proxies=options.get('proxies'),
+                        max_pool_connections=options.get('max_pool_connections'),
+                        tcp_keepalive=options.get('tcp_keepalive'),
+                        on_attempt=_record_sts_attempt)
+
+# ----------------------------------------------------------------------------
+def get_sts_client(access_key: str,
+                   secret_key: str,
+                   client_config: Dict[str, Any],
+                   botocore_options: Dict[str, Any] | None = None,
+                   backend: str = DEFAULT_STS_BACKEND) -> Any:
+    """
+    Create the STS client for the specified access key.
+    If the cache is enabled, the client is kept and reused for the same key and configuration.
+    Args:
+        access_key (str): AWS access key id.
+        secret_key (str): AWS secret access key.
+        client_config (Dict[str, Any]): Keyword arguments passed to `Session.client`.
+        botocore_options (Dict[str, Any] | None, optional): Keyword arguments of `botocore.config.Config`
+            (e.g. proxies, timeouts and retries). Defaults to None.
+        backend (str, optional): "boto3", or "native" for the built-in client. Defaults to DEFAULT_STS_BACKEND.
+    Returns:
+        Any: The boto3 STS client, or NativeStsClient.
+    """
+    if backend == "native":
+        with phase("client_build"):
+            return get_native_sts_client(access_key, secret_key, client_config, botocore_options)
+
+    cache_key = (access_key, secret_key,
+                 repr(sorted(client_config.items())),
+                 repr(sorted(botocore_options.items())) if botocore_options else None)
+    if _cache_enabled:
+        with _cache_lock:
+            sts_client = _sts_client_cache.get(cache_key)
+        if sts_client is not None:
+            return sts_client
+
+    with phase("client_build"):
+        import boto3
+        from botocore.config import Config
+        # Create a session with explicit credentials
+        session = boto3.Session(
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key
+        )
+        if botocore_options:
+            sts_client = session.client('sts', config=Config(**botocore_options), **client_config)
+        else:
+            sts_client = session.client('sts', **client_config)
+        sts_client.meta.events.register('before-send.sts', _on_sts_attempt)
+    if _cache_enabled:
+        with _cache_lock:
+            _sts_client_cache[cache_key] = sts_client
+    return sts_client
+
+# ----------------------------------------------------------------------------
+def get_sts_endpoint_url(config: ConfigParser,
+                         profile_name: str,
+                         endpoint_url: str | None = None) -> str | None:
+    """
+    Resolve the STS endpoint URL for the profile.
+    Args:
+        config (ConfigParser): The parsed credential file.
+        profile_name (str): The profile name in the AWS credentials file.
+        endpoint_url (str | None, optional): Explicitly specified endpoint URL. Defaults to None.
+    Returns:
+        str | None: The endpoint URL, or None to use the default AWS endpoint.
+    """
+    if endpoint_url:
+        return endpoint_url
+    profile_url = config.get(profile_name, 'sts_endpoint_url', fallback=None)
+    if profile_url and profile_url.strip():
+        return profile_url.strip()
+    return os.environ.get(STS_ENDPOINT_URL_ENV) or None
+
+# ----------------------------------------------------------------------------
+def get_connection_options(config: ConfigParser,
+                           profile_name: str,
+                           connection_options: Dict[str, Any] | None = None,
+                           profile_region: str | None = None) -> Dict[str, Any]:
+    """
+    Resolve the connection settings of the STS client for the profile.
+    The explicitly specified options take precedence over the `sts_*` keys of the profile (see CONNECTION_KEYS),
+    which take precedence over the defaults of the process, $UPDSTS_STS_REGION and $UPDSTS_STS_BACKEND,
+    which take precedence over the `region` of the profile in the AWS config file.
+    Args:
+        config (ConfigParser): The parsed credential file.
+        profile_name (str): The profile name in the AWS credentials file.
+        connection_options (Dict[str, Any] | None, optional): Explicitly specified options. Defaults to None.
+        profile_region (str | None, optional): The `region` of the profile (see ProfileIndex.resolve).
+            Defaults to None.
+    Returns:
+        Dict[str, Any]: Options of botocore.config.Config.
+    Raises:
+        ValueError: If a key of the profile has an invalid value.
+    """
+    ret = {'region_name': profile_region} if profile_region else {}
+    env_region = os.environ.get(STS_REGION_ENV)
+    if env_region and env_region.strip():
+        ret['region_name'] = env_region.strip()
+    env_backend = os.environ.get(STS_BACKEND_ENV)
+    if env_backend and env_backend.strip():
+        ret['sts_backend'] = env_backend.strip()
+    ret.update(_default_connection_options)
+    for key, (option, value_type) in CONNECTION_KEYS.items():
+        value = config.get(profile_name, key, fallback=None)
+        if value is None or not value.strip():
+            continue
+        try:
+            ret[option] = config.getboolean(profile_name, key) if value_type is bool else value_type(value.strip())
+        except ValueError:
+            raise ValueError(f"Invalid value of '{key}' in profile '{profile_name}': {value.strip()}")
+    if connection_options:
+        ret.update({k: v for k, v in connection_options.items() if v is not None})
+    if ret.get('sts_backend', DEFAULT_STS_BACKEND) not in STS_BACKENDS:
+        raise ValueError(f"Invalid STS backend '{ret['sts_backend']}' (choose from {', '.join(STS_BACKENDS)})")
+    return ret
+
+# ----------------------------------------------------------------------------
+def get_env_proxies() -> Dict[str, str]:
+    """
+    Read the proxy settings from the environment variables.
+    Returns:
+        Dict[str, str]: Proxy URL by scheme ("http", "https").
+    """
+    logger = get_logger()
+    proxies = {}
+    http_proxy = os.environ.get('http_proxy') or os.environ.get('HTTP_PROXY')
+    https_proxy = os.environ.get('https_proxy') or os.environ.get('HTTPS_PROXY')
+    if http_proxy:
+        proxies['http'] = http_proxy
+        logger.debug("Using HTTP proxy: %s", http_proxy)
+    if https_proxy:
+        proxies['https'] = https_proxy
+        logger.debug("Using HTTPS proxy: %s", https_proxy)
+    return proxies
+
+# ----------------------------------------------------------------------------
+def _prepare_sts_request(profile_name: str,
+                         credential_file: str | None,
+                         endpoint_url: str | None,
+                         connection_options: Dict[str, Any] | None) -> Dict[str, Any]:
+    """
+    Read the profile and resolve the settings of the STS request (shared by get_sts_token and get_sts_token_async).
+    Returns:
+        Dict[str, Any]: access_key, secret_key, mfa_arn, endpoint_url, client_config, connection
+            (the botocore options), proxies, backend and breaker.
+    """
+    logger = get_logger()
+    credential_file = get_credential_file_path(credential_file)
+    if not credential_file.exists():
+        raise FileNotFoundError(f"Credential file '{credential_file}' does not exist.")
+    index = read_profile_index(credential_file)
+    config = index.credentials
+    try:
+        access_key = config.get(profile_name, 'aws_access_key_id')
+        secret_key = config.get(profile_name, 'aws_secret_access_key')
+        resolved = index.resolve(profile_name)
+        # the `mfa_serial` of the AWS config file if the credentials file has no `mfa_device_arn`
+        mfa_arn = resolved.get('mfa_serial') or config.get(profile_name, 'mfa_device_arn')
+    except (NoOptionError) as e:
+        raise Exception(f"Profile '{profile_name}' is missing required options: {e}")
+    except (NoSectionError) as e:
+        raise Exception(f"Error reading profile '{profile_name}' from credentials file: {e}{format_suggestions(config, profile_name)}")
+
+    logger.debug("Using profile '%s' with access key '%s' and MFA device ARN '%s'", profile_name, access_key, mfa_arn)
+    endpoint_url = get_sts_endpoint_url(config, profile_name, endpoint_url)
+    connection = get_connection_options(config, profile_name, connection_options, resolved.get('region'))
+    region_name = connection.pop('region_name', None)
+    backend = connection.pop('sts_backend', DEFAULT_STS_BACKEND)
+
+    proxies = get_env_proxies()
+
+    if region_name == AUTO_REGION:
+        # the fastest healthy endpoint of the last probe (see `updsts probe`), or the default one
+        region_name = None
+        fastest = None if endpoint_url else get_fastest_endpoint(proxies)
+        if fastest is not None:
+            endpoint_url, region_name = fastest['url'], fastest.get('region')
+            logger.debug("Using the fastest STS endpoint: %s", endpoint_url)
+
+    # Create STS client with proxy configuration if available
+    client_config = {}
+    if endpoint_url:
+        client_config['endpoint_url'] = endpoint_url
+        # a custom endpoint needs a signing region (the global STS endpoint signs as us-east-1)
+        client_config['region_name'] = region_name or os.environ.get('AWS_REGION') or os.environ.get('AWS_DEFAULT_REGION') or DEFAULT_STS_REGION
+    elif region_name:
+        # the regional endpoint (sts.<region>.amazonaws.com) instead of the global sts.amazonaws.com
+        client_config['region_name'] = region_name
+    # the retries are done by call_with_retry
+    connection['retries'] = {'mode': 'standard', 'total_max_attempts': 1}
+    if proxies:
+        connection['proxies'] = proxies
+
+    if backend == "native":
+        reason = unsupported_reason(endpoint_url, proxies)
+        if reason:
+            logger.warning("The native STS client cannot be used (%s), falling back to boto3.", reason)
+            backend = "boto3"
+
+    return {
+        'access_key': access_key,
+        'secret_key': secret_key,
+        'mfa_arn': mfa_arn,
+        'endpoint_url': endpoint_url,
+        'client_config': client_config,
+        'connection': connection,
+        'proxies': proxies,
+        'backend': backend,
+        'breaker': get_circuit_breaker(endpoint_url, proxies.get('https') or proxies.get('http')),
+    }
+
+# ----------------------------------------------------------------------------
+def _get_botocore_options(request: Dict[str, Any], deadline, attempts_left: int) -> Dict[str, Any]:
+    """
+    Get the connection settings of an attempt: a deadline of the call bounds the timeouts.
+    """
+    botocore_options = dict(request['connection'])
+    if deadline is not None:
+        deadline.check("the STS request")
+        for key, value in deadline.botocore_options(attempts_left).items():
+            botocore_options[key] = min(value, botocore_options.get(key, value))
+        get_logger().debug("Deadline %.1fs remaining: %s", deadline.remaining(), botocore_options)
+    return botocore_options
+
+# ----------------------------------------------------------------------------
+def _set_request_attributes(request: Dict[str, Any]) -> None:
+    current = current_span()
+    if current is not None:
+        current.set_attribute("sts.endpoint", request['endpoint_url'] or "default")
+        current.set_attribute("sts.region", request['client_config'].get('region_name', "default"))
+        current.set_attribute("sts.proxy", bool(request['proxies']))
+        current.set_attribute("sts.backend", request['backend'])
+
+# ----------------------------------------------------------------------------
+def _format_credentials(profile_name: str, response: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert the GetSessionToken response to the credentials written to the file.
+    """
+    credentials = response['Credentials']
+    get_logger().info("Successfully obtained temporary STS credentials for profile '%s'", profile_name)
+
+    # Convert expiration time from UTC to local timezone
+    expiration_utc = credentials['Expiration']
+    # AWS returns naive datetime in UTC, so we need to make it timezone-aware
+    if expiration_utc.tzinfo is None:
+        expiration_utc = expiration_utc.replace(tzinfo=timezone.utc)
+    # Convert to local timezone
+    expiration_local = expiration_utc.astimezone()
+
+    return {
+        'AccessKeyId': credentials['AccessKeyId'],
+        'SecretAccessKey': credentials['SecretAccessKey'],
+        'SessionToken': credentials['SessionToken'],
+        'Expiration': expiration_local.isoformat()
+    }
+
+# ----------------------------------------------------------------------------
+def _on_sts_request_error(e: StsRequestError) -> None:
+    get_registry().counter("sts_errors_total").inc()
+    current = current_span()
+    if current is not None:
+        current.set_attribute("sts.error_kind", e.kind)
+    get_logger().error("Error obtaining STS token: %s", e)
+    _last_sts_error.set(e)
+
 # ----------------------------------------------------------------------------
 def get_sts_token(profile_name: str,
                   totp_token: str,
                   duration_seconds: int = 3600,
-                  credential_file: str | None = None) -> Optional[Dict[str, Any]]:
+                  credential_file: str | None = None,
+                  endpoint_url: str | None = None,
+                  connection_options: Dict[str, Any] | None = None) -> Optional[Dict[str, Any]]:
     """
     Get temporary STS token using MFA.
     Args:
@@ -92,88 +622,152 @@ def get_sts_token(profile_name: str,
         totp_token (str): The TOTP token of the registerd MFA device. 
         credential_file (str | None, optional): Path to the AWS credentials file. 
             If None, the default location (~/.aws/credentials) is used. Defaults to None.
+        endpoint_url (str | None, optional): URL of the STS endpoint.
+            If None, the `sts_endpoint_url` key of the profile or $UPDSTS_STS_ENDPOINT_URL is used,
+            and the default AWS endpoint if none of them is set. Defaults to None.
+        connection_options (Dict[str, Any] | None, optional): Connection settings of the STS client
+            (region_name, connect_timeout, read_timeout, max_pool_connections, tcp_keepalive, sts_backend).
+            The unspecified ones are taken from the profile (see get_connection_options). Defaults to None.
     Returns:
         Optional[Dict[str, Any]]: A dictionary containing the temporary STS credentials
-            if successful, None otherwise. 
+            if successful, None otherwise (see get_last_sts_error for the reason).
     Raises:
         Exception: If there is an error reading the credentials file or obtaining the STS token.
     """
-    logger = get_logger()
-
+    _last_sts_error.set(None)
     if totp_token is None or len(totp_token) == 0:
         raise ValueError("TOTP token is required to obtain STS token.")
+    request = _prepare_sts_request(profile_name, credential_file, endpoint_url, connection_options)
+    deadline = current_deadline()
+
+    def request_token(attempts_left: int):
+        botocore_options = _get_botocore_options(request, deadline, attempts_left)
+        sts_client = get_sts_client(request['access_key'], request['secret_key'], request['client_config'],
+                                    botocore_options, backend=request['backend'])
+        get_registry().counter("sts_requests_total").inc()
+        return sts_client.get_session_token(DurationSeconds=duration_seconds,
+                                            SerialNumber=request['mfa_arn'],
+                                            TokenCode=totp_token)
 
-    credential_file = get_credential_file_path(credential_file)
-    if not credential_file.exists():
-        raise FileNotFoundError(f"Credential file '{credential_file}' does not exist.")
-    config = ConfigParser()
-    config.read(credential_file)
     try:
-        access_key = config.get(profile_name, 'aws_access_key_id')
-        secret_key = config.get(profile_name, 'aws_secret_access_key')
-        mfa_arn    = config.get(profile_name, 'mfa_device_arn')
-    except (NoOptionError) as e:
-        raise Exception(f"Profile '{profile_name}' is missing required options: {e}")
-    except (NoSectionError) as e:
-        raise Exception(f"Error reading profile '{profile_name}' from credentials file: {e}")
+        with phase("sts_request"):
+            _set_request_attributes(request)
+            response = call_with_retry(request_token, request['breaker'], deadline=deadline)
+        return _format_credentials(profile_name, response)
+    except StsRequestError as e:
+        _on_sts_request_error(e)
+        return None
+
+# ----------------------------------------------------------------------------
+async def get_sts_token_async(profile_name: str,
+                              totp_token: str,
+                              duration_seconds: int = 3600,
+                              credential_file: str | None = None,
+                              endpoint_url: str | None = None,
+                              connection_options: Dict[str, Any] | None = None) -> Optional[Dict[str, Any]]:
+    """
+    Get temporary STS token using MFA without blocking the event loop (see get_sts_token).
+    The request is sent by the asyncio client of the native backend. With the boto3 backend
+    (or when the native client cannot be used) the blocking get_sts_token runs in a worker thread.
+    """
+    import asyncio
+    _last_sts_error.set(None)
+    if totp_token is None or len(totp_token) == 0:
+        raise ValueError("TOTP token is required to obtain STS token.")
+    request = _prepare_sts_request(profile_name, credential_file, endpoint_url, connection_options)
+    if request['backend'] != "native":
+        def request_in_thread():
+            # the worker runs in a copy of the context: bring the error back
+            return get_sts_token(profile_name, totp_token, duration_seconds,
+                                 credential_file, endpoint_url, connection_options), get_last_sts_error()
+        credentials, error = await asyncio.to_thread(request_in_thread)
+        _last_sts_error.set(error)
+        return credentials
+    deadline = current_deadline()
 
-    logger.debug(f"Using profile '{profile_name}' with access key '{access_key}' and MFA device ARN '{mfa_arn}'")
+    async def request_token(attempts_left: int):
+        botocore_options = _get_botocore_options(request, deadline, attempts_left)
+        with phase("client_build"):
+            sts_client = get_native_sts_client(request['access_key'], request['secret_key'],
+                                               request['client_config'], botocore_options, asynchronous=True)
+        get_registry().counter("sts_requests_total").inc()
+        return await sts_client.get_session_token(DurationSeconds=duration_seconds,
+                                                  SerialNumber=request['mfa_arn'],
+                                                  TokenCode=totp_token)
 
     try:
-        # Read proxy settings from environment variables
-        proxies = {}
-        http_proxy = os.environ.get('http_proxy') or os.environ.get('HTTP_PROXY')
-        https_proxy = os.environ.get('https_proxy') or os.environ.get('HTTPS_PROXY')
-        if http_proxy:
-            proxies['http'] = http_proxy
-            logger.debug(f"Using HTTP proxy: {http_proxy}")
-        if https_proxy:
-            proxies['https'] = https_proxy
-            logger.debug(f"Using HTTPS proxy: {https_proxy}")
+        with phase("sts_request"):
+            _set_request_attributes(request)
+            response = await call_with_retry_async(request_token, request['breaker'], deadline=deadline)
+        return _format_credentials(profile_name, response)
+    except StsRequestError as e:
+        _on_sts_request_error(e)
+        return None
 
-        # Create a session with explicit credentials
-        session = boto3.Session(
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key
-        )
+# ----------------------------------------------------------------------------
+def prewarm_sts_client(profile_name: str,
+                       credential_file: str | None = None,
+                       deadline_seconds: float | None = None) -> str:
+    """
+    Prepare the STS request of the profile ahead of the first call: parse the credentials file,
+    and with the boto3 backend build the client the call will take from the cache (boto3 is imported by then).
+    The client is only kept while the cache is enabled (see set_cache_enabled).
+    Args:
+        profile_name (str): The profile name in the AWS credentials file.
+        credential_file (str | None, optional): Path to the AWS credentials file. Defaults to None.
+        deadline_seconds (float | None, optional): Deadline of the expected call, which bounds the timeouts
+            of its client (see get_sts_token). Defaults to None.
+    Returns:
+        str: The backend of the profile.
+    """
+    request = _prepare_sts_request(profile_name, credential_file, None, None)
+    if request['backend'] == "native":
+        # nothing to build: the connections of the asyncio client belong to the event loop of the caller
+        return request['backend']
+    deadline = Deadline(deadline_seconds) if deadline_seconds else None
+    attempts = RetryPolicy().max_attempts
+    if deadline is not None:
+        attempts = min(attempts, deadline.max_attempts())
+    get_sts_client(request['access_key'], request['secret_key'], request['client_config'],
+                   _get_botocore_options(request, deadline, attempts), backend=request['backend'])
+    return request['backend']
 
-        # Create STS client with proxy configuration if available
-        client_config = {}
-        if proxies:
-            client_config['proxies'] = proxies
-
-        sts_client = session.client('sts', **client_config)
-        response = sts_client.get_session_token(DurationSeconds=duration_seconds,
-                                                SerialNumber=mfa_arn,
-                                                TokenCode=totp_token)
-        credentials = response['Credentials']
-        logger.info(f"Successfully obtained temporary STS credentials for profile '{profile_name}'")
-
-        # Convert expiration time from UTC to local timezone
-        expiration_utc = credentials['Expiration']
-        # AWS returns naive datetime in UTC, so we need to make it timezone-aware
-        if expiration_utc.tzinfo is None:
-            expiration_utc = expiration_utc.replace(tzinfo=timezone.utc)
-        # Convert to local timezone
-        expiration_local = expiration_utc.astimezone()
+# ----------------------------------------------------------------------------
+def get_sts_backend(profile_name: str,
+                    cred_file: str | os.PathLike | None = None,
+                    connection_options: Dict[str, Any] | None = None) -> str:
+    """
+    Get the STS backend selected for the profile (resolved like the other options by get_connection_options).
+    Returns:
+        str: "boto3" or "native" (the default if the file or the profile cannot be read).
+    """
+    if connection_options and connection_options.get('sts_backend'):
+        return connection_options['sts_backend']
+    try:
+        config = read_credential_config(get_credential_file_path(str(cred_file) if cred_file else None))
+        return get_connection_options(config, profile_name).get('sts_backend', DEFAULT_STS_BACKEND)
+    except (OSError, ValueError, ConfigParserError):
+        return DEFAULT_STS_BACKEND
 
-        return {
-            'AccessKeyId': credentials['AccessKeyId'],
-            'SecretAccessKey': credentials['SecretAccessKey'],
-            'SessionToken': credentials['SessionToken'],
-            'Expiration': expiration_local.isoformat()
-        }
-    except (BotoCoreError, ClientError) as e:
-        logger.error(f"Error obtaining STS token: {e}")
-        return None
+# ----------------------------------------------------------------------------
+def get_last_sts_error() -> StsRequestError | None:
+    """
+    Get the classified error of the last failed `get_sts_token` call in the current context.
+    Returns:
+        StsRequestError | None: The error (its `kind` tells throttling, network, auth, etc.),
+            or None if the last call did not fail in the STS request.
+    """
+    return _last_sts_error.get()
 
 # ----------------------------------------------------------------------------
 def get_profile_info(profile_name: str,
                      credential_file: str | None = None,
                      secret_mask: bool = False,
-                     ctx: ConfigParser = None) -> Optional[Dict[str, str]]:
+                     ctx: ProfileIndex = None) -> Optional[Dict[str, str]]:
     """
     Get the credencials from the AWS credentials file for the specified profile.
+    The settings of the profile in the AWS config file (region, role_arn, source_profile, mfa_serial, ...)
+    are added, with the `role_chain` of the `source_profile` links (see ProfileIndex.resolve).
     Args:
         profile_name (str): The profile name in the AWS credentials file.
         credential_file (str | None, optional): Path to the AWS credentials file. 
@@ -185,13 +779,13 @@ def get_profile_info(profile_name: str,
         Exception: If there is an error reading the profile from the credentials file.
     """
     logger = get_logger()
-    config = ctx
-    if config is None:
+    index = ctx
+    if index is None:
         credential_file = get_credential_file_path(credential_file)
         if not credential_file.exists():
             raise FileNotFoundError(f"Credential file '{credential_file}' does not exist.")
-        config = ConfigParser()
-        config.read(credential_file)
+        index = read_profile_index(credential_file)
+    config = index.credentials
     item_dic = None
     try:
         item_dic = {
@@ -202,10 +796,15 @@ def get_profile_info(profile_name: str,
             'totp_secret_name': '(not defined)',
             'expiration_datetime': '(not defined)'
         }
-        for key, value in config.items(profile_name):
+        # this loop runs for every key of every profile, so skip the debug log as early as possible
+        is_debug = logger.isEnabledFor(logging.DEBUG)
+        # a profile of the AWS config file only (e.g. a role) has no keys in the credentials file
+        config_only = index.has_profile(profile_name) and not config.has_section(profile_name)
+        for key, value in ([] if config_only else config.items(profile_name)):
             # Remove whitespace and newlines from log output
             safe_value = value.strip() if value else value
-            logger.debug(f"Profile '{profile_name}': {key} = {safe_value}")
+            if is_debug:
+                logger.debug("Profile '%s': %s = %s", profile_name, key, safe_value)
             # Mask secret key and session token if required
             if key == 'aws_secret_access_key':
                 secret_key = mask_string(safe_value) if (safe_value and secret_mask) else safe_value
@@ -215,14 +814,60 @@ def get_profile_info(profile_name: str,
                 item_dic[key] = session_token
             else:
                 item_dic[key] = safe_value
+        # without the AWS config file, only a chain or an mfa_serial adds to the keys of the section
+        needs_resolve = index.config_profiles or 'source_profile' in item_dic or 'mfa_serial' in item_dic
+        for key, value in (index.resolve(profile_name).items() if needs_resolve else []):
+            if key == 'role_chain':
+                if value:
+                    item_dic[key] = " -> ".join([profile_name] + value)
+            elif key == 'mfa_serial':
+                if item_dic['mfa_device_arn'] == '(not defined)':
+                    item_dic['mfa_device_arn'] = value
+            else:
+                item_dic.setdefault(key, value)
         item_dic['profile_name'] = profile_name
         return item_dic
     except (NoSectionError) as e:
-        logger.error(f"Error reading profile '{profile_name}' from credentials file: {e}")
+        logger.error("Error reading profile '%s' from credentials file: %s", profile_name, e)
+        # ranked candidates, so that the caller can retry without listing all profiles
+        candidates = suggest_profiles(config, profile_name)
+        if candidates:
+            item_dic['did_you_mean'] = ", ".join(candidates)
     except (NoOptionError) as e:
-        logger.error(f"Profile '{profile_name}' is missing required options: {e}")
+        logger.error("Profile '%s' is missing required options: %s", profile_name, e)
     return item_dic
 
+# ----------------------------------------------------------------------------
+def format_suggestions(config: ConfigParser, profile_name: str) -> str:
+    """
+    Format the "did you mean" hint for the missing profile.
+    Args:
+        config (ConfigParser): The parsed credential file.
+        profile_name (str): The missing profile name.
+    Returns:
+        str: " (did you mean: a, b?)" or "" if there is no similar profile.
+    """
+    candidates = suggest_profiles(config, profile_name)
+    return f" (did you mean: {', '.join(candidates)}?)" if candidates else ""
+
+# ----------------------------------------------------------------------------
+def get_expiry_status(expiration_datetime: str | None) -> dict[str, Any]:
+    """
+    Get the expiry status from the `expiration_datetime` value of the profile.
+    Args:
+        expiration_datetime (str | None): ISO 8601 datetime written by updsts.
+    Returns:
+        dict[str, Any]: {"expired": bool | None, "expires_in_seconds": int | None}
+            (None if the profile has no valid expiration).
+    """
+    try:
+        expiration = datetime.fromisoformat(expiration_datetime)
+    except (TypeError, ValueError):
+        return {"expired": None, "expires_in_seconds": None}
+    now = datetime.now(expiration.tzinfo) if expiration.tzinfo else datetime.now()
+    remaining = int((expiration - now).total_seconds())
+    return {"expired": remaining <= 0, "expires_in_seconds": max(remaining, 0)}
+
 # ----------------------------------------------------------------------------
 def get_profile_list(credential_file: str | None = None,
                      secret_mask: bool = False) -> list[dict[str, str]]:
@@ -241,55 +886,215 @@ def get_profile_list(credential_file: str | None = None,
     credential_file = get_credential_file_path(credential_file)
     if not credential_file.exists():
         raise FileNotFoundError(f"Credential file '{credential_file}' does not exist.")
-    config = ConfigParser()
-    config.read(credential_file)
+    index = read_profile_index(credential_file)
     profiles = []
-    for section in config.sections():
+    for section in index.profile_names():
         item_dic = get_profile_info(profile_name=section,
                                     credential_file=credential_file,
                                     secret_mask=secret_mask,
-                                    ctx=config)
+                                    ctx=index)
         if item_dic:
             profiles.append(item_dic)
 
     if not profiles:
         logger.info("No valid profiles found in the credentials file.")
     else:
-        logger.info(f"Found {len(profiles)} profiles in the credentials file.")
+        logger.info("Found %s profiles in the credentials file.", len(profiles))
     return profiles
 
+# ----------------------------------------------------------------------------
+def _store_credentials(profile_name: str,
+                       sts_credentials: dict[str, Any] | None,
+                       sts_profile_name: str | None,
+                       target_key: str | None,
+                       cred_file: str | os.PathLike | None,
+                       writer: Callable | None = None) -> dict[str, str]:
+    """
+    Write the credentials obtained by get_sts_token to the credentials file (shared by update_credentials
+    and update_credentials_async).
+    """
+    logger = get_logger()
+    if not sts_credentials:
+        error = get_last_sts_error()
+        if error is not None:
+            raise Exception(f"Failed to retrieve STS credentials: {error}") from error
+        logger.error("Failed to retrieve STS credentials.")
+        raise Exception("Failed to retrieve STS credentials.")
+    target_key = profile_name if target_key is None else target_key
+    if writer is not None:
+        ret = writer(target_key, sts_credentials, sts_profile_name)
+    else:
+        credential_file_path = Path(cred_file) if cred_file else get_credential_file_path()
+        updater = CredentialUpdater(credential_path=credential_file_path)
+        updater.set_target_tag_name(target_key)
+        updater.set_credentials(sts_credentials)
+        updater.set_sts_profile_name(sts_profile_name)
+        ret = updater.update_credential_file()
+    logger.info("STS Credentials for profile '%s' updated successfully.", profile_name)
+    print(f"STS Credentials of profile '{profile_name}' updated successfully.")
+    print(f"The temporary credential({ret.get("updated_profile_name", '')}) will expire at: {sts_credentials.get('Expiration', '')}")
+    return ret
+
 # ----------------------------------------------------------------------------
 def update_credentials(profile_name: str,
                        totp_token: str,
                        duration: int = 3600,
                        sts_profile_name: str | None = None,
                        target_key: str | None = None,
-                       cred_file: str | os.PathLike | None = None) -> dict[str, str] | None:
+                       cred_file: str | os.PathLike | None = None,
+                       writer: Callable | None = None,
+                       **sts_options) -> dict[str, str] | None:
     """
     Update the AWS credentials file with new STS tokens.
+    Additional keyword arguments (e.g. endpoint_url) are passed to `get_sts_token`.
+    The block is written by `writer(target_key, credentials, sts_profile_name)` if given
+    (e.g. the write queue of the MCP server, see tenancy.Tenant.write), otherwise by a CredentialUpdater.
     """
     logger = get_logger()
-    ret = None
     try:
         sts_credentials = get_sts_token(profile_name=profile_name,
                                         totp_token=totp_token,
                                         credential_file=cred_file,
-                                        duration_seconds=duration)
-        if sts_credentials:
-            target_key = profile_name if target_key is None else target_key
-            credential_file_path = Path(cred_file) if cred_file else get_credential_file_path()
-            updater = CredentialUpdater(credential_path=credential_file_path)
-            updater.set_target_tag_name(target_key)
-            updater.set_credentials(sts_credentials)
-            updater.set_sts_profile_name(sts_profile_name)
-            ret = updater.update_credential_file()
-            logger.info(f"STS Credentials for profile '{profile_name}' updated successfully.")
-            print(f"STS Credentials of profile '{profile_name}' updated successfully.")
-            print(f"The temporary credential({ret.get("updated_profile_name", '')}) will expire at: {sts_credentials.get('Expiration', '')}")
-        else:
-            logger.error("Failed to retrieve STS credentials.")
-            raise Exception("Failed to retrieve STS credentials.")
+                                        duration_seconds=duration,
+                                        **sts_options)
+        return _store_credentials(profile_name, sts_credentials, sts_profile_name, target_key, cred_file, writer)
     except Exception as e:
-        logger.error(f"Error: {e}")
+        logger.error("Error: %s", e)
         raise
-    return ret
+
+# ----------------------------------------------------------------------------
+async def update_credentials_async(profile_name: str,
+                                   totp_token: str,
+                                   duration: int = 3600,
+                                   sts_profile_name: str | None = None,
+                                   target_key: str | None = None,
+                                   cred_file: str | os.PathLike | None = None,
+                                   writer: Callable | None = None,
+                                   **sts_options) -> dict[str, str] | None:
+    """
+    Update the AWS credentials file with new STS tokens without blocking the event loop (see update_credentials).
+    The STS request is awaited on the event loop (native backend), and the file is rewritten in a worker thread.
+    """
+    import asyncio
+    logger = get_logger()
+    try:
+        sts_credentials = await get_sts_token_async(profile_name=profile_name,
+                                                    totp_token=totp_token,
+                                                    credential_file=cred_file,
+                                                    duration_seconds=duration,
+                                                    **sts_options)
+        return await asyncio.to_thread(_store_credentials, profile_name, sts_credentials,
+                                       sts_profile_name, target_key, cred_file, writer)
+    except Exception as e:
+        logger.error("Error: %s", e)
+        raise
+
+# ----------------------------------------------------------------------------
+def update_credentials_batch(items: list[dict[str, Any]],
+                             cred_file: str | os.PathLike | None = None,
+                             max_workers: int = DEFAULT_BATCH_WORKERS,
+                             **sts_options) -> list[dict[str, Any]]:
+    """
+    Update the AWS credentials file with new STS tokens of many profiles in one rewrite.
+    The MFA devices are requested concurrently, and the items of the same device one after another:
+    a TOTP code is accepted only once per device, so the items with the same access key, code and duration
+    share one request. The failure of an item does not stop the others.
+    Additional keyword arguments (e.g. endpoint_url) are passed to `get_sts_token`.
+    Args:
+        items (list[dict[str, Any]]): profile_name, totp_token, and optionally sts_profile_name and duration.
+        cred_file (str | os.PathLike | None, optional): Path to the AWS credentials file. Defaults to None.
+        max_workers (int, optional): MFA devices requested at the same time. Defaults to DEFAULT_BATCH_WORKERS.
+    Returns:
+        list[dict[str, Any]]: The result of each item, in the order of the items: profile_name, status
+            ("updated" or "failed"), and the updated profile info (see update_credentials) or the error.
+    Raises:
+        FileNotFoundError: If the credentials file does not exist.
+    """
+    logger = get_logger()
+    credential_file_path = get_credential_file_path(str(cred_file) if cred_file else None)
+    if not credential_file_path.exists():
+        raise FileNotFoundError(f"Credential file '{credential_file_path}' does not exist.")
+    index = read_profile_index(credential_file_path)
+    config = index.credentials
+    get_registry().counter("batch_items_total").inc(len(items))
+
+    results: list[dict[str, Any]] = [{"profile_name": item.get("profile_name"), "status": "failed"} for item in items]
+    # MFA device -> (access key, TOTP code, duration) -> indexes of the items
+    groups: dict[str, dict[tuple, list[int]]] = {}
+    seen_profiles = set()
+    for i, item in enumerate(items):
+        profile_name = item.get("profile_name")
+        totp_token = item.get("totp_token")
+        duration = item.get("duration")
+        try:
+            duration = 3600 if duration is None else int(duration)
+        except (TypeError, ValueError):
+            duration = 0
+        if not profile_name or not totp_token:
+            results[i]["error"] = "profile_name and totp_token are required."
+        elif duration <= 0:
+            results[i]["error"] = f"Invalid duration: {item.get('duration')!r} (seconds as a positive integer)."
+        elif profile_name in seen_profiles:
+            results[i]["error"] = f"Profile '{profile_name}' is duplicated in the batch."
+        elif not config.has_section(profile_name):
+            results[i]["error"] = f"Profile '{profile_name}' is not found in the credentials file.{format_suggestions(config, profile_name)}"
+        else:
+            seen_profiles.add(profile_name)
+            mfa_arn = index.resolve(profile_name).get('mfa_serial', "")
+            request_key = (config.get(profile_name, 'aws_access_key_id', fallback=""), totp_token, duration)
+            groups.setdefault(mfa_arn, {}).setdefault(request_key, []).append(i)
+
+    def request_device(requests: dict[tuple, list[int]]) -> dict[int, dict[str, Any] | str]:
+        # the credentials (or the error) of each item of the device
+        ret = {}
+        for (_, totp_token, duration), indexes in requests.items():
+            profile_name = items[indexes[0]]["profile_name"]
+            try:
+                credentials = get_sts_token(profile_name=profile_name,
+                                            totp_token=totp_token,
+                                            credential_file=str(credential_file_path),
+                                            duration_seconds=duration,
+                                            **sts_options)
+                if credentials:
+                    outcome = credentials
+                else:
+                    error = get_last_sts_error()
+                    outcome = f"Failed to retrieve STS credentials: {error}" if error is not None \
+                        else "Failed to retrieve STS credentials."
+            except Exception as e:
+                outcome = str(e)
+            ret.update({i: outcome for i in indexes})
+        return ret
+
+    outcomes: dict[int, dict[str, Any] | str] = {}
+    if groups:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(groups))),
+                                thread_name_prefix="updsts-batch") as executor:
+            # each device runs in a copy of the context (the deadline of the call, the last STS error)
+            futures = [executor.submit(copy_context().run, request_device, requests) for requests in groups.values()]
+            for future in futures:
+                outcomes.update(future.result())
+
+    updater = CredentialUpdater(credential_path=credential_file_path)
+    for i, outcome in outcomes.items():
+        if isinstance(outcome, dict):
+            updater.add_target(items[i]["profile_name"], outcome, items[i].get("sts_profile_name") or None)
+        else:
+            results[i]["error"] = outcome
+    if updater.get_targets():
+        try:
+            # every block in one rewrite
+            updater.update_credential_file()
+        except Exception as e:
+            logger.error("Error: %s", e)
+            for i, outcome in outcomes.items():
+                if isinstance(outcome, dict):
+                    results[i]["error"] = f"Failed to write the credentials file: {e}"
+        else:
+            for i, outcome in outcomes.items():
+                if isinstance(outcome, dict):
+                    results[i].update(updater.updated_profiles[items[i]["profile_name"]])
+                    results[i]["status"] = "updated"
+    logger.info("STS Credentials of %d/%d profiles updated.",
+                sum(1 for result in results if result["status"] == "updated"), len(items))
+    return results
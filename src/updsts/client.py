@@ -0,0 +1,31 @@
+﻿# encoding: utf-8-sig
+
+import sys
+
+from .daemon import forward_command
+
+# ---------------------------------------------------------------------------------------
+def main():
+    """
+    Entry point of the updsts command.
+
+    'get' and 'list' are forwarded to the resident daemon when it is running.
+    Otherwise the command is executed in-process as usual.
+    Only the standard library is loaded until the fallback is taken,
+    so that forwarded commands do not pay the boto3 / fastmcp imports.
+    """
+    response = forward_command(sys.argv[1:])
+    if response is not None:
+        if response.get("status") != "ok":
+            print(f"Error: {response.get('message', 'unknown daemon error')}", file=sys.stderr)
+            sys.exit(1)
+        sys.stdout.write(response.get("stdout", ""))
+        sys.stderr.write(response.get("stderr", ""))
+        sys.exit(response.get("exit_code", 0))
+
+    from .__main__ import main as cli_main
+    cli_main()
+
+# ---------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    main()
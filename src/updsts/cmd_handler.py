@@ -4,11 +4,40 @@ import os
 import sys
 from pathlib import Path
 from argparse import ArgumentParser
+from typing import Any
 
 from .logutil import get_logger
 from .cmdparam import *
 from .awsutil import *
 from .mcp_server import *
+from .daemon import *
+from .deadline import *
+from .memwatch import *
+from .probe import *
+from .watchview import run_watch
+from .fragments import compile_fragments
+from .credgc import collect_garbage, enable_auto_gc, get_auto_gc_days
+from .tenancy import set_tenant_options
+from .warmstart import set_warm_start_enabled
+
+# ----------------------------------------------------------------------------
+def get_connection_args(args) -> dict[str, Any]:
+    """
+    Get the connection settings of the STS client specified on the command line.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+
+    Returns:
+        dict[str, Any]: Options of botocore.config.Config and the STS backend (only the specified ones).
+    """
+    ret = {}
+    for option in ('region_name', 'connect_timeout', 'read_timeout', 'max_pool_connections', 'tcp_keepalive',
+                   'sts_backend'):
+        value = getattr(args, option, None)
+        if value is not None:
+            ret[option] = value
+    return ret
 
 # ----------------------------------------------------------------------------
 def handle_get(args):
@@ -25,13 +54,32 @@ def handle_get(args):
     duration = args.duration if args.duration else 3600
     sts_profile_name = args.sts_profile_name if hasattr(args, 'sts_profile_name') and args.sts_profile_name else None
     target_key = args.target_key if hasattr(args, 'target_key') and args.target_key else None
+    # optional settings of the STS request (passed only when specified)
+    sts_options = {}
+    if hasattr(args, 'endpoint_url') and args.endpoint_url:
+        sts_options['endpoint_url'] = args.endpoint_url
+    connection_options = get_connection_args(args)
+    if connection_options:
+        sts_options['connection_options'] = connection_options
+
+    deadline = args.deadline if hasattr(args, 'deadline') and args.deadline else None
+    auto_gc_days = get_auto_gc_days(getattr(args, 'auto_gc', None))
 
-    update_credentials(profile_name=profile_name,
-                       totp_token=totp_token,
-                       duration=duration,
-                       sts_profile_name=sts_profile_name,
-                       target_key=target_key,
-                       cred_file=cred_file)
+    with deadline_scope(deadline):
+        update_credentials(profile_name=profile_name,
+                           totp_token=totp_token,
+                           duration=duration,
+                           sts_profile_name=sts_profile_name,
+                           target_key=target_key,
+                           cred_file=cred_file,
+                           **sts_options)
+    if auto_gc_days is not None:
+        # once after the rewrite of this command only: the command may run in the daemon,
+        # whose rewrites for the other clients must not be collected (see enable_auto_gc for the MCP server)
+        try:
+            collect_garbage(get_credential_file_path(cred_file), retention_days=auto_gc_days)
+        except OSError as e:
+            get_logger().warning("automatic gc of '%s' failed: %s", cred_file, e)
 
 # ----------------------------------------------------------------------------
 def handle_list(args):
@@ -55,8 +103,28 @@ def handle_list(args):
             print(f"  Expiration DateTime : {prof['expiration_datetime']}")
             print(f"  MFA Device ARN      : {prof['mfa_device_arn']}")
             print(f"  TOTP Secret Name    : {prof['totp_secret_name']}")
+            # the settings of the AWS config file, if any
+            if prof.get('region'):
+                print(f"  Region              : {prof['region']}")
+            if prof.get('role_arn'):
+                print(f"  Role ARN            : {prof['role_arn']}")
+            if prof.get('role_chain'):
+                print(f"  Role Chain          : {prof['role_chain']}")
             print()
 
+# ----------------------------------------------------------------------------
+def handle_watch(args):
+    """
+    Handle the 'watch' command to display the profiles, updated when the credential file changes.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+    """
+    credential_file = args.credential_file if args.credential_file else None
+    run_watch(credential_file=credential_file,
+              interval=args.interval,
+              use_inotify=not args.no_inotify)
+
 # ----------------------------------------------------------------------------
 def handle_mcp(args):
     """
@@ -69,9 +137,130 @@ def handle_mcp(args):
     run_mcp = args.mcp_server if args.mcp_server else False
     if run_mcp:
         # If the MCP server flag is set, run the MCP server
-        run_as_mcp_server()
+        connection_args = get_connection_args(args)
+        probe_interval = getattr(args, 'probe_interval', None)
+        if probe_interval and not connection_args.get('region_name'):
+            connection_args['region_name'] = AUTO_REGION
+        set_default_connection_options(connection_args)
+        set_warm_start_enabled(getattr(args, 'warm_start', True))
+        set_tenant_options(max_tenants=getattr(args, 'max_files', None),
+                           rate_per_minute=getattr(args, 'file_rate_limit', None))
+        auto_gc_days = get_auto_gc_days(getattr(args, 'auto_gc', None))
+        if auto_gc_days is not None:
+            enable_auto_gc(auto_gc_days)
+        mem_watch = getattr(args, 'mem_watch', None)
+        if mem_watch:
+            mem_ceiling = getattr(args, 'mem_ceiling', None)
+            start_watchdog(interval=mem_watch,
+                           ceiling_bytes=mem_ceiling * 1024 * 1024 if mem_ceiling else None,
+                           use_tracemalloc=getattr(args, 'tracemalloc', False),
+                           on_ceiling=clear_cache)
+        if probe_interval:
+            start_prober(interval=probe_interval, proxies=get_env_proxies())
+        try:
+            run_as_mcp_server(getattr(args, 'credential_file', None),
+                              transport=getattr(args, 'transport', 'stdio'),
+                              bind=getattr(args, 'bind', None),
+                              max_concurrency=getattr(args, 'max_concurrency', DEFAULT_MAX_CONCURRENCY))
+        finally:
+            stop_prober()
+            stop_watchdog()
         pass
     else:
         # Otherwise, run the MCP server test
         disp_tools()
         pass
+
+# ----------------------------------------------------------------------------
+def handle_daemon(args):
+    """
+    Handle the 'daemon' command to run or stop the resident daemon.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+    """
+    socket_path = args.socket if args.socket else None
+    if args.stop:
+        if stop_daemon(socket_path):
+            print("updsts daemon stopped.")
+        else:
+            print("updsts daemon is not running.")
+    else:
+        run_daemon(socket_path)
+
+# ----------------------------------------------------------------------------
+def handle_compile(args):
+    """
+    Handle the 'compile' command to merge the fragment directory into the credential file.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+    """
+    credential_file = args.credential_file if args.credential_file else None
+    result = compile_fragments(credential_file=credential_file,
+                               fragment_dir=args.fragment_dir,
+                               dry_run=args.dry_run)
+    for status in ("added", "updated", "removed"):
+        for name in result[status]:
+            print(f"{status:9s}: {name}")
+    for name, reason in result["errors"].items():
+        print(f"rejected : {name} ({reason})")
+    if result["written"]:
+        print(f"'{result['credential_file']}' updated from '{result['fragment_dir']}'.")
+    elif args.dry_run:
+        print("Dry run: the credential file is not written.")
+    else:
+        print(f"'{result['credential_file']}' is up to date ({len(result['unchanged'])} fragments unchanged).")
+
+# ----------------------------------------------------------------------------
+def handle_gc(args):
+    """
+    Handle the 'gc' command to remove the stale blocks from the credential file.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+    """
+    credential_file = args.credential_file if args.credential_file else None
+    result = collect_garbage(credential_file=credential_file,
+                             retention_days=args.retention_days,
+                             dry_run=args.dry_run)
+    for status in ("dropped", "collapsed", "duplicates"):
+        for key in result[status]:
+            print(f"{status:10s}: key='{key}'")
+    if result["written"]:
+        print(f"'{result['credential_file']}' collected: {result['bytes_reclaimed']} bytes reclaimed "
+              f"({result['bytes_before']} -> {result['bytes_after']} bytes).")
+    elif args.dry_run:
+        print(f"Dry run: {result['bytes_reclaimed']} bytes would be reclaimed.")
+    else:
+        print(f"'{result['credential_file']}' has no stale blocks.")
+
+# ----------------------------------------------------------------------------
+def handle_probe(args):
+    """
+    Handle the 'probe' command to measure the latency of the STS endpoints.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+    """
+    regions = [r.strip() for r in args.regions.split(",") if r.strip()] if args.regions else None
+    proxies = get_env_proxies()
+    results = probe_endpoints(get_candidates(regions, args.endpoints),
+                              proxies=proxies,
+                              timeout=args.timeout,
+                              attempts=args.attempts)
+    save_probe_results(results, proxies.get("https") or proxies.get("http"))
+    print(f"{'Rank':>4s}  {'Latency':>9s}  {'Connect':>9s}  {'Tunnel':>9s}  {'TLS':>9s}  Endpoint")
+    for rank, result in enumerate(results, start=1):
+        def ms(key: str) -> str:
+            return f"{result[key]:.1f}ms" if result[key] is not None else "-"
+        line = f"{rank:4d}  {ms('latency_ms'):>9s}  {ms('connect_ms'):>9s}  {ms('tunnel_ms'):>9s}  " \
+               f"{ms('handshake_ms'):>9s}  {result['url']}"
+        if not result["healthy"]:
+            line += f"  (unhealthy: {result['error']})"
+        print(line)
+    fastest = next((result for result in results if result["healthy"]), None)
+    if fastest is None:
+        print("No STS endpoint is reachable.")
+    else:
+        print(f"Fastest: {fastest['url']} (used by --region auto for {int(DEFAULT_PROBE_TTL // 60)} minutes)")
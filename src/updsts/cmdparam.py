@@ -2,6 +2,57 @@
 
 import argparse
 
+# ----------------------------------------------------------------------------
+def add_connection_arguments(parser: argparse.ArgumentParser,
+                             scope: str = 'the sts_* keys of the profile'):
+    """
+    Add the connection settings of the STS client to the subcommand.
+    """
+    group = parser.add_argument_group('STS connection settings')
+    group.add_argument(
+        '--region',
+        dest='region_name',
+        type=str,
+        default=None,
+        help=f'Region of the STS endpoint, to use the regional endpoint instead of sts.amazonaws.com, '
+             f'or "auto" for the fastest endpoint of the last probe (see "updsts probe"). (default: {scope})'
+    )
+    group.add_argument(
+        '--connect-timeout',
+        type=float,
+        default=None,
+        metavar='SEC',
+        help=f'Connect timeout of the STS request. (default: {scope})'
+    )
+    group.add_argument(
+        '--read-timeout',
+        type=float,
+        default=None,
+        metavar='SEC',
+        help=f'Read timeout of the STS request. (default: {scope})'
+    )
+    group.add_argument(
+        '--max-pool-connections',
+        type=int,
+        default=None,
+        metavar='N',
+        help=f'Maximum connections kept in the pool of the STS client. (default: {scope})'
+    )
+    group.add_argument(
+        '--tcp-keepalive',
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help=f'Enable the TCP keep-alive of the STS connections. (default: {scope})'
+    )
+    group.add_argument(
+        '--sts-backend',
+        type=str,
+        choices=['boto3', 'native'],
+        default=None,
+        help=f'STS client: boto3, or the built-in native client (falls back to boto3 if it cannot be used). (default: {scope})'
+    )
+    return parser
+
 # ----------------------------------------------------------------------------
 def register_sub_get(subparsers,
                      handle_get: callable,
@@ -46,6 +97,31 @@ def register_sub_get(subparsers,
         default=3600,
         help='Duration seconds of the sts token (default: 3600)'
     )
+    get_parser.add_argument(
+        '-e',
+        '--endpoint_url',
+        type=str,
+        required=False,
+        default=None,
+        help='URL of the STS endpoint. (default: sts_endpoint_url of the profile, $UPDSTS_STS_ENDPOINT_URL or the AWS endpoint)'
+    )
+    get_parser.add_argument(
+        '--deadline',
+        type=float,
+        required=False,
+        default=None,
+        metavar='SEC',
+        help='Seconds allowed for the STS request, including the retries. (default: no deadline)'
+    )
+    get_parser.add_argument(
+        '--auto-gc',
+        type=float,
+        default=None,
+        metavar='DAYS',
+        help='Collect the stale blocks after each update, keeping the expired credentials for DAYS days. '
+             '(default: $UPDSTS_AUTO_GC_DAYS, or disabled)'
+    )
+    add_connection_arguments(get_parser)
     get_parser.set_defaults(handler=handle_get)
     return subparsers
 
@@ -67,6 +143,36 @@ def register_sub_list(subparsers,
     list_parser.set_defaults(handler=handle_list)
     return subparsers
 
+# ----------------------------------------------------------------------------
+def register_sub_watch(subparsers,
+                       handle_watch: callable,
+                       parent_parser: argparse.ArgumentParser):
+    """
+    Register the 'watch' subcommand to the argument parser.
+    """
+    watch_parser = subparsers.add_parser(
+        'watch',
+        help='Watch the profiles and their expiry',
+        description='Show the masked profiles and their expiry, updated when the credential file changes.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        parents=[parent_parser]
+    )
+    watch_parser.add_argument(
+        '-i',
+        '--interval',
+        type=float,
+        default=1.0,
+        metavar='SEC',
+        help='Refresh interval of the remaining times (and of the file polling without inotify)'
+    )
+    watch_parser.add_argument(
+        '--no-inotify',
+        action='store_true',
+        help='Poll the credential file instead of using inotify'
+    )
+    watch_parser.set_defaults(handler=handle_watch)
+    return subparsers
+
 # ----------------------------------------------------------------------------
 def register_sub_mcp(subparsers,
                      handle_mcp: callable,
@@ -86,5 +192,221 @@ def register_sub_mcp(subparsers,
         action="store_true",
         help="Run as MCP server"
     )
+    mcp_parser.add_argument(
+        "--transport",
+        type=str,
+        choices=["stdio", "http"],
+        default="stdio",
+        help="Transport of the MCP server. 'http' serves many agents from one warm process"
+    )
+    mcp_parser.add_argument(
+        "--bind",
+        type=str,
+        default="127.0.0.1:8701",
+        metavar="HOST:PORT",
+        help="Address to listen with the http transport"
+    )
+    mcp_parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=4,
+        metavar="N",
+        help="Maximum tool calls running at the same time per client session"
+    )
+    mcp_parser.add_argument(
+        "--max-files",
+        type=int,
+        default=32,
+        metavar="N",
+        help="Maximum credential files kept resident (cached) in the server (default: 32)"
+    )
+    mcp_parser.add_argument(
+        "--file-rate-limit",
+        type=float,
+        default=0.0,
+        metavar="PER_MIN",
+        help="Maximum credential refreshes per minute of each credential file, 0 for no limit (default: 0)"
+    )
+    mcp_parser.add_argument(
+        "--mem-watch",
+        type=float,
+        default=None,
+        metavar="SEC",
+        help="Sample the memory footprint every SEC seconds (see the updsts_get_memory_stats tool)"
+    )
+    mcp_parser.add_argument(
+        "--mem-ceiling",
+        type=int,
+        default=None,
+        metavar="MB",
+        help="Evict the in-process caches when the RSS exceeds MB (requires --mem-watch)"
+    )
+    mcp_parser.add_argument(
+        "--tracemalloc",
+        action="store_true",
+        help="Record the top allocation sites with tracemalloc (requires --mem-watch)"
+    )
+    mcp_parser.add_argument(
+        "--probe-interval",
+        type=float,
+        default=None,
+        metavar="SEC",
+        help="Probe the latency of the STS endpoints every SEC seconds and use the fastest one "
+             "(sets --region auto unless --region is given)"
+    )
+    mcp_parser.add_argument(
+        "--auto-gc",
+        type=float,
+        default=None,
+        metavar="DAYS",
+        help="Collect the stale blocks after each update, keeping the expired credentials for DAYS days "
+             "(default: $UPDSTS_AUTO_GC_DAYS, or disabled)"
+    )
+    mcp_parser.add_argument(
+        "--no-warm-start",
+        dest="warm_start",
+        action="store_false",
+        help="Do not restore the state of the last run (~/.awscm/cache/mcp-state.json) nor prewarm the STS clients"
+    )
+    add_connection_arguments(mcp_parser, scope='the sts_* keys of each profile')
     mcp_parser.set_defaults(handler=handle_mcp)
     return subparsers
+
+# ----------------------------------------------------------------------------
+def register_sub_daemon(subparsers,
+                        handle_daemon: callable,
+                        parent_parser: argparse.ArgumentParser):
+    """
+    Register the 'daemon' subcommand to the argument parser.
+    """
+    daemon_parser = subparsers.add_parser(
+        'daemon',
+        help='Run the resident updsts daemon',
+        description='Run the resident updsts daemon which serves get/list requests over a unix domain socket.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        parents=[parent_parser]
+    )
+    daemon_parser.add_argument(
+        '-s',
+        '--socket',
+        type=str,
+        required=False,
+        default=None,
+        help='Path to the unix domain socket. (default: $UPDSTS_SOCKET or ~/.awscm/run/updsts.sock)'
+    )
+    daemon_parser.add_argument(
+        '--stop',
+        action='store_true',
+        help='Stop the running daemon'
+    )
+    daemon_parser.set_defaults(handler=handle_daemon)
+    return subparsers
+
+# ----------------------------------------------------------------------------
+def register_sub_compile(subparsers,
+                         handle_compile: callable,
+                         parent_parser: argparse.ArgumentParser):
+    """
+    Register the 'compile' subcommand to the argument parser.
+    """
+    compile_parser = subparsers.add_parser(
+        'compile',
+        help='Merge the fragment directory into the credential file',
+        description='Merge the files of the fragment directory into the credential file, '
+                    'rewriting only the blocks of the changed fragments.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        parents=[parent_parser]
+    )
+    compile_parser.add_argument(
+        '-d',
+        '--fragment_dir',
+        type=str,
+        required=False,
+        default=None,
+        help='Path to the fragment directory. (default: $UPDSTS_FRAGMENT_DIR or <credential file>.d)'
+    )
+    compile_parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Show the changes without writing the credential file'
+    )
+    compile_parser.set_defaults(handler=handle_compile)
+    return subparsers
+
+# ----------------------------------------------------------------------------
+def register_sub_gc(subparsers,
+                    handle_gc: callable,
+                    parent_parser: argparse.ArgumentParser):
+    """
+    Register the 'gc' subcommand to the argument parser.
+    """
+    gc_parser = subparsers.add_parser(
+        'gc',
+        help='Remove the stale blocks from the credential file',
+        description='Drop the blocks of the deleted profiles and collapse the blocks expired '
+                    'more than the retention days ago, in one rewrite of the credential file.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        parents=[parent_parser]
+    )
+    gc_parser.add_argument(
+        '-r',
+        '--retention-days',
+        type=float,
+        default=7.0,
+        metavar='DAYS',
+        help='Days to keep the expired credentials'
+    )
+    gc_parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Show the stale blocks without writing the credential file'
+    )
+    gc_parser.set_defaults(handler=handle_gc)
+    return subparsers
+
+# ----------------------------------------------------------------------------
+def register_sub_probe(subparsers,
+                       handle_probe: callable,
+                       parent_parser: argparse.ArgumentParser):
+    """
+    Register the 'probe' subcommand to the argument parser.
+    """
+    probe_parser = subparsers.add_parser(
+        'probe',
+        help='Measure the latency of the STS endpoints',
+        description='Measure the connect and TLS handshake latency of the global and regional STS endpoints '
+                    'through the proxy, and keep the ranking for "--region auto".',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        parents=[parent_parser]
+    )
+    probe_parser.add_argument(
+        '--regions',
+        type=str,
+        default=None,
+        metavar='REGION,...',
+        help='Comma separated regions of the regional endpoints to probe. (default: the major regions)'
+    )
+    probe_parser.add_argument(
+        '--endpoint',
+        dest='endpoints',
+        action='append',
+        default=None,
+        metavar='URL',
+        help='Other endpoint to probe, e.g. a VPC endpoint (repeatable)'
+    )
+    probe_parser.add_argument(
+        '--timeout',
+        type=float,
+        default=3.0,
+        metavar='SEC',
+        help='Timeout of each step of a connection'
+    )
+    probe_parser.add_argument(
+        '--attempts',
+        type=int,
+        default=3,
+        metavar='N',
+        help='Connections to each endpoint (the median is used)'
+    )
+    probe_parser.set_defaults(handler=handle_probe)
+    return subparsers
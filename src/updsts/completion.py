@@ -0,0 +1,204 @@
+﻿# encoding: utf-8-sig
+
+import json
+import os
+import re
+import sys
+from pathlib import Path
+
+# NOTE: this module is loaded on every TAB press, so only the standard library
+#       may be imported (not even the other modules of updsts, which load boto3).
+
+CACHE_PATH_ENV = "UPDSTS_COMPLETION_CACHE"
+SHELLS = ("bash", "zsh", "fish")
+
+SUBCOMMANDS = ("get", "list", "watch", "mcp", "daemon", "compile", "gc", "probe")
+GLOBAL_OPTIONS = ("-h", "--help", "--profile", "--stats", "--trace")
+COMMON_OPTIONS = ("-h", "--help", "-v", "--verbose", "-c", "--credential_file", "--no_log_file")
+CONNECTION_OPTIONS = ("--region", "--connect-timeout", "--read-timeout", "--max-pool-connections",
+                      "--tcp-keepalive", "--no-tcp-keepalive", "--sts-backend")
+SUBCOMMAND_OPTIONS = {
+    "get": ("-n", "--profile_name", "-sn", "--sts_profile_name", "-t", "--totp_token", "-d", "--duration",
+            "-e", "--endpoint_url", "--deadline", "--auto-gc") + CONNECTION_OPTIONS,
+    "list": (),
+    "watch": ("-i", "--interval", "--no-inotify"),
+    "mcp": ("--mcp-server", "--transport", "--bind", "--max-concurrency", "--max-files", "--file-rate-limit",
+            "--mem-watch", "--mem-ceiling", "--tracemalloc", "--probe-interval", "--auto-gc",
+            "--no-warm-start") + CONNECTION_OPTIONS,
+    "daemon": ("-s", "--socket", "--stop"),
+    "compile": ("-d", "--fragment_dir", "--dry-run"),
+    "gc": ("-r", "--retention-days", "--dry-run"),
+    "probe": ("--regions", "--endpoint", "--timeout", "--attempts"),
+}
+PROFILE_OPTIONS = ("-n", "--profile_name")
+CREDENTIAL_FILE_OPTIONS = ("-c", "--credential_file")
+
+SECTION_RE = re.compile(r"^\s*\[([^\]]+)\]", re.MULTILINE)
+TAG_KEY_RE = re.compile(r"^#\s*\$\{\{\{\s*key=(\S+)", re.MULTILINE)
+
+BASH_SCRIPT = """\
+_updsts_complete() {
+    local IFS=$'\\n'
+    COMPREPLY=( $(updsts-complete complete "$COMP_CWORD" "${COMP_WORDS[@]}") )
+}
+complete -o default -F _updsts_complete updsts
+"""
+
+ZSH_SCRIPT = """\
+#compdef updsts
+_updsts() {
+    local -a candidates
+    candidates=("${(@f)$(updsts-complete complete $((CURRENT - 1)) "${words[@]}")}")
+    if (( ${#candidates} )) && [[ -n "${candidates[1]}" ]]; then
+        compadd -- "${candidates[@]}"
+    else
+        _files
+    fi
+}
+compdef _updsts updsts
+"""
+
+FISH_SCRIPT = """\
+function __updsts_complete
+    set -l tokens (commandline -opc)
+    updsts-complete complete (count $tokens) $tokens (commandline -ct)
+end
+complete -c updsts -f -a '(__updsts_complete)'
+complete -c updsts -n 'contains -- (commandline -opc)[-1] -c --credential_file' -F
+"""
+
+# ----------------------------------------------------------------------------
+def get_cache_path() -> Path:
+    """
+    Get the path of the name index ($UPDSTS_COMPLETION_CACHE or ~/.awscm/cache/completion.json).
+    """
+    env_path = os.environ.get(CACHE_PATH_ENV)
+    if env_path:
+        return Path(env_path)
+    return Path(os.path.expanduser("~")) / ".awscm" / "cache" / "completion.json"
+
+# ----------------------------------------------------------------------------
+def scan_profile_names(text: str) -> list[str]:
+    """
+    Get the section names and the keys of the updsts tag blocks of the credentials file.
+    Args:
+        text (str): Contents of the credentials file.
+    Returns:
+        list[str]: The names, sorted and without duplicates.
+    """
+    names = {name.strip() for name in SECTION_RE.findall(text)}
+    names.update(TAG_KEY_RE.findall(text))
+    names.discard("")
+    return sorted(names)
+
+# ----------------------------------------------------------------------------
+def read_profile_names(credential_file: str | os.PathLike | None = None,
+                       cache_path: str | os.PathLike | None = None) -> list[str]:
+    """
+    Get the profile names of the credentials file, from the name index while the file is unchanged.
+    Args:
+        credential_file (str | os.PathLike | None, optional): Path to the credentials file.
+            If None, ~/.aws/credentials is used. Defaults to None.
+        cache_path (str | os.PathLike | None, optional): Path of the name index. Defaults to get_cache_path().
+    Returns:
+        list[str]: The profile names (empty if the file cannot be read).
+    """
+    path = Path(os.path.expanduser(credential_file)) if credential_file else \
+        Path(os.path.expanduser("~")) / ".aws" / "credentials"
+    try:
+        st = path.stat()
+    except OSError:
+        return []
+    key = os.path.abspath(path)
+    fingerprint = [st.st_mtime_ns, st.st_size, st.st_ino]
+    cache_path = Path(cache_path) if cache_path else get_cache_path()
+
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        entry = index.get(key)
+        if entry and entry.get("fingerprint") == fingerprint:
+            return entry["names"]
+    except (OSError, ValueError, AttributeError):
+        index = {}
+
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            names = scan_profile_names(f.read())
+    except OSError:
+        return []
+
+    # the index is best effort: a failure to write it must not break the completion
+    index = index if isinstance(index, dict) else {}
+    index[key] = {"fingerprint": fingerprint, "names": names}
+    try:
+        cache_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+    return names
+
+# ----------------------------------------------------------------------------
+def complete(cword: int, words: list[str]) -> list[str]:
+    """
+    Get the candidates of the word being completed.
+    Args:
+        cword (int): Index of the word being completed in the words.
+        words (list[str]): The words of the command line ("updsts" first).
+    Returns:
+        list[str]: The candidates. Empty to let the shell complete the file names.
+    """
+    current = words[cword] if cword < len(words) else ""
+    previous = words[cword - 1] if 0 < cword <= len(words) else ""
+    before = words[1:cword]
+
+    if previous in PROFILE_OPTIONS:
+        credential_file = None
+        for i, word in enumerate(before):
+            if word in CREDENTIAL_FILE_OPTIONS and i + 1 < len(before):
+                credential_file = before[i + 1]
+            elif word.startswith("--credential_file="):
+                credential_file = word.split("=", 1)[1]
+        return [name for name in read_profile_names(credential_file) if name.startswith(current)]
+    if previous in CREDENTIAL_FILE_OPTIONS:
+        return []
+
+    subcommand = next((word for word in before if word in SUBCOMMANDS), None)
+    if subcommand is None:
+        candidates = GLOBAL_OPTIONS if current.startswith("-") else SUBCOMMANDS
+    elif current.startswith("-"):
+        candidates = COMMON_OPTIONS + SUBCOMMAND_OPTIONS[subcommand]
+    else:
+        return []
+    return [candidate for candidate in candidates if candidate.startswith(current)]
+
+# ----------------------------------------------------------------------------
+def main(argv: list[str] | None = None) -> int:
+    """
+    Entry point of the updsts-complete command.
+
+        updsts-complete script {bash,zsh,fish}    print the script to register the completion
+        updsts-complete complete CWORD WORDS...   print the candidates (called by the script)
+        updsts-complete names [CREDENTIAL_FILE]   print the profile names
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) >= 2 and argv[0] == "script" and argv[1] in SHELLS:
+        sys.stdout.write({"bash": BASH_SCRIPT, "zsh": ZSH_SCRIPT, "fish": FISH_SCRIPT}[argv[1]])
+        return 0
+    if len(argv) >= 2 and argv[0] == "complete" and argv[1].isdigit():
+        candidates = complete(int(argv[1]), argv[2:])
+    elif argv and argv[0] == "names":
+        candidates = read_profile_names(argv[1] if len(argv) > 1 else None)
+    else:
+        sys.stderr.write("usage: updsts-complete script {bash,zsh,fish} | complete CWORD WORDS... | names [FILE]\n")
+        return 2
+    if candidates:
+        sys.stdout.write("\n".join(candidates) + "\n")
+    return 0
+
+# ---------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    sys.exit(main())
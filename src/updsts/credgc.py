@@ -0,0 +1,210 @@
+﻿# encoding: utf-8-sig
+
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any
+
+from .awsutil import get_credential_file_path
+from .logutil import get_logger
+from .metrics import get_registry
+from .timing import phase
+from .upcred import add_update_listener, get_file_lock, remove_update_listener, update_listeners
+
+AUTO_GC_ENV = "UPDSTS_AUTO_GC_DAYS"
+DEFAULT_RETENTION_DAYS = 7.0
+
+# the tags of the blocks written by CredentialUpdater
+KEY_BGN_TAG = re.compile(r"^\s*#\s+\$\{\{\{\s+key=([\w\-_]+)\s+.*\r?\n?$")
+KEY_END_TAG = re.compile(r"^\s*#\s+\$\}\}\}\s+.*\r?\n?$")
+SECTION_RE = re.compile(r"^\s*\[([^\]]+)\]")
+EXPIRATION_RE = re.compile(r"^\s*expiration_datetime\s*[=:]\s*(.*?)\s*$")
+
+# globals
+auto_gc_retention_days: float | None = None
+
+# ----------------------------------------------------------------------------
+def split_key_blocks(lines: list[str]) -> list[tuple[str | None, list[str]]]:
+    """
+    Split the lines of the credentials file into the `key=` blocks and the other lines.
+    Returns:
+        list[tuple[str | None, list[str]]]: (key, lines) of each part. The key is None for the other lines.
+    """
+    parts = []
+    other = []
+    block = None
+    for line in lines:
+        if block is None:
+            obj = KEY_BGN_TAG.match(line)
+            if obj:
+                if other:
+                    parts.append((None, other))
+                    other = []
+                block = (obj.group(1), [line])
+            else:
+                other.append(line)
+            continue
+        block[1].append(line)
+        if KEY_END_TAG.match(line):
+            parts.append(block)
+            block = None
+    if block is not None:
+        # an unterminated block is not touched
+        other.extend(block[1])
+    if other:
+        parts.append((None, other))
+    return parts
+
+# ----------------------------------------------------------------------------
+def get_block_expiration(block_lines: list[str]) -> datetime | None:
+    """
+    Get the `expiration_datetime` of the block, or None if it is missing or invalid.
+    """
+    for line in block_lines:
+        obj = EXPIRATION_RE.match(line)
+        if obj:
+            try:
+                return datetime.fromisoformat(obj.group(1))
+            except ValueError:
+                return None
+    return None
+
+# ----------------------------------------------------------------------------
+def collect_garbage(credential_file: str | os.PathLike | None = None,
+                    retention_days: float = DEFAULT_RETENTION_DAYS,
+                    dry_run: bool = False,
+                    now: datetime | None = None) -> dict[str, Any]:
+    """
+    Remove the stale `key=` blocks of the credentials file in one atomic rewrite.
+    - The blocks whose key has no base profile left are dropped.
+    - The blocks that expired more than `retention_days` ago are collapsed to their tags,
+      so that the next `get` of the profile writes at the same place.
+    - The later blocks of a duplicated key are dropped (CredentialUpdater rewrites them all).
+    Args:
+        credential_file (str | os.PathLike | None, optional): Path to the credentials file. Defaults to None.
+        retention_days (float, optional): Days to keep the expired credentials. Defaults to DEFAULT_RETENTION_DAYS.
+        dry_run (bool, optional): Do not write the credentials file. Defaults to False.
+        now (datetime | None, optional): Current time (for the tests). Defaults to None.
+    Returns:
+        dict[str, Any]: The keys by action ("dropped", "collapsed", "duplicates"), the sizes of the file
+            ("bytes_before", "bytes_after", "bytes_reclaimed"), and whether the file was rewritten ("written").
+    """
+    logger = get_logger()
+    credential_file_path = get_credential_file_path(str(credential_file) if credential_file else None)
+    result = {"credential_file": str(credential_file_path),
+              "dropped": [], "collapsed": [], "duplicates": [],
+              "bytes_before": 0, "bytes_after": 0, "bytes_reclaimed": 0, "written": False}
+
+    with get_file_lock(credential_file_path), phase("gc"):
+        with credential_file_path.open(mode="r", encoding="utf-8") as fin:
+            lines = fin.readlines()
+        parts = split_key_blocks(lines)
+        # the sections outside the managed blocks (including the compiled fragments) are the base profiles
+        base_profiles = {obj.group(1).strip()
+                         for key, part_lines in parts if key is None
+                         for obj in map(SECTION_RE.match, part_lines) if obj}
+        threshold = timedelta(days=retention_days)
+        current = now if now else datetime.now(timezone.utc)
+        if current.tzinfo is None:
+            current = current.astimezone()
+
+        out_lines = []
+        seen_keys = set()
+        for key, part_lines in parts:
+            if key is None:
+                out_lines.extend(part_lines)
+                continue
+            if key in seen_keys:
+                result["duplicates"].append(key)
+                continue
+            seen_keys.add(key)
+            if key not in base_profiles:
+                result["dropped"].append(key)
+                continue
+            expiration = get_block_expiration(part_lines)
+            if expiration is not None:
+                # the naive datetimes are in the local time
+                if expiration.tzinfo is None:
+                    expiration = expiration.astimezone()
+                if current - expiration > threshold:
+                    result["collapsed"].append(key)
+                    out_lines.extend([part_lines[0], part_lines[-1]])
+                    continue
+            out_lines.extend(part_lines)
+
+        result["bytes_before"] = sum(len(line.encode("utf-8")) for line in lines)
+        result["bytes_after"] = sum(len(line.encode("utf-8")) for line in out_lines)
+        result["bytes_reclaimed"] = result["bytes_before"] - result["bytes_after"]
+        if dry_run or result["bytes_reclaimed"] == 0:
+            return result
+
+        out_path = credential_file_path.with_suffix(".tmp")
+        with out_path.open(mode="w", encoding="utf-8") as fout:
+            fout.writelines(out_lines)
+            fout.flush()
+            with phase("fsync"):
+                os.fsync(fout.fileno())
+        os.chmod(out_path, credential_file_path.stat().st_mode)
+        os.replace(out_path, credential_file_path)
+        result["written"] = True
+        logger.info("collected the stale blocks of '%s': dropped=%s collapsed=%s duplicates=%s (%d bytes reclaimed)",
+                    credential_file_path, result["dropped"], result["collapsed"], result["duplicates"],
+                    result["bytes_reclaimed"])
+
+    metrics = get_registry()
+    metrics.counter("credential_file_rewrites_total").inc()
+    metrics.counter("gc_bytes_reclaimed_total").inc(result["bytes_reclaimed"])
+    metrics.gauge("credential_file_bytes").set(result["bytes_after"])
+    for listener in list(update_listeners):
+        if listener is _auto_gc_listener:
+            continue
+        try:
+            listener(credential_file_path)
+        except Exception as e:
+            logger.error("update listener failed: %s", e)
+    return result
+
+# ----------------------------------------------------------------------------
+def _auto_gc_listener(credential_file_path: Path) -> None:
+    if auto_gc_retention_days is None:
+        return
+    try:
+        collect_garbage(credential_file_path, retention_days=auto_gc_retention_days)
+    except OSError as e:
+        get_logger().warning("automatic gc of '%s' failed: %s", credential_file_path, e)
+
+# ----------------------------------------------------------------------------
+def get_auto_gc_days(retention_days: float | None = None) -> float | None:
+    """
+    Get the retention days of the automatic gc: the explicit value, or $UPDSTS_AUTO_GC_DAYS.
+    Returns:
+        float | None: The retention days, or None if the automatic gc is disabled.
+    """
+    if retention_days is not None:
+        return retention_days
+    try:
+        return float(os.environ[AUTO_GC_ENV])
+    except (KeyError, ValueError):
+        return None
+
+# ----------------------------------------------------------------------------
+def enable_auto_gc(retention_days: float = DEFAULT_RETENTION_DAYS) -> None:
+    """
+    Collect the stale blocks after every rewrite of a credentials file by CredentialUpdater.
+    The gc only reads the file unless there is something to collect.
+    Args:
+        retention_days (float, optional): Days to keep the expired credentials. Defaults to DEFAULT_RETENTION_DAYS.
+    """
+    global auto_gc_retention_days
+    auto_gc_retention_days = retention_days
+    add_update_listener(_auto_gc_listener)
+
+# ----------------------------------------------------------------------------
+def disable_auto_gc() -> None:
+    global auto_gc_retention_days
+    auto_gc_retention_days = None
+    remove_update_listener(_auto_gc_listener)
+
+
+__all__ = ["collect_garbage", "disable_auto_gc", "enable_auto_gc", "get_auto_gc_days"]
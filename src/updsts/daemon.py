@@ -0,0 +1,330 @@
+﻿# encoding: utf-8-sig
+
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+# NOTE: this module is imported by the thin client (client.py) before the heavy
+#       modules (boto3, fastmcp) are loaded, so only the standard library may be
+#       imported at the module level.
+
+SOCKET_PATH_ENV = "UPDSTS_SOCKET"
+NO_DAEMON_ENV = "UPDSTS_NO_DAEMON"
+FORWARDABLE_COMMANDS = ("get", "list")
+CONNECT_TIMEOUT = 0.5
+REQUEST_TIMEOUT = 300.0
+MAX_REQUEST_BYTES = 1024 * 1024
+# environment of the client read by the forwarded commands: the command is run in-process
+# if one of them differs from the environment of the daemon (the environment is process-wide)
+FORWARDED_ENV = (
+    "HTTP_PROXY", "http_proxy", "HTTPS_PROXY", "https_proxy", "NO_PROXY", "no_proxy",
+    "AWS_REGION", "AWS_DEFAULT_REGION", "AWS_CONFIG_FILE", "AWS_CA_BUNDLE", "AWS_MAX_ATTEMPTS",
+    "AWS_ENDPOINT_URL", "AWS_ENDPOINT_URL_STS", "AWS_STS_REGIONAL_ENDPOINTS",
+    "UPDSTS_STS_ENDPOINT_URL", "UPDSTS_STS_REGION", "UPDSTS_STS_BACKEND", "UPDSTS_AUTO_GC_DAYS",
+    "UPDSTS_PROBE_CACHE",
+)
+
+# ----------------------------------------------------------------------------
+def get_socket_path(socket_path: str | os.PathLike | None = None) -> Path:
+    """
+    Get the path of the unix domain socket of the daemon.
+    Args:
+        socket_path (str | os.PathLike | None, optional): Path to the socket.
+            If None, $UPDSTS_SOCKET or ~/.awscm/run/updsts.sock is used. Defaults to None.
+    Returns:
+        Path: Path of the socket.
+    """
+    if socket_path:
+        return Path(socket_path)
+    env_path = os.environ.get(SOCKET_PATH_ENV)
+    if env_path:
+        return Path(env_path)
+    user_home = os.path.expanduser("~")
+    return Path(user_home) / ".awscm" / "run" / "updsts.sock"
+
+# ----------------------------------------------------------------------------
+def normalize_argv(argv: list[str], cwd: str) -> list[str]:
+    """
+    Make the credential file path in the arguments absolute,
+    so that the daemon resolves it against the working directory of the client.
+    Args:
+        argv (list[str]): Command line arguments.
+        cwd (str): Working directory of the client.
+    Returns:
+        list[str]: Normalized arguments.
+    """
+    ret = []
+    is_path_next = False
+    for arg in argv:
+        if is_path_next:
+            arg = os.path.join(cwd, os.path.expanduser(arg))
+            is_path_next = False
+        elif arg in ("-c", "--credential_file"):
+            is_path_next = True
+        elif arg.startswith("--credential_file="):
+            value = arg.split("=", 1)[1]
+            arg = f"--credential_file={os.path.join(cwd, os.path.expanduser(value))}"
+        ret.append(arg)
+    return ret
+
+# ----------------------------------------------------------------------------
+def send_request(request: dict,
+                 socket_path: str | os.PathLike | None = None,
+                 timeout: float = REQUEST_TIMEOUT) -> dict | None:
+    """
+    Send a request to the daemon.
+    Args:
+        request (dict): The request message.
+        socket_path (str | os.PathLike | None, optional): Path to the socket. Defaults to None.
+        timeout (float, optional): Timeout seconds to wait for the response.
+    Returns:
+        dict | None: The response message, or None if the daemon is not running.
+    """
+    path = get_socket_path(socket_path)
+    if not path.exists():
+        return None
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(CONNECT_TIMEOUT)
+        try:
+            sock.connect(str(path))
+        except OSError:
+            # stale socket file or the daemon is not accepting connections
+            return None
+        # once the request is sent, it must not be executed again in-process
+        # (e.g. the TOTP token cannot be reused), so errors are reported from here.
+        sock.settimeout(timeout)
+        try:
+            sock.sendall((json.dumps(request) + "\n").encode("utf-8"))
+            chunks = []
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                if chunk.endswith(b"\n"):
+                    break
+            data = b"".join(chunks)
+            if not data:
+                return {"status": "error", "message": "The daemon closed the connection without a response."}
+            return json.loads(data.decode("utf-8"))
+        except (OSError, ValueError) as e:
+            return {"status": "error", "message": f"Failed to communicate with the daemon: {e}"}
+
+# ----------------------------------------------------------------------------
+def forward_command(argv: list[str],
+                    socket_path: str | os.PathLike | None = None) -> dict | None:
+    """
+    Forward the command to the daemon if it is running.
+    Args:
+        argv (list[str]): Command line arguments (without the program name).
+        socket_path (str | os.PathLike | None, optional): Path to the socket. Defaults to None.
+    Returns:
+        dict | None: The response of the daemon,
+            or None if the command should be executed in-process
+            (including when the environment of the daemon differs, see FORWARDED_ENV).
+    """
+    if not argv or argv[0] not in FORWARDABLE_COMMANDS:
+        return None
+    if os.environ.get(NO_DAEMON_ENV):
+        return None
+    request = {
+        "command": "run",
+        "argv": normalize_argv(argv, os.getcwd()),
+        "env": {name: os.environ.get(name) for name in FORWARDED_ENV},
+    }
+    response = send_request(request, socket_path=socket_path)
+    if response and response.get("status") == "fallback":
+        # the daemon did not run the command
+        return None
+    return response
+
+# ----------------------------------------------------------------------------
+def stop_daemon(socket_path: str | os.PathLike | None = None) -> bool:
+    """
+    Request the running daemon to stop.
+    Args:
+        socket_path (str | os.PathLike | None, optional): Path to the socket. Defaults to None.
+    Returns:
+        bool: True if the daemon accepted the request.
+    """
+    response = send_request({"command": "shutdown"}, socket_path=socket_path, timeout=CONNECT_TIMEOUT)
+    return bool(response and response.get("status") == "ok")
+
+# ############################################################################
+class _ThreadLocalStream(io.TextIOBase):
+    """
+    Text stream which redirects writes of the capturing thread into its own buffer.
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self, default_stream):
+        self._default_stream = default_stream
+        self._local = threading.local()
+
+    # ----------------------------------------------------------------------------
+    def writable(self) -> bool:
+        return True
+
+    # ----------------------------------------------------------------------------
+    def write(self, s: str) -> int:
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is not None:
+            return buffer.write(s)
+        return self._default_stream.write(s)
+
+    # ----------------------------------------------------------------------------
+    def flush(self):
+        if getattr(self._local, "buffer", None) is None:
+            self._default_stream.flush()
+
+    # ----------------------------------------------------------------------------
+    @contextmanager
+    def capture(self):
+        buffer = io.StringIO()
+        self._local.buffer = buffer
+        try:
+            yield buffer
+        finally:
+            self._local.buffer = None
+
+# ############################################################################
+class _DaemonRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Handle one request per connection.
+    """
+    # ----------------------------------------------------------------------------
+    def handle(self):
+        try:
+            line = self.rfile.readline(MAX_REQUEST_BYTES)
+            request = json.loads(line.decode("utf-8"))
+            response = self.server.dispatch(request)
+        except Exception as e:
+            response = {"status": "error", "message": str(e)}
+        self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+
+# ############################################################################
+class UpdstsDaemon(socketserver.ThreadingUnixStreamServer):
+    """
+    Resident daemon serving the updsts commands over a unix domain socket.
+    The parsed credential files and the STS clients are kept warm between requests.
+    """
+    daemon_threads = True
+
+    # ----------------------------------------------------------------------------
+    def __init__(self, socket_path: Path, cli_main: callable):
+        self.socket_path = socket_path
+        self.cli_main = cli_main
+        self.stdout = None
+        self.stderr = None
+        self._stream_lock = threading.Lock()
+        super().__init__(str(socket_path), _DaemonRequestHandler)
+
+    # ----------------------------------------------------------------------------
+    def install_streams(self):
+        """
+        Route sys.stdout / sys.stderr through the capturing streams.
+        The streams are installed again if somebody else replaced them.
+        """
+        with self._stream_lock:
+            if sys.stdout is not self.stdout:
+                self.stdout = _ThreadLocalStream(sys.stdout)
+                sys.stdout = self.stdout
+            if sys.stderr is not self.stderr:
+                self.stderr = _ThreadLocalStream(sys.stderr)
+                sys.stderr = self.stderr
+
+    # ----------------------------------------------------------------------------
+    def dispatch(self, request: dict) -> dict:
+        """
+        Execute the request.
+        Args:
+            request (dict): The request message.
+        Returns:
+            dict: The response message.
+        """
+        command = request.get("command")
+        if command == "ping":
+            return {"status": "ok", "pid": os.getpid()}
+        if command == "shutdown":
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return {"status": "ok"}
+        if command == "run":
+            argv = request.get("argv") or []
+            if not argv or argv[0] not in FORWARDABLE_COMMANDS:
+                return {"status": "error", "message": f"Command is not supported by the daemon: {argv[:1]}"}
+            env = request.get("env") or {}
+            differs = sorted(name for name in FORWARDED_ENV if name in env and env[name] != os.environ.get(name))
+            if differs:
+                return {"status": "fallback", "message": f"The environment of the daemon differs: {differs}"}
+            return self.run_command(argv)
+        return {"status": "error", "message": f"Unknown request: {command}"}
+
+    # ----------------------------------------------------------------------------
+    def run_command(self, argv: list[str]) -> dict:
+        """
+        Run the CLI command in-process and capture its output.
+        """
+        exit_code = 0
+        self.install_streams()
+        with self.stdout.capture() as out, self.stderr.capture() as err:
+            try:
+                self.cli_main(argv)
+            except SystemExit as e:
+                exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        return {
+            "status": "ok",
+            "exit_code": exit_code,
+            "stdout": out.getvalue(),
+            "stderr": err.getvalue(),
+        }
+
+# ----------------------------------------------------------------------------
+def run_daemon(socket_path: str | os.PathLike | None = None) -> None:
+    """
+    Run the daemon in the foreground until it is stopped.
+    Args:
+        socket_path (str | os.PathLike | None, optional): Path to the socket. Defaults to None.
+    Raises:
+        RuntimeError: If another daemon is already listening on the socket.
+    """
+    # heavy imports are done here, so that the daemon is warm for the first request
+    from .__main__ import main as cli_main
+    from .awsutil import set_cache_enabled
+    from .filewatch import start_file_watcher, stop_file_watcher
+    from .logutil import get_logger
+
+    logger = get_logger()
+    path = get_socket_path(socket_path)
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    if path.exists():
+        response = send_request({"command": "ping"}, socket_path=path, timeout=CONNECT_TIMEOUT)
+        if response and response.get("status") == "ok":
+            raise RuntimeError(f"updsts daemon is already running on '{path}' (pid={response.get('pid')}).")
+        # remove the stale socket file
+        path.unlink()
+
+    set_cache_enabled(True)
+    start_file_watcher()
+    server = UpdstsDaemon(path, cli_main)
+    os.chmod(path, 0o600)
+    saved_streams = (sys.stdout, sys.stderr)
+    server.install_streams()
+    logger.info("updsts daemon is listening on '%s'", path)
+    try:
+        server.serve_forever()
+    finally:
+        sys.stdout, sys.stderr = saved_streams
+        server.server_close()
+        if path.exists():
+            path.unlink()
+        stop_file_watcher()
+        set_cache_enabled(False)
+        logger.info("updsts daemon stopped")
+
+
+__all__ = ["get_socket_path", "forward_command", "stop_daemon", "run_daemon", "UpdstsDaemon"]
@@ -0,0 +1,124 @@
+﻿# encoding: utf-8-sig
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator
+
+# per-attempt timeouts are rounded down to these steps (seconds),
+# so that the cached STS clients stay few while the remaining time varies
+TIMEOUT_STEPS = (0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+# the deadline of the current call (None when the call has no deadline)
+_current_deadline: ContextVar["Deadline | None"] = ContextVar("updsts_deadline", default=None)
+
+# ############################################################################
+class DeadlineExceeded(TimeoutError):
+    """
+    The call ran out of its time, or it was cancelled by the caller.
+    """
+
+# ############################################################################
+class Deadline:
+    """
+    Time limit of one call, shared by the caller and the worker thread doing the blocking work.
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+        self._cancelled = threading.Event()
+
+    # ----------------------------------------------------------------------------
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    # ----------------------------------------------------------------------------
+    def cancel(self) -> None:
+        """
+        Cancel the call (e.g. the client disconnected). The worker stops at its next check.
+        """
+        self._cancelled.set()
+
+    # ----------------------------------------------------------------------------
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    # ----------------------------------------------------------------------------
+    def wait(self, seconds: float) -> None:
+        """
+        Sleep for the seconds, but no longer than the remaining time, and wake up on the cancellation.
+        """
+        self._cancelled.wait(min(seconds, self.remaining()))
+
+    # ----------------------------------------------------------------------------
+    def check(self, stage: str) -> None:
+        """
+        Raise if the work should not go on to the stage.
+        Args:
+            stage (str): Name of the next stage (for the message).
+        Raises:
+            DeadlineExceeded: If the call was cancelled or its deadline passed.
+        """
+        if self.cancelled:
+            raise DeadlineExceeded(f"The call was cancelled before {stage}.")
+        if self.remaining() <= 0:
+            raise DeadlineExceeded(f"The deadline of {self.seconds:g} seconds was exceeded before {stage}.")
+
+    # ----------------------------------------------------------------------------
+    def max_attempts(self) -> int:
+        """
+        Get the number of attempts the remaining time is worth (the retry budget).
+        """
+        remaining = self.remaining()
+        return 3 if remaining >= 10 else (2 if remaining >= 4 else 1)
+
+    # ----------------------------------------------------------------------------
+    def botocore_options(self, attempts: int = 1) -> dict[str, Any]:
+        """
+        Map the remaining time onto the botocore connect/read timeouts of the next attempt.
+        Args:
+            attempts (int, optional): Number of attempts left (including the next one)
+                sharing the remaining time. Defaults to 1.
+        Returns:
+            dict[str, Any]: Keyword arguments of botocore.config.Config.
+        """
+        per_attempt = self.remaining() / max(attempts, 1)
+        timeout = TIMEOUT_STEPS[0]
+        for step in TIMEOUT_STEPS:
+            if step <= per_attempt:
+                timeout = step
+        return {"connect_timeout": timeout, "read_timeout": timeout}
+
+# ----------------------------------------------------------------------------
+def current_deadline() -> Deadline | None:
+    """
+    Get the deadline of the current call.
+    """
+    return _current_deadline.get()
+
+# ----------------------------------------------------------------------------
+@contextmanager
+def deadline_scope(seconds: float | None) -> Iterator[Deadline | None]:
+    """
+    Set the deadline of the enclosed call.
+    The worker threads started with asyncio.to_thread in the block inherit it.
+    Args:
+        seconds (float | None): Seconds allowed for the call. None or 0 means no deadline.
+    Yields:
+        Deadline | None: The deadline, or None if there is no deadline.
+    """
+    if not seconds or seconds <= 0:
+        yield None
+        return
+    deadline = Deadline(seconds)
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+__all__ = ["Deadline", "DeadlineExceeded", "current_deadline", "deadline_scope"]
@@ -0,0 +1,294 @@
+﻿# encoding: utf-8-sig
+
+import argparse
+import random
+import secrets
+import string
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+from xml.sax.saxutils import escape
+
+# Local stand-in for the AWS STS query API.
+# It implements GetSessionToken / AssumeRole with configurable latency and fault injection,
+# so that the refresh path can be benchmarked and soak-tested without network access.
+#
+#   python -m updsts.fakests --port 8765 --latency normal:80:20 --throttle-rate 0.05
+#
+# and point updsts at it with the `sts_endpoint_url` profile key
+# or the UPDSTS_STS_ENDPOINT_URL environment variable.
+
+STS_XMLNS = "https://sts.amazonaws.com/doc/2011-06-15/"
+
+# ############################################################################
+class LatencyModel:
+    """
+    Latency distribution of the fake STS responses (milliseconds).
+
+    Spec format:
+        fixed:<ms>
+        uniform:<min_ms>:<max_ms>
+        normal:<mean_ms>:<stddev_ms>
+        exponential:<mean_ms>
+        lognormal:<median_ms>:<sigma>
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self, spec: str = "fixed:0", rng: random.Random | None = None):
+        self.spec = spec
+        self.rng = rng if rng else random.Random()
+        name, *params = spec.split(":")
+        try:
+            values = [float(v) for v in params]
+        except ValueError:
+            raise ValueError(f"Invalid latency spec: '{spec}'")
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "exponential": 1, "lognormal": 2}
+        if name not in expected or len(values) != expected[name]:
+            raise ValueError(f"Invalid latency spec: '{spec}'")
+        self.name = name
+        self.values = values
+
+    # ----------------------------------------------------------------------------
+    def sample(self) -> float:
+        """
+        Draw one latency value.
+        Returns:
+            float: latency in seconds (never negative).
+        """
+        v = self.values
+        if self.name == "fixed":
+            ms = v[0]
+        elif self.name == "uniform":
+            ms = self.rng.uniform(v[0], v[1])
+        elif self.name == "normal":
+            ms = self.rng.gauss(v[0], v[1])
+        elif self.name == "exponential":
+            ms = self.rng.expovariate(1.0 / v[0]) if v[0] > 0 else 0.0
+        else:
+            ms = self.rng.lognormvariate(0.0, v[1]) * v[0]
+        return max(0.0, ms) / 1000.0
+
+# ############################################################################
+class FakeStsServer(ThreadingHTTPServer):
+    """
+    HTTP server emulating the STS query API.
+    """
+    daemon_threads = True
+
+    # ----------------------------------------------------------------------------
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 latency: str = "fixed:0",
+                 throttle_rate: float = 0.0,
+                 mfa_fault_rate: float = 0.0,
+                 reject_reused_mfa: bool = True,
+                 seed: int | None = None):
+        """
+        Args:
+            host (str, optional): Listen address. Defaults to "127.0.0.1".
+            port (int, optional): Listen port. 0 selects a free port. Defaults to 0.
+            latency (str, optional): Latency spec (see LatencyModel). Defaults to "fixed:0".
+            throttle_rate (float, optional): Ratio of requests answered with a Throttling error.
+            mfa_fault_rate (float, optional): Ratio of requests answered with an MFA failure.
+            reject_reused_mfa (bool, optional): Reject a TOTP code already used for the same device.
+            seed (int | None, optional): Random seed for reproducible runs.
+        """
+        self.rng = random.Random(seed)
+        self.latency = LatencyModel(latency, self.rng)
+        self.throttle_rate = throttle_rate
+        self.mfa_fault_rate = mfa_fault_rate
+        self.reject_reused_mfa = reject_reused_mfa
+        self.lock = threading.Lock()
+        self.used_mfa_codes: set[tuple[str, str]] = set()
+        self.stats = {
+            "requests": 0,
+            "succeeded": 0,
+            "throttled": 0,
+            "mfa_failed": 0,
+            "invalid": 0,
+        }
+        super().__init__((host, port), _FakeStsRequestHandler)
+
+    # ----------------------------------------------------------------------------
+    @property
+    def endpoint_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    # ----------------------------------------------------------------------------
+    def count(self, key: str):
+        with self.lock:
+            self.stats[key] += 1
+
+    # ----------------------------------------------------------------------------
+    def draw(self, rate: float) -> bool:
+        with self.lock:
+            return rate > 0 and self.rng.random() < rate
+
+    # ----------------------------------------------------------------------------
+    def use_mfa_code(self, serial: str, code: str) -> bool:
+        """
+        Register the TOTP code as used.
+        Returns:
+            bool: False if the code was already used for the device.
+        """
+        with self.lock:
+            key = (serial, code)
+            if key in self.used_mfa_codes:
+                return False
+            self.used_mfa_codes.add(key)
+            return True
+
+    # ----------------------------------------------------------------------------
+    def start(self) -> threading.Thread:
+        """
+        Serve in a background thread.
+        """
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    # ----------------------------------------------------------------------------
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+# ############################################################################
+class _FakeStsRequestHandler(BaseHTTPRequestHandler):
+    """
+    Request handler of the fake STS server.
+    """
+    protocol_version = "HTTP/1.1"
+    server: FakeStsServer
+
+    # ----------------------------------------------------------------------------
+    def log_message(self, format, *args):
+        # keep the console quiet under load
+        pass
+
+    # ----------------------------------------------------------------------------
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", "0"))
+        body = self.rfile.read(length).decode("utf-8")
+        params = {k: v[0] for k, v in parse_qs(body).items()}
+        self.server.count("requests")
+
+        delay = self.server.latency.sample()
+        if delay:
+            time.sleep(delay)
+
+        action = params.get("Action", "")
+        if action not in ("GetSessionToken", "AssumeRole"):
+            self.server.count("invalid")
+            self.send_error_response(400, "InvalidAction", f"Could not find operation {action}")
+            return
+        if self.server.draw(self.server.throttle_rate):
+            self.server.count("throttled")
+            self.send_error_response(400, "Throttling", "Rate exceeded")
+            return
+
+        serial = params.get("SerialNumber")
+        code = params.get("TokenCode")
+        if serial or code:
+            if self.server.draw(self.server.mfa_fault_rate):
+                self.server.count("mfa_failed")
+                self.send_error_response(403, "AccessDenied",
+                                         "MultiFactorAuthentication failed, unable to validate MFA code.")
+                return
+            if self.server.reject_reused_mfa and not self.server.use_mfa_code(serial or "", code or ""):
+                self.server.count("mfa_failed")
+                self.send_error_response(403, "AccessDenied",
+                                         "MultiFactorAuthentication failed with invalid MFA one time pass code.")
+                return
+
+        duration = int(params.get("DurationSeconds", "3600"))
+        if action == "GetSessionToken":
+            result = self.credentials_xml(duration)
+        else:
+            role_arn = params.get("RoleArn", "arn:aws:iam::123456789012:role/fake")
+            session_name = params.get("RoleSessionName", "fake-session")
+            role_id = "AROA" + _random_string(16, string.ascii_uppercase + string.digits)
+            result = (
+                self.credentials_xml(duration)
+                + "<AssumedRoleUser>"
+                + f"<Arn>{escape(role_arn)}/{escape(session_name)}</Arn>"
+                + f"<AssumedRoleId>{role_id}:{escape(session_name)}</AssumedRoleId>"
+                + "</AssumedRoleUser>"
+            )
+        self.server.count("succeeded")
+        self.send_xml(200,
+                      f'<{action}Response xmlns="{STS_XMLNS}">'
+                      f"<{action}Result>{result}</{action}Result>"
+                      f"<ResponseMetadata><RequestId>{uuid.uuid4()}</RequestId></ResponseMetadata>"
+                      f"</{action}Response>")
+
+    # ----------------------------------------------------------------------------
+    def credentials_xml(self, duration: int) -> str:
+        expiration = datetime.now(timezone.utc) + timedelta(seconds=duration)
+        return (
+            "<Credentials>"
+            f"<AccessKeyId>ASIA{_random_string(16, string.ascii_uppercase + string.digits)}</AccessKeyId>"
+            f"<SecretAccessKey>{_random_string(40)}</SecretAccessKey>"
+            f"<SessionToken>FwoGZXIvYXdzE{_random_string(120)}</SessionToken>"
+            f"<Expiration>{expiration.strftime('%Y-%m-%dT%H:%M:%SZ')}</Expiration>"
+            "</Credentials>"
+        )
+
+    # ----------------------------------------------------------------------------
+    def send_error_response(self, status: int, code: str, message: str):
+        self.send_xml(status,
+                      f'<ErrorResponse xmlns="{STS_XMLNS}">'
+                      f"<Error><Type>Sender</Type><Code>{code}</Code><Message>{escape(message)}</Message></Error>"
+                      f"<RequestId>{uuid.uuid4()}</RequestId>"
+                      "</ErrorResponse>")
+
+    # ----------------------------------------------------------------------------
+    def send_xml(self, status: int, xml: str):
+        data = xml.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/xml")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+# ----------------------------------------------------------------------------
+def _random_string(length: int, alphabet: str = string.ascii_letters + string.digits + "/+") -> str:
+    return "".join(secrets.choice(alphabet) for _ in range(length))
+
+# ----------------------------------------------------------------------------
+def main():
+    argp = argparse.ArgumentParser(prog="python -m updsts.fakests",
+                                   description="Run a local fake STS endpoint for offline load tests.",
+                                   formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    argp.add_argument('--host', type=str, default="127.0.0.1", help='Listen address.')
+    argp.add_argument('--port', type=int, default=8765, help='Listen port.')
+    argp.add_argument('--latency', type=str, default="fixed:0",
+                      help='Latency distribution in ms (fixed:MS, uniform:MIN:MAX, normal:MEAN:SD, exponential:MEAN, lognormal:MEDIAN:SIGMA).')
+    argp.add_argument('--throttle-rate', type=float, default=0.0, help='Ratio of requests answered with a Throttling error.')
+    argp.add_argument('--mfa-fault-rate', type=float, default=0.0, help='Ratio of requests answered with an MFA failure.')
+    argp.add_argument('--allow-mfa-reuse', action='store_true', help='Accept a TOTP code already used for the same device.')
+    argp.add_argument('--seed', type=int, default=None, help='Random seed.')
+    args = argp.parse_args()
+
+    server = FakeStsServer(host=args.host,
+                           port=args.port,
+                           latency=args.latency,
+                           throttle_rate=args.throttle_rate,
+                           mfa_fault_rate=args.mfa_fault_rate,
+                           reject_reused_mfa=not args.allow_mfa_reuse,
+                           seed=args.seed)
+    print(f"fake STS endpoint is listening on {server.endpoint_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"stats: {server.stats}")
+
+# ----------------------------------------------------------------------------
+if __name__ == "__main__":
+    main()
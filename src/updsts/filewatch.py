@@ -0,0 +1,376 @@
+﻿# encoding: utf-8-sig
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+from pathlib import Path
+from typing import Callable
+
+from .logutil import get_logger
+from .metrics import get_registry
+
+DEFAULT_POLL_INTERVAL = 1.0
+
+# inotify event masks (see inotify(7))
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+# the directory is watched, since the files are replaced by renaming (updsts, editors, the AWS CLI)
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+EVENT_HEADER = struct.Struct("iIII")
+
+# ----------------------------------------------------------------------------
+def _stat_fingerprint(path: Path) -> tuple[int, int, int] | None:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+# ----------------------------------------------------------------------------
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    except OSError:
+        return None
+    return libc if hasattr(libc, "inotify_init1") and hasattr(libc, "inotify_add_watch") else None
+
+# ############################################################################
+class FileWatcher:
+    """
+    Watch files for changes, with inotify on Linux and stat polling elsewhere.
+    Every change bumps the generation of the file, so that a parse cache keyed by the generation
+    is invalidated without calling stat() on every read, and the listeners are called with the path.
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self, poll_interval: float = DEFAULT_POLL_INTERVAL, use_inotify: bool = True):
+        """
+        Args:
+            poll_interval (float, optional): Interval of the stat polling in seconds. Defaults to DEFAULT_POLL_INTERVAL.
+            use_inotify (bool, optional): Use inotify if available. Defaults to True.
+        """
+        self.poll_interval = poll_interval
+        self._libc = _load_libc() if use_inotify else None
+        self._inotify_fd: int | None = None
+        # resolved path -> generation
+        self._generations: dict[Path, int] = {}
+        # resolved path -> last stat fingerprint (polling only)
+        self._fingerprints: dict[Path, tuple[int, int, int] | None] = {}
+        # inotify watch descriptor -> watched directory, and its reverse
+        self._dirs: dict[int, Path] = {}
+        self._dir_wds: dict[Path, int] = {}
+        self._listeners: list[Callable[[Path], None]] = []
+        self._lock = threading.Lock()
+        # held while the read events are applied, so that a reader never sees them half applied
+        self._events_lock = threading.RLock()
+        self._stop_r: int | None = None
+        self._stop_w: int | None = None
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # ----------------------------------------------------------------------------
+    @property
+    def backend(self) -> str:
+        """
+        "inotify" if the changes are delivered by the kernel, "poll" if they are found by polling (or not started).
+        """
+        return "inotify" if self._inotify_fd is not None else "poll"
+
+    # ----------------------------------------------------------------------------
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # ----------------------------------------------------------------------------
+    def add_listener(self, listener: Callable[[Path], None]) -> None:
+        """
+        Add the listener called with the resolved path of a changed file (in the watcher thread).
+        """
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    # ----------------------------------------------------------------------------
+    def remove_listener(self, listener: Callable[[Path], None]) -> None:
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    # ----------------------------------------------------------------------------
+    def watch(self, path: str | os.PathLike) -> Path:
+        """
+        Start watching the file (it may not exist yet).
+        Args:
+            path (str | os.PathLike): Path of the file.
+        Returns:
+            Path: The resolved path, used as the key of the generation and passed to the listeners.
+        """
+        path = Path(path)
+        with self._lock:
+            if path in self._generations:
+                # already resolved and watched (skips the syscalls of resolve())
+                return path
+        resolved = path.resolve()
+        with self._lock:
+            if resolved in self._generations:
+                return resolved
+            self._generations[resolved] = 0
+            self._fingerprints[resolved] = _stat_fingerprint(resolved)
+            if self._inotify_fd is not None:
+                self._add_dir_watch(resolved.parent)
+        return resolved
+
+    # ----------------------------------------------------------------------------
+    def unwatch(self, path: str | os.PathLike) -> None:
+        resolved = Path(path).resolve()
+        with self._lock:
+            self._generations.pop(resolved, None)
+            self._fingerprints.pop(resolved, None)
+
+    # ----------------------------------------------------------------------------
+    def is_watching(self, path: str | os.PathLike) -> bool:
+        with self._lock:
+            return Path(path).resolve() in self._generations
+
+    # ----------------------------------------------------------------------------
+    def generation(self, path: str | os.PathLike) -> int | None:
+        """
+        Watch the file and get its generation, bumped on every change.
+        Args:
+            path (str | os.PathLike): Path of the file.
+        Returns:
+            int | None: The generation, or None if the changes are found by polling
+                (not promptly, so the callers must check the file by themselves).
+        """
+        if self._inotify_fd is None:
+            return None
+        resolved = self.watch(path)
+        self._drain_events()
+        with self._lock:
+            return self._generations.get(resolved)
+
+    # ----------------------------------------------------------------------------
+    def _add_dir_watch(self, directory: Path) -> None:
+        if directory in self._dir_wds:
+            return
+        wd = self._libc.inotify_add_watch(self._inotify_fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            # e.g. the directory does not exist yet: the file is checked by polling until then
+            get_logger().debug("inotify_add_watch failed for '%s': errno=%d", directory, ctypes.get_errno())
+            return
+        self._dirs[wd] = directory
+        self._dir_wds[directory] = wd
+
+    # ----------------------------------------------------------------------------
+    def _changed(self, paths: set[Path]) -> None:
+        self._notify_listeners(self._bump_generations(paths))
+
+    # ----------------------------------------------------------------------------
+    def _bump_generations(self, paths: set[Path]) -> set[Path]:
+        with self._lock:
+            for path in paths:
+                self._generations[path] = self._generations.get(path, 0) + 1
+        return paths
+
+    # ----------------------------------------------------------------------------
+    def _notify_listeners(self, paths: set[Path]) -> None:
+        with self._lock:
+            listeners = list(self._listeners)
+        registry = get_registry()
+        for path in paths:
+            get_logger().debug("watched file changed: %s", path)
+            registry.counter("watched_file_changes_total").inc()
+            for listener in listeners:
+                try:
+                    listener(path)
+                except Exception as e:
+                    get_logger().error("file watch listener failed: %s", e)
+
+    # ----------------------------------------------------------------------------
+    def _poll_changes(self) -> set[Path]:
+        changed = set()
+        with self._lock:
+            paths = list(self._fingerprints.keys())
+        for path in paths:
+            fingerprint = _stat_fingerprint(path)
+            with self._lock:
+                if path in self._fingerprints and self._fingerprints[path] != fingerprint:
+                    self._fingerprints[path] = fingerprint
+                    changed.add(path)
+        return changed
+
+    # ----------------------------------------------------------------------------
+    def _read_events(self) -> set[Path]:
+        try:
+            data = os.read(self._inotify_fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        changed = set()
+        offset = 0
+        with self._lock:
+            while offset + EVENT_HEADER.size <= len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0")
+                offset += EVENT_HEADER.size + length
+                if mask & IN_Q_OVERFLOW:
+                    # events were lost: every file may have changed
+                    changed.update(self._generations.keys())
+                    continue
+                directory = self._dirs.get(wd)
+                if directory is None:
+                    continue
+                if mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                    # the directory is gone: watch it again once the files are polled back
+                    self._dirs.pop(wd, None)
+                    self._dir_wds.pop(directory, None)
+                    changed.update(p for p in self._generations if p.parent == directory)
+                    continue
+                path = directory / os.fsdecode(name)
+                if path in self._generations:
+                    changed.add(path)
+        return changed
+
+    # ----------------------------------------------------------------------------
+    def _drain_events(self) -> None:
+        """
+        Apply the pending events in the calling thread.
+        The kernel queues the event before write()/rename() returns, so a change made by another process
+        just before this call is applied even if the watcher thread has not read it yet.
+        The listeners are called after the events lock is released, since they may read the file again
+        (e.g. the resource hub, whose lock is held by the writer thread calling generation()).
+        """
+        changed = set()
+        with self._events_lock:
+            if self._inotify_fd is None:
+                return
+            readable, _, _ = select.select([self._inotify_fd], [], [], 0)
+            if readable:
+                changed = self._bump_generations(self._read_events())
+        if changed:
+            self._notify_listeners(changed)
+
+    # ----------------------------------------------------------------------------
+    def _run_inotify(self):
+        while not self._stop_event.is_set():
+            readable, _, _ = select.select([self._inotify_fd, self._stop_r], [], [], self.poll_interval)
+            if self._stop_r in readable:
+                break
+            if self._inotify_fd in readable:
+                self._drain_events()
+            with self._lock:
+                # the files of the unwatched directories (removed or not created yet) fall back to polling
+                unwatched = any(path.parent not in self._dir_wds for path in self._generations)
+            if unwatched:
+                changed = {p for p in self._poll_changes() if p.parent not in self._dir_wds}
+                with self._lock:
+                    # and their directories are watched again when they appear
+                    for path in self._generations:
+                        if path.parent not in self._dir_wds and path.parent.is_dir():
+                            self._add_dir_watch(path.parent)
+                if changed:
+                    self._changed(changed)
+
+    # ----------------------------------------------------------------------------
+    def _run_poll(self):
+        while not self._stop_event.wait(self.poll_interval):
+            changed = self._poll_changes()
+            if changed:
+                self._changed(changed)
+
+    # ----------------------------------------------------------------------------
+    def start(self) -> None:
+        """
+        Start watching in a background thread.
+        """
+        if self.running:
+            return
+        self._stop_event.clear()
+        target = self._run_poll
+        if self._libc is not None:
+            fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                # e.g. the limit of the inotify instances is reached
+                get_logger().warning("inotify is not available (errno=%d), polling the files", ctypes.get_errno())
+            else:
+                self._inotify_fd = fd
+                self._stop_r, self._stop_w = os.pipe()
+                with self._lock:
+                    for path in self._generations:
+                        self._add_dir_watch(path.parent)
+                target = self._run_inotify
+        self._thread = threading.Thread(target=target, name="updsts-filewatch", daemon=True)
+        self._thread.start()
+
+    # ----------------------------------------------------------------------------
+    def stop(self) -> None:
+        """
+        Stop the background thread and release the inotify instance.
+        """
+        self._stop_event.set()
+        if self._stop_w is not None:
+            os.write(self._stop_w, b"x")
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._events_lock:
+            for fd in (self._inotify_fd, self._stop_r, self._stop_w):
+                if fd is not None:
+                    os.close(fd)
+            self._inotify_fd = self._stop_r = self._stop_w = None
+        with self._lock:
+            self._dirs.clear()
+            self._dir_wds.clear()
+
+# globals
+watcher: FileWatcher | None = None
+
+# ----------------------------------------------------------------------------
+def get_file_watcher() -> FileWatcher | None:
+    """
+    Get the process-wide file watcher, or None if it is not started.
+    """
+    return watcher
+
+# ----------------------------------------------------------------------------
+def start_file_watcher(**kwargs) -> FileWatcher:
+    """
+    Start the process-wide file watcher, used by the parse cache of the credential files.
+    Args:
+        **kwargs: Arguments of FileWatcher.
+    Returns:
+        FileWatcher: The started watcher.
+    """
+    global watcher
+    if watcher is not None:
+        watcher.stop()
+    watcher = FileWatcher(**kwargs)
+    watcher.start()
+    return watcher
+
+# ----------------------------------------------------------------------------
+def stop_file_watcher() -> None:
+    """
+    Stop the process-wide file watcher.
+    """
+    global watcher
+    if watcher is not None:
+        watcher.stop()
+        watcher = None
+
+
+__all__ = ["FileWatcher", "get_file_watcher", "start_file_watcher", "stop_file_watcher"]
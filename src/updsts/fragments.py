@@ -0,0 +1,262 @@
+﻿# encoding: utf-8-sig
+
+import hashlib
+import os
+import re
+from configparser import ConfigParser, Error as ConfigParserError
+from pathlib import Path
+from typing import Any
+
+from .awsutil import get_credential_file_path
+from .logutil import get_logger
+from .metrics import get_registry
+from .timing import phase
+from .upcred import get_file_lock, update_listeners
+
+FRAGMENT_DIR_ENV = "UPDSTS_FRAGMENT_DIR"
+# fragment files: plain names only (editor backups and temporary files are ignored)
+FRAGMENT_NAME_RE = re.compile(r"^[\w\-][\w.\-]*$")
+IGNORED_SUFFIXES = (".tmp", ".swp", ".bak", ".orig")
+
+# the compiled blocks are tagged apart from the `key=` blocks rewritten by CredentialUpdater
+FRAGMENT_BGN_TAG = re.compile(r"^\s*#\s+\$\{\{\{\s+fragment=(\S+)\s+sha256=([0-9a-f]{64})\s+.*\r?\n?$")
+FRAGMENT_END_TAG = re.compile(r"^\s*#\s+\$\}\}\}\s+fragment=(\S+)\s+.*\r?\n?$")
+KEY_BGN_TAG = re.compile(r"^\s*#\s+\$\{\{\{\s+key=")
+SECTION_RE = re.compile(r"^\s*\[([^\]]+)\]")
+
+# ----------------------------------------------------------------------------
+def get_fragment_dir(credential_file_path: Path, fragment_dir: str | os.PathLike | None = None) -> Path:
+    """
+    Get the fragment directory of the credentials file.
+    Args:
+        credential_file_path (Path): Path to the credentials file.
+        fragment_dir (str | os.PathLike | None, optional): Explicit directory. If None, $UPDSTS_FRAGMENT_DIR
+            or `<credentials file>.d` (e.g. ~/.aws/credentials.d) is used. Defaults to None.
+    Returns:
+        Path: The fragment directory.
+    """
+    if fragment_dir:
+        return Path(os.path.expanduser(fragment_dir))
+    env_dir = os.environ.get(FRAGMENT_DIR_ENV)
+    if env_dir:
+        return Path(os.path.expanduser(env_dir))
+    return credential_file_path.with_name(credential_file_path.name + ".d")
+
+# ----------------------------------------------------------------------------
+def list_fragments(fragment_dir: Path) -> list[Path]:
+    """
+    Get the fragment files of the directory, sorted by name (the order of the appended blocks).
+    """
+    if not fragment_dir.is_dir():
+        return []
+    return sorted((p for p in fragment_dir.iterdir()
+                   if p.is_file() and FRAGMENT_NAME_RE.match(p.name) and not p.name.endswith(IGNORED_SUFFIXES)),
+                  key=lambda p: p.name)
+
+# ----------------------------------------------------------------------------
+def split_blocks(lines: list[str]) -> list[tuple[str | None, str | None, list[str]]]:
+    """
+    Split the lines of the credentials file into the compiled fragment blocks and the other lines.
+    Args:
+        lines (list[str]): Lines of the credentials file (with the line endings).
+    Returns:
+        list[tuple[str | None, str | None, list[str]]]: (fragment name, sha256, lines) of each part.
+            The name and the hash are None for the lines that are not compiled from a fragment.
+    """
+    parts = []
+    other = []
+    block = None
+    for line in lines:
+        if block is None:
+            obj = FRAGMENT_BGN_TAG.match(line)
+            if obj:
+                if other:
+                    parts.append((None, None, other))
+                    other = []
+                block = (obj.group(1), obj.group(2), [line])
+            else:
+                other.append(line)
+            continue
+        block[2].append(line)
+        eobj = FRAGMENT_END_TAG.match(line)
+        if eobj and eobj.group(1) == block[0]:
+            parts.append(block)
+            block = None
+    if block is not None:
+        # an unterminated block (e.g. cut by hand): keep its lines as they are
+        other.extend(block[2])
+    if other:
+        parts.append((None, None, other))
+    return parts
+
+# ----------------------------------------------------------------------------
+def render_block(name: str, digest: str, text: str) -> list[str]:
+    """
+    Render the compiled block of the fragment.
+    """
+    body = text if text.endswith("\n") or not text else text + "\n"
+    return ([f"# ${{{{{{ fragment={name} sha256={digest} [compiled by updsts]\n"]
+            + body.splitlines(keepends=True)
+            + [f"# $}}}}}} fragment={name} [compiled by updsts]\n"])
+
+# ----------------------------------------------------------------------------
+def check_fragment(text: str, taken_sections: set[str]) -> list[str]:
+    """
+    Check that the fragment can be merged into the credentials file.
+    Args:
+        text (str): Contents of the fragment.
+        taken_sections (set[str]): Sections already defined by the other parts of the credentials file.
+    Returns:
+        list[str]: The sections of the fragment.
+    Raises:
+        ValueError: If the fragment cannot be parsed, contains an updsts managed block,
+            or redefines a section of the other parts.
+    """
+    for line in text.splitlines():
+        if KEY_BGN_TAG.match(line) or FRAGMENT_BGN_TAG.match(line):
+            raise ValueError("the managed blocks of updsts must stay in the credentials file")
+    config = ConfigParser(interpolation=None)
+    try:
+        config.read_string(text)
+    except ConfigParserError as e:
+        raise ValueError(f"cannot be parsed: {e}") from e
+    duplicated = sorted(set(config.sections()) & taken_sections)
+    if duplicated:
+        raise ValueError(f"section(s) {', '.join(duplicated)} already defined")
+    return config.sections()
+
+# ----------------------------------------------------------------------------
+def compile_fragments(credential_file: str | os.PathLike | None = None,
+                      fragment_dir: str | os.PathLike | None = None,
+                      dry_run: bool = False) -> dict[str, Any]:
+    """
+    Merge the files of the fragment directory into the credentials file.
+    Each fragment is compiled into a block tagged with the sha256 of its contents, so only the fragments
+    whose hash changed are checked again, the blocks of the removed fragments are dropped, the new ones
+    are appended, and the file is rewritten in a single pass only if any block changed.
+    The lines outside the compiled blocks (including the `key=` blocks updated by `get`) are kept as they are.
+    Args:
+        credential_file (str | os.PathLike | None, optional): Path to the credentials file. Defaults to None.
+        fragment_dir (str | os.PathLike | None, optional): Fragment directory (see get_fragment_dir). Defaults to None.
+        dry_run (bool, optional): Do not write the credentials file. Defaults to False.
+    Returns:
+        dict[str, Any]: The fragment names by result ("added", "updated", "removed", "unchanged"),
+            the rejected fragments with the reason ("errors"), and whether the file was rewritten ("written").
+    Raises:
+        ValueError: If the fragment directory does not exist (all the compiled blocks would be dropped).
+    """
+    logger = get_logger()
+    credential_file_path = get_credential_file_path(str(credential_file) if credential_file else None)
+    fragment_dir = get_fragment_dir(credential_file_path, fragment_dir)
+    if not fragment_dir.is_dir():
+        # e.g. a mistyped -d: not the same as an empty directory, whose fragments were all removed
+        raise ValueError(f"The fragment directory '{fragment_dir}' does not exist.")
+    result = {"credential_file": str(credential_file_path), "fragment_dir": str(fragment_dir),
+              "added": [], "updated": [], "removed": [], "unchanged": [], "errors": {}, "written": False}
+
+    with get_file_lock(credential_file_path), phase("compile"):
+        try:
+            with credential_file_path.open(mode="r", encoding="utf-8") as fin:
+                lines = fin.readlines()
+        except FileNotFoundError:
+            lines = []
+        parts = split_blocks(lines)
+        compiled = {name: digest for name, digest, _ in parts if name is not None}
+
+        # hash every fragment, but check only the new and the changed ones
+        fragments = {}
+        for path in list_fragments(fragment_dir):
+            data = path.read_bytes()
+            fragments[path.name] = (hashlib.sha256(data).hexdigest(), data)
+        changed = [name for name, (digest, _) in fragments.items() if compiled.get(name) != digest]
+
+        # the sections of the parts that are kept as they are, and of the last blocks of the changed fragments
+        taken_base = set()
+        last_sections = {}
+        for name, _, part_lines in parts:
+            sections = {obj.group(1).strip() for obj in map(SECTION_RE.match, part_lines) if obj}
+            if name is None or (name in fragments and name not in changed):
+                taken_base |= sections
+            elif name in fragments:
+                last_sections[name] = sections
+
+        # the fragments that cannot be merged whatever the others are rejected first
+        texts = {}
+        for name in changed:
+            try:
+                texts[name] = fragments[name][1].decode("utf-8-sig")
+                check_fragment(texts[name], set())
+            except (UnicodeDecodeError, ValueError) as e:
+                result["errors"][name] = str(e)
+        # a rejected fragment keeps its last good block, so the sections of that block stay taken:
+        # check the others again until no more fragment is rejected
+        while True:
+            taken_sections = taken_base.union(*(last_sections.get(name, set()) for name in result["errors"]))
+            for name in changed:
+                if name in result["errors"]:
+                    continue
+                try:
+                    taken_sections.update(check_fragment(texts[name], taken_sections))
+                except ValueError as e:
+                    result["errors"][name] = str(e)
+                    break
+            else:
+                break
+
+        new_blocks = {}
+        for name in changed:
+            if name in result["errors"]:
+                logger.warning("fragment '%s' is not compiled: %s", name, result["errors"][name])
+                continue
+            digest, _ = fragments[name]
+            new_blocks[name] = render_block(name, digest, texts[name])
+            result["updated" if name in compiled else "added"].append(name)
+
+        out_lines = []
+        for name, _, part_lines in parts:
+            if name is None:
+                out_lines.extend(part_lines)
+            elif name in new_blocks:
+                out_lines.extend(new_blocks.pop(name))
+            elif name in fragments:
+                # unchanged, or rejected: the last good block stays
+                out_lines.extend(part_lines)
+                if name not in result["errors"]:
+                    result["unchanged"].append(name)
+            else:
+                result["removed"].append(name)
+        for name, block in new_blocks.items():
+            if out_lines and not out_lines[-1].endswith("\n"):
+                out_lines[-1] += "\n"
+            out_lines.extend(block)
+
+        if dry_run or not (result["added"] or result["updated"] or result["removed"]):
+            return result
+
+        out_path = credential_file_path.with_suffix(".tmp")
+        mode = credential_file_path.stat().st_mode if credential_file_path.exists() else 0o600
+        credential_file_path.parent.mkdir(parents=True, exist_ok=True)
+        with out_path.open(mode="w", encoding="utf-8") as fout:
+            fout.writelines(out_lines)
+            fout.flush()
+            with phase("fsync"):
+                os.fsync(fout.fileno())
+        os.chmod(out_path, mode)
+        os.replace(out_path, credential_file_path)
+        result["written"] = True
+        logger.info("compiled '%s' into '%s': added=%s updated=%s removed=%s",
+                    fragment_dir, credential_file_path, result["added"], result["updated"], result["removed"])
+
+    metrics = get_registry()
+    metrics.counter("credential_file_rewrites_total").inc()
+    metrics.counter("fragments_compiled_total").inc(len(result["added"]) + len(result["updated"]))
+    metrics.gauge("credential_file_bytes").set(credential_file_path.stat().st_size)
+    for listener in list(update_listeners):
+        try:
+            listener(credential_file_path)
+        except Exception as e:
+            logger.error("update listener failed: %s", e)
+    return result
+
+
+__all__ = ["compile_fragments", "get_fragment_dir", "list_fragments"]
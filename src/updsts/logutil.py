@@ -1,19 +1,66 @@
 ﻿# encoding: utf-8-sig
 
+import atexit
 import os
 import sys
+import queue
 import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 from typing import Optional
 
+from .tracing import TraceContextFilter
+
 # globals
 logger_obj: Optional[logging.Logger] = None
 is_initialized: bool = False
+queue_listener: Optional[QueueListener] = None
+file_logging_enabled: bool = True
 
 DEFAULT_LOGGER_NAME = "awssts"
 DEFALT_LOG_LEVEL = logging.WARNING
 DEFAULT_FILE_LEVEL = logging.WARNING
 DEFAULT_CONSOLE_LEVEL = logging.WARNING
+DEFAULT_LOG_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_LOG_BACKUP_COUNT = 5
+
+# environment variables
+LOG_FILE_ENV = "UPDSTS_LOG_FILE"                # path of the log file, or "off" to disable file logging
+LOG_MAX_BYTES_ENV = "UPDSTS_LOG_MAX_BYTES"      # size of the log file to rotate
+LOG_BACKUP_COUNT_ENV = "UPDSTS_LOG_BACKUP_COUNT"  # number of rotated log files to keep
+
+# ----------------------------------------------------------------------------
+def set_file_logging(enabled: bool) -> None:
+    """
+    Enable or disable the log file (e.g. for ephemeral runs).
+    It takes effect when the logger is initialized, so call it before `get_logger`.
+
+    Args:
+        enabled (bool): False to log only to the console.
+    """
+    global file_logging_enabled
+    file_logging_enabled = enabled
+
+# ----------------------------------------------------------------------------
+def _get_env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    try:
+        return int(value) if value else default
+    except ValueError:
+        return default
+
+# ----------------------------------------------------------------------------
+def shutdown_logging() -> None:
+    """
+    Stop the background log writer after flushing the queued records.
+    """
+    global queue_listener
+    if queue_listener is not None:
+        listener = queue_listener
+        queue_listener = None
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
 
 # ----------------------------------------------------------------------------
 def get_with_init(
@@ -22,59 +69,101 @@ def get_with_init(
     level: int = DEFALT_LOG_LEVEL,
     file_level: int = DEFAULT_FILE_LEVEL,
     console_level: int = DEFAULT_CONSOLE_LEVEL,
+    max_bytes: int | None = None,
+    backup_count: int | None = None,
     force: bool = False
 ) -> logging.Logger:
     """
     Initialize the logger with the specified configuration.
     If the logger is already initialized, it will return the existing logger
 
+    The records are put on a queue and written by a background listener thread,
+    so that the file / console I/O does not block the caller.
+    The log file is rotated by size.
+
     Args:
-        log_file (str | None, optional): Defaults to None.
+        log_file (str | None, optional): Defaults to None ($UPDSTS_LOG_FILE or ~/.awscm/log/awscm.log).
         level (int, optional): Defaults to DEFAULT_LEVEL.
         file_level (int, optional):  Defaults to DEFAULT_FILE_LEVEL.
         console_level (int, optional):  Defaults to DEFAULT_CONSOLE_LEVEL.
-        force (bool, optional):  Defaults to False.
+        max_bytes (int | None, optional): Size to rotate the log file. Defaults to $UPDSTS_LOG_MAX_BYTES or 10MB.
+        backup_count (int | None, optional): Rotated files to keep. Defaults to $UPDSTS_LOG_BACKUP_COUNT or 5.
+        force (bool, optional):  Re-initialize the logger even if it is already initialized. Defaults to False.
 
     Returns:
         logging.Logger: Logger instance for the mktotp module.
     """
+    global logger_obj, is_initialized, queue_listener
+    if is_initialized and not force:
+        return logger_obj
 
-    if log_file is None:
-        user_home = os.path.expanduser("~")
-        log_dir = Path(user_home) / ".awscm" / "log"
-        os.makedirs(log_dir, exist_ok=True)
-        log_file = log_dir / "awscm.log"
-    else:
-        # make the directory for the specified path if it does not exist
-        try:
-            os.makedirs(os.path.dirname(log_file), exist_ok=True)
-        except OSError:
-            # If the directory cannot be created, we just ignore it
-            pass
-
-    global logger_obj, is_initialized
-    if not is_initialized:
-        logger_obj = logging.getLogger(DEFAULT_LOGGER_NAME)
-        logger_obj.setLevel(level=level)
-        formatter = logging.Formatter(
-            '%(asctime)s [%(name)s] [%(levelname)s] %(message)s'
-        )
-
+    env_log_file = os.environ.get(LOG_FILE_ENV)
+    use_file = file_logging_enabled and (env_log_file or "").lower() != "off"
+    if log_file is None and env_log_file and use_file:
+        log_file = env_log_file
+
+    if use_file:
+        if log_file is None:
+            user_home = os.path.expanduser("~")
+            log_dir = Path(user_home) / ".awscm" / "log"
+            try:
+                os.makedirs(log_dir, exist_ok=True)
+            except OSError:
+                pass
+            log_file = log_dir / "awscm.log"
+        else:
+            # make the directory for the specified path if it does not exist
+            try:
+                os.makedirs(os.path.dirname(log_file), exist_ok=True)
+            except OSError:
+                # If the directory cannot be created, we just ignore it
+                pass
+
+    if is_initialized:
+        # re-initialization: stop the previous pipeline
+        shutdown_logging()
+        for handler in list(logger_obj.handlers):
+            logger_obj.removeHandler(handler)
+
+    logger_obj = logging.getLogger(DEFAULT_LOGGER_NAME)
+    logger_obj.setLevel(level=level)
+    formatter = logging.Formatter(
+        '%(asctime)s [%(name)s] [%(levelname)s]%(trace_ctx)s %(message)s'
+    )
+
+    handlers = []
+    if use_file:
         try:
-            file_handler = logging.FileHandler(log_file, encoding="utf-8")
+            file_handler = RotatingFileHandler(
+                log_file,
+                maxBytes=max_bytes if max_bytes is not None else _get_env_int(LOG_MAX_BYTES_ENV, DEFAULT_LOG_MAX_BYTES),
+                backupCount=backup_count if backup_count is not None else _get_env_int(LOG_BACKUP_COUNT_ENV, DEFAULT_LOG_BACKUP_COUNT),
+                encoding="utf-8"
+            )
             file_handler.setFormatter(formatter)
             file_handler.setLevel(file_level)
-            logger_obj.addHandler(file_handler)
+            handlers.append(file_handler)
         except (OSError, PermissionError):
             # If file handler creation fails, we just skip it and only use console handler
             pass
 
-        console_handler = logging.StreamHandler(sys.stderr)
-        console_handler.setFormatter(formatter)
-        console_handler.setLevel(console_level)
-        logger_obj.addHandler(console_handler)
+    console_handler = logging.StreamHandler(sys.stderr)
+    console_handler.setFormatter(formatter)
+    console_handler.setLevel(console_level)
+    handlers.append(console_handler)
+
+    # the logger only enqueues the records, the listener thread writes them
+    log_queue = queue.SimpleQueue()
+    # the trace ids are taken in the calling thread, before the record is enqueued
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(TraceContextFilter())
+    logger_obj.addHandler(queue_handler)
+    queue_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    queue_listener.start()
 
-        is_initialized = True
+    if not is_initialized:
+        atexit.register(shutdown_logging)
+    is_initialized = True
     return logger_obj
 
 # ----------------------------------------------------------------------------
@@ -94,16 +183,17 @@ def get_logger(verbose_level: int | None = None) -> logging.Logger:
 
     logObj = None
     if verbose_level is not None:
+        # the console follows the verbosity level, so that verbose output is visible
         if verbose_level == 0:
             logObj = get_with_init(level=logging.WARNING)
         elif verbose_level == 1:
-            logObj = get_with_init(level=logging.INFO)
+            logObj = get_with_init(level=logging.INFO, console_level=logging.INFO)
         elif verbose_level == 2:
-            logObj = get_with_init(level=logging.DEBUG)
+            logObj = get_with_init(level=logging.DEBUG, console_level=logging.DEBUG)
     else:
         # If no verbose level is specified, use the default level
         logObj = get_with_init()
     return logObj
 
 
-__all__ = ["get_logger"]
+__all__ = ["get_logger", "set_file_logging", "shutdown_logging"]
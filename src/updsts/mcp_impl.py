@@ -1,19 +1,46 @@
 ﻿# encoding : utf-8-sig
 
 import asyncio
+import logging
 import traceback
 from pathlib import Path
 from typing import Annotated, Any
 
+from .deadline import DeadlineExceeded, deadline_scope
 from .logutil import get_logger
+from .memwatch import get_memory_report
+from .metrics import get_registry
+from .retry import get_circuit_states
+from .tenancy import get_tenant_registry
+from .tracing import traced
+from .warmstart import record_profile_use
 from .awsutil import *
 
 #-------------------------------------------------------------------------------------------
+async def _await_within_deadline(work, call_deadline, deadline: float | None) -> Any:
+    """
+    Await the work of the tool within the deadline of the call (None for no deadline).
+    """
+    if call_deadline is None:
+        return await work
+    try:
+        return await asyncio.wait_for(work, timeout=call_deadline.remaining())
+    except (asyncio.CancelledError, TimeoutError) as e:
+        # the caller gave up or disconnected: stop the worker at its next check
+        call_deadline.cancel()
+        if isinstance(e, asyncio.CancelledError):
+            raise
+        raise DeadlineExceeded(f"The deadline of {deadline:g} seconds was exceeded.") from e
+
+#-------------------------------------------------------------------------------------------
+@traced("updsts_update_sts_credential")
 async def updsts_update_sts_credential_impl(profile_name: str,
                                             totp_token: str,
                                             sts_profile_name: str | None = None,
                                             cred_file: str | None = None,
-                                            duration: int = 3600) -> dict[str, str] | None:
+                                            duration: int = 3600,
+                                            deadline: float | None = None,
+                                            region: str | None = None) -> dict[str, str] | None:
     """
     Implementation for updating AWS STS credentials.
 
@@ -21,6 +48,10 @@ async def updsts_update_sts_credential_impl(profile_name: str,
         profile_name (str): Profile name to get sts secret key.
         totp_token (str): TOTP token of ARN device.
         cred_file (str | None): Credential file. If None, the default credential file will be used.
+        deadline (float | None): Seconds allowed for the call. None or 0 means no deadline.
+            The botocore timeouts and retries are bounded by it, and the call fails when it passes.
+        region (str | None): Region of the STS endpoint. If None, the `sts_region` key of the profile
+            or the default of the server is used.
 
     Returns:
         list[dict[str, str]]: List containing the updated credential details.
@@ -30,20 +61,87 @@ async def updsts_update_sts_credential_impl(profile_name: str,
     """
     ret = None
     try:
-        ret = update_credentials(profile_name=profile_name,
-                                 totp_token=totp_token,
-                                 sts_profile_name=sts_profile_name,
-                                 cred_file=cred_file,
-                                 duration=duration)
+        # the credentials file has its own worker threads, rate limit and write queue (see tenancy.py)
+        tenant = get_tenant_registry().get(cred_file)
+        tenant.check_rate()
+        with deadline_scope(deadline) as call_deadline:
+            sts_options = {'connection_options': {'region_name': region}} if region else {}
+            if get_sts_backend(profile_name, cred_file, sts_options.get('connection_options')) == "native":
+                # the native client awaits the STS request on the event loop (only the file is written in a thread)
+                work = tenant.track(update_credentials_async(profile_name=profile_name,
+                                                             totp_token=totp_token,
+                                                             sts_profile_name=sts_profile_name,
+                                                             cred_file=cred_file,
+                                                             duration=duration,
+                                                             writer=tenant.write,
+                                                             **sts_options))
+            else:
+                # run in a worker thread of the file, so that the other clients of the server are not blocked
+                # (the thread inherits the deadline of this call)
+                work = tenant.run(update_credentials,
+                                  profile_name=profile_name,
+                                  totp_token=totp_token,
+                                  sts_profile_name=sts_profile_name,
+                                  cred_file=cred_file,
+                                  duration=duration,
+                                  writer=tenant.write,
+                                  **sts_options)
+            ret = await _await_within_deadline(work, call_deadline, deadline)
+        # the snapshot of the warm start is written in the background, after the reply
+        asyncio.get_running_loop().run_in_executor(None, record_profile_use, cred_file, profile_name)
     except Exception as e:
         logger = get_logger()
-        logger.error(f"Error updating credentials for profile '{profile_name}': {str(e)}")
-        logger.debug(f"Traceback: {traceback.format_exc()}")
+        logger.error("Error updating credentials for profile '%s': %s", profile_name, e)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Traceback: %s", traceback.format_exc())
         raise ValueError(f"Failed to update credentials for profile '{profile_name}': {str(e)}") from e
     return ret
 
 
 #-------------------------------------------------------------------------------------------
+@traced("updsts_update_sts_credentials_batch")
+async def updsts_update_sts_credentials_batch_impl(items: list[dict[str, Any]],
+                                                   cred_file: str | None = None,
+                                                   deadline: float | None = None,
+                                                   region: str | None = None) -> list[dict[str, Any]]:
+    """
+    Implementation for updating the AWS STS credentials of many profiles in one call.
+
+    Args:
+        items (list[dict[str, Any]]): profile_name, totp_token, sts_profile_name and duration of each profile.
+        cred_file (str | None): Credential file. If None, the default credential file will be used.
+        deadline (float | None): Seconds allowed for the whole batch. None or 0 means no deadline.
+        region (str | None): Region of the STS endpoint for all items.
+
+    Returns:
+        list[dict[str, Any]]: The result of each item (see update_credentials_batch).
+
+    Raises:
+        ValueError: If the batch cannot be run (e.g. the credential file does not exist).
+    """
+    ret = []
+    try:
+        tenant = get_tenant_registry().get(cred_file)
+        tenant.check_rate(len(items))
+        with deadline_scope(deadline) as call_deadline:
+            sts_options = {'connection_options': {'region_name': region}} if region else {}
+            # the devices are requested by the worker threads of the batch (they inherit the deadline)
+            work = tenant.run(update_credentials_batch, items, cred_file=cred_file, **sts_options)
+            ret = await _await_within_deadline(work, call_deadline, deadline)
+        updated = [result["profile_name"] for result in ret if result["status"] == "updated"]
+        if updated:
+            asyncio.get_running_loop().run_in_executor(None, record_profile_use, cred_file, *updated)
+    except Exception as e:
+        logger = get_logger()
+        logger.error("Error updating credentials in batch: %s", e)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Traceback: %s", traceback.format_exc())
+        raise ValueError(f"Failed to update credentials in batch: {str(e)}") from e
+    return ret
+
+
+#-------------------------------------------------------------------------------------------
+@traced("updsts_get_credential_info")
 async def updsts_get_credential_info_impl(profile_name: str,
                                     cred_file: str | None = None) -> dict[str, str] | None:
     """
@@ -60,23 +158,27 @@ async def updsts_get_credential_info_impl(profile_name: str,
         ValueError: If any validation fails or operation encounters an error.
     """
     logger = get_logger()
-    logger.info(f"DEBUG: awssts_get_credential_info_impl called with profile_name='{profile_name}', cred_file='{cred_file}'")
+    logger.info("DEBUG: awssts_get_credential_info_impl called with profile_name='%s', cred_file='%s'", profile_name, cred_file)
     ret = None
     try:
-        logger.info(f"DEBUG: About to call get_profile_info")
-        ret = get_profile_info(profile_name=profile_name,
-                               credential_file=cred_file,
-                               secret_mask=True)
-        # Clean the return value for logging to avoid newline issues
-        safe_ret = {k: v.strip() if isinstance(v, str) else v for k, v in ret.items()} if ret else ret
-        logger.info(f"DEBUG: get_profile_info returned: {safe_ret}")
+        logger.info("DEBUG: About to call get_profile_info")
+        ret = await get_tenant_registry().get(cred_file).run(get_profile_info,
+                                                             profile_name=profile_name,
+                                                             credential_file=cred_file,
+                                                             secret_mask=True)
+        if logger.isEnabledFor(logging.INFO):
+            # Clean the return value for logging to avoid newline issues
+            safe_ret = {k: v.strip() if isinstance(v, str) else v for k, v in ret.items()} if ret else ret
+            logger.info("DEBUG: get_profile_info returned: %s", safe_ret)
     except Exception as e:
-        logger.error(f"Error retrieving credentials for profile '{profile_name}': {str(e)}")
-        logger.debug(f"Traceback: {traceback.format_exc()}")
+        logger.error("Error retrieving credentials for profile '%s': %s", profile_name, e)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Traceback: %s", traceback.format_exc())
         raise ValueError(f"Failed to retrieve credentials for profile '{profile_name}': {str(e)}") from e
     return ret
 
 #-------------------------------------------------------------------------------------------
+@traced("updsts_get_credential_info_list")
 async def updsts_get_credential_info_list_impl(cred_file: str | None = None) -> list[dict[str, str]]:
     """
     Implementation for getting list of AWS STS credential info.
@@ -92,11 +194,42 @@ async def updsts_get_credential_info_list_impl(cred_file: str | None = None) ->
     """
     ret = None
     try:
-        ret = get_profile_list(credential_file=cred_file,
-                               secret_mask=True)
+        ret = await get_tenant_registry().get(cred_file).run(get_profile_list,
+                                                             credential_file=cred_file,
+                                                             secret_mask=True)
     except Exception as e:
         logger = get_logger()
-        logger.error(f"Error retrieving credential list: {str(e)}")
-        logger.debug(f"Traceback: {traceback.format_exc()}")
+        logger.error("Error retrieving credential list: %s", e)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Traceback: %s", traceback.format_exc())
         raise ValueError(f"Failed to retrieve credential list: {str(e)}") from e
-    return ret
\ No newline at end of file
+    return ret
+
+#-------------------------------------------------------------------------------------------
+async def updsts_get_stats_impl() -> dict[str, Any]:
+    """
+    Implementation for getting the runtime metrics of the server.
+
+    Returns:
+        dict[str, Any]: Snapshot of the metrics registry, the cache state, the circuit breakers and the tenants.
+    """
+    ret = get_registry().snapshot()
+    ret["cache"] = get_cache_stats()
+    ret["circuit_breakers"] = get_circuit_states()
+    ret["tenants"] = get_tenant_registry().stats()
+    return ret
+
+#-------------------------------------------------------------------------------------------
+async def updsts_get_memory_stats_impl(top_n: int = 10) -> dict[str, Any]:
+    """
+    Implementation for getting the memory footprint of the server.
+
+    Args:
+        top_n (int): Number of allocation sites when sampling on demand.
+
+    Returns:
+        dict[str, Any]: The latest memory sample with the watchdog state.
+    """
+    ret = get_memory_report(top_n=top_n)
+    ret["cache"] = get_cache_stats()
+    return ret
@@ -0,0 +1,67 @@
+﻿# encoding: utf-8-sig
+
+import asyncio
+from typing import Any
+
+from fastmcp.server.middleware import Middleware, MiddlewareContext
+
+from .logutil import get_logger
+from .metrics import get_registry
+
+DEFAULT_MAX_CONCURRENCY = 4
+
+# ############################################################################
+class ClientConcurrencyLimiter(Middleware):
+    """
+    Limit the number of tool calls running at the same time for each client session,
+    so that one busy agent cannot starve the other agents sharing the server.
+    The calls over the limit wait for their turn.
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        if max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be 1 or more: {max_concurrency}")
+        self.max_concurrency = max_concurrency
+        # session id -> [semaphore, number of calls running or waiting]
+        self._sessions: dict[str, list[Any]] = {}
+
+    # ----------------------------------------------------------------------------
+    @staticmethod
+    def get_client_id(context: MiddlewareContext) -> str:
+        ctx = context.fastmcp_context
+        if ctx is None:
+            return "(unknown)"
+        try:
+            return ctx.session_id
+        except RuntimeError:
+            return "(unknown)"
+
+    # ----------------------------------------------------------------------------
+    def in_flight(self, client_id: str) -> int:
+        entry = self._sessions.get(client_id)
+        return entry[1] if entry else 0
+
+    # ----------------------------------------------------------------------------
+    async def on_call_tool(self, context: MiddlewareContext, call_next):
+        client_id = self.get_client_id(context)
+        # the middleware runs on the event loop, so the dict needs no lock
+        entry = self._sessions.get(client_id)
+        if entry is None:
+            entry = [asyncio.Semaphore(self.max_concurrency), 0]
+            self._sessions[client_id] = entry
+        semaphore = entry[0]
+        entry[1] += 1
+        try:
+            if semaphore.locked():
+                get_logger().info("client '%s' reached the concurrency limit (%d), waiting", client_id, self.max_concurrency)
+                get_registry().counter("mcp_throttled_calls_total").inc()
+            async with semaphore:
+                return await call_next(context)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                # forget the idle sessions
+                self._sessions.pop(client_id, None)
+
+
+__all__ = ["ClientConcurrencyLimiter", "DEFAULT_MAX_CONCURRENCY"]
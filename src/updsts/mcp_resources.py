@@ -0,0 +1,311 @@
+﻿# encoding: utf-8-sig
+
+import asyncio
+import json
+import threading
+from pathlib import Path
+from typing import Any
+
+from mcp import types
+
+try:
+    # mcp >= 2.x (protocol 2026-07-28): the changes are delivered on `subscriptions/listen` streams
+    from mcp.server.subscriptions import InMemorySubscriptionBus, ListenHandler, ResourceUpdated
+except ImportError:
+    ListenHandler = None
+
+from .logutil import get_logger
+from .awsutil import *
+from .filewatch import get_file_watcher
+from .upcred import add_update_listener, remove_update_listener
+
+# URIs of the resources
+PROFILES_URI = "updsts://credentials"
+PROFILE_URI_PREFIX = "updsts://credentials/"
+DEFAULT_POLL_INTERVAL = 2.0
+
+# ----------------------------------------------------------------------------
+def get_profile_resource(info: dict[str, str]) -> dict[str, Any]:
+    """
+    Build the resource content of the profile (masked metadata and expiry).
+    Args:
+        info (dict[str, str]): Masked profile info (see get_profile_info).
+    Returns:
+        dict[str, Any]: The resource content.
+    """
+    ret: dict[str, Any] = dict(info)
+    ret.update(get_expiry_status(info.get("expiration_datetime")))
+    return ret
+
+# ----------------------------------------------------------------------------
+def read_profile_resources(credential_file: str | None = None) -> dict[str, dict[str, Any]]:
+    """
+    Read the resource contents of all profiles (backed by the cached parse of the file).
+    Args:
+        credential_file (str | None, optional): Path to the credentials file. Defaults to None.
+    Returns:
+        dict[str, dict[str, Any]]: profile name -> resource content.
+    """
+    return {
+        info["profile_name"]: get_profile_resource(info)
+        for info in get_profile_list(credential_file=credential_file, secret_mask=True)
+    }
+
+# ############################################################################
+class ResourceHub:
+    """
+    Keep the resource subscriptions of the MCP sessions, and push
+    `notifications/resources/updated` when the credential file changes,
+    either by CredentialUpdater or by another process (detected by the file watcher, or by polling the file).
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self, credential_file: str | None = None, poll_interval: float = DEFAULT_POLL_INTERVAL):
+        self.credential_file = credential_file
+        self.poll_interval = poll_interval
+        # session -> (event loop of the session, subscribed URIs)
+        self._subscriptions: dict[Any, tuple[asyncio.AbstractEventLoop, set[str]]] = {}
+        # profile name -> unmasked profile info of the last check (kept to detect the changes)
+        self._published: dict[str, dict[str, str]] | None = None
+        self._fingerprint: tuple[int, int, int] | None = None
+        self._lock = threading.RLock()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._watcher = None
+
+    # ----------------------------------------------------------------------------
+    @property
+    def path(self) -> Path:
+        return get_credential_file_path(self.credential_file)
+
+    # ----------------------------------------------------------------------------
+    def subscribe(self, session: Any, uri: str) -> None:
+        """
+        Register the subscription of the session. Must be called in the event loop of the session.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            _, uris = self._subscriptions.setdefault(session, (loop, set()))
+            uris.add(uri)
+            first = self._published is None
+        if first:
+            fingerprint, published = self._read_published()
+            with self._lock:
+                if self._published is None:
+                    self._fingerprint, self._published = fingerprint, published
+        self._start_polling()
+
+    # ----------------------------------------------------------------------------
+    def unsubscribe(self, session: Any, uri: str) -> None:
+        with self._lock:
+            entry = self._subscriptions.get(session)
+            if entry is None:
+                return
+            entry[1].discard(uri)
+            if not entry[1]:
+                del self._subscriptions[session]
+
+    # ----------------------------------------------------------------------------
+    def subscribed_uris(self) -> set[str]:
+        with self._lock:
+            return {uri for _, uris in self._subscriptions.values() for uri in uris}
+
+    # ----------------------------------------------------------------------------
+    def _read_published(self) -> tuple[tuple[int, int, int] | None, dict[str, dict[str, str]]]:
+        # compare the unmasked values, since the masked ones hide most of a new token
+        path = self.path
+        try:
+            fingerprint = get_file_fingerprint(path)
+            return fingerprint, {info["profile_name"]: info for info in get_profile_list(credential_file=str(path))}
+        except OSError:
+            return None, {}
+
+    # ----------------------------------------------------------------------------
+    def on_file_updated(self, path: str | Path) -> None:
+        """
+        Listener of CredentialUpdater: notify the changed resources of the served file.
+        """
+        try:
+            if Path(path).resolve() != self.path.resolve():
+                return
+        except OSError:
+            return
+        self.check_changes()
+
+    # ----------------------------------------------------------------------------
+    def check_changes(self, force: bool = False) -> set[str]:
+        """
+        Compare the file with the last published contents, and notify the subscribers of the changed resources.
+        Args:
+            force (bool, optional): Re-read the file even if its fingerprint is unchanged.
+        Returns:
+            set[str]: The changed URIs.
+        """
+        with self._lock:
+            if not self._subscriptions:
+                self._published = None
+                return set()
+            try:
+                fingerprint = get_file_fingerprint(self.path)
+            except OSError:
+                fingerprint = None
+            if not force and self._published is not None and fingerprint == self._fingerprint:
+                return set()
+
+        # the file is parsed without the lock, taken meanwhile by the listeners of the updater and the file watcher
+        fingerprint, current = self._read_published()
+        with self._lock:
+            previous = self._published or {}
+            self._fingerprint, self._published = fingerprint, current
+            changed = {
+                f"{PROFILE_URI_PREFIX}{name}"
+                for name in previous.keys() | current.keys()
+                if previous.get(name) != current.get(name)
+            }
+            if changed:
+                changed.add(PROFILES_URI)
+            self._notify(changed)
+            return changed
+
+    # ----------------------------------------------------------------------------
+    def _notify(self, changed: set[str]) -> None:
+        logger = get_logger()
+        for session, (loop, uris) in list(self._subscriptions.items()):
+            for uri in uris & changed:
+                logger.info("notify resource updated: %s", uri)
+                try:
+                    asyncio.run_coroutine_threadsafe(session.send_resource_updated(uri), loop)
+                except RuntimeError:
+                    # the event loop of the session is closed
+                    self._subscriptions.pop(session, None)
+                    break
+
+    # ----------------------------------------------------------------------------
+    def _poll(self):
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                self.check_changes()
+            except Exception as e:
+                get_logger().error("Failed to check the credential file: %s", e)
+
+    # ----------------------------------------------------------------------------
+    def _start_polling(self):
+        with self._lock:
+            if self._thread is not None or self._watcher is not None:
+                return
+            add_update_listener(self.on_file_updated)
+            watcher = get_file_watcher()
+            if watcher is not None and watcher.generation(self.path) is not None:
+                # the changes are delivered by inotify, no need to poll
+                watcher.add_listener(self.on_file_updated)
+                self._watcher = watcher
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._poll, name="updsts-resource-watch", daemon=True)
+            self._thread.start()
+
+    # ----------------------------------------------------------------------------
+    def stop(self) -> None:
+        self._stop_event.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+            self._thread = None
+            remove_update_listener(self.on_file_updated)
+        if self._watcher is not None:
+            self._watcher.remove_listener(self.on_file_updated)
+            self._watcher = None
+            remove_update_listener(self.on_file_updated)
+        with self._lock:
+            self._subscriptions.clear()
+            self._published = None
+
+# ############################################################################
+class _ListenStream:
+    """
+    One `subscriptions/listen` stream, registered to the hub as a session.
+    The stream has its own bus, so that the notifications of the hub reach only this stream.
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self):
+        self.bus = InMemorySubscriptionBus()
+        self.handler = ListenHandler(self.bus)
+
+    # ----------------------------------------------------------------------------
+    async def send_resource_updated(self, uri: str) -> None:
+        await self.bus.publish(ResourceUpdated(uri=str(uri)))
+
+# globals
+hub = ResourceHub()
+
+# ----------------------------------------------------------------------------
+def get_resource_hub() -> ResourceHub:
+    """
+    Get the resource hub of the MCP server.
+    """
+    return hub
+
+# ----------------------------------------------------------------------------
+def register_resources(mcp) -> None:
+    """
+    Register the credential resources and the subscription handlers to the FastMCP server.
+    Args:
+        mcp (FastMCP): The server.
+    """
+    @mcp.resource(PROFILES_URI,
+                  name="credential_profiles",
+                  description="Masked metadata and expiry of all profiles in the credentials file.",
+                  mime_type="application/json")
+    def credential_profiles() -> str:
+        return json.dumps(list(read_profile_resources(hub.credential_file).values()))
+
+    @mcp.resource(PROFILE_URI_PREFIX + "{profile_name}",
+                  name="credential_profile",
+                  description="Masked metadata and expiry of the profile in the credentials file.",
+                  mime_type="application/json")
+    def credential_profile(profile_name: str) -> str:
+        info = get_profile_info(profile_name, credential_file=hub.credential_file, secret_mask=True)
+        if info is None or "profile_name" not in info:
+            hint = f" Did you mean: {info['did_you_mean']}?" if info and info.get("did_you_mean") else ""
+            raise ValueError(f"Profile '{profile_name}' is not found in the credentials file.{hint}")
+        return json.dumps(get_profile_resource(info))
+
+    low_level = mcp._mcp_server
+    if hasattr(low_level, "add_request_handler") and ListenHandler is not None:
+        async def on_listen(ctx, params: types.SubscriptionsListenRequestParams) -> types.SubscriptionsListenResult:
+            stream = _ListenStream()
+            uris = [str(uri) for uri in params.notifications.resource_subscriptions or []]
+            for uri in uris:
+                hub.subscribe(stream, uri)
+            try:
+                # acknowledges, then forwards the notifications until the client ends the stream
+                return await stream.handler(ctx, params)
+            finally:
+                for uri in uris:
+                    hub.unsubscribe(stream, uri)
+
+        low_level.add_request_handler("subscriptions/listen", types.SubscriptionsListenRequestParams, on_listen)
+    if hasattr(low_level, "add_request_handler"):
+        # the clients of the protocol versions before 2026-07-28
+        async def on_subscribe(ctx, params: types.SubscribeRequestParams) -> types.EmptyResult:
+            hub.subscribe(ctx.session, str(params.uri))
+            return types.EmptyResult()
+
+        async def on_unsubscribe(ctx, params: types.UnsubscribeRequestParams) -> types.EmptyResult:
+            hub.unsubscribe(ctx.session, str(params.uri))
+            return types.EmptyResult()
+
+        low_level.add_request_handler("resources/subscribe", types.SubscribeRequestParams, on_subscribe)
+        low_level.add_request_handler("resources/unsubscribe", types.UnsubscribeRequestParams, on_unsubscribe)
+    elif hasattr(low_level, "subscribe_resource"):
+        # older mcp: decorator based handlers with the request context
+        @low_level.subscribe_resource()
+        async def on_subscribe_legacy(uri) -> None:
+            hub.subscribe(low_level.request_context.session, str(uri))
+
+        @low_level.unsubscribe_resource()
+        async def on_unsubscribe_legacy(uri) -> None:
+            hub.unsubscribe(low_level.request_context.session, str(uri))
+
+
+__all__ = ["PROFILES_URI", "PROFILE_URI_PREFIX", "ResourceHub",
+           "get_expiry_status", "get_resource_hub", "read_profile_resources", "register_resources"]
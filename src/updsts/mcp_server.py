@@ -1,38 +1,119 @@
 ﻿# encoding : utf-8-sig
 
 import asyncio
+import logging
 import traceback
 
 from fastmcp import Client, FastMCP
 from fastmcp.client.transports import FastMCPTransport
-from typing import Annotated
-from pydantic import Field
+from typing import Annotated, Any
+from pydantic import BaseModel, Field
 
+from .filewatch import start_file_watcher, stop_file_watcher
 from .logutil import get_logger
 from .mcp_impl import *
+from .mcp_middleware import ClientConcurrencyLimiter, DEFAULT_MAX_CONCURRENCY
+from .mcp_resources import get_resource_hub, register_resources
+from .tenancy import get_tenant_registry
+from .warmstart import is_warm_start_enabled, start_warm_start, stop_warm_start
+
+DEFAULT_HTTP_BIND = "127.0.0.1:8701"
+
+# ############################################################################
+class BatchUpdateItem(BaseModel):
+    """
+    A profile to update with updsts_update_sts_credentials_batch.
+    """
+    profile_name: str = Field(description="Profile name to get sts secret key.")
+    totp_token: str = Field(description="TOTP token of the MFA device of the profile.")
+    sts_profile_name: str = Field(default="", description="STS Profile name in the AWS credentials file. If empty string, '<profile_name>_sts' will be used.")
+    duration: int = Field(default=3600, description="Duration seconds of the sts token (default: 3600).")
 
 # FastMCP instance
 mcp = FastMCP("updsts")
+# credential profiles published as MCP resources (with change notifications)
+register_resources(mcp)
 
 # -------------------------------------------------------------------------------------------
 # return the FastMCP instance
 def get_mcp():
     return mcp
 
+# -------------------------------------------------------------------------------------------
+# parse the bind address of the http transport
+def parse_bind(bind: str | None) -> tuple[str, int]:
+    """
+    Parse the bind address.
+
+    Args:
+        bind (str | None): "HOST:PORT" (or ":PORT"). If None, DEFAULT_HTTP_BIND is used.
+
+    Returns:
+        tuple[str, int]: The host and the port.
+
+    Raises:
+        ValueError: If the address is invalid.
+    """
+    host, sep, port = (bind or DEFAULT_HTTP_BIND).rpartition(":")
+    if not sep or not port.isdigit() or not 0 < int(port) < 65536:
+        raise ValueError(f"Invalid bind address '{bind}'. Specify it as HOST:PORT (e.g. {DEFAULT_HTTP_BIND}).")
+    return (host.strip("[]") or "127.0.0.1"), int(port)
+
 # -------------------------------------------------------------------------------------------
 # run the MCP server
-def run_as_mcp_server():
+def run_as_mcp_server(credential_file: str | None = None,
+                      transport: str = "stdio",
+                      bind: str | None = None,
+                      max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
     """
-    Run the MCP server with stdio transport.
+    Run the MCP server with stdio or http (streamable) transport.
+
+    With the http transport, one warm server process is shared by many agents:
+    the caches, the file locks and the metrics are shared, and the tool calls of
+    each client session are limited to `max_concurrency` at a time.
+    Each credentials file (the `cred_file` of the tools) has its own worker threads,
+    rate limit and write queue, and the least recently used ones are evicted
+    (see set_tenant_options of tenancy.py).
+
+    Args:
+        credential_file (str | None): Credentials file published as the resources. If None, the default is used.
+        transport (str): "stdio" or "http".
+        bind (str | None): "HOST:PORT" to listen with the http transport. If None, DEFAULT_HTTP_BIND is used.
+        max_concurrency (int): Maximum tool calls running at the same time per client session.
+
+    Unless disabled by set_warm_start_enabled, the snapshot of the last run is restored and the STS clients
+    of its profiles are prewarmed in the background (see warmstart.py). It is saved again when the server stops.
     """
     logger = get_logger()
+    # the resources and the tools are served from the cached parse of the credentials file,
+    # invalidated by the file watcher when the file is edited
+    set_cache_enabled(True)
+    start_file_watcher()
+    hub = get_resource_hub()
+    hub.credential_file = credential_file
+    mcp.add_middleware(ClientConcurrencyLimiter(max_concurrency))
+    if is_warm_start_enabled():
+        start_warm_start(credential_file)
     try:
-        logger.info("Starting awssts MCP server with stdio transport")
-        mcp.run(transport="stdio", show_banner=False)
+        if transport == "http":
+            host, port = parse_bind(bind)
+            if host not in ("127.0.0.1", "localhost", "::1"):
+                logger.warning("MCP server is listening on '%s', which may expose the credentials to other hosts", host)
+            logger.info("Starting awssts MCP server with http transport on %s:%d", host, port)
+            mcp.run(transport="http", host=host, port=port, show_banner=False)
+        else:
+            logger.info("Starting awssts MCP server with stdio transport")
+            mcp.run(transport="stdio", show_banner=False)
     except Exception as e:
-        logger.error(f"Failed to start MCP server: {str(e)}")
-        logger.debug(f"Traceback: {traceback.format_exc()}")
+        logger.error("Failed to start MCP server: %s", e)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Traceback: %s", traceback.format_exc())
         raise
+    finally:
+        stop_warm_start()
+        get_tenant_registry().close()
+        hub.stop()
+        stop_file_watcher()
 
 # -------------------------------------------------------------------------------------------
 # display the list of tools available in the MCP server
@@ -58,7 +139,7 @@ def disp_tools():
         asyncio.run(list_server_tools(mcp))
         logger.info("Successfully displayed MCP tools list")
     except Exception as e:
-        logger.error(f"Failed to display MCP tools: {str(e)}")
+        logger.error("Failed to display MCP tools: %s", e)
         raise
 
 # -------------------------------------------------------------------------------------------
@@ -70,6 +151,8 @@ async def updsts_update_sts_credential(
         sts_profile_name: Annotated[str, Field(description="STS Profile name in the AWS credentials file. If empty string, '<profile_name>_sts' will be used.")] = "",
         cred_file: Annotated[str, Field(description="Credential file path. If empty string, the default credential file will be used.")] = "",
         duration: Annotated[int, Field(description="Duration seconds of the sts token (default: 3600).")] = 3600,
+        deadline: Annotated[float, Field(description="Seconds allowed for this call. 0 means no deadline (default: 60).")] = 60,
+        region: Annotated[str, Field(description="Region of the STS endpoint (e.g. 'ap-northeast-1'). If empty string, the 'sts_region' key of the profile or the server default is used.")] = "",
 ) -> dict[str, str] | None:
     """
     Get and update AWS credentials for the specified profile using TOTP token.
@@ -88,6 +171,12 @@ async def updsts_update_sts_credential(
         cred_file: Path to AWS credentials file (optional)
                    If empty string, the default location (~/.aws/credentials) is used. Defaults to "".
         duration: Duration seconds of the sts token (default: 3600)
+        deadline: Seconds allowed for this call (default: 60). The connect/read timeouts and
+                  the retries of the STS request are bounded by it, so the call fails fast
+                  when the network or the proxy is not responding. 0 means no deadline.
+        region: Region of the regional STS endpoint (sts.<region>.amazonaws.com), which is
+                closer than the global endpoint for the users far from us-east-1.
+                If empty string, the 'sts_region' key of the profile or the server default is used. Defaults to "".
 
     Returns:
         dict[str, str] | None: Dictionary containing the updated credential details or None if failed
@@ -97,7 +186,46 @@ async def updsts_update_sts_credential(
                                                   totp_token=totp_token,
                                                   sts_profile_name=sts_profile_name if sts_profile_name else None,
                                                   cred_file=cred_file if cred_file else None,
-                                                  duration=duration)
+                                                  duration=duration,
+                                                  deadline=deadline if deadline > 0 else None,
+                                                  region=region if region else None)
+    return ret
+
+# -------------------------------------------------------------------------------------------
+# mcp tool for updating many profiles at once
+@mcp.tool()
+async def updsts_update_sts_credentials_batch(
+        items: Annotated[list[BatchUpdateItem], Field(description="Profiles to update, each with its TOTP token.")],
+        cred_file: Annotated[str, Field(description="Credential file path. If empty string, the default credential file will be used.")] = "",
+        deadline: Annotated[float, Field(description="Seconds allowed for the whole batch. 0 means no deadline (default: 60).")] = 60,
+        region: Annotated[str, Field(description="Region of the STS endpoint for all items. If empty string, the 'sts_region' key of each profile or the server default is used.")] = "",
+) -> list[dict[str, Any]]:
+    """
+    Get and update AWS credentials for many profiles in one call.
+
+    Use this tool instead of calling 'updsts_update_sts_credential' for each profile:
+    the STS requests of the different MFA devices run concurrently, and all the
+    credentials are written to the credentials file at once. The profiles of the same
+    MFA device are requested one after another, since a TOTP code is accepted only once
+    per device (the profiles with the same access key and TOTP code share one request).
+
+    Args:
+        items: The profiles to update: profile_name, totp_token, sts_profile_name (optional,
+               '<profile_name>_sts' if empty) and duration (optional, default: 3600).
+        cred_file: Path to AWS credentials file (optional)
+                   If empty string, the default location (~/.aws/credentials) is used. Defaults to "".
+        deadline: Seconds allowed for the whole batch (default: 60). 0 means no deadline.
+        region: Region of the regional STS endpoint for all items. Defaults to "".
+
+    Returns:
+        list[dict[str, Any]]: The result of each item, in the order of the items: 'profile_name',
+            'status' ('updated' or 'failed'), and 'updated_profile_name' and 'aws_token_expiration'
+            if updated, or 'error' if failed. A failed item does not stop the others.
+    """
+    ret = await updsts_update_sts_credentials_batch_impl(items=[item.model_dump() for item in items],
+                                                         cred_file=cred_file if cred_file else None,
+                                                         deadline=deadline if deadline > 0 else None,
+                                                         region=region if region else None)
     return ret
 
 # -------------------------------------------------------------------------------------------
@@ -118,7 +246,9 @@ async def updsts_get_credential_info(
         cred_file: Path to AWS credentials file (optional)
                    If empty string, the default location (~/.aws/credentials) is used. Defaults to "".
     Returns:
-        dict[str, str] | None: Dictionary containing the credential details or None if not found
+        dict[str, str] | None: Dictionary containing the credential details or None if not found.
+            If the profile does not exist, 'did_you_mean' contains the similar profile names
+            (comma separated, best first), so retry with one of them instead of listing all profiles.
     """
     ret = None
     ret = await updsts_get_credential_info_impl(profile_name=profile_name,
@@ -144,4 +274,47 @@ async def updsts_get_credential_info_list(
     """
     ret = []
     ret = await updsts_get_credential_info_list_impl(cred_file=cred_file if cred_file else None)
-    return ret
\ No newline at end of file
+    return ret
+
+# -------------------------------------------------------------------------------------------
+# mcp tool for getting the runtime metrics
+@mcp.tool()
+async def updsts_get_stats() -> dict[str, Any]:
+    """
+    Get the runtime metrics of the updsts MCP server.
+
+    This tool returns the operational data of this server process:
+    the number of STS requests and errors, latency histograms of each phase
+    (parse, client_build, sts_request, rewrite), the number of credential file
+    reads / parses / rewrites, the size of the credential file, the cache state
+    and the circuit breaker state of each STS endpoint ('closed', 'open' while the
+    endpoint is failing and the requests fail fast, 'half_open' while probing),
+    and the credential files resident in the server ('tenants').
+    No credential values are included.
+
+    Returns:
+        dict[str, Any]: Dictionary containing 'uptime_seconds', 'metrics', 'cache', 'circuit_breakers' and 'tenants'.
+    """
+    ret = await updsts_get_stats_impl()
+    return ret
+
+# -------------------------------------------------------------------------------------------
+# mcp tool for getting the memory footprint
+@mcp.tool()
+async def updsts_get_memory_stats(
+        top_n: Annotated[int, Field(description="Number of allocation sites to report when sampling on demand (default: 10).")] = 10,
+) -> dict[str, Any]:
+    """
+    Get the memory footprint of the updsts MCP server.
+
+    This tool returns the latest sample of the memory watchdog (enabled with
+    `updsts mcp --mcp-server --mem-watch SEC`): the RSS of the process, the
+    configured ceiling, the number of cache evictions and, with `--tracemalloc`,
+    the top allocation sites. If the watchdog is not running, a sample is taken
+    on demand. Use it to rule updsts in or out when the agent host runs out of memory.
+
+    Returns:
+        dict[str, Any]: Dictionary containing 'running', 'interval', 'tracemalloc', 'evictions', 'last_sample' and 'cache'.
+    """
+    ret = await updsts_get_memory_stats_impl(top_n=top_n)
+    return ret
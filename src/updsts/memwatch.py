@@ -0,0 +1,248 @@
+﻿# encoding: utf-8-sig
+
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable
+
+from .logutil import get_logger
+from .metrics import get_registry
+
+DEFAULT_INTERVAL = 60.0
+DEFAULT_TOP_N = 10
+# the eviction is armed again when the RSS falls below this ratio of the ceiling
+# (CPython rarely returns the freed memory to the OS, so the RSS often stays above the ceiling after an eviction)
+REARM_RATIO = 0.9
+
+# ----------------------------------------------------------------------------
+def get_rss_bytes() -> int | None:
+    """
+    Get the resident set size of the current process.
+    Returns:
+        int | None: RSS in bytes, or None if it cannot be measured on this platform.
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # not the current RSS but the peak (ru_maxrss is KiB on Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+# ----------------------------------------------------------------------------
+def get_top_allocations(top_n: int = DEFAULT_TOP_N) -> list[dict[str, Any]]:
+    """
+    Get the top allocation sites recorded by tracemalloc.
+    Args:
+        top_n (int, optional): Number of sites. Defaults to DEFAULT_TOP_N.
+    Returns:
+        list[dict[str, Any]]: [{"site": "file:line", "size_bytes": n, "count": n}, ...],
+            or an empty list if tracemalloc is not tracing.
+    """
+    if not tracemalloc.is_tracing():
+        return []
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    ))
+    ret = []
+    for stat in snapshot.statistics("lineno")[:top_n]:
+        frame = stat.traceback[0]
+        ret.append({
+            "site": f"{frame.filename}:{frame.lineno}",
+            "size_bytes": stat.size,
+            "count": stat.count,
+        })
+    return ret
+
+# ############################################################################
+class MemoryWatchdog:
+    """
+    Sample the memory footprint of the process on an interval,
+    and evict the caches when the RSS crosses the ceiling (once, until it falls below REARM_RATIO of the ceiling).
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self,
+                 interval: float = DEFAULT_INTERVAL,
+                 ceiling_bytes: int | None = None,
+                 use_tracemalloc: bool = False,
+                 top_n: int = DEFAULT_TOP_N,
+                 on_ceiling: Callable[[], None] | None = None):
+        """
+        Args:
+            interval (float, optional): Sampling interval in seconds. Defaults to DEFAULT_INTERVAL.
+            ceiling_bytes (int | None, optional): RSS to trigger the eviction. None disables the eviction.
+            use_tracemalloc (bool, optional): Trace the allocation sites (adds overhead to every allocation).
+            top_n (int, optional): Number of allocation sites to report. Defaults to DEFAULT_TOP_N.
+            on_ceiling (Callable[[], None] | None, optional): Eviction callback (e.g. awsutil.clear_cache).
+        """
+        self.interval = interval
+        self.ceiling_bytes = ceiling_bytes
+        self.use_tracemalloc = use_tracemalloc
+        self.top_n = top_n
+        self.on_ceiling = on_ceiling
+        self.evictions = 0
+        self._armed = True
+        self.last_sample: dict[str, Any] | None = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # ----------------------------------------------------------------------------
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # ----------------------------------------------------------------------------
+    def sample(self) -> dict[str, Any]:
+        """
+        Take one sample, and evict the caches if the ceiling is crossed since the last eviction.
+        Returns:
+            dict[str, Any]: The sample.
+        """
+        rss = get_rss_bytes()
+        ret: dict[str, Any] = {
+            "timestamp": time.time(),
+            "rss_bytes": rss,
+            "ceiling_bytes": self.ceiling_bytes,
+            "evicted": False,
+        }
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            ret["tracemalloc_current_bytes"] = current
+            ret["tracemalloc_peak_bytes"] = peak
+            ret["top_allocations"] = get_top_allocations(self.top_n)
+
+        registry = get_registry()
+        if rss is not None:
+            registry.gauge("process_rss_bytes").set(rss)
+        if self.ceiling_bytes and rss is not None and rss < self.ceiling_bytes * REARM_RATIO:
+            self._armed = True
+        if self.ceiling_bytes and rss is not None and rss > self.ceiling_bytes and self._armed:
+            self._armed = False
+            logger = get_logger()
+            logger.warning("memory ceiling exceeded: rss=%d ceiling=%d, evicting the caches", rss, self.ceiling_bytes)
+            if self.on_ceiling is not None:
+                self.on_ceiling()
+            gc.collect()
+            registry.counter("memory_evictions_total").inc()
+            ret["evicted"] = True
+            with self._lock:
+                self.evictions += 1
+
+        with self._lock:
+            self.last_sample = ret
+        return ret
+
+    # ----------------------------------------------------------------------------
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                # the watchdog must never take the server down
+                get_logger().error("memory watchdog failed to sample: %s", e)
+
+    # ----------------------------------------------------------------------------
+    def start(self) -> None:
+        """
+        Start sampling in a background thread.
+        """
+        if self.running:
+            return
+        if self.use_tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._stop_event.clear()
+        self.sample()
+        self._thread = threading.Thread(target=self._run, name="updsts-memwatch", daemon=True)
+        self._thread.start()
+
+    # ----------------------------------------------------------------------------
+    def stop(self) -> None:
+        """
+        Stop the background thread (and tracemalloc if it was started by the watchdog).
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.use_tracemalloc and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    # ----------------------------------------------------------------------------
+    def report(self) -> dict[str, Any]:
+        """
+        Get the latest sample with the watchdog state.
+        """
+        with self._lock:
+            last_sample = self.last_sample
+            evictions = self.evictions
+        return {
+            "running": self.running,
+            "interval": self.interval,
+            "tracemalloc": tracemalloc.is_tracing(),
+            "evictions": evictions,
+            "last_sample": last_sample,
+        }
+
+# globals
+watchdog: MemoryWatchdog | None = None
+
+# ----------------------------------------------------------------------------
+def start_watchdog(**kwargs) -> MemoryWatchdog:
+    """
+    Start the process-wide memory watchdog.
+    Args:
+        **kwargs: Arguments of MemoryWatchdog.
+    Returns:
+        MemoryWatchdog: The started watchdog.
+    """
+    global watchdog
+    if watchdog is not None:
+        watchdog.stop()
+    watchdog = MemoryWatchdog(**kwargs)
+    watchdog.start()
+    return watchdog
+
+# ----------------------------------------------------------------------------
+def stop_watchdog() -> None:
+    """
+    Stop the process-wide memory watchdog.
+    """
+    global watchdog
+    if watchdog is not None:
+        watchdog.stop()
+        watchdog = None
+
+# ----------------------------------------------------------------------------
+def get_memory_report(top_n: int = DEFAULT_TOP_N) -> dict[str, Any]:
+    """
+    Get the memory footprint of the process.
+    If the watchdog is not running, a sample is taken on demand (without eviction).
+    Args:
+        top_n (int, optional): Number of allocation sites when sampling on demand.
+    Returns:
+        dict[str, Any]: The memory report.
+    """
+    if watchdog is not None:
+        return watchdog.report()
+    return {
+        "running": False,
+        "interval": None,
+        "tracemalloc": tracemalloc.is_tracing(),
+        "evictions": 0,
+        "last_sample": MemoryWatchdog(top_n=top_n).sample(),
+    }
+
+
+__all__ = ["MemoryWatchdog", "get_rss_bytes", "get_top_allocations",
+           "start_watchdog", "stop_watchdog", "get_memory_report"]
@@ -0,0 +1,179 @@
+﻿# encoding: utf-8-sig
+
+import bisect
+import threading
+import time
+from typing import Any
+
+# upper bounds (seconds) of the latency histogram buckets
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# ############################################################################
+class Counter:
+    """
+    Monotonically increasing counter.
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self._value = 0
+        self._lock = threading.Lock()
+
+    # ----------------------------------------------------------------------------
+    def inc(self, amount: int = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    # ----------------------------------------------------------------------------
+    @property
+    def value(self) -> int:
+        return self._value
+
+    # ----------------------------------------------------------------------------
+    def snapshot(self) -> dict[str, Any]:
+        return {"type": "counter", "value": self._value}
+
+# ############################################################################
+class Gauge:
+    """
+    Value which can go up and down (e.g. the size of the credential file).
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self._value = 0.0
+
+    # ----------------------------------------------------------------------------
+    def set(self, value: float) -> None:
+        self._value = value
+
+    # ----------------------------------------------------------------------------
+    @property
+    def value(self) -> float:
+        return self._value
+
+    # ----------------------------------------------------------------------------
+    def snapshot(self) -> dict[str, Any]:
+        return {"type": "gauge", "value": self._value}
+
+# ############################################################################
+class Histogram:
+    """
+    Latency histogram with fixed buckets.
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self, name: str, description: str = "", buckets: tuple[float, ...] = DEFAULT_LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        # the last slot counts the values above the largest bucket
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    # ----------------------------------------------------------------------------
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._sum += value
+            if value > self._max:
+                self._max = value
+
+    # ----------------------------------------------------------------------------
+    @property
+    def count(self) -> int:
+        return self._count
+
+    # ----------------------------------------------------------------------------
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            counts = list(self._counts)
+            count, total, maximum = self._count, self._sum, self._max
+        # cumulative counts, keyed by the upper bound ("le" = less or equal)
+        buckets = {}
+        cumulative = 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            buckets[f"le_{bound:g}"] = cumulative
+        buckets["le_inf"] = cumulative + counts[-1]
+        return {
+            "type": "histogram",
+            "count": count,
+            "sum": total,
+            "mean": total / count if count else 0.0,
+            "max": maximum,
+            "buckets": buckets,
+        }
+
+# ############################################################################
+class MetricsRegistry:
+    """
+    Registry of the in-process metrics.
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self):
+        self._metrics: dict[str, Counter | Gauge | Histogram] = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    # ----------------------------------------------------------------------------
+    def _get_or_create(self, name: str, factory, description: str):
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(name)
+                if metric is None:
+                    metric = factory(name, description)
+                    self._metrics[name] = metric
+        return metric
+
+    # ----------------------------------------------------------------------------
+    def counter(self, name: str, description: str = "") -> Counter:
+        return self._get_or_create(name, Counter, description)
+
+    # ----------------------------------------------------------------------------
+    def gauge(self, name: str, description: str = "") -> Gauge:
+        return self._get_or_create(name, Gauge, description)
+
+    # ----------------------------------------------------------------------------
+    def histogram(self, name: str, description: str = "") -> Histogram:
+        return self._get_or_create(name, Histogram, description)
+
+    # ----------------------------------------------------------------------------
+    def snapshot(self) -> dict[str, Any]:
+        """
+        Get the current values of all metrics.
+        Returns:
+            dict[str, Any]: {"uptime_seconds": ..., "metrics": {name: values}}
+        """
+        with self._lock:
+            metrics = dict(self._metrics)
+        return {
+            "uptime_seconds": time.time() - self.started_at,
+            "metrics": {name: metrics[name].snapshot() for name in sorted(metrics)},
+        }
+
+    # ----------------------------------------------------------------------------
+    def reset(self) -> None:
+        with self._lock:
+            self._metrics.clear()
+            self.started_at = time.time()
+
+# global registry
+registry = MetricsRegistry()
+
+# ----------------------------------------------------------------------------
+def get_registry() -> MetricsRegistry:
+    """
+    Get the global metrics registry.
+    """
+    return registry
+
+
+__all__ = ["Counter", "Gauge", "Histogram", "MetricsRegistry", "get_registry"]
@@ -0,0 +1,379 @@
+﻿# encoding: utf-8-sig
+
+import json
+import os
+import socket
+import statistics
+import threading
+import time
+from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+from urllib.parse import unquote, urlsplit
+
+from .logutil import get_logger
+from .metrics import get_registry
+from .retry import get_circuit_breaker
+from .stsclient import GLOBAL_ENDPOINT_URL, _ssl_context, get_endpoint_url
+
+# NOTE: the probe measures how long it takes to reach each STS endpoint through the proxy of the site
+#       (TCP connect, CONNECT tunnel, TLS handshake) without sending a request, so that `sts_region = auto`
+#       routes the requests to the fastest endpoint. The results hold no credential and no proxy password.
+
+PROBE_CACHE_ENV = "UPDSTS_PROBE_CACHE"
+AUTO_REGION = "auto"
+DEFAULT_PROBE_REGIONS = ("us-east-1", "us-east-2", "us-west-2", "eu-west-1", "eu-central-1",
+                         "ap-northeast-1", "ap-southeast-1", "ap-southeast-2", "ap-south-1", "sa-east-1")
+DEFAULT_PROBE_TIMEOUT = 3.0
+DEFAULT_PROBE_ATTEMPTS = 3
+# seconds the results are used by `sts_region = auto`
+DEFAULT_PROBE_TTL = 3600.0
+
+# ----------------------------------------------------------------------------
+def get_probe_cache_path() -> Path:
+    """
+    Get the path of the probe results ($UPDSTS_PROBE_CACHE or ~/.awscm/cache/sts-probe.json).
+    """
+    env_path = os.environ.get(PROBE_CACHE_ENV)
+    if env_path:
+        return Path(os.path.expanduser(env_path))
+    return Path(os.path.expanduser("~")) / ".awscm" / "cache" / "sts-probe.json"
+
+# ----------------------------------------------------------------------------
+def get_route_key(proxy: str | None) -> str:
+    """
+    Get the key of the results of the proxy ("direct" without a proxy; the password is never included).
+    """
+    if not proxy:
+        return "direct"
+    parts = urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+    return f"{parts.scheme}://{parts.hostname}:{parts.port or 80}"
+
+# ----------------------------------------------------------------------------
+def get_candidates(regions: list[str] | tuple[str, ...] | None = None,
+                   endpoint_urls: list[str] | None = None) -> list[dict[str, Any]]:
+    """
+    Get the endpoints to probe: the global endpoint, the regional endpoints and the explicit URLs.
+    Args:
+        regions (list[str] | None, optional): Regions of the regional endpoints. Defaults to DEFAULT_PROBE_REGIONS.
+        endpoint_urls (list[str] | None, optional): Other endpoints (e.g. a VPC endpoint). Defaults to None.
+    Returns:
+        list[dict[str, Any]]: "url" and "region" (None for the global endpoint and the explicit URLs) of each endpoint.
+    """
+    candidates = [{"url": GLOBAL_ENDPOINT_URL, "region": None}]
+    candidates += [{"url": get_endpoint_url(region_name=region), "region": region}
+                   for region in (DEFAULT_PROBE_REGIONS if regions is None else regions)]
+    candidates += [{"url": url, "region": None} for url in endpoint_urls or []]
+    return candidates
+
+# ----------------------------------------------------------------------------
+def _open_tunnel(sock: socket.socket, proxy: str, host: str, port: int) -> None:
+    """
+    Open the CONNECT tunnel to host:port through the proxy connected with the socket.
+    """
+    parts = urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+    lines = [f"CONNECT {host}:{port} HTTP/1.1", f"Host: {host}:{port}"]
+    if parts.username:
+        userinfo = f"{unquote(parts.username)}:{unquote(parts.password or '')}"
+        lines.append("Proxy-Authorization: Basic " + b64encode(userinfo.encode("utf-8")).decode("ascii"))
+    sock.sendall(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+    head = b""
+    while b"\r\n\r\n" not in head:
+        chunk = sock.recv(4096)
+        if not chunk:
+            raise ConnectionError("the proxy closed the connection")
+        head += chunk
+    status_line = head.split(b"\r\n", 1)[0].decode("latin-1")
+    status = status_line.split(" ", 2)[1] if status_line.count(" ") >= 1 else ""
+    if status != "200":
+        raise ConnectionError(f"the proxy refused the tunnel: {status_line}")
+
+# ----------------------------------------------------------------------------
+def probe_endpoint(url: str, proxy: str | None = None, timeout: float = DEFAULT_PROBE_TIMEOUT) -> dict[str, Any]:
+    """
+    Measure one connection to the endpoint: the TCP connect (to the proxy if any),
+    the CONNECT tunnel through the proxy and the TLS handshake (https only). No request is sent.
+    Args:
+        url (str): URL of the endpoint.
+        proxy (str | None, optional): URL of the http proxy. Defaults to None.
+        timeout (float, optional): Timeout of each step in seconds. Defaults to DEFAULT_PROBE_TIMEOUT.
+    Returns:
+        dict[str, Any]: "connect_ms", "tunnel_ms" and "handshake_ms" (None if not done), "latency_ms"
+            (their sum) and "error" (None if the endpoint was reached).
+    """
+    parts = urlsplit(url)
+    https = parts.scheme == "https"
+    host, port = parts.hostname, parts.port or (443 if https else 80)
+    ret: dict[str, Any] = {"connect_ms": None, "tunnel_ms": None, "handshake_ms": None,
+                           "latency_ms": None, "error": None}
+    sock = None
+    try:
+        if proxy:
+            proxy_parts = urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+            address = (proxy_parts.hostname, proxy_parts.port or 80)
+        else:
+            address = (host, port)
+        start = time.perf_counter()
+        sock = socket.create_connection(address, timeout=timeout)
+        ret["connect_ms"] = (time.perf_counter() - start) * 1000
+        if proxy:
+            start = time.perf_counter()
+            _open_tunnel(sock, proxy, host, port)
+            ret["tunnel_ms"] = (time.perf_counter() - start) * 1000
+        if https:
+            start = time.perf_counter()
+            sock = _ssl_context().wrap_socket(sock, server_hostname=host)
+            ret["handshake_ms"] = (time.perf_counter() - start) * 1000
+        ret["latency_ms"] = sum(ret[key] or 0.0 for key in ("connect_ms", "tunnel_ms", "handshake_ms"))
+    except (OSError, ValueError) as e:
+        ret["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        if sock is not None:
+            sock.close()
+    return ret
+
+# ----------------------------------------------------------------------------
+def probe_endpoints(candidates: list[dict[str, Any]],
+                    proxies: dict[str, str] | None = None,
+                    timeout: float = DEFAULT_PROBE_TIMEOUT,
+                    attempts: int = DEFAULT_PROBE_ATTEMPTS) -> list[dict[str, Any]]:
+    """
+    Probe the endpoints concurrently, `attempts` times each.
+    Args:
+        candidates (list[dict[str, Any]]): The endpoints (see get_candidates).
+        proxies (dict[str, str] | None, optional): Proxy URL by scheme ("http", "https"). Defaults to None.
+        timeout (float, optional): Timeout of each step in seconds. Defaults to DEFAULT_PROBE_TIMEOUT.
+        attempts (int, optional): Connections to each endpoint. Defaults to DEFAULT_PROBE_ATTEMPTS.
+    Returns:
+        list[dict[str, Any]]: The candidates with the medians of the successful attempts, "healthy"
+            (all attempts succeeded) and the last "error", the fastest healthy endpoint first.
+    """
+    proxies = proxies or {}
+    metrics = get_registry()
+
+    def probe(candidate: dict[str, Any]) -> dict[str, Any]:
+        proxy = proxies.get(urlsplit(candidate["url"]).scheme)
+        samples = [probe_endpoint(candidate["url"], proxy, timeout) for _ in range(max(1, attempts))]
+        succeeded = [sample for sample in samples if sample["error"] is None]
+        metrics.counter("sts_probes_total").inc(len(samples))
+        metrics.counter("sts_probe_failures_total").inc(len(samples) - len(succeeded))
+        ret = dict(candidate)
+        for key in ("connect_ms", "tunnel_ms", "handshake_ms", "latency_ms"):
+            values = [sample[key] for sample in succeeded if sample[key] is not None]
+            ret[key] = round(statistics.median(values), 2) if values else None
+        ret["healthy"] = len(succeeded) == len(samples)
+        ret["error"] = next((sample["error"] for sample in reversed(samples) if sample["error"]), None)
+        return ret
+
+    with ThreadPoolExecutor(max_workers=max(1, min(len(candidates), 8)), thread_name_prefix="updsts-probe") as executor:
+        results = list(executor.map(probe, candidates))
+    results.sort(key=lambda result: (not result["healthy"], result["latency_ms"] or 0.0))
+    return results
+
+# globals
+# route key (see get_route_key) -> {"probed_at": epoch seconds, "results": [...]}
+_probe_results: dict[str, dict[str, Any]] = {}
+_probe_lock = threading.Lock()
+
+# ----------------------------------------------------------------------------
+def save_probe_results(results: list[dict[str, Any]], proxy: str | None = None,
+                       path: str | os.PathLike | None = None) -> None:
+    """
+    Keep the results of the route in the process and in the cache file (readable by the user only).
+    """
+    key = get_route_key(proxy)
+    path = Path(path) if path else get_probe_cache_path()
+    with _probe_lock:
+        _probe_results[key] = {"probed_at": time.time(), "results": results}
+        try:
+            with path.open(mode="r", encoding="utf-8") as fin:
+                data = json.load(fin)
+            if not isinstance(data, dict):
+                data = {}
+        except (OSError, ValueError):
+            data = {}
+        data[key] = _probe_results[key]
+        path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as fout:
+            json.dump(data, fout)
+        os.replace(tmp_path, path)
+
+# ----------------------------------------------------------------------------
+def load_probe_results(proxy: str | None = None, path: str | os.PathLike | None = None,
+                       ttl: float | None = None) -> dict[str, Any] | None:
+    """
+    Get the results of the route: the ones of the process, or the ones of the cache file
+    (e.g. written by `updsts probe`).
+    Args:
+        proxy (str | None, optional): Proxy URL of the route. Defaults to None.
+        path (str | os.PathLike | None, optional): Cache file. Defaults to get_probe_cache_path().
+        ttl (float | None, optional): Seconds the results of the process are used before the cache file
+            is read again for newer ones. If None, they are used until cleared. Defaults to None.
+    Returns:
+        dict[str, Any] | None: {"probed_at": epoch seconds, "results": [...]}, or None if never probed.
+    """
+    key = get_route_key(proxy)
+    with _probe_lock:
+        cached = _probe_results.get(key)
+    if cached is not None and (ttl is None or time.time() - cached.get("probed_at", 0) <= ttl):
+        return cached
+    try:
+        with (Path(path) if path else get_probe_cache_path()).open(mode="r", encoding="utf-8") as fin:
+            entry = json.load(fin).get(key)
+    except (OSError, ValueError, AttributeError):
+        return cached
+    if not isinstance(entry, dict) or not isinstance(entry.get("results"), list):
+        return cached
+    with _probe_lock:
+        # the results of another process replace the stale ones of this process only if newer
+        cached = _probe_results.get(key)
+        if cached is None or entry.get("probed_at", 0) > cached.get("probed_at", 0):
+            _probe_results[key] = cached = entry
+    return cached
+
+# ----------------------------------------------------------------------------
+def clear_probe_results() -> None:
+    """
+    Forget the results kept in the process.
+    """
+    with _probe_lock:
+        _probe_results.clear()
+
+# ----------------------------------------------------------------------------
+def get_fastest_endpoint(proxies: dict[str, str] | None = None,
+                         ttl: float = DEFAULT_PROBE_TTL) -> dict[str, Any] | None:
+    """
+    Get the fastest healthy endpoint of the route whose results are not older than `ttl`.
+    An endpoint whose circuit breaker is open (failing requests) is skipped.
+    Args:
+        proxies (dict[str, str] | None, optional): Proxy URL by scheme ("http", "https"). Defaults to None.
+        ttl (float, optional): Seconds the results are used. Defaults to DEFAULT_PROBE_TTL.
+    Returns:
+        dict[str, Any] | None: The result of the endpoint ("url", "region", ...), or None.
+    """
+    proxy = (proxies or {}).get("https") or (proxies or {}).get("http")
+    entry = load_probe_results(proxy, ttl=ttl)
+    if entry is None or time.time() - entry.get("probed_at", 0) > ttl:
+        return None
+    for result in entry["results"]:
+        if not result.get("healthy") or not result.get("url"):
+            continue
+        if get_circuit_breaker(result["url"], proxy).state == "open":
+            continue
+        return result
+    return None
+
+# ############################################################################
+class EndpointProber:
+    """
+    Probe the STS endpoints on an interval in a background thread (the MCP server).
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self,
+                 interval: float,
+                 candidates: list[dict[str, Any]] | None = None,
+                 proxies: dict[str, str] | None = None,
+                 timeout: float = DEFAULT_PROBE_TIMEOUT,
+                 attempts: int = DEFAULT_PROBE_ATTEMPTS):
+        """
+        Args:
+            interval (float): Seconds between the probes.
+            candidates (list[dict[str, Any]] | None, optional): The endpoints. Defaults to get_candidates().
+            proxies (dict[str, str] | None, optional): Proxy URL by scheme. Defaults to None.
+            timeout (float, optional): Timeout of each step in seconds. Defaults to DEFAULT_PROBE_TIMEOUT.
+            attempts (int, optional): Connections to each endpoint. Defaults to DEFAULT_PROBE_ATTEMPTS.
+        """
+        self.interval = interval
+        self.candidates = candidates if candidates is not None else get_candidates()
+        self.proxies = proxies or {}
+        self.timeout = timeout
+        self.attempts = attempts
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # ----------------------------------------------------------------------------
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # ----------------------------------------------------------------------------
+    def probe(self) -> list[dict[str, Any]]:
+        """
+        Probe the endpoints once and keep the results.
+        """
+        results = probe_endpoints(self.candidates, self.proxies, self.timeout, self.attempts)
+        proxy = self.proxies.get("https") or self.proxies.get("http")
+        try:
+            save_probe_results(results, proxy)
+        except OSError as e:
+            get_logger().warning("Failed to save the probe results: %s", e)
+        fastest = next((result for result in results if result["healthy"]), None)
+        if fastest is not None:
+            get_logger().info("Fastest STS endpoint: %s (%.1f ms)", fastest["url"], fastest["latency_ms"])
+        return results
+
+    # ----------------------------------------------------------------------------
+    def _run(self):
+        while True:
+            try:
+                self.probe()
+            except Exception as e:
+                # the prober must never take the server down
+                get_logger().error("STS endpoint probe failed: %s", e)
+            if self._stop_event.wait(self.interval):
+                break
+
+    # ----------------------------------------------------------------------------
+    def start(self) -> None:
+        """
+        Start probing in a background thread (the first probe runs at once).
+        """
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="updsts-probe", daemon=True)
+        self._thread.start()
+
+    # ----------------------------------------------------------------------------
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+# globals
+prober: EndpointProber | None = None
+
+# ----------------------------------------------------------------------------
+def start_prober(**kwargs) -> EndpointProber:
+    """
+    Start the process-wide endpoint prober.
+    Args:
+        **kwargs: Arguments of EndpointProber.
+    Returns:
+        EndpointProber: The started prober.
+    """
+    global prober
+    if prober is not None:
+        prober.stop()
+    prober = EndpointProber(**kwargs)
+    prober.start()
+    return prober
+
+# ----------------------------------------------------------------------------
+def stop_prober() -> None:
+    """
+    Stop the process-wide endpoint prober.
+    """
+    global prober
+    if prober is not None:
+        prober.stop()
+        prober = None
+
+
+__all__ = ["AUTO_REGION", "DEFAULT_PROBE_REGIONS", "DEFAULT_PROBE_TTL", "EndpointProber", "clear_probe_results",
+           "get_candidates", "get_fastest_endpoint", "get_probe_cache_path", "load_probe_results", "probe_endpoint",
+           "probe_endpoints", "save_probe_results", "start_prober", "stop_prober"]
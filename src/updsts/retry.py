@@ -0,0 +1,425 @@
+﻿# encoding: utf-8-sig
+
+import os
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable
+
+from botocore.exceptions import BotoCoreError, ClientError, ConnectionError, HTTPClientError
+
+from .deadline import Deadline
+from .logutil import get_logger
+from .metrics import get_registry
+from .stsclient import StsConnectionError, StsServiceError
+from .tracing import current_span
+
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 8.0
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_RESET_TIMEOUT = 30.0
+
+# error kinds
+THROTTLING = "throttling"
+NETWORK = "network"
+SERVER = "server"
+AUTH = "auth"
+REQUEST = "request"
+CLIENT = "client"
+CIRCUIT_OPEN = "circuit_open"
+
+# the faults worth another attempt
+RETRYABLE_KINDS = frozenset((THROTTLING, NETWORK, SERVER))
+# the faults of the endpoint (or the proxy) rather than of the request, counted by the circuit breaker
+BREAKER_KINDS = frozenset((NETWORK, SERVER))
+
+THROTTLING_CODES = frozenset((
+    "Throttling", "ThrottlingException", "ThrottledException", "RequestThrottled",
+    "RequestThrottledException", "TooManyRequestsException", "RequestLimitExceeded",
+    "SlowDown", "PriorRequestNotComplete",
+))
+AUTH_CODES = frozenset((
+    "AccessDenied", "AccessDeniedException", "InvalidClientTokenId", "SignatureDoesNotMatch",
+    "ExpiredToken", "ExpiredTokenException", "UnrecognizedClientException", "InvalidUserCode.Expired",
+))
+
+KIND_MESSAGES = {
+    THROTTLING: "STS throttled the request",
+    NETWORK: "STS endpoint is unreachable",
+    SERVER: "STS failed to process the request",
+    AUTH: "STS rejected the credentials or the MFA code",
+    REQUEST: "STS rejected the request",
+    CLIENT: "STS request could not be made",
+}
+
+# ----------------------------------------------------------------------------
+def classify_error(e: BaseException) -> str:
+    """
+    Classify the error of the STS request.
+    Args:
+        e (BaseException): The error raised by botocore or the native STS client.
+    Returns:
+        str: One of THROTTLING, NETWORK, SERVER, AUTH, REQUEST and CLIENT.
+    """
+    if isinstance(e, (ClientError, StsServiceError)):
+        if isinstance(e, StsServiceError):
+            code, status = e.code, e.status
+        else:
+            code = e.response.get("Error", {}).get("Code", "")
+            status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+        if code in THROTTLING_CODES or status == 429:
+            return THROTTLING
+        if status >= 500:
+            return SERVER
+        if code in AUTH_CODES or status in (401, 403):
+            return AUTH
+        return REQUEST
+    if isinstance(e, (ConnectionError, HTTPClientError, StsConnectionError)):
+        return NETWORK
+    return CLIENT
+
+# ############################################################################
+class StsRequestError(Exception):
+    """
+    The STS request failed. The kind tells whether it was throttled, unreachable, rejected, etc.
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self, message: str, kind: str, attempts: int = 0, circuit: dict[str, Any] | None = None):
+        super().__init__(message)
+        self.kind = kind
+        self.attempts = attempts
+        self.circuit = circuit
+
+    # ----------------------------------------------------------------------------
+    @property
+    def retryable(self) -> bool:
+        return self.kind in RETRYABLE_KINDS
+
+# ############################################################################
+class CircuitOpenError(StsRequestError):
+    """
+    The request was not sent since the circuit of the endpoint is open.
+    """
+
+# ############################################################################
+class RetryPolicy:
+    """
+    Bounded retries with the decorrelated jitter backoff
+    (each delay is drawn between the base delay and three times the previous one, up to the max delay).
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self,
+                 max_attempts: int | None = None,
+                 base_delay: float = DEFAULT_BASE_DELAY,
+                 max_delay: float = DEFAULT_MAX_DELAY,
+                 rng: random.Random | None = None):
+        """
+        Args:
+            max_attempts (int | None, optional): Attempts including the first one.
+                Defaults to $AWS_MAX_ATTEMPTS or DEFAULT_MAX_ATTEMPTS.
+            base_delay (float, optional): The smallest delay in seconds. Defaults to DEFAULT_BASE_DELAY.
+            max_delay (float, optional): The largest delay in seconds. Defaults to DEFAULT_MAX_DELAY.
+            rng (random.Random | None, optional): Random generator (for tests).
+        """
+        if max_attempts is None:
+            try:
+                max_attempts = int(os.environ.get("AWS_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS))
+            except ValueError:
+                max_attempts = DEFAULT_MAX_ATTEMPTS
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rng = rng if rng else random.Random()
+
+    # ----------------------------------------------------------------------------
+    def next_delay(self, previous: float) -> float:
+        """
+        Get the delay before the next attempt.
+        Args:
+            previous (float): The previous delay (the base delay before the first retry).
+        Returns:
+            float: The delay in seconds.
+        """
+        return min(self.max_delay, self.rng.uniform(self.base_delay, max(previous, self.base_delay) * 3))
+
+# ############################################################################
+class CircuitBreaker:
+    """
+    Circuit breaker of one STS endpoint (and proxy).
+    After `failure_threshold` consecutive faults of the endpoint the circuit opens, and the requests
+    fail fast without being sent. After `reset_timeout` seconds one probe request is let through
+    (half open): its success closes the circuit, its failure opens it again.
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self,
+                 name: str,
+                 failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout: float = DEFAULT_RESET_TIMEOUT,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    # ----------------------------------------------------------------------------
+    def _state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    # ----------------------------------------------------------------------------
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    # ----------------------------------------------------------------------------
+    def _retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - self.clock())
+
+    # ----------------------------------------------------------------------------
+    def retry_after(self) -> float:
+        """
+        Get the seconds until the circuit lets a probe request through.
+        """
+        with self._lock:
+            return self._retry_after()
+
+    # ----------------------------------------------------------------------------
+    def allow(self) -> bool:
+        """
+        Whether a request may be sent now. In the half open state, only one probe is allowed at a time.
+        """
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    # ----------------------------------------------------------------------------
+    def record_success(self) -> None:
+        with self._lock:
+            if self.opened_at is not None:
+                get_logger().info("circuit of STS endpoint '%s' closed", self.name)
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    # ----------------------------------------------------------------------------
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._probing or (self.opened_at is None and self.failures >= self.failure_threshold):
+                get_logger().warning("circuit of STS endpoint '%s' opened after %d failures", self.name, self.failures)
+                get_registry().counter("sts_circuit_opened_total").inc()
+                self.opened_at = self.clock()
+            self._probing = False
+
+    # ----------------------------------------------------------------------------
+    def release(self) -> None:
+        """
+        Give up the probe without an outcome (e.g. the call was cancelled), so that another probe can be sent.
+        """
+        with self._lock:
+            self._probing = False
+
+    # ----------------------------------------------------------------------------
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "endpoint": self.name,
+                "state": self._state(),
+                "failures": self.failures,
+                "retry_after": round(self._retry_after(), 1),
+            }
+
+# globals
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+# ----------------------------------------------------------------------------
+def get_circuit_breaker(endpoint_url: str | None, proxy: str | None = None) -> CircuitBreaker:
+    """
+    Get the circuit breaker of the endpoint reached through the proxy.
+    Args:
+        endpoint_url (str | None): URL of the STS endpoint (None for the default AWS endpoint).
+        proxy (str | None, optional): URL of the proxy. Defaults to None.
+    Returns:
+        CircuitBreaker: The shared breaker of the endpoint.
+    """
+    name = endpoint_url or "default"
+    if proxy:
+        name = f"{name} via {proxy}"
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name)
+            _breakers[name] = breaker
+        return breaker
+
+# ----------------------------------------------------------------------------
+def get_circuit_states() -> list[dict[str, Any]]:
+    """
+    Get the state of the circuit breakers of the endpoints used so far.
+    """
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return [breaker.snapshot() for breaker in breakers]
+
+# ----------------------------------------------------------------------------
+def reset_circuit_breakers() -> None:
+    """
+    Forget all circuit breakers (all circuits closed).
+    """
+    with _breakers_lock:
+        _breakers.clear()
+
+# the errors of a sent (or attempted) STS request
+REQUEST_ERRORS = (BotoCoreError, ClientError, StsServiceError, StsConnectionError)
+
+# ----------------------------------------------------------------------------
+def _start_attempt(breaker: CircuitBreaker, attempt: int) -> None:
+    if not breaker.allow():
+        get_registry().counter("sts_short_circuited_total").inc()
+        raise CircuitOpenError(
+            f"STS endpoint '{breaker.name}' is unavailable: the circuit is open after {breaker.failures} failures"
+            f" (next try in {breaker.retry_after():.0f}s)",
+            CIRCUIT_OPEN, attempt - 1, breaker.snapshot())
+
+# ----------------------------------------------------------------------------
+def _on_request_error(e: BaseException,
+                      attempt: int,
+                      attempts: int,
+                      breaker: CircuitBreaker,
+                      policy: RetryPolicy,
+                      deadline: Deadline | None,
+                      delay: float) -> float:
+    """
+    Record the failed attempt and decide whether to retry.
+    Returns:
+        float: The delay before the next attempt.
+    Raises:
+        StsRequestError: If the request is not retried.
+    """
+    kind = classify_error(e)
+    if kind in BREAKER_KINDS:
+        breaker.record_failure()
+    else:
+        # the endpoint answered
+        breaker.record_success()
+    current = current_span()
+    if current is not None:
+        current.add_event("sts.error", {"attempt": attempt, "kind": kind, "error": str(e)})
+
+    retry = kind in RETRYABLE_KINDS and attempt < attempts
+    if retry:
+        delay = policy.next_delay(delay)
+        if deadline is not None and deadline.remaining() <= delay:
+            retry = False
+    if not retry:
+        raise StsRequestError(f"{KIND_MESSAGES[kind]} ({kind}): {e} [attempts: {attempt}, circuit: {breaker.state}]",
+                              kind, attempt, breaker.snapshot()) from e
+
+    get_logger().warning("STS request failed (%s), retrying in %.2fs (attempt %d/%d): %s",
+                         kind, delay, attempt, attempts, e)
+    get_registry().counter("sts_retries_total").inc()
+    return delay
+
+# ----------------------------------------------------------------------------
+def call_with_retry(func: Callable[[int], Any],
+                    breaker: CircuitBreaker,
+                    policy: RetryPolicy | None = None,
+                    deadline: Deadline | None = None,
+                    sleep: Callable[[float], None] = time.sleep) -> Any:
+    """
+    Call the STS request with the retries of the policy, guarded by the circuit breaker.
+    The retries stop at the first error that is not retryable (e.g. a wrong MFA code,
+    which is never worth resending), and when the deadline leaves no time for the next attempt.
+    Args:
+        func (Callable[[int], Any]): The request. Called with the number of attempts left (including this one),
+            so that it can share the remaining time of the deadline among them.
+        breaker (CircuitBreaker): The circuit breaker of the endpoint.
+        policy (RetryPolicy | None, optional): The retry policy. Defaults to RetryPolicy().
+        deadline (Deadline | None, optional): The deadline of the call. Defaults to None.
+        sleep (Callable[[float], None], optional): Sleep function (for tests).
+    Returns:
+        Any: The result of the request.
+    Raises:
+        StsRequestError: If the request failed, CircuitOpenError if the circuit is open.
+        DeadlineExceeded: If the deadline passed or the call was cancelled.
+    """
+    policy = policy if policy else RetryPolicy()
+    attempts = policy.max_attempts
+    if deadline is not None:
+        attempts = min(attempts, deadline.max_attempts())
+
+    delay = policy.base_delay
+    attempt = 0
+    while True:
+        attempt += 1
+        _start_attempt(breaker, attempt)
+        try:
+            result = func(attempts - attempt + 1)
+        except REQUEST_ERRORS as e:
+            delay = _on_request_error(e, attempt, attempts, breaker, policy, deadline, delay)
+            if deadline is not None:
+                deadline.wait(delay)
+                deadline.check("the STS retry")
+            else:
+                sleep(delay)
+        except Exception:
+            breaker.release()
+            raise
+        else:
+            breaker.record_success()
+            return result
+
+# ----------------------------------------------------------------------------
+async def call_with_retry_async(func: Callable[[int], Awaitable[Any]],
+                                breaker: CircuitBreaker,
+                                policy: RetryPolicy | None = None,
+                                deadline: Deadline | None = None) -> Any:
+    """
+    The asyncio version of call_with_retry: the request is awaited and the backoff does not block the loop.
+    The cancellation of the task stops it at once (the deadline is checked after each backoff).
+    """
+    import asyncio
+    policy = policy if policy else RetryPolicy()
+    attempts = policy.max_attempts
+    if deadline is not None:
+        attempts = min(attempts, deadline.max_attempts())
+
+    delay = policy.base_delay
+    attempt = 0
+    while True:
+        attempt += 1
+        _start_attempt(breaker, attempt)
+        try:
+            result = await func(attempts - attempt + 1)
+        except REQUEST_ERRORS as e:
+            delay = _on_request_error(e, attempt, attempts, breaker, policy, deadline, delay)
+            await asyncio.sleep(delay)
+            if deadline is not None:
+                deadline.check("the STS retry")
+        except BaseException:
+            breaker.release()
+            raise
+        else:
+            breaker.record_success()
+            return result
+
+__all__ = ["StsRequestError", "CircuitOpenError", "RetryPolicy", "CircuitBreaker",
+           "classify_error", "call_with_retry", "call_with_retry_async",
+           "get_circuit_breaker", "get_circuit_states", "reset_circuit_breakers"]
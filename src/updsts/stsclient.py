@@ -0,0 +1,589 @@
+﻿# encoding: utf-8-sig
+
+import hashlib
+import hmac
+import http.client
+import os
+import socket
+import ssl
+import threading
+import xml.etree.ElementTree as ElementTree
+from base64 import b64encode
+from datetime import datetime, timezone
+from typing import Any, Callable
+from urllib.parse import quote, unquote, urlencode, urlsplit
+
+from .metrics import get_registry
+
+# NOTE: the built-in STS client for the `native` backend. It makes the few query API calls of updsts
+#       (GetSessionToken / AssumeRole) with the standard library only, so that boto3/botocore are not
+#       imported nor their client built. asyncio is imported by the async client on its first use.
+
+STS_API_VERSION = "2011-06-15"
+GLOBAL_ENDPOINT_URL = "https://sts.amazonaws.com"
+DEFAULT_SIGNING_REGION = "us-east-1"
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_MAX_POOL_CONNECTIONS = 10
+CA_BUNDLE_ENV = "AWS_CA_BUNDLE"
+
+# ############################################################################
+class StsServiceError(Exception):
+    """
+    STS answered the request with an error (the counterpart of botocore's ClientError).
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self, action: str, code: str, message: str, status: int, request_id: str | None = None):
+        super().__init__(f"An error occurred ({code}) when calling the {action} operation: {message}")
+        self.action = action
+        self.code = code
+        self.message = message
+        self.status = status
+        self.request_id = request_id
+
+# ############################################################################
+class StsConnectionError(Exception):
+    """
+    The request could not be sent or the response could not be received (connection, TLS, proxy, timeout).
+    """
+
+# ----------------------------------------------------------------------------
+def get_endpoint_url(endpoint_url: str | None = None, region_name: str | None = None) -> str:
+    """
+    Get the URL of the STS endpoint: the explicit one, the regional one of the region, or the global one.
+    """
+    if endpoint_url:
+        return endpoint_url
+    if region_name:
+        return f"https://sts.{region_name}.amazonaws.com"
+    return GLOBAL_ENDPOINT_URL
+
+# ----------------------------------------------------------------------------
+def unsupported_reason(endpoint_url: str | None, proxies: dict[str, str] | None) -> str | None:
+    """
+    Check whether the native client can make the request.
+    Returns:
+        str | None: Why the request is not supported (e.g. a SOCKS proxy), or None if it is.
+    """
+    scheme = urlsplit(get_endpoint_url(endpoint_url)).scheme
+    if scheme not in ("http", "https"):
+        return f"unsupported endpoint scheme '{scheme}'"
+    proxy_url = (proxies or {}).get(scheme)
+    if proxy_url:
+        proxy_scheme = urlsplit(proxy_url if "://" in proxy_url else f"http://{proxy_url}").scheme
+        if proxy_scheme != "http":
+            return f"unsupported proxy scheme '{proxy_scheme}'"
+    return None
+
+# ----------------------------------------------------------------------------
+def _sha256_hex(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+# ----------------------------------------------------------------------------
+def _hmac_sha256(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode("utf-8"), hashlib.sha256).digest()
+
+# ----------------------------------------------------------------------------
+def sign_request(method: str,
+                 url: str,
+                 headers: dict[str, str],
+                 body: bytes,
+                 access_key: str,
+                 secret_key: str,
+                 region: str,
+                 service: str = "sts",
+                 session_token: str | None = None,
+                 now: datetime | None = None) -> dict[str, str]:
+    """
+    Sign the request with AWS Signature Version 4.
+    Args:
+        method (str): HTTP method.
+        url (str): URL of the request.
+        headers (dict[str, str]): Headers to sign (Host and X-Amz-Date are added).
+        body (bytes): Body of the request.
+        access_key (str): AWS access key id.
+        secret_key (str): AWS secret access key.
+        region (str): Signing region.
+        service (str, optional): Signing service. Defaults to "sts".
+        session_token (str | None, optional): Session token of temporary credentials. Defaults to None.
+        now (datetime | None, optional): Signing time (for the tests). Defaults to None.
+    Returns:
+        dict[str, str]: The headers to send, including Authorization.
+    """
+    now = now if now else datetime.now(timezone.utc)
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+    date_stamp = now.strftime("%Y%m%d")
+    parts = urlsplit(url)
+
+    signed = dict(headers)
+    signed["Host"] = parts.netloc.rsplit("@", 1)[-1]
+    signed["X-Amz-Date"] = amz_date
+    if session_token:
+        signed["X-Amz-Security-Token"] = session_token
+
+    canonical_uri = quote(unquote(parts.path or "/"), safe="/~")
+    query = sorted((quote(k, safe="-_.~"), quote(v, safe="-_.~"))
+                   for k, _, v in (pair.partition("=") for pair in parts.query.split("&") if pair))
+    canonical_query = "&".join(f"{k}={v}" for k, v in query)
+    lowered = sorted((name.lower(), " ".join(str(value).split())) for name, value in signed.items())
+    canonical_headers = "".join(f"{name}:{value}\n" for name, value in lowered)
+    signed_headers = ";".join(name for name, _ in lowered)
+    canonical_request = "\n".join([method, canonical_uri, canonical_query,
+                                   canonical_headers, signed_headers, _sha256_hex(body)])
+
+    scope = f"{date_stamp}/{region}/{service}/aws4_request"
+    string_to_sign = "\n".join(["AWS4-HMAC-SHA256", amz_date, scope,
+                                _sha256_hex(canonical_request.encode("utf-8"))])
+    key = _hmac_sha256(f"AWS4{secret_key}".encode("utf-8"), date_stamp)
+    for part in (region, service, "aws4_request"):
+        key = _hmac_sha256(key, part)
+    signature = hmac.new(key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+    signed["Authorization"] = (f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, "
+                               f"SignedHeaders={signed_headers}, Signature={signature}")
+    return signed
+
+# ----------------------------------------------------------------------------
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+# ----------------------------------------------------------------------------
+def _find_text(element: ElementTree.Element, name: str) -> str | None:
+    for child in element.iter():
+        if _local_name(child.tag) == name:
+            return child.text or ""
+    return None
+
+# ----------------------------------------------------------------------------
+def parse_response(action: str, status: int, data: bytes) -> dict[str, Any]:
+    """
+    Parse the XML response of the STS query API into the shape of the boto3 response.
+    Args:
+        action (str): The action of the request (e.g. "GetSessionToken").
+        status (int): HTTP status of the response.
+        data (bytes): Body of the response.
+    Returns:
+        dict[str, Any]: {"Credentials": {...}, "ResponseMetadata": {...}} (and "AssumedRoleUser" for AssumeRole).
+            The Expiration of the credentials is a timezone-aware datetime.
+    Raises:
+        StsServiceError: If STS answered with an error.
+        StsConnectionError: If the response is not a valid STS response.
+    """
+    try:
+        root = ElementTree.fromstring(data) if data else None
+    except ElementTree.ParseError:
+        root = None
+    if status != 200:
+        if root is None:
+            raise StsServiceError(action, http.client.responses.get(status, "Unknown"),
+                                  data[:200].decode("utf-8", "replace"), status)
+        raise StsServiceError(action, _find_text(root, "Code") or "Unknown", _find_text(root, "Message") or "",
+                              status, _find_text(root, "RequestId"))
+    credentials = None
+    if root is not None:
+        credentials = next((e for e in root.iter() if _local_name(e.tag) == "Credentials"), None)
+    if credentials is None:
+        raise StsConnectionError(f"The {action} response has no credentials")
+
+    values = {_local_name(e.tag): (e.text or "") for e in credentials}
+    try:
+        expiration = datetime.fromisoformat(values["Expiration"].replace("Z", "+00:00"))
+    except (KeyError, ValueError) as e:
+        raise StsConnectionError(f"The {action} response has no valid expiration") from e
+    ret = {
+        "Credentials": {
+            "AccessKeyId": values.get("AccessKeyId", ""),
+            "SecretAccessKey": values.get("SecretAccessKey", ""),
+            "SessionToken": values.get("SessionToken", ""),
+            "Expiration": expiration if expiration.tzinfo else expiration.replace(tzinfo=timezone.utc),
+        },
+        "ResponseMetadata": {"RequestId": _find_text(root, "RequestId"), "HTTPStatusCode": status},
+    }
+    user = next((e for e in root.iter() if _local_name(e.tag) == "AssumedRoleUser"), None)
+    if user is not None:
+        ret["AssumedRoleUser"] = {_local_name(e.tag): (e.text or "") for e in user}
+    return ret
+
+# ----------------------------------------------------------------------------
+def _ssl_context() -> ssl.SSLContext:
+    # $AWS_CA_BUNDLE is honored as botocore does
+    return ssl.create_default_context(cafile=os.environ.get(CA_BUNDLE_ENV) or None)
+
+# ############################################################################
+class _ConnectionPool:
+    """
+    Idle keep-alive connections by origin, shared by all clients of the process.
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self, close: Callable[[Any], None]):
+        self._idle: dict[tuple, list[Any]] = {}
+        self._lock = threading.Lock()
+        self._close = close
+
+    # ----------------------------------------------------------------------------
+    def get(self, key: tuple) -> Any | None:
+        with self._lock:
+            idle = self._idle.get(key)
+            return idle.pop() if idle else None
+
+    # ----------------------------------------------------------------------------
+    def put(self, key: tuple, conn: Any, max_size: int) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < max_size:
+                idle.append(conn)
+                return
+        self._close(conn)
+
+    # ----------------------------------------------------------------------------
+    def clear(self) -> None:
+        with self._lock:
+            conns = [conn for idle in self._idle.values() for conn in idle]
+            self._idle.clear()
+        for conn in conns:
+            self._close(conn)
+
+# ----------------------------------------------------------------------------
+def _close_stream(conn: tuple) -> None:
+    loop, _, writer = conn
+    # the transport of a closed event loop cannot be closed: it closes its socket when collected
+    if not loop.is_closed():
+        writer.close()
+
+_sync_pool = _ConnectionPool(lambda conn: conn.close())
+_async_pool = _ConnectionPool(_close_stream)
+
+# ----------------------------------------------------------------------------
+def close_connections() -> None:
+    """
+    Close the idle connections of the native clients.
+    """
+    _sync_pool.clear()
+    _async_pool.clear()
+
+# ############################################################################
+class _NativeStsClientBase:
+    """
+    Request building, signing and parsing shared by the blocking and the asyncio clients.
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self,
+                 access_key: str,
+                 secret_key: str,
+                 endpoint_url: str | None = None,
+                 region_name: str | None = None,
+                 connect_timeout: float | None = None,
+                 read_timeout: float | None = None,
+                 proxies: dict[str, str] | None = None,
+                 max_pool_connections: int | None = None,
+                 tcp_keepalive: bool | None = None,
+                 session_token: str | None = None,
+                 on_attempt: Callable[[str], None] | None = None):
+        """
+        Args:
+            access_key (str): AWS access key id.
+            secret_key (str): AWS secret access key.
+            endpoint_url (str | None, optional): URL of the STS endpoint (see get_endpoint_url). Defaults to None.
+            region_name (str | None, optional): Region of the endpoint, and the signing region. Defaults to None.
+            connect_timeout (float | None, optional): Connect timeout in seconds. Defaults to DEFAULT_TIMEOUT.
+            read_timeout (float | None, optional): Read timeout in seconds. Defaults to DEFAULT_TIMEOUT.
+            proxies (dict[str, str] | None, optional): Proxy URL by scheme ("http", "https"). Defaults to None.
+            max_pool_connections (int | None, optional): Idle connections kept for the endpoint.
+                Defaults to DEFAULT_MAX_POOL_CONNECTIONS.
+            tcp_keepalive (bool | None, optional): Enable the TCP keep-alive. Defaults to None.
+            session_token (str | None, optional): Session token of temporary credentials. Defaults to None.
+            on_attempt (Callable[[str], None] | None, optional): Called with the URL before each HTTP request.
+        Raises:
+            ValueError: If the endpoint or the proxy is not supported (see unsupported_reason).
+        """
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.session_token = session_token
+        self.endpoint_url = get_endpoint_url(endpoint_url, region_name)
+        self.region_name = region_name or DEFAULT_SIGNING_REGION
+        self.connect_timeout = connect_timeout if connect_timeout else DEFAULT_TIMEOUT
+        self.read_timeout = read_timeout if read_timeout else DEFAULT_TIMEOUT
+        self.max_pool_connections = max_pool_connections if max_pool_connections else DEFAULT_MAX_POOL_CONNECTIONS
+        self.tcp_keepalive = bool(tcp_keepalive)
+        self.on_attempt = on_attempt
+        reason = unsupported_reason(endpoint_url, proxies)
+        if reason:
+            raise ValueError(f"The native STS client cannot make the request: {reason}")
+
+        parts = urlsplit(self.endpoint_url)
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.https else 80)
+        self.path = parts.path or "/"
+        self.proxy = None
+        self.proxy_headers: dict[str, str] = {}
+        proxy_url = (proxies or {}).get(parts.scheme)
+        if proxy_url:
+            proxy = urlsplit(proxy_url if "://" in proxy_url else f"http://{proxy_url}")
+            self.proxy = (proxy.hostname, proxy.port or 80)
+            if proxy.username:
+                userinfo = f"{unquote(proxy.username)}:{unquote(proxy.password or '')}"
+                self.proxy_headers["Proxy-Authorization"] = "Basic " + b64encode(userinfo.encode("utf-8")).decode("ascii")
+
+    # ----------------------------------------------------------------------------
+    @property
+    def pool_key(self) -> tuple:
+        return (self.https, self.host, self.port, self.proxy, self.tcp_keepalive)
+
+    # ----------------------------------------------------------------------------
+    @property
+    def request_target(self) -> str:
+        if self.proxy and not self.https:
+            # a plain http request through the proxy is sent with the absolute URL
+            return f"http://{self.host}:{self.port}{self.path}"
+        return self.path
+
+    # ----------------------------------------------------------------------------
+    def build_request(self, action: str, params: dict[str, Any]) -> tuple[bytes, dict[str, str]]:
+        """
+        Build the body and the signed headers of the query API request.
+        """
+        query = {"Action": action, "Version": STS_API_VERSION}
+        query.update({k: str(v) for k, v in params.items() if v is not None})
+        body = urlencode(query, quote_via=quote).encode("utf-8")
+        headers = sign_request("POST", self.endpoint_url,
+                               {"Content-Type": "application/x-www-form-urlencoded; charset=utf-8"},
+                               body, self.access_key, self.secret_key, self.region_name,
+                               session_token=self.session_token)
+        if self.proxy and not self.https:
+            headers.update(self.proxy_headers)
+        if self.on_attempt is not None:
+            self.on_attempt(self.endpoint_url)
+        return body, headers
+
+    # ----------------------------------------------------------------------------
+    def _set_keepalive(self, sock: socket.socket | None) -> None:
+        if self.tcp_keepalive and sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+# ############################################################################
+class NativeStsClient(_NativeStsClientBase):
+    """
+    Blocking STS client with the method names and the response shape of the boto3 client.
+    The keep-alive connections are pooled by endpoint and reused by all clients of the process.
+    """
+    # ----------------------------------------------------------------------------
+    def get_session_token(self, DurationSeconds: int | None = None,
+                          SerialNumber: str | None = None,
+                          TokenCode: str | None = None) -> dict[str, Any]:
+        return self._call("GetSessionToken", {"DurationSeconds": DurationSeconds,
+                                              "SerialNumber": SerialNumber,
+                                              "TokenCode": TokenCode})
+
+    # ----------------------------------------------------------------------------
+    def assume_role(self, RoleArn: str, RoleSessionName: str,
+                    DurationSeconds: int | None = None,
+                    SerialNumber: str | None = None,
+                    TokenCode: str | None = None,
+                    ExternalId: str | None = None) -> dict[str, Any]:
+        return self._call("AssumeRole", {"RoleArn": RoleArn, "RoleSessionName": RoleSessionName,
+                                         "DurationSeconds": DurationSeconds, "SerialNumber": SerialNumber,
+                                         "TokenCode": TokenCode, "ExternalId": ExternalId})
+
+    # ----------------------------------------------------------------------------
+    def _call(self, action: str, params: dict[str, Any]) -> dict[str, Any]:
+        body, headers = self.build_request(action, params)
+        status, data = self._send(body, headers)
+        return parse_response(action, status, data)
+
+    # ----------------------------------------------------------------------------
+    def _connect(self) -> http.client.HTTPConnection:
+        if self.proxy:
+            host, port = self.proxy
+        else:
+            host, port = self.host, self.port
+        if self.https:
+            conn = http.client.HTTPSConnection(host, port, timeout=self.connect_timeout, context=_ssl_context())
+            if self.proxy:
+                conn.set_tunnel(self.host, self.port, headers=self.proxy_headers)
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=self.connect_timeout)
+        try:
+            conn.connect()
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            raise StsConnectionError(f"Could not connect to the endpoint URL: \"{self.endpoint_url}\": {e}") from e
+        conn.sock.settimeout(self.read_timeout)
+        self._set_keepalive(conn.sock)
+        get_registry().counter("sts_connections_opened_total").inc()
+        return conn
+
+    # ----------------------------------------------------------------------------
+    def _send(self, body: bytes, headers: dict[str, str]) -> tuple[int, bytes]:
+        while True:
+            conn = _sync_pool.get(self.pool_key)
+            reused = conn is not None
+            if conn is None:
+                conn = self._connect()
+            else:
+                # the pooled connection may have been opened by a client with another read timeout
+                # (e.g. bounded by the deadline of another call)
+                conn.sock.settimeout(self.read_timeout)
+                get_registry().counter("sts_connections_reused_total").inc()
+            try:
+                conn.request("POST", self.request_target, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (ConnectionResetError, BrokenPipeError, http.client.RemoteDisconnected) as e:
+                conn.close()
+                if reused:
+                    # the idle connection was closed by the server: send again on a new one
+                    continue
+                raise StsConnectionError(f"Connection was closed by \"{self.endpoint_url}\": {e}") from e
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                raise StsConnectionError(f"Request to \"{self.endpoint_url}\" failed: {e}") from e
+            if response.will_close:
+                conn.close()
+            else:
+                _sync_pool.put(self.pool_key, conn, self.max_pool_connections)
+            return response.status, data
+
+# ############################################################################
+class AsyncNativeStsClient(_NativeStsClientBase):
+    """
+    asyncio STS client, the counterpart of NativeStsClient awaited by the MCP server without a worker thread.
+    """
+    # ----------------------------------------------------------------------------
+    async def get_session_token(self, DurationSeconds: int | None = None,
+                                SerialNumber: str | None = None,
+                                TokenCode: str | None = None) -> dict[str, Any]:
+        return await self._call("GetSessionToken", {"DurationSeconds": DurationSeconds,
+                                                    "SerialNumber": SerialNumber,
+                                                    "TokenCode": TokenCode})
+
+    # ----------------------------------------------------------------------------
+    async def assume_role(self, RoleArn: str, RoleSessionName: str,
+                          DurationSeconds: int | None = None,
+                          SerialNumber: str | None = None,
+                          TokenCode: str | None = None,
+                          ExternalId: str | None = None) -> dict[str, Any]:
+        return await self._call("AssumeRole", {"RoleArn": RoleArn, "RoleSessionName": RoleSessionName,
+                                               "DurationSeconds": DurationSeconds, "SerialNumber": SerialNumber,
+                                               "TokenCode": TokenCode, "ExternalId": ExternalId})
+
+    # ----------------------------------------------------------------------------
+    async def _call(self, action: str, params: dict[str, Any]) -> dict[str, Any]:
+        body, headers = self.build_request(action, params)
+        status, data = await self._send(body, headers)
+        return parse_response(action, status, data)
+
+    # ----------------------------------------------------------------------------
+    async def _connect(self):
+        import asyncio
+        try:
+            if self.proxy is None:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port,
+                                            ssl=_ssl_context() if self.https else None,
+                                            server_hostname=self.host if self.https else None),
+                    self.connect_timeout)
+            else:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(*self.proxy), self.connect_timeout)
+                if self.https:
+                    # tunnel to the endpoint, then TLS over the tunnel
+                    lines = [f"CONNECT {self.host}:{self.port} HTTP/1.1", f"Host: {self.host}:{self.port}"]
+                    lines += [f"{k}: {v}" for k, v in self.proxy_headers.items()]
+                    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+                    await writer.drain()
+                    status, _, _ = await asyncio.wait_for(_read_response(reader, head_only=True), self.connect_timeout)
+                    if status != 200:
+                        writer.close()
+                        raise StsConnectionError(f"The proxy refused to connect to \"{self.endpoint_url}\": {status}")
+                    await asyncio.wait_for(writer.start_tls(_ssl_context(), server_hostname=self.host),
+                                           self.connect_timeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+            raise StsConnectionError(f"Could not connect to the endpoint URL: \"{self.endpoint_url}\": {e}") from e
+        self._set_keepalive(writer.get_extra_info("socket"))
+        get_registry().counter("sts_connections_opened_total").inc()
+        return asyncio.get_running_loop(), reader, writer
+
+    # ----------------------------------------------------------------------------
+    async def _send(self, body: bytes, headers: dict[str, str]) -> tuple[int, bytes]:
+        import asyncio
+        loop = asyncio.get_running_loop()
+        # the streams belong to the event loop that opened them
+        key = (id(loop),) + self.pool_key
+        request = [f"POST {self.request_target} HTTP/1.1"]
+        request += [f"{k}: {v}" for k, v in headers.items()]
+        request += [f"Content-Length: {len(body)}", "", ""]
+        request = "\r\n".join(request).encode("latin-1") + body
+        while True:
+            conn = _async_pool.get(key)
+            if conn is not None and (conn[0] is not loop or conn[2].is_closing()):
+                _close_stream(conn)
+                continue
+            reused = conn is not None
+            if conn is None:
+                conn = await self._connect()
+            else:
+                get_registry().counter("sts_connections_reused_total").inc()
+            _, reader, writer = conn
+            try:
+                writer.write(request)
+                await writer.drain()
+                status, response_headers, data = await asyncio.wait_for(_read_response(reader), self.read_timeout)
+            except (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError) as e:
+                writer.close()
+                if reused and not getattr(e, "partial", b""):
+                    # the idle connection was closed by the server: send again on a new one
+                    continue
+                raise StsConnectionError(f"Connection was closed by \"{self.endpoint_url}\": {e!r}") from e
+            except (OSError, asyncio.TimeoutError, ValueError) as e:
+                writer.close()
+                raise StsConnectionError(f"Request to \"{self.endpoint_url}\" failed: {e!r}") from e
+            except BaseException:
+                # cancelled in the middle of the exchange: the connection cannot be reused
+                writer.close()
+                raise
+            if response_headers.get("connection", "").lower() == "close":
+                writer.close()
+            else:
+                _async_pool.put(key, conn, self.max_pool_connections)
+            return status, data
+
+# ----------------------------------------------------------------------------
+async def _read_response(reader, head_only: bool = False) -> tuple[int, dict[str, str], bytes]:
+    """
+    Read an HTTP/1.1 response (Content-Length or chunked body) from the stream.
+    """
+    import asyncio
+    status_line = await reader.readline()
+    if not status_line:
+        raise asyncio.IncompleteReadError(b"", None)
+    try:
+        status = int(status_line.split(None, 2)[1])
+    except (IndexError, ValueError):
+        raise ValueError(f"invalid status line: {status_line[:100]!r}")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if head_only:
+        return status, headers, b""
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";", 1)[0].strip() or b"0", 16)
+            if size == 0:
+                # the trailer
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+        return status, headers, b"".join(chunks)
+    if "content-length" in headers:
+        return status, headers, await reader.readexactly(int(headers["content-length"]))
+    headers["connection"] = "close"
+    return status, headers, await reader.read()
+
+
+__all__ = ["NativeStsClient", "AsyncNativeStsClient", "StsServiceError", "StsConnectionError",
+           "close_connections", "parse_response", "sign_request", "unsupported_reason"]
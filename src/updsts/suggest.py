@@ -0,0 +1,152 @@
+﻿# encoding: utf-8-sig
+
+from collections import Counter
+from configparser import ConfigParser
+
+DEFAULT_SUGGEST_LIMIT = 5
+DEFAULT_MIN_SIMILARITY = 0.2
+
+# ----------------------------------------------------------------------------
+def trigrams(s: str) -> set[str]:
+    """
+    Get the trigrams of the string (case-insensitive, padded so that short names have trigrams).
+    Args:
+        s (str): The string.
+    Returns:
+        set[str]: The trigrams.
+    """
+    padded = f"  {s.lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+# ----------------------------------------------------------------------------
+def edit_distance(a: str, b: str) -> int:
+    """
+    Get the Levenshtein distance of the strings (case-insensitive).
+    """
+    a, b = a.lower(), b.lower()
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1,
+                               current[j - 1] + 1,
+                               previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+# ############################################################################
+class TrigramIndex:
+    """
+    Inverted trigram index of names, to suggest the names similar to a misspelled one.
+    Each indexed name points to a target (e.g. `totp_secret_name` -> its profile name).
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self):
+        self._names: list[str] = []
+        self._targets: list[str] = []
+        self._gram_counts: list[int] = []
+        self._postings: dict[str, list[int]] = {}
+
+    # ----------------------------------------------------------------------------
+    def __len__(self) -> int:
+        return len(self._names)
+
+    # ----------------------------------------------------------------------------
+    def add(self, name: str, target: str | None = None) -> None:
+        """
+        Add the name to the index.
+        Args:
+            name (str): Name to match against.
+            target (str | None, optional): Value to suggest when the name matches. Defaults to the name.
+        """
+        entry = len(self._names)
+        grams = trigrams(name)
+        self._names.append(name)
+        self._targets.append(target if target is not None else name)
+        self._gram_counts.append(len(grams))
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(entry)
+
+    # ----------------------------------------------------------------------------
+    def search(self,
+               query: str,
+               limit: int = DEFAULT_SUGGEST_LIMIT,
+               min_similarity: float = DEFAULT_MIN_SIMILARITY) -> list[str]:
+        """
+        Get the targets of the names similar to the query, best first.
+        The candidates are collected by the shared trigrams (Jaccard similarity),
+        and ranked by the edit distance.
+        Args:
+            query (str): The misspelled name.
+            limit (int, optional): Maximum number of suggestions. Defaults to DEFAULT_SUGGEST_LIMIT.
+            min_similarity (float, optional): Minimum trigram similarity of the candidates.
+        Returns:
+            list[str]: The suggested targets (without duplicates).
+        """
+        query_grams = trigrams(query)
+        shared = Counter()
+        for gram in query_grams:
+            for entry in self._postings.get(gram, ()):
+                shared[entry] += 1
+
+        candidates = []
+        for entry, count in shared.items():
+            similarity = count / (len(query_grams) + self._gram_counts[entry] - count)
+            if similarity >= min_similarity:
+                candidates.append((similarity, entry))
+        # the edit distance is computed only for the best candidates by similarity
+        candidates.sort(reverse=True)
+        ranked = sorted(candidates[:limit * 4],
+                        key=lambda c: (edit_distance(query, self._names[c[1]]), -c[0]))
+
+        ret = []
+        for _, entry in ranked:
+            target = self._targets[entry]
+            if target not in ret:
+                ret.append(target)
+                if len(ret) >= limit:
+                    break
+        return ret
+
+# ----------------------------------------------------------------------------
+def build_profile_index(config: ConfigParser) -> TrigramIndex:
+    """
+    Build the index of the profile names and the `totp_secret_name` values of the credential file.
+    Args:
+        config (ConfigParser): The parsed credential file.
+    Returns:
+        TrigramIndex: The index (targets are the profile names).
+    """
+    index = TrigramIndex()
+    for section in config.sections():
+        index.add(section)
+        totp_secret_name = config.get(section, "totp_secret_name", fallback=None)
+        if totp_secret_name:
+            index.add(totp_secret_name.strip(), section)
+    return index
+
+# ----------------------------------------------------------------------------
+def suggest_profiles(config: ConfigParser,
+                     profile_name: str,
+                     limit: int = DEFAULT_SUGGEST_LIMIT) -> list[str]:
+    """
+    Suggest the profile names similar to the missing one.
+    The index is kept with the parsed file, so it is built once per parse
+    (and reused while the parse cache holds the file).
+    Args:
+        config (ConfigParser): The parsed credential file.
+        profile_name (str): The missing profile name.
+        limit (int, optional): Maximum number of suggestions. Defaults to DEFAULT_SUGGEST_LIMIT.
+    Returns:
+        list[str]: The suggested profile names, best first.
+    """
+    index = getattr(config, "_updsts_profile_index", None)
+    if index is None:
+        index = build_profile_index(config)
+        config._updsts_profile_index = index
+    return index.search(profile_name, limit=limit)
+
+
+__all__ = ["TrigramIndex", "build_profile_index", "suggest_profiles", "edit_distance", "trigrams"]
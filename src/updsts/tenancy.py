@@ -0,0 +1,280 @@
+﻿# encoding: utf-8-sig
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable
+
+from .awsutil import evict_cached_file, get_credential_file_path
+from .logutil import get_logger
+from .metrics import get_registry
+from .upcred import CredentialUpdater
+
+# NOTE: a tenant is one credentials file served by the MCP server. Each tenant has its own worker threads,
+#       rate limit and write queue, so that a file refreshed over and over does not delay the calls of another.
+
+DEFAULT_MAX_TENANTS = 32
+DEFAULT_TENANT_WORKERS = 4
+# refreshes per minute of each file (0: unlimited)
+DEFAULT_RATE_LIMIT = 0.0
+DEFAULT_RATE_BURST = 10
+
+# ############################################################################
+class TenantRateLimited(Exception):
+    """
+    The refreshes of the credentials file exceeded its rate limit.
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self, credential_file: str, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"Too many refreshes of '{credential_file}', retry after {retry_after:.1f} seconds.")
+
+# ############################################################################
+class TokenBucket:
+    """
+    Token bucket of the refreshes of one file (thread-safe).
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self, rate_per_minute: float, burst: int = DEFAULT_RATE_BURST):
+        self.rate = rate_per_minute / 60.0
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    # ----------------------------------------------------------------------------
+    def try_acquire(self, count: int = 1) -> float:
+        """
+        Take the tokens of `count` refreshes.
+        Returns:
+            float: 0 if taken, otherwise the seconds until they are available (nothing is taken).
+        Raises:
+            ValueError: If `count` exceeds the burst (the tokens would never be available).
+        """
+        if count > self.burst:
+            raise ValueError(f"{count} refreshes at once exceed the burst of the rate limit ({self.burst}), "
+                             "split the batch.")
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= count:
+                self._tokens -= count
+                return 0.0
+            return (count - self._tokens) / self.rate
+
+# ############################################################################
+class Tenant:
+    """
+    State of one credentials file in the MCP server.
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self, path: Path,
+                 max_workers: int = DEFAULT_TENANT_WORKERS,
+                 rate_per_minute: float = DEFAULT_RATE_LIMIT,
+                 burst: int = DEFAULT_RATE_BURST):
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"updsts-{path.name}")
+        self.bucket = TokenBucket(rate_per_minute, burst) if rate_per_minute > 0 else None
+        # tool calls running or waiting (a busy tenant is not evicted)
+        self.in_flight = 0
+        self.last_used = time.monotonic()
+        # blocks waiting for the rewrite: [key, credentials, sts profile name, result, error, done]
+        self._pending: list[list[Any]] = []
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    # ----------------------------------------------------------------------------
+    def check_rate(self, count: int = 1) -> None:
+        """
+        Take the rate limit tokens of `count` refreshes.
+        Raises:
+            TenantRateLimited: If the file is refreshed too often.
+            ValueError: If `count` exceeds the burst of the rate limit.
+        """
+        if self.bucket is None:
+            return
+        retry_after = self.bucket.try_acquire(count)
+        if retry_after > 0:
+            get_registry().counter("tenant_rate_limited_total").inc()
+            raise TenantRateLimited(str(self.path), retry_after)
+
+    # ----------------------------------------------------------------------------
+    async def track(self, work) -> Any:
+        """
+        Await the work of a tool call on this tenant (the tenant is not evicted meanwhile).
+        """
+        self.in_flight += 1
+        try:
+            return await work
+        finally:
+            self.in_flight -= 1
+            self.last_used = time.monotonic()
+
+    # ----------------------------------------------------------------------------
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        Run the function in a worker thread of this tenant (with the context of the caller, e.g. the deadline).
+        """
+        loop = asyncio.get_running_loop()
+        return await self.track(loop.run_in_executor(self.executor, partial(copy_context().run, func, *args, **kwargs)))
+
+    # ----------------------------------------------------------------------------
+    def write(self, target_key: str, creds: dict, sts_profile_name: str | None = None) -> dict[str, str]:
+        """
+        Write the block of the credentials to the file (the `writer` of awsutil.update_credentials).
+        The blocks queued while the file is being rewritten are written together by the next rewrite,
+        so that N refreshes of a hot file cost fewer than N rewrites. The call returns after its block is written.
+        Returns:
+            dict[str, str]: The updated profile info (see CredentialUpdater.update_credential_file).
+        """
+        entry = [target_key, creds, sts_profile_name, None, None, False]
+        with self._pending_lock:
+            self._pending.append(entry)
+        with self._write_lock:
+            if not entry[5]:
+                with self._pending_lock:
+                    batch, self._pending = self._pending, []
+                self._write_batch(batch)
+        if entry[4] is not None:
+            raise entry[4]
+        return entry[3]
+
+    # ----------------------------------------------------------------------------
+    def _write_batch(self, batch: list[list[Any]]) -> None:
+        updater = CredentialUpdater(credential_path=self.path)
+        # the later credentials of the same key win
+        for target_key, creds, sts_profile_name, *_ in batch:
+            updater.add_target(target_key, creds, sts_profile_name)
+        try:
+            updater.update_credential_file()
+        except Exception as e:
+            for entry in batch:
+                entry[4] = e
+        else:
+            for entry in batch:
+                entry[3] = updater.updated_profiles[entry[0]]
+        for entry in batch:
+            entry[5] = True
+        if len(batch) > 1:
+            get_registry().counter("tenant_coalesced_writes_total").inc(len(batch) - 1)
+
+    # ----------------------------------------------------------------------------
+    def close(self) -> None:
+        """
+        Stop the worker threads and drop the cached parse of the file.
+        """
+        self.executor.shutdown(wait=False)
+        evict_cached_file(self.path)
+
+# ############################################################################
+class TenantRegistry:
+    """
+    Tenants of the MCP server, keyed by the resolved path of the credentials file.
+    At most `max_tenants` files stay resident: the least recently used idle one is evicted for a new one.
+    It is used on the event loop only, so it needs no lock.
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self, max_tenants: int = DEFAULT_MAX_TENANTS,
+                 max_workers: int = DEFAULT_TENANT_WORKERS,
+                 rate_per_minute: float = DEFAULT_RATE_LIMIT,
+                 burst: int = DEFAULT_RATE_BURST):
+        if max_tenants < 1:
+            raise ValueError(f"max_tenants must be 1 or more: {max_tenants}")
+        self.max_tenants = max_tenants
+        self.max_workers = max_workers
+        self.rate_per_minute = rate_per_minute
+        self.burst = burst
+        self._tenants: OrderedDict[str, Tenant] = OrderedDict()
+
+    # ----------------------------------------------------------------------------
+    def get(self, credential_file: str | None = None) -> Tenant:
+        """
+        Get the tenant of the credentials file (created if needed), as the most recently used.
+        """
+        path = get_credential_file_path(credential_file).resolve()
+        key = str(path)
+        tenant = self._tenants.get(key)
+        if tenant is not None:
+            self._tenants.move_to_end(key)
+            tenant.last_used = time.monotonic()
+            return tenant
+        tenant = Tenant(path, self.max_workers, self.rate_per_minute, self.burst)
+        self._tenants[key] = tenant
+        self._evict()
+        return tenant
+
+    # ----------------------------------------------------------------------------
+    def _evict(self) -> None:
+        # the busy tenants are kept, even over the limit
+        for key in [key for key, tenant in self._tenants.items() if tenant.in_flight == 0]:
+            if len(self._tenants) <= self.max_tenants:
+                break
+            tenant = self._tenants.pop(key)
+            tenant.close()
+            get_registry().counter("tenant_evictions_total").inc()
+            get_logger().debug("Evicted the tenant of '%s'", key)
+
+    # ----------------------------------------------------------------------------
+    def __len__(self) -> int:
+        return len(self._tenants)
+
+    # ----------------------------------------------------------------------------
+    def stats(self) -> dict[str, Any]:
+        """
+        Get the state of the tenants (no credential values).
+        """
+        now = time.monotonic()
+        return {
+            "max_tenants": self.max_tenants,
+            "rate_limit_per_minute": self.rate_per_minute,
+            "tenants": {key: {"in_flight": tenant.in_flight, "idle_seconds": round(now - tenant.last_used, 1)}
+                        for key, tenant in self._tenants.items()},
+        }
+
+    # ----------------------------------------------------------------------------
+    def close(self) -> None:
+        for tenant in self._tenants.values():
+            tenant.close()
+        self._tenants.clear()
+
+# globals
+_tenant_options: dict[str, Any] = {}
+_tenant_registry: TenantRegistry | None = None
+
+# ----------------------------------------------------------------------------
+def set_tenant_options(max_tenants: int | None = None,
+                       rate_per_minute: float | None = None,
+                       burst: int | None = None) -> None:
+    """
+    Set the limits of the tenants of the MCP server of this process (None keeps the default).
+    Args:
+        max_tenants (int | None, optional): Credentials files kept resident. Defaults to None.
+        rate_per_minute (float | None, optional): Refreshes per minute of each file (0: unlimited). Defaults to None.
+        burst (int | None, optional): Refreshes allowed at once above the rate. Defaults to None.
+    """
+    global _tenant_options, _tenant_registry
+    options = {"max_tenants": max_tenants, "rate_per_minute": rate_per_minute, "burst": burst}
+    _tenant_options = {key: value for key, value in options.items() if value is not None}
+    if _tenant_registry is not None:
+        _tenant_registry.close()
+        _tenant_registry = None
+
+# ----------------------------------------------------------------------------
+def get_tenant_registry() -> TenantRegistry:
+    """
+    Get the tenants of this process (created on the first use with the options of set_tenant_options).
+    """
+    global _tenant_registry
+    if _tenant_registry is None:
+        _tenant_registry = TenantRegistry(**_tenant_options)
+    return _tenant_registry
+
+
+__all__ = ["DEFAULT_MAX_TENANTS", "DEFAULT_RATE_LIMIT", "Tenant", "TenantRateLimited", "TenantRegistry", "TokenBucket",
+           "get_tenant_registry", "set_tenant_options"]
@@ -0,0 +1,83 @@
+﻿# encoding: utf-8-sig
+
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+from .metrics import get_registry
+from .tracing import span
+
+# time when the updsts modules started loading (used to report the import phase)
+MODULE_LOADED_AT = time.perf_counter()
+
+# phase name -> accumulated seconds of the current command (None when not collecting)
+_phases: ContextVar[dict[str, float] | None] = ContextVar("updsts_timing_phases", default=None)
+
+# ----------------------------------------------------------------------------
+def record_phase(name: str, elapsed: float) -> None:
+    """
+    Add the elapsed time to the phase of the current command.
+    Args:
+        name (str): Phase name.
+        elapsed (float): Elapsed seconds.
+    """
+    phases = _phases.get()
+    if phases is not None:
+        phases[name] = phases.get(name, 0.0) + elapsed
+
+# ----------------------------------------------------------------------------
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """
+    Measure the enclosed block as the named phase.
+    The elapsed time is also observed by the `<name>_seconds` histogram of the metrics registry,
+    and the block is recorded as a span if a trace is active.
+    Args:
+        name (str): Phase name (e.g. "parse", "client_build", "sts_request", "rewrite").
+    """
+    start = time.perf_counter()
+    try:
+        with span(name):
+            yield
+    finally:
+        elapsed = time.perf_counter() - start
+        record_phase(name, elapsed)
+        get_registry().histogram(f"{name}_seconds").observe(elapsed)
+
+# ----------------------------------------------------------------------------
+def format_summary(label: str, phases: dict[str, float], total: float) -> str:
+    """
+    Format the phases as one structured (key=value) line.
+    """
+    items = [f"command={label}", f"total_ms={total * 1000:.3f}"]
+    items.extend(f"{name}_ms={elapsed * 1000:.3f}" for name, elapsed in phases.items())
+    return "timing: " + " ".join(items)
+
+# ----------------------------------------------------------------------------
+@contextmanager
+def timing_session(label: str, logger: logging.Logger, include_import: bool = False) -> Iterator[dict[str, float]]:
+    """
+    Collect the phases of one command and log the summary line at INFO level.
+    Args:
+        label (str): Name of the command.
+        logger (logging.Logger): Logger to emit the summary.
+        include_import (bool, optional): Report the module import time as the "import" phase.
+    Yields:
+        dict[str, float]: The collected phases.
+    """
+    phases: dict[str, float] = {}
+    start = time.perf_counter()
+    if include_import:
+        phases["import"] = start - MODULE_LOADED_AT
+    token = _phases.set(phases)
+    try:
+        yield phases
+    finally:
+        _phases.reset(token)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(format_summary(label, phases, time.perf_counter() - start))
+
+
+__all__ = ["phase", "record_phase", "timing_session", "format_summary"]
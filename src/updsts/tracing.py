@@ -0,0 +1,292 @@
+﻿# encoding: utf-8-sig
+
+import functools
+import inspect
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Iterator
+
+# Lightweight tracing of the tool calls / commands.
+# Each root span (one MCP tool call or CLI command) and its child spans
+# (parse, client_build, sts_request, rewrite, fsync) are written as one line of
+# OTLP/JSON (ExportTraceServiceRequest) to a local file, so no collector is needed.
+# Tracing is disabled unless $UPDSTS_TRACE_FILE (or `set_trace_file`) specifies the file.
+
+TRACE_FILE_ENV = "UPDSTS_TRACE_FILE"
+SERVICE_NAME = "updsts"
+
+# OTLP span kind / status codes
+SPAN_KIND_INTERNAL = 1
+STATUS_CODE_OK = 1
+STATUS_CODE_ERROR = 2
+
+# the innermost span of the current context (None when not tracing)
+_current_span: ContextVar["Span | None"] = ContextVar("updsts_current_span", default=None)
+
+# globals
+_exporter: "JsonLinesSpanExporter | None" = None
+_exporter_resolved: bool = False
+_exporter_lock = threading.Lock()
+
+# ############################################################################
+class Span:
+    """
+    One timed operation of a trace.
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self, name: str, parent: "Span | None" = None, attributes: dict[str, Any] | None = None):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.attributes: dict[str, Any] = dict(attributes) if attributes else {}
+        self.events: list[tuple[str, int, dict[str, Any]]] = []
+        self.status_code = STATUS_CODE_OK
+        self.status_message = ""
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        # finished spans of the trace, collected by the root span
+        self.finished: list[Span] = []
+
+    # ----------------------------------------------------------------------------
+    @property
+    def root(self) -> "Span":
+        span = self
+        while span.parent is not None:
+            span = span.parent
+        return span
+
+    # ----------------------------------------------------------------------------
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    # ----------------------------------------------------------------------------
+    def add_event(self, name: str, attributes: dict[str, Any] | None = None) -> None:
+        self.events.append((name, time.time_ns(), dict(attributes) if attributes else {}))
+
+    # ----------------------------------------------------------------------------
+    def record_error(self, error: BaseException) -> None:
+        self.status_code = STATUS_CODE_ERROR
+        self.status_message = str(error)
+        self.add_event("exception", {
+            "exception.type": type(error).__name__,
+            "exception.message": str(error),
+        })
+
+    # ----------------------------------------------------------------------------
+    def end(self) -> None:
+        self.end_ns = time.time_ns()
+        self.root.finished.append(self)
+
+    # ----------------------------------------------------------------------------
+    def to_otlp(self) -> dict[str, Any]:
+        """
+        Convert the span to the OTLP/JSON representation.
+        """
+        ret = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": _to_otlp_attributes(self.attributes),
+            "status": {"code": self.status_code},
+        }
+        if self.parent is not None:
+            ret["parentSpanId"] = self.parent.span_id
+        if self.status_message:
+            ret["status"]["message"] = self.status_message
+        if self.events:
+            ret["events"] = [
+                {"timeUnixNano": str(ts), "name": name, "attributes": _to_otlp_attributes(attrs)}
+                for name, ts, attrs in self.events
+            ]
+        return ret
+
+# ############################################################################
+class JsonLinesSpanExporter:
+    """
+    Append the finished traces to a file, one OTLP/JSON request per line.
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self, path: str | os.PathLike):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    # ----------------------------------------------------------------------------
+    def export(self, spans: list[Span]) -> None:
+        request = {
+            "resourceSpans": [{
+                "resource": {"attributes": _to_otlp_attributes({
+                    "service.name": SERVICE_NAME,
+                    "process.pid": os.getpid(),
+                })},
+                "scopeSpans": [{
+                    "scope": {"name": SERVICE_NAME},
+                    "spans": [span.to_otlp() for span in spans],
+                }],
+            }],
+        }
+        line = json.dumps(request, separators=(",", ":")) + "\n"
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open(mode="a", encoding="utf-8") as f:
+                f.write(line)
+
+# ----------------------------------------------------------------------------
+def _to_otlp_attributes(attributes: dict[str, Any]) -> list[dict[str, Any]]:
+    ret = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            otlp_value = {"boolValue": value}
+        elif isinstance(value, int):
+            otlp_value = {"intValue": str(value)}
+        elif isinstance(value, float):
+            otlp_value = {"doubleValue": value}
+        else:
+            otlp_value = {"stringValue": str(value)}
+        ret.append({"key": key, "value": otlp_value})
+    return ret
+
+# ----------------------------------------------------------------------------
+def set_trace_file(path: str | os.PathLike | None) -> None:
+    """
+    Set the file to export the traces to.
+    Args:
+        path (str | os.PathLike | None): Path of the JSON-lines file. None disables tracing.
+    """
+    global _exporter, _exporter_resolved
+    with _exporter_lock:
+        _exporter = JsonLinesSpanExporter(path) if path else None
+        _exporter_resolved = True
+
+# ----------------------------------------------------------------------------
+def get_exporter() -> JsonLinesSpanExporter | None:
+    """
+    Get the exporter, initialized from $UPDSTS_TRACE_FILE on the first call.
+    Returns:
+        JsonLinesSpanExporter | None: The exporter, or None if tracing is disabled.
+    """
+    global _exporter, _exporter_resolved
+    if not _exporter_resolved:
+        with _exporter_lock:
+            if not _exporter_resolved:
+                env_path = os.environ.get(TRACE_FILE_ENV)
+                if env_path and env_path.lower() != "off":
+                    _exporter = JsonLinesSpanExporter(os.path.expanduser(env_path))
+                _exporter_resolved = True
+    return _exporter
+
+# ----------------------------------------------------------------------------
+def current_span() -> Span | None:
+    """
+    Get the innermost span of the current context.
+    """
+    return _current_span.get()
+
+# ----------------------------------------------------------------------------
+@contextmanager
+def _run_span(span: Span) -> Iterator[Span]:
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+
+# ----------------------------------------------------------------------------
+@contextmanager
+def start_trace(name: str, **attributes) -> Iterator[Span | None]:
+    """
+    Start a new trace with the root span, and export it when the block exits.
+    If tracing is disabled, nothing is recorded.
+    Args:
+        name (str): Name of the root span (e.g. the tool name).
+        **attributes: Attributes of the root span.
+    Yields:
+        Span | None: The root span, or None if tracing is disabled.
+    """
+    exporter = get_exporter()
+    if exporter is None:
+        yield None
+        return
+
+    root = Span(name, attributes=attributes)
+    try:
+        with _run_span(root):
+            yield root
+    finally:
+        try:
+            exporter.export(root.finished)
+        except OSError as e:
+            logging.getLogger(__name__).debug("Failed to export the trace: %s", e)
+
+# ----------------------------------------------------------------------------
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span | None]:
+    """
+    Measure the enclosed block as a child span of the current span.
+    Outside of a trace, nothing is recorded.
+    Args:
+        name (str): Name of the span.
+        **attributes: Attributes of the span.
+    Yields:
+        Span | None: The span, or None if no trace is active.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    with _run_span(Span(name, parent=parent, attributes=attributes)) as child:
+        yield child
+
+# ----------------------------------------------------------------------------
+def traced(name: str):
+    """
+    Decorator to run the function (sync or async) as the root span of a trace.
+    Args:
+        name (str): Name of the root span.
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with start_trace(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with start_trace(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# ############################################################################
+class TraceContextFilter(logging.Filter):
+    """
+    Add the `trace_ctx` field (" [trace_id=... span_id=...]" or "") to the log records.
+    """
+    # ----------------------------------------------------------------------------
+    def filter(self, record: logging.LogRecord) -> bool:
+        current = _current_span.get()
+        if current is not None:
+            record.trace_ctx = f" [trace_id={current.trace_id} span_id={current.span_id}]"
+        else:
+            record.trace_ctx = ""
+        return True
+
+
+__all__ = ["Span", "JsonLinesSpanExporter", "TraceContextFilter",
+           "set_trace_file", "get_exporter", "current_span", "start_trace", "span", "traced"]
@@ -2,11 +2,51 @@
 
 import os
 import re
+import threading
 
 from argparse import ArgumentParser
 from pathlib import Path
 
 from .logutil import get_logger
+from .metrics import get_registry
+from .timing import phase
+
+# callbacks called with the path of the credential file after it is rewritten
+update_listeners: list = []
+
+# lock of each credential file (the rewrite uses a fixed temporary file next to it)
+file_locks: dict[str, threading.Lock] = {}
+file_locks_guard = threading.Lock()
+
+# ----------------------------------------------------------------------------
+def get_file_lock(path: str | os.PathLike) -> threading.Lock:
+    """
+    Get the lock to serialize the rewrites of the credential file in this process.
+    Args:
+        path (str | os.PathLike): Path of the credential file.
+    Returns:
+        threading.Lock: The lock of the file.
+    """
+    key = os.path.realpath(path)
+    with file_locks_guard:
+        lock = file_locks.get(key)
+        if lock is None:
+            lock = threading.Lock()
+            file_locks[key] = lock
+        return lock
+
+# ----------------------------------------------------------------------------
+def add_update_listener(listener: callable) -> None:
+    """
+    Register a callback called with the path of the credential file after it is rewritten.
+    """
+    if listener not in update_listeners:
+        update_listeners.append(listener)
+
+# ----------------------------------------------------------------------------
+def remove_update_listener(listener: callable) -> None:
+    if listener in update_listeners:
+        update_listeners.remove(listener)
 
 # ############################################################################
 class CredentialUpdater:
@@ -19,6 +59,10 @@ class CredentialUpdater:
         self.target_tag_name = None
         self.credential_file_path = None
         self.sts_profile_name = None
+        # the other blocks updated in the same rewrite: key -> (credentials, sts profile name)
+        self.extra_targets: dict[str, tuple[dict, str | None]] = {}
+        # the result of the last rewrite: key -> updated profile info
+        self.updated_profiles: dict[str, dict[str, str]] = {}
         if (credential_path):
             self.set_credentials_path(credential_path)
 
@@ -57,21 +101,88 @@ class CredentialUpdater:
         """
         self.sts_profile_name = sts_profile_name
 
+    # ----------------------------------------------------------------------------
+    def add_target(self, target_tag_name: str, creds: dict, sts_profile_name: str | None = None):
+        """
+        add another block to be updated in the same rewrite of the file
+        Args:
+            target_tag_name (str): target key name in the credentials file to be replaced
+            creds (dict): AWS STS credentials dictionary
+            sts_profile_name (str | None, optional): STS profile name. Defaults to '<key>_sts'.
+        """
+        self.extra_targets[target_tag_name] = (creds, sts_profile_name)
+
+    # ----------------------------------------------------------------------------
+    def get_targets(self) -> dict[str, tuple[dict, str]]:
+        """
+        get the blocks to be updated
+        Returns:
+            dict[str, tuple[dict, str]]: key -> (credentials, sts profile name)
+        """
+        targets = {}
+        if self.target_tag_name is not None:
+            targets[self.target_tag_name] = (self.creds, self.sts_profile_name or f'{self.target_tag_name}_sts')
+        for key, (creds, sts_profile_name) in self.extra_targets.items():
+            targets.setdefault(key, (creds, sts_profile_name or f'{key}_sts'))
+        return targets
+
     # ----------------------------------------------------------------------------
     def update_credential_file(self) -> dict[str, str] | None:
         """
         update the credentials file
         """
+        with get_file_lock(self.credential_file_path), phase("rewrite"):
+            ret = self._update_credential_file()
+        metrics = get_registry()
+        metrics.counter("credential_file_rewrites_total").inc()
+        metrics.gauge("credential_file_bytes").set(self.credential_file_path.stat().st_size)
+        logger = get_logger()
+        for listener in list(update_listeners):
+            try:
+                listener(self.credential_file_path)
+            except Exception as e:
+                # a failing listener must not fail the update
+                logger.error("update listener failed: %s", e)
+        return ret
+
+    # ----------------------------------------------------------------------------
+    @staticmethod
+    def _write_profile(fout, sts_profile_name: str, creds: dict) -> dict[str, str]:
+        """
+        write the section of the sts profile
+        """
+        aws_access_key_id     = creds.get("AccessKeyId",     "")
+        aws_secret_access_key = creds.get("SecretAccessKey", "")
+        aws_session_token     = creds.get("SessionToken",    "")
+        aws_token_expiration  = creds.get("Expiration",      "")
+        # write section header
+        fout.write(f"[{sts_profile_name}]\n")
+        # write items
+        fout.write(f"aws_access_key_id={aws_access_key_id}\n")
+        fout.write(f"aws_secret_access_key={aws_secret_access_key}\n")
+        fout.write(f"aws_session_token={aws_session_token}\n")
+        fout.write(f"expiration_datetime={aws_token_expiration}\n")
+        return {
+            "updated_profile_name" : sts_profile_name,
+            "aws_access_key_id"    : aws_access_key_id,
+            "aws_token_expiration" : aws_token_expiration
+        }
+
+    # ----------------------------------------------------------------------------
+    def _update_credential_file(self) -> dict[str, str] | None:
+        """
+        rewrite the credentials file with the target blocks replaced
+        """
         logger = get_logger()
         bgn_tag = re.compile(r"^(\s*)#\s+\$\{\{\{\s+key=([\w\-_]+)\s+.*\r?\n")
         end_tag = re.compile(r"^(\s*)#\s+\$\}\}\}\s+.*\r?\n")
         out_path = self.credential_file_path.with_suffix(".tmp")
-        updated_profile_info = None
+        targets = self.get_targets()
+        updated = {}
         with self.credential_file_path.open(mode='r', encoding="utf-8") as fin:
             with out_path.open(mode='w', encoding="utf-8") as fout:
                 is_break = False
                 is_in_replace_tag = None
-                sts_profile_name = self.sts_profile_name if self.sts_profile_name else f'{self.target_tag_name}_sts'
                 while not is_break: 
                     line = fin.readline()
                     if (not line):
@@ -84,32 +195,12 @@ class CredentialUpdater:
                         if (obj):
                             matched_whitespaces = obj.group(1)
                             matched_key         = obj.group(2)
-                            if (self.target_tag_name == matched_key):
-                                print(f"found key : key='{self.target_tag_name}'")
-                                # write credentials
-                                aws_access_key_id     = self.creds.get("AccessKeyId",     "")
-                                aws_secret_access_key = self.creds.get("SecretAccessKey", "")
-                                aws_session_token     = self.creds.get("SessionToken",    "")
-                                aws_token_expiration  = self.creds.get("Expiration",      "")
-                                # write section header
-                                prof_tag = f"[{sts_profile_name}]\n"
-                                fout.write(prof_tag)
-                                # write items
-                                ak_str    = f"aws_access_key_id={aws_access_key_id}\n"
-                                asak_str  = f"aws_secret_access_key={aws_secret_access_key}\n"
-                                token_str = f"aws_session_token={aws_session_token}\n"
-                                exp_str   = f"expiration_datetime={aws_token_expiration}\n"
-                                fout.write(ak_str)
-                                fout.write(asak_str)
-                                fout.write(token_str)
-                                fout.write(exp_str)
+                            if (matched_key in targets):
+                                print(f"found key : key='{matched_key}'")
+                                creds, sts_profile_name = targets[matched_key]
+                                updated[matched_key] = self._write_profile(fout, sts_profile_name, creds)
                                 # ignore until end tag
                                 is_in_replace_tag = matched_key
-                                updated_profile_info = {
-                                    "updated_profile_name" : sts_profile_name,
-                                    "aws_access_key_id"    : self.creds.get("AccessKeyId", ""),
-                                    "aws_token_expiration" : self.creds.get("Expiration",      "")
-                                }
                             else:
                                 # regular line
                                 is_in_replace_tag = None
@@ -120,44 +211,31 @@ class CredentialUpdater:
                             is_in_replace_tag = None
                             fout.write(line)
 
-                if not updated_profile_info:
-                    logger.warning(f"the target block key='{self.target_tag_name}' is not found. creating new block for the target key.")
-                    # create section
-                    aws_access_key_id     = self.creds.get("AccessKeyId",     "")
-                    aws_secret_access_key = self.creds.get("SecretAccessKey", "")
-                    aws_session_token     = self.creds.get("SessionToken",    "")
-                    aws_token_expiration  = self.creds.get("Expiration",      "")
-                    # write with indentation
-                    prof_tag = f"[{sts_profile_name}]\n"
-                    ak_str    = f"aws_access_key_id={aws_access_key_id}\n"
-                    asak_str  = f"aws_secret_access_key={aws_secret_access_key}\n"
-                    token_str = f"aws_session_token={aws_session_token}\n"
-                    exp_str   = f"expiration_datetime={aws_token_expiration}\n"
+                for key, (creds, sts_profile_name) in targets.items():
+                    if key in updated:
+                        continue
+                    logger.warning("the target block key='%s' is not found. creating new block for the target key.", key)
                     # write begin tag
-                    fout.write(f"# ${{{{{{ key={self.target_tag_name} [auto update by updsts]\n")
-                    fout.write(prof_tag)
-                    fout.write(ak_str)
-                    fout.write(asak_str)
-                    fout.write(token_str)
-                    fout.write(exp_str)
+                    fout.write(f"# ${{{{{{ key={key} [auto update by updsts]\n")
+                    updated[key] = self._write_profile(fout, sts_profile_name, creds)
                     # write end tag
                     fout.write(f"# $}}}}}} [auto update by updsts]\n")
-                    logger.info(f"added  : key='{self.target_tag_name}_sts'")
-                    updated_profile_info = {
-                        "updated_profile_name" : sts_profile_name,
-                        "aws_access_key_id"    : self.creds.get("AccessKeyId", ""),
-                        "aws_token_expiration" : self.creds.get("Expiration",      "")
-                    }
+                    logger.info("added  : key='%s_sts'", key)
+                # make sure the new content is on the disk before replacing the original file
+                fout.flush()
+                with phase("fsync"):
+                    os.fsync(fout.fileno())
 
         # replace original file
-        logger.info(f"modifying : '{self.credential_file_path}'")
+        logger.info("modifying : '%s'", self.credential_file_path)
         # copy file permissions
         st = os.stat(self.credential_file_path)
         os.chmod(out_path, st.st_mode)
         self.credential_file_path.unlink()
         out_path.rename(self.credential_file_path)
-        logger.info(f"modified  : '{self.credential_file_path}'")
+        logger.info("modified  : '%s'", self.credential_file_path)
         if out_path.exists():
             out_path.unlink()
 
-        return updated_profile_info
+        self.updated_profiles = updated
+        return updated.get(self.target_tag_name) if self.target_tag_name is not None else None
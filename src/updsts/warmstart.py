@@ -0,0 +1,230 @@
+﻿# encoding: utf-8-sig
+
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from .awsutil import get_credential_file_path, prewarm_sts_client, read_profile_index
+from .logutil import get_logger
+from .metrics import get_registry
+from .timing import phase
+
+# NOTE: the snapshot holds the profile names to prewarm at the next start only (the recently requested
+#       ones and the last prewarmed ones of each file), never a key or a token. The file itself is parsed
+#       again by the prewarm thread, through the cache that the first tool call uses.
+
+STATE_FILE_ENV = "UPDSTS_STATE_FILE"
+SNAPSHOT_VERSION = 2
+# profiles whose STS client is built in the background at the start
+MAX_PREWARM = 4
+MAX_RECENT = 16
+# the default deadline of the updsts_update_sts_credential tool (the timeouts of the prewarmed client)
+PREWARM_DEADLINE = 60.0
+
+# ----------------------------------------------------------------------------
+def get_snapshot_path() -> Path:
+    """
+    Get the path of the snapshot ($UPDSTS_STATE_FILE or ~/.awscm/cache/mcp-state.json).
+    """
+    env_path = os.environ.get(STATE_FILE_ENV)
+    if env_path:
+        return Path(os.path.expanduser(env_path))
+    return Path(os.path.expanduser("~")) / ".awscm" / "cache" / "mcp-state.json"
+
+# ############################################################################
+class WarmState:
+    """
+    State of the MCP server saved across restarts: for each credentials file,
+    the "recent" profiles requested by the tools and the profiles of the last "prewarm".
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self, path: str | os.PathLike | None = None):
+        self.path = Path(path) if path else get_snapshot_path()
+        # resolved path of the credentials file -> {"recent": [...], "prewarm": [...]}
+        self._files: dict[str, dict[str, Any]] = {}
+        self._lock = threading.RLock()
+
+    # ----------------------------------------------------------------------------
+    def load(self) -> bool:
+        """
+        Load the snapshot. A missing, broken or older snapshot is ignored.
+        Returns:
+            bool: True if the snapshot was restored.
+        """
+        try:
+            with self.path.open(mode="r", encoding="utf-8") as fin:
+                data = json.load(fin)
+            files = data["files"] if data.get("version") == SNAPSHOT_VERSION else None
+        except (OSError, ValueError, KeyError, AttributeError):
+            files = None
+        if not isinstance(files, dict):
+            return False
+        with self._lock:
+            self._files = {key: entry for key, entry in files.items() if isinstance(entry, dict)}
+        get_logger().debug("Restored the warm-start snapshot '%s' (%d files)", self.path, len(files))
+        return True
+
+    # ----------------------------------------------------------------------------
+    def save(self) -> None:
+        """
+        Write the snapshot atomically (readable by the user only).
+        """
+        with self._lock:
+            data = {"version": SNAPSHOT_VERSION, "saved_at": datetime.now().astimezone().isoformat(),
+                    "files": self._files}
+            self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as fout:
+                json.dump(data, fout)
+            os.replace(tmp_path, self.path)
+
+    # ----------------------------------------------------------------------------
+    def _get_entry(self, credential_file: str | os.PathLike | None) -> dict[str, Any]:
+        path = get_credential_file_path(str(credential_file) if credential_file else None)
+        with self._lock:
+            return self._files.setdefault(str(path.resolve()), {})
+
+    # ----------------------------------------------------------------------------
+    def record_use(self, credential_file: str | os.PathLike | None, profile_name: str) -> None:
+        """
+        Record the profile requested by a tool call (the first candidates of the next prewarm).
+        """
+        with self._lock:
+            entry = self._get_entry(credential_file)
+            recent = [name for name in entry.get("recent", []) if name != profile_name]
+            entry["recent"] = [profile_name] + recent[:MAX_RECENT - 1]
+
+    # ----------------------------------------------------------------------------
+    def prewarm_targets(self, credential_file: str | os.PathLike | None = None,
+                        limit: int = MAX_PREWARM) -> list[str]:
+        """
+        Get the profiles likely to be requested first: the recently requested ones, the ones of the last
+        prewarm, then the other profiles with an MFA device in the order of the file.
+        The MFA device is the `mfa_device_arn` of the credentials file or the `mfa_serial` of the AWS config file
+        (see ProfileIndex.resolve). The profiles no longer in the file (or without an MFA device) are skipped.
+        """
+        path = get_credential_file_path(str(credential_file) if credential_file else None)
+        try:
+            # the cached parse, used again by the first tool call
+            index = read_profile_index(path)
+        except OSError:
+            return []
+        sts_profiles = [name for name in index.credentials.sections() if index.resolve(name).get("mfa_serial")]
+        with self._lock:
+            entry = self._get_entry(credential_file)
+            candidates = entry.get("recent", []) + entry.get("prewarm", [])
+        targets = []
+        for name in candidates + sts_profiles:
+            if name in sts_profiles and name not in targets:
+                targets.append(name)
+        return targets[:limit]
+
+    # ----------------------------------------------------------------------------
+    def prewarm(self, credential_file: str | os.PathLike | None = None, limit: int = MAX_PREWARM) -> list[str]:
+        """
+        Build the STS clients of the prewarm targets (see prewarm_sts_client).
+        Returns:
+            list[str]: The profiles prepared.
+        """
+        logger = get_logger()
+        done = []
+        with phase("prewarm"):
+            for profile_name in self.prewarm_targets(credential_file, limit):
+                try:
+                    prewarm_sts_client(profile_name, str(credential_file) if credential_file else None,
+                                       deadline_seconds=PREWARM_DEADLINE)
+                except Exception as e:
+                    logger.debug("Prewarm of profile '%s' skipped: %s", profile_name, e)
+                    continue
+                done.append(profile_name)
+        with self._lock:
+            self._get_entry(credential_file)["prewarm"] = done
+        get_registry().counter("sts_clients_prewarmed_total").inc(len(done))
+        if done:
+            logger.info("Prewarmed the STS clients of %s", done)
+        return done
+
+# globals
+_warm_start_enabled: bool = True
+_warm_state: WarmState | None = None
+_prewarm_thread: threading.Thread | None = None
+
+# ----------------------------------------------------------------------------
+def set_warm_start_enabled(enabled: bool = True) -> None:
+    """
+    Enable or disable the warm start of the MCP server of this process (enabled by default).
+    """
+    global _warm_start_enabled
+    _warm_start_enabled = enabled
+
+# ----------------------------------------------------------------------------
+def is_warm_start_enabled() -> bool:
+    return _warm_start_enabled
+
+# ----------------------------------------------------------------------------
+def get_warm_state() -> WarmState | None:
+    """
+    Get the warm state of the running server (None if the warm start is disabled).
+    """
+    return _warm_state
+
+# ----------------------------------------------------------------------------
+def start_warm_start(credential_file: str | None = None, path: str | os.PathLike | None = None) -> WarmState:
+    """
+    Restore the snapshot and prewarm the STS clients in a background thread.
+    Args:
+        credential_file (str | None, optional): Credentials file served by the server. Defaults to None.
+        path (str | os.PathLike | None, optional): Path of the snapshot. Defaults to get_snapshot_path().
+    Returns:
+        WarmState: The state, saved by stop_warm_start.
+    """
+    global _warm_state, _prewarm_thread
+    state = WarmState(path)
+    state.load()
+    _warm_state = state
+    _prewarm_thread = threading.Thread(target=state.prewarm, args=(credential_file,),
+                                       name="updsts-prewarm", daemon=True)
+    _prewarm_thread.start()
+    return state
+
+# ----------------------------------------------------------------------------
+def stop_warm_start() -> None:
+    """
+    Save the snapshot of the running server.
+    """
+    global _warm_state, _prewarm_thread
+    state = _warm_state
+    if state is None:
+        return
+    if _prewarm_thread is not None:
+        _prewarm_thread.join()
+    try:
+        state.save()
+    except OSError as e:
+        get_logger().warning("Failed to save the warm-start snapshot '%s': %s", state.path, e)
+    _warm_state = None
+    _prewarm_thread = None
+
+# ----------------------------------------------------------------------------
+def record_profile_use(credential_file: str | os.PathLike | None, *profile_names: str) -> None:
+    """
+    Record the profiles requested by a tool call, if the warm start is enabled.
+    The snapshot is saved at once, since the server is often killed by its host without a clean stop.
+    """
+    state = _warm_state
+    if state is None:
+        return
+    for profile_name in profile_names:
+        state.record_use(credential_file, profile_name)
+    try:
+        state.save()
+    except OSError as e:
+        get_logger().warning("Failed to save the warm-start snapshot '%s': %s", state.path, e)
+
+
+__all__ = ["WarmState", "get_snapshot_path", "get_warm_state", "is_warm_start_enabled",
+           "record_profile_use", "set_warm_start_enabled", "start_warm_start", "stop_warm_start"]
@@ -0,0 +1,175 @@
+﻿# encoding: utf-8-sig
+
+import sys
+import threading
+import time
+from configparser import Error as ConfigParserError
+from datetime import datetime
+from pathlib import Path
+from typing import Any, TextIO
+
+from .awsutil import get_credential_file_path, get_expiry_status, get_profile_list
+from .filewatch import DEFAULT_POLL_INTERVAL, FileWatcher
+
+TABLE_COLUMNS = ("PROFILE", "ACCESS KEY ID", "EXPIRES AT", "REMAINING", "TOTP SECRET")
+# wait for the burst of events of one save (e.g. write + rename) before re-reading the file
+SETTLE_SECONDS = 0.05
+
+# ----------------------------------------------------------------------------
+def format_remaining(expiry: dict[str, Any]) -> str:
+    """
+    Format the expiry status of the profile (see get_expiry_status).
+    """
+    if expiry["expired"] is None:
+        return "-"
+    if expiry["expired"]:
+        return "expired"
+    seconds = expiry["expires_in_seconds"]
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    return f"{seconds // 60}m{seconds % 60:02d}s"
+
+# ----------------------------------------------------------------------------
+def format_expiration(expiration_datetime: str | None) -> str:
+    try:
+        return datetime.fromisoformat(expiration_datetime).strftime("%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        return "-"
+
+# ----------------------------------------------------------------------------
+def build_table(profiles: list[dict[str, str]]) -> list[str]:
+    """
+    Build the lines of the masked profile/expiry table.
+    Args:
+        profiles (list[dict[str, str]]): Masked profiles (see get_profile_list).
+    Returns:
+        list[str]: The header line and one line per profile.
+    """
+    rows = [TABLE_COLUMNS]
+    for prof in profiles:
+        rows.append((
+            prof.get("profile_name", ""),
+            prof.get("aws_access_key_id") or "-",
+            format_expiration(prof.get("expiration_datetime")),
+            format_remaining(get_expiry_status(prof.get("expiration_datetime"))),
+            prof.get("totp_secret_name") or "-",
+        ))
+    widths = [max(len(row[i]) for row in rows) for i in range(len(TABLE_COLUMNS))]
+    return ["  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip() for row in rows]
+
+# ############################################################################
+class TableRenderer:
+    """
+    Render the table to the terminal, rewriting only the lines that changed since the last render.
+    If the output is not a terminal, the whole table is written again when it changes.
+    """
+    # ----------------------------------------------------------------------------
+    def __init__(self, out: TextIO, interactive: bool | None = None):
+        self.out = out
+        self.interactive = out.isatty() if interactive is None else interactive
+        self._lines: list[str] | None = None
+
+    # ----------------------------------------------------------------------------
+    def render(self, lines: list[str]) -> int:
+        """
+        Render the lines.
+        Returns:
+            int: Number of the lines written.
+        """
+        previous = self._lines
+        if previous == lines:
+            return 0
+        self._lines = list(lines)
+        if not self.interactive:
+            self.out.write("\n".join(lines) + "\n\n")
+            self.out.flush()
+            return len(lines)
+
+        written = 0
+        if previous is None:
+            # clear the screen
+            self.out.write("\x1b[2J")
+            previous = []
+        for row, line in enumerate(lines):
+            if row < len(previous) and previous[row] == line:
+                continue
+            # move to the row, clear it and write the new line
+            self.out.write(f"\x1b[{row + 1};1H\x1b[2K{line}")
+            written += 1
+        if len(lines) < len(previous):
+            # clear the rows of the removed profiles
+            self.out.write(f"\x1b[{len(lines) + 1};1H\x1b[J")
+        self.out.write(f"\x1b[{len(lines) + 1};1H")
+        self.out.flush()
+        return written
+
+# ----------------------------------------------------------------------------
+def load_profiles(credential_file: Path) -> tuple[list[dict[str, str]] | None, str | None]:
+    """
+    Read the masked profiles.
+    Returns:
+        tuple[list[dict[str, str]] | None, str | None]: (profiles, None), or (None, message)
+            if the file cannot be read (e.g. while it is being edited).
+    """
+    try:
+        return get_profile_list(credential_file=str(credential_file), secret_mask=True), None
+    except FileNotFoundError:
+        return None, f"Credential file '{credential_file}' does not exist."
+    except ConfigParserError as e:
+        return None, f"Credential file '{credential_file}' cannot be parsed: {e}"
+
+# ----------------------------------------------------------------------------
+def run_watch(credential_file: str | None = None,
+              interval: float = DEFAULT_POLL_INTERVAL,
+              use_inotify: bool = True,
+              out: TextIO | None = None,
+              stop_event: threading.Event | None = None) -> None:
+    """
+    Show the masked profile/expiry table, and update it when the credential file changes.
+    The file is parsed only when it changes; on a terminal, the remaining times are updated
+    every `interval` seconds from the parsed profiles.
+    Args:
+        credential_file (str | None, optional): Path to the credentials file. Defaults to None.
+        interval (float, optional): Refresh interval of the remaining times (and of the stat polling
+            when inotify is not available). Defaults to DEFAULT_POLL_INTERVAL.
+        use_inotify (bool, optional): Use inotify if available. Defaults to True.
+        out (TextIO | None, optional): Output stream. Defaults to sys.stdout.
+        stop_event (threading.Event | None, optional): Event to stop watching (Ctrl+C also stops it).
+    """
+    out = out if out else sys.stdout
+    stop_event = stop_event if stop_event else threading.Event()
+    path = get_credential_file_path(credential_file).resolve()
+    changed = threading.Event()
+    watcher = FileWatcher(poll_interval=interval, use_inotify=use_inotify)
+    watcher.add_listener(lambda changed_path: changed.set() if changed_path == path else None)
+    watcher.watch(path)
+    watcher.start()
+    renderer = TableRenderer(out)
+
+    try:
+        profiles, error = load_profiles(path)
+        updated_at = datetime.now().strftime("%H:%M:%S")
+        updated = True
+        while not stop_event.is_set():
+            lines = [f"updsts watch: {path} ({watcher.backend}, updated at {updated_at})", ""]
+            lines.extend([error] if error else build_table(profiles))
+            if renderer.interactive or updated:
+                renderer.render(lines)
+            updated = False
+
+            if changed.wait(interval):
+                time.sleep(SETTLE_SECONDS)
+                changed.clear()
+                profiles, error = load_profiles(path)
+                updated_at = datetime.now().strftime("%H:%M:%S")
+                updated = True
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop()
+        if renderer.interactive:
+            out.write("\n")
+            out.flush()
+
+
+__all__ = ["TableRenderer", "build_table", "format_remaining", "run_watch"]
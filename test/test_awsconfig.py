@@ -0,0 +1,171 @@
+# encoding: utf-8-sig
+
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import pytest
+
+from updsts.awsconfig import ProfileIndex, get_config_file_path, read_config_profiles
+from updsts.awsutil import (get_cache_stats, get_profile_info, get_profile_list, get_sts_token,
+                            read_profile_index, set_cache_enabled)
+from updsts.metrics import get_registry
+
+CREDENTIALS = """[dev]
+aws_access_key_id = AKIADEV
+aws_secret_access_key = devSecretKey
+
+[ops]
+aws_access_key_id = AKIAOPS
+aws_secret_access_key = opsSecretKey
+mfa_device_arn = arn:aws:iam::123456789012:mfa/ops-credentials
+"""
+
+CONFIG = """[default]
+region = us-west-2
+
+[profile dev]
+region = ap-northeast-1
+mfa_serial = arn:aws:iam::123456789012:mfa/dev
+aws_secret_access_key = notReturned
+
+[profile ops]
+mfa_serial = arn:aws:iam::123456789012:mfa/ops-config
+
+[profile admin]
+role_arn = arn:aws:iam::123456789012:role/admin
+source_profile = dev
+
+[profile deploy]
+role_arn = arn:aws:iam::210987654321:role/deploy
+source_profile = admin
+
+[profile loop]
+source_profile = loop2
+
+[profile loop2]
+source_profile = loop
+
+[sso-session corp]
+sso_region = us-east-1
+"""
+
+
+@pytest.fixture
+def aws_dir(temp_file_factory, monkeypatch):
+    """Fixture providing a credentials file with its config file next to it."""
+    monkeypatch.delenv("AWS_CONFIG_FILE", raising=False)
+    temp_file_factory(CONFIG, "config")
+    return temp_file_factory(CREDENTIALS, "credentials")
+
+
+@pytest.mark.unit
+class TestProfileIndex:
+    """Test cases for the resolution of the effective settings."""
+
+    def test_config_file_path(self, temp_dir, monkeypatch):
+        """Test that the config file is the one next to the credentials file, unless $AWS_CONFIG_FILE is set."""
+        monkeypatch.delenv("AWS_CONFIG_FILE", raising=False)
+        assert get_config_file_path(temp_dir / "credentials") == temp_dir / "config"
+        monkeypatch.setenv("AWS_CONFIG_FILE", str(temp_dir / "other"))
+        assert get_config_file_path(temp_dir / "credentials") == temp_dir / "other"
+
+    def test_read_config_profiles(self, aws_dir):
+        """Test that only the profile sections and the resolved keys are read."""
+        profiles = read_config_profiles(aws_dir.with_name("config"))
+        assert "corp" not in profiles and "sso-session corp" not in profiles
+        assert profiles["default"] == {"region": "us-west-2"}
+        assert "aws_secret_access_key" not in profiles["dev"]
+
+    def test_resolve(self, aws_dir):
+        """Test the role chain and the MFA serial fallback."""
+        index = read_profile_index(aws_dir)
+        assert index.resolve("deploy")["role_chain"] == ["admin", "dev"]
+        assert index.resolve("deploy")["mfa_serial"] == "arn:aws:iam::123456789012:mfa/dev"
+        # the mfa_device_arn of the credentials file wins
+        assert index.resolve("ops")["mfa_serial"] == "arn:aws:iam::123456789012:mfa/ops-credentials"
+        assert "loop" in index.resolve("loop")["role_chain_error"]
+        assert index.profile_names() == ["dev", "ops", "default", "admin", "deploy", "loop", "loop2"]
+
+    def test_without_config_file(self, credentials_file):
+        """Test that a missing config file leaves the credentials file as is."""
+        index = read_profile_index(credentials_file)
+        assert isinstance(index, ProfileIndex)
+        assert index.resolve("default") == {"role_chain": [], "mfa_serial": "arn:aws:iam::123456789012:mfa/user"}
+
+
+@pytest.mark.unit
+class TestProfileInfo:
+    """Test cases for the settings of the config file in the profile info."""
+
+    def test_get_profile_info(self, aws_dir):
+        """Test that the settings of the config file are added to the profile info."""
+        info = get_profile_info("dev", str(aws_dir), secret_mask=True)
+        assert info["region"] == "ap-northeast-1"
+        assert info["mfa_device_arn"] == "arn:aws:iam::123456789012:mfa/dev"
+        assert info["aws_secret_access_key"] != "notReturned"
+
+        info = get_profile_info("deploy", str(aws_dir))
+        assert info["role_chain"] == "deploy -> admin -> dev"
+        assert info["aws_access_key_id"] == "(not defined)"
+
+    def test_get_profile_list(self, aws_dir):
+        """Test that the profiles of the config file only are listed after the ones of the credentials file."""
+        profiles = get_profile_list(str(aws_dir))
+        assert [p["profile_name"] for p in profiles][:3] == ["dev", "ops", "default"]
+        assert profiles[3]["role_arn"] == "arn:aws:iam::123456789012:role/admin"
+
+    def test_list_without_config_file(self, temp_file_factory, monkeypatch):
+        """Test that only the profiles with a chain or an mfa_serial are resolved without the config file."""
+        monkeypatch.delenv("AWS_CONFIG_FILE", raising=False)
+        path = temp_file_factory(CREDENTIALS + "\n[role]\nsource_profile = ops\nmfa_serial = arn:aws:iam::1:mfa/role\n",
+                                 "credentials")
+        with patch.object(ProfileIndex, "resolve", autospec=True, side_effect=ProfileIndex.resolve) as resolve:
+            profiles = get_profile_list(str(path))
+        assert [call.args[1] for call in resolve.call_args_list] == ["role"]
+        assert profiles[2]["role_chain"] == "role -> ops"
+        assert profiles[2]["mfa_device_arn"] == "arn:aws:iam::1:mfa/role"
+
+
+@pytest.mark.integration
+class TestCombinedCache:
+    """Test cases for the cache of the combined index."""
+
+    @pytest.fixture(autouse=True)
+    def enable_cache(self):
+        """Enable the cache only while the test is running."""
+        set_cache_enabled(True)
+        yield
+        set_cache_enabled(False)
+
+    def test_keyed_by_both_files(self, aws_dir):
+        """Test that the index is reused while both files are unchanged, and rebuilt when one changes."""
+        parses = get_registry().counter("config_file_parses_total")
+        before = parses.value
+        index = read_profile_index(aws_dir)
+        assert read_profile_index(aws_dir) is index
+        assert parses.value == before + 1
+        assert get_cache_stats()["profile_indexes"] == 1
+
+        with aws_dir.with_name("config").open("a", encoding="utf-8") as f:
+            f.write("\n[profile later]\nregion = eu-west-1\n")
+        index = read_profile_index(aws_dir)
+        assert index.resolve("later")["region"] == "eu-west-1"
+        assert parses.value == before + 2
+
+        # a change of the credentials file keeps the parsed config file
+        with aws_dir.open("a", encoding="utf-8") as f:
+            f.write("\n[new]\naws_access_key_id = AKIANEW\n")
+        assert read_profile_index(aws_dir).has_profile("new")
+        assert parses.value == before + 2
+
+    def test_sts_request_uses_config(self, aws_dir):
+        """Test that the STS request takes the region and the MFA serial of the config file."""
+        with patch("updsts.awsutil.boto3.Session") as mock_session:
+            client = mock_session.return_value.client.return_value
+            client.get_session_token.return_value = {
+                'Credentials': {'AccessKeyId': 'ASIADEV', 'SecretAccessKey': 's', 'SessionToken': 't',
+                                'Expiration': datetime(2026, 10, 19, tzinfo=timezone.utc)}}
+            result = get_sts_token(profile_name="dev", totp_token="123456", credential_file=str(aws_dir))
+        assert result["AccessKeyId"] == "ASIADEV"
+        assert mock_session.return_value.client.call_args.kwargs["region_name"] == "ap-northeast-1"
+        assert client.get_session_token.call_args.kwargs["SerialNumber"] == "arn:aws:iam::123456789012:mfa/dev"
@@ -10,7 +10,12 @@ from updsts.awsutil import (
     mask_string,
     get_credential_file_path,
     get_profile_info,
-    get_profile_list
+    get_profile_list,
+    read_credential_config,
+    set_cache_enabled,
+    set_default_connection_options,
+    get_connection_options,
+    get_sts_token
 )
 
 
@@ -139,4 +144,116 @@ class TestProfileInfo:
             get_profile_info("default", "/nonexistent/path/credentials")
         
         with pytest.raises(FileNotFoundError):
-            get_profile_list("/nonexistent/path/credentials")
\ No newline at end of file
+            get_profile_list("/nonexistent/path/credentials")
+
+
+@pytest.mark.unit
+class TestCredentialCache:
+    """Test cases for the parsed credential file cache."""
+
+    @pytest.fixture(autouse=True)
+    def enable_cache(self):
+        """Enable the cache only while the test is running."""
+        set_cache_enabled(True)
+        yield
+        set_cache_enabled(False)
+
+    def test_cache_hit(self, credentials_file):
+        """Test that an unchanged file is parsed only once."""
+        first = read_credential_config(credentials_file)
+        second = read_credential_config(credentials_file)
+        assert first is second
+
+    def test_cache_invalidated_on_change(self, credentials_file):
+        """Test that a modified file is parsed again."""
+        first = read_credential_config(credentials_file)
+        content = credentials_file.read_text(encoding='utf-8')
+        credentials_file.write_text(content + "\n[new_profile]\naws_access_key_id=AKIANEW\n", encoding='utf-8')
+
+        second = read_credential_config(credentials_file)
+        assert first is not second
+        assert second.has_section('new_profile')
+
+    def test_cache_disabled(self, credentials_file):
+        """Test that the file is parsed on every call when the cache is disabled."""
+        set_cache_enabled(False)
+        first = read_credential_config(credentials_file)
+        second = read_credential_config(credentials_file)
+        assert first is not second
+
+
+@pytest.mark.unit
+class TestConnectionOptions:
+    """Test cases for the connection settings of the STS client."""
+
+    @pytest.fixture
+    def config(self):
+        """Parsed credential file with the connection settings in a profile."""
+        config = ConfigParser()
+        config.read_string(
+            "[tuned]\n"
+            "sts_region = ap-northeast-1\n"
+            "sts_connect_timeout = 2.5\n"
+            "sts_max_pool_connections = 20\n"
+            "sts_tcp_keepalive = yes\n"
+            "[plain]\n"
+            "aws_access_key_id = AKIAPLAIN\n"
+        )
+        yield config
+        set_default_connection_options(None)
+
+    def test_profile_keys(self, config, monkeypatch):
+        """Test that the sts_* keys of the profile are converted to the botocore options."""
+        monkeypatch.delenv("UPDSTS_STS_REGION", raising=False)
+        assert get_connection_options(config, "tuned") == {
+            "region_name": "ap-northeast-1",
+            "connect_timeout": 2.5,
+            "max_pool_connections": 20,
+            "tcp_keepalive": True,
+        }
+        assert get_connection_options(config, "plain") == {}
+
+    def test_precedence(self, config, monkeypatch):
+        """Test that explicit options > profile keys > process defaults > $UPDSTS_STS_REGION."""
+        monkeypatch.setenv("UPDSTS_STS_REGION", "eu-west-1")
+        assert get_connection_options(config, "plain") == {"region_name": "eu-west-1"}
+
+        set_default_connection_options({"region_name": "us-west-2", "read_timeout": 5.0})
+        assert get_connection_options(config, "plain") == {"region_name": "us-west-2", "read_timeout": 5.0}
+        assert get_connection_options(config, "tuned")["region_name"] == "ap-northeast-1"
+
+        options = get_connection_options(config, "tuned", {"region_name": "eu-central-1", "read_timeout": None})
+        assert options["region_name"] == "eu-central-1"
+        assert options["read_timeout"] == 5.0
+
+    def test_invalid_value(self, config):
+        """Test that an invalid key value is reported with the profile name."""
+        config.set("plain", "sts_connect_timeout", "soon")
+        with pytest.raises(ValueError, match="sts_connect_timeout.*plain"):
+            get_connection_options(config, "plain")
+
+    @patch('updsts.awsutil.boto3.Session')
+    def test_regional_endpoint(self, mock_session, temp_file_factory, monkeypatch):
+        """Test that the STS client is built for the region with the botocore Config of the profile."""
+        monkeypatch.delenv("UPDSTS_STS_REGION", raising=False)
+        mock_client = mock_session.return_value.client.return_value
+        mock_client.get_session_token.side_effect = AssertionError("stop")
+        cred_file = temp_file_factory(
+            "[tuned]\n"
+            "aws_access_key_id = AKIAI44QH8DHBEXAMPLE\n"
+            "aws_secret_access_key = secret\n"
+            "mfa_device_arn = arn:aws:iam::123456789012:mfa/testuser\n"
+            "sts_region = ap-northeast-1\n"
+            "sts_tcp_keepalive = true\n"
+        )
+
+        with pytest.raises(AssertionError):
+            get_sts_token("tuned", "123456", credential_file=str(cred_file),
+                          connection_options={"read_timeout": 3.0})
+
+        args, kwargs = mock_session.return_value.client.call_args
+        assert args == ('sts',)
+        assert kwargs['region_name'] == 'ap-northeast-1'
+        assert 'endpoint_url' not in kwargs
+        assert kwargs['config'].tcp_keepalive is True
+        assert kwargs['config'].read_timeout == 3.0
@@ -0,0 +1,134 @@
+# encoding: utf-8-sig
+
+import asyncio
+from configparser import ConfigParser
+from unittest.mock import patch
+
+import pytest
+
+from updsts.awsutil import update_credentials_batch
+from updsts.fakests import FakeStsServer
+from updsts.mcp_impl import updsts_update_sts_credentials_batch_impl
+from updsts.retry import reset_circuit_breakers
+from updsts.upcred import CredentialUpdater
+
+CREDENTIALS = """[alice]
+aws_access_key_id = AKIAALICE
+aws_secret_access_key = aliceSecret
+mfa_device_arn = arn:aws:iam::123456789012:mfa/alice
+
+[alice_ci]
+aws_access_key_id = AKIAALICE
+aws_secret_access_key = aliceSecret
+mfa_device_arn = arn:aws:iam::123456789012:mfa/alice
+
+[bob]
+aws_access_key_id = AKIABOB
+aws_secret_access_key = bobSecret
+mfa_device_arn = arn:aws:iam::123456789012:mfa/bob
+
+# ${{{ key=bob [auto update by updsts]
+[bob_sts]
+aws_access_key_id = ASIAOLD
+# $}}} [auto update by updsts]
+"""
+
+
+@pytest.fixture
+def batch_credentials(temp_file_factory):
+    """Fixture providing a credentials file with two profiles of one MFA device and one of another."""
+    return temp_file_factory(CREDENTIALS, "credentials")
+
+
+@pytest.fixture
+def fake_sts():
+    """Fixture running the fake STS server, which rejects a reused TOTP code."""
+    reset_circuit_breakers()
+    server = FakeStsServer(seed=1)
+    server.start()
+    yield server
+    server.stop()
+    reset_circuit_breakers()
+
+
+@pytest.mark.unit
+class TestCredentialUpdaterTargets:
+    """Test cases for the update of many blocks in one rewrite."""
+
+    def test_add_target(self, batch_credentials, sample_credentials):
+        """Test that the existing block is replaced and the missing one is appended in one rewrite."""
+        updater = CredentialUpdater(credential_path=batch_credentials)
+        updater.add_target("bob", sample_credentials)
+        updater.add_target("alice", sample_credentials, "alice_temp")
+        assert updater.update_credential_file() is None
+        assert set(updater.updated_profiles) == {"alice", "bob"}
+
+        config = ConfigParser()
+        config.read(batch_credentials)
+        assert config.get("bob_sts", "aws_session_token") == sample_credentials["SessionToken"]
+        assert config.get("alice_temp", "aws_access_key_id") == sample_credentials["AccessKeyId"]
+        assert batch_credentials.read_text(encoding="utf-8").count("key=bob") == 1
+
+
+@pytest.mark.integration
+class TestUpdateCredentialsBatch:
+    """Test cases for update_credentials_batch against the fake STS server."""
+
+    def test_per_item_results(self, batch_credentials, fake_sts):
+        """Test that one bad item does not stop the others, and the file is rewritten once."""
+        items = [
+            {"profile_name": "alice", "totp_token": "111111"},
+            {"profile_name": "bob", "totp_token": "222222", "duration": 900},
+            {"profile_name": "carol", "totp_token": "333333"},
+            {"profile_name": "alice_ci", "totp_token": "111111", "sts_profile_name": "ci_sts"},
+        ]
+        with patch.object(CredentialUpdater, "update_credential_file",
+                          autospec=True, side_effect=CredentialUpdater.update_credential_file) as mock_write:
+            results = update_credentials_batch(items, cred_file=str(batch_credentials),
+                                               endpoint_url=fake_sts.endpoint_url)
+        assert mock_write.call_count == 1
+        assert [result["status"] for result in results] == ["updated", "updated", "failed", "updated"]
+        assert "not found" in results[2]["error"]
+        assert results[1]["updated_profile_name"] == "bob_sts"
+        # the profiles of the same access key and TOTP code share one request
+        assert fake_sts.stats["succeeded"] == 2
+
+        config = ConfigParser()
+        config.read(batch_credentials)
+        assert config.get("ci_sts", "aws_session_token") == config.get("alice_sts", "aws_session_token")
+        assert config.get("bob_sts", "aws_access_key_id").startswith("ASIA")
+
+    def test_invalid_duration(self, batch_credentials, fake_sts):
+        """Test that an item with an invalid duration fails alone."""
+        items = [
+            {"profile_name": "alice", "totp_token": "111111", "duration": "1h"},
+            {"profile_name": "bob", "totp_token": "222222", "duration": 0},
+            {"profile_name": "alice_ci", "totp_token": "111111", "duration": "900"},
+        ]
+        results = update_credentials_batch(items, cred_file=str(batch_credentials),
+                                           endpoint_url=fake_sts.endpoint_url)
+        assert [result["status"] for result in results] == ["failed", "failed", "updated"]
+        assert "Invalid duration: '1h'" in results[0]["error"]
+        assert "Invalid duration: 0" in results[1]["error"]
+
+    def test_same_device_other_code(self, batch_credentials, fake_sts):
+        """Test that the items of one device are sent one after another, and a reused code fails alone."""
+        items = [
+            {"profile_name": "alice", "totp_token": "111111"},
+            {"profile_name": "alice_ci", "totp_token": "111111", "duration": 900},
+            {"profile_name": "alice", "totp_token": "444444"},
+        ]
+        results = update_credentials_batch(items, cred_file=str(batch_credentials),
+                                           endpoint_url=fake_sts.endpoint_url)
+        assert [result["status"] for result in results] == ["updated", "failed", "failed"]
+        assert "auth" in results[1]["error"]
+        assert "duplicated" in results[2]["error"]
+
+    def test_tool(self, batch_credentials, fake_sts):
+        """Test the batch tool with a deadline."""
+        items = [{"profile_name": "alice", "totp_token": "111111"},
+                 {"profile_name": "bob", "totp_token": "222222"}]
+        with patch("updsts.awsutil.get_sts_endpoint_url", return_value=fake_sts.endpoint_url):
+            results = asyncio.run(updsts_update_sts_credentials_batch_impl(items, cred_file=str(batch_credentials),
+                                                                           deadline=30))
+        assert [result["status"] for result in results] == ["updated", "updated"]
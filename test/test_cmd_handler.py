@@ -80,6 +80,21 @@ class TestCmdHandler:
                 cred_file='/path/to/creds'
             )
     
+    def test_handle_get_with_auto_gc(self, temp_dir):
+        """Test that --auto-gc collects once after the update, without enabling the gc for the process."""
+        from updsts import credgc
+        cred_file = str(temp_dir / "credentials")
+        args = Namespace(profile_name='test_profile', totp_token='123456', credential_file=cred_file,
+                         duration=None, auto_gc=7.0)
+
+        with patch('updsts.cmd_handler.update_credentials'), \
+             patch('updsts.cmd_handler.collect_garbage') as mock_gc:
+            handle_get(args)
+        mock_gc.assert_called_once()
+        assert str(mock_gc.call_args.args[0]) == cred_file
+        assert mock_gc.call_args.kwargs == {"retention_days": 7.0}
+        assert credgc.auto_gc_retention_days is None
+    
     def test_handle_list_with_profiles(self, temp_dir):
         """Test handle_list with existing profiles."""
         # Arrange
@@ -0,0 +1,131 @@
+# encoding: utf-8-sig
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+
+from updsts.completion import (COMMON_OPTIONS, GLOBAL_OPTIONS, SUBCOMMAND_OPTIONS, SUBCOMMANDS,
+                               complete, main, read_profile_names, scan_profile_names)
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+
+@pytest.fixture(autouse=True)
+def completion_cache(temp_dir, monkeypatch):
+    """Fixture keeping the name index in the temporary directory."""
+    cache_path = temp_dir / "completion.json"
+    monkeypatch.setenv("UPDSTS_COMPLETION_CACHE", str(cache_path))
+    return cache_path
+
+
+@pytest.mark.unit
+class TestProfileNames:
+    """Test cases for the scan and the index of the profile names."""
+
+    def test_scan_sections_and_tags(self):
+        """Test that the sections and the keys of the tag blocks are found."""
+        text = ("[default]\n"
+                "aws_access_key_id = AKIA\n"
+                "# ${{{ key=work [auto update by updsts]\n"
+                "[work]\n"
+                "# }}}$ key=work [auto update by updsts]\n"
+                "  [ spaced ]\n"
+                "# ${{{ key=tagged_only [auto update by updsts]\n")
+        assert scan_profile_names(text) == ["default", "spaced", "tagged_only", "work"]
+
+    def test_read_profile_names(self, credentials_file):
+        """Test the profile names of the credentials file."""
+        assert read_profile_names(credentials_file) == ["default", "sts_profile", "test_profile"]
+
+    def test_missing_file(self, temp_dir):
+        """Test that a missing credentials file has no names."""
+        assert read_profile_names(temp_dir / "missing") == []
+
+    def test_index_hit_and_invalidation(self, credentials_file, completion_cache):
+        """Test that the index is used while the file is unchanged and rebuilt when it changes."""
+        read_profile_names(credentials_file)
+        index = json.loads(completion_cache.read_text(encoding="utf-8"))
+        entry = index[os.path.abspath(credentials_file)]
+        # an entry with the same fingerprint is returned without reading the file
+        entry["names"] = ["from_index"]
+        completion_cache.write_text(json.dumps(index), encoding="utf-8")
+        assert read_profile_names(credentials_file) == ["from_index"]
+
+        with credentials_file.open("a", encoding="utf-8") as f:
+            f.write("\n[added]\naws_access_key_id = AKIAADDED\n")
+        assert "added" in read_profile_names(credentials_file)
+
+    def test_broken_index(self, credentials_file, completion_cache):
+        """Test that a broken index is ignored and replaced."""
+        completion_cache.write_text("{broken", encoding="utf-8")
+        assert read_profile_names(credentials_file) == ["default", "sts_profile", "test_profile"]
+        assert json.loads(completion_cache.read_text(encoding="utf-8"))
+
+
+@pytest.mark.unit
+class TestComplete:
+    """Test cases for complete function."""
+
+    def test_subcommands(self):
+        """Test the subcommands and the global options."""
+        assert complete(1, ["updsts", ""]) == list(SUBCOMMANDS)
+        assert complete(1, ["updsts", "l"]) == ["list"]
+        assert complete(1, ["updsts", "--st"]) == ["--stats"]
+
+    def test_profile_names(self, credentials_file):
+        """Test that the profile names of the credentials file given by -c are completed."""
+        words = ["updsts", "get", "-c", str(credentials_file), "-n", "s"]
+        assert complete(5, words) == ["sts_profile"]
+        words = ["updsts", "get", f"--credential_file={credentials_file}", "--profile_name"]
+        assert complete(4, words) == ["default", "sts_profile", "test_profile"]
+
+    def test_credential_file_falls_back_to_files(self):
+        """Test that no candidate is returned for the file name."""
+        assert complete(3, ["updsts", "get", "-c", "./"]) == []
+
+    def test_subcommand_options(self):
+        """Test the options of the subcommand."""
+        assert complete(2, ["updsts", "watch", "--i"]) == ["--interval"]
+        assert complete(2, ["updsts", "get", "--re"]) == ["--region", "--read-timeout"]
+
+    def test_options_match_parser(self):
+        """Test that the static option lists are the options of the argument parser."""
+        from updsts.__main__ import create_arg_parser
+        parser = create_arg_parser()
+        assert set(GLOBAL_OPTIONS) == {o for a in parser._actions for o in a.option_strings}
+        subparsers = next(a for a in parser._actions if isinstance(a, argparse._SubParsersAction))
+        assert set(SUBCOMMANDS) == set(subparsers.choices)
+        for name, subparser in subparsers.choices.items():
+            options = {o for a in subparser._actions for o in a.option_strings}
+            assert set(COMMON_OPTIONS + SUBCOMMAND_OPTIONS[name]) == options, name
+
+
+@pytest.mark.integration
+class TestCompletionCommand:
+    """Test cases for the updsts-complete command."""
+
+    @pytest.mark.parametrize("shell", ["bash", "zsh", "fish"])
+    def test_script(self, shell, capsys):
+        """Test that the registration script of each shell calls updsts-complete."""
+        assert main(["script", shell]) == 0
+        assert "updsts-complete complete" in capsys.readouterr().out
+
+    def test_usage(self, capsys):
+        """Test that an unknown command prints the usage."""
+        assert main(["script", "tcsh"]) == 2
+        assert "usage" in capsys.readouterr().err
+
+    def test_no_heavy_imports(self, credentials_file, completion_cache):
+        """Test that the completion does not import boto3 nor the MCP server."""
+        code = ("import sys\n"
+                "from updsts.completion import main\n"
+                f"main(['complete', '5', 'updsts', 'get', '-c', {str(credentials_file)!r}, '-n', ''])\n"
+                "loaded = [m for m in ('boto3', 'botocore', 'fastmcp', 'updsts.awsutil') if m in sys.modules]\n"
+                "print('loaded=' + ','.join(loaded))\n")
+        env = dict(os.environ, PYTHONPATH=str(SRC_DIR), UPDSTS_COMPLETION_CACHE=str(completion_cache))
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True)
+        assert result.stdout.splitlines() == ["default", "sts_profile", "test_profile", "loaded="]
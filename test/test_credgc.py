@@ -0,0 +1,128 @@
+# encoding: utf-8-sig
+
+from datetime import datetime, timezone
+import pytest
+
+from updsts.credgc import collect_garbage, disable_auto_gc, enable_auto_gc, get_auto_gc_days
+from updsts.upcred import CredentialUpdater
+
+NOW = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+CREDENTIALS = """[default]
+aws_access_key_id = AKIADEFAULT
+aws_secret_access_key = secret
+
+[work]
+aws_access_key_id = AKIAWORK
+aws_secret_access_key = secret
+
+# ${{{ key=default [auto update by updsts]
+[default_sts]
+aws_access_key_id=ASIAFRESH
+expiration_datetime=2025-05-31 12:00:00+00:00
+# $}}} [auto update by updsts]
+# ${{{ key=work [auto update by updsts]
+[work_sts]
+aws_access_key_id=ASIAOLD
+expiration_datetime=2025-05-01 12:00:00+00:00
+# $}}} [auto update by updsts]
+# ${{{ key=deleted [auto update by updsts]
+[deleted_sts]
+aws_access_key_id=ASIADELETED
+expiration_datetime=2025-05-31 12:00:00+00:00
+# $}}} [auto update by updsts]
+# ${{{ key=default [auto update by updsts]
+[default_sts]
+aws_access_key_id=ASIAFRESH
+expiration_datetime=2025-05-31 12:00:00+00:00
+# $}}} [auto update by updsts]
+"""
+
+
+@pytest.fixture
+def stale_file(temp_file_factory):
+    """Fixture providing a credentials file with stale blocks."""
+    return temp_file_factory(CREDENTIALS, "credentials")
+
+
+@pytest.mark.unit
+class TestCollectGarbage:
+    """Test cases for collect_garbage function."""
+
+    def test_collect(self, stale_file):
+        """Test that the orphaned and duplicated blocks are dropped and the old ones collapsed."""
+        size = stale_file.stat().st_size
+        result = collect_garbage(stale_file, retention_days=7, now=NOW)
+        assert result["dropped"] == ["deleted"]
+        assert result["collapsed"] == ["work"]
+        assert result["duplicates"] == ["default"]
+        assert result["written"]
+        assert result["bytes_before"] == size
+        assert result["bytes_reclaimed"] == size - stale_file.stat().st_size > 0
+
+        content = stale_file.read_text(encoding="utf-8")
+        assert "ASIADELETED" not in content
+        assert "ASIAOLD" not in content
+        assert content.count("ASIAFRESH") == 1
+        # the collapsed block keeps its tags
+        assert "# ${{{ key=work [auto update by updsts]\n# $}}} [auto update by updsts]\n" in content
+
+    def test_nothing_to_collect(self, stale_file):
+        """Test that the file is not rewritten when every block is kept."""
+        collect_garbage(stale_file, retention_days=7, now=NOW)
+        mtime = stale_file.stat().st_mtime_ns
+        result = collect_garbage(stale_file, retention_days=7, now=NOW)
+        assert result["bytes_reclaimed"] == 0
+        assert not result["written"]
+        assert stale_file.stat().st_mtime_ns == mtime
+
+    def test_retention(self, stale_file):
+        """Test that the expired blocks within the retention days are kept."""
+        result = collect_garbage(stale_file, retention_days=60, now=NOW)
+        assert result["collapsed"] == []
+        assert "ASIAOLD" in stale_file.read_text(encoding="utf-8")
+
+    def test_dry_run(self, stale_file):
+        """Test that the dry run reports the reclaimable bytes without writing."""
+        result = collect_garbage(stale_file, retention_days=7, dry_run=True, now=NOW)
+        assert result["bytes_reclaimed"] > 0
+        assert not result["written"]
+        assert stale_file.read_text(encoding="utf-8") == CREDENTIALS
+
+    def test_collapsed_block_reused(self, stale_file, sample_credentials):
+        """Test that the next update writes into the collapsed block."""
+        collect_garbage(stale_file, retention_days=7, now=NOW)
+        updater = CredentialUpdater(stale_file)
+        updater.set_target_tag_name("work")
+        updater.set_credentials(sample_credentials)
+        updater.update_credential_file()
+        content = stale_file.read_text(encoding="utf-8")
+        assert content.count("key=work") == 1
+        assert content.index("key=work") < content.index(sample_credentials["AccessKeyId"])
+
+
+@pytest.mark.unit
+class TestAutoGc:
+    """Test cases for the automatic gc after the updates."""
+
+    def test_auto_gc_days(self, monkeypatch):
+        """Test the retention days of the automatic gc."""
+        monkeypatch.delenv("UPDSTS_AUTO_GC_DAYS", raising=False)
+        assert get_auto_gc_days() is None
+        monkeypatch.setenv("UPDSTS_AUTO_GC_DAYS", "3")
+        assert get_auto_gc_days() == 3.0
+        assert get_auto_gc_days(1.5) == 1.5
+
+    def test_gc_after_update(self, stale_file, sample_credentials):
+        """Test that the orphaned blocks are collected after an update."""
+        enable_auto_gc(retention_days=10000)
+        try:
+            updater = CredentialUpdater(stale_file)
+            updater.set_target_tag_name("default")
+            updater.set_credentials(sample_credentials)
+            updater.update_credential_file()
+        finally:
+            disable_auto_gc()
+        content = stale_file.read_text(encoding="utf-8")
+        assert "ASIADELETED" not in content
+        assert content.count("key=default") == 1
@@ -0,0 +1,153 @@
+# encoding: utf-8-sig
+
+import pytest
+import os
+import socket
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+from updsts.daemon import (
+    normalize_argv,
+    forward_command,
+    stop_daemon,
+    run_daemon,
+    send_request
+)
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="unix domain socket is not available")
+
+
+@pytest.fixture(scope="function")
+def socket_path():
+    """Fixture providing a short socket path (unix socket paths are limited in length)."""
+    sock_dir = Path(tempfile.mkdtemp(prefix="updsts_sock_"))
+    yield sock_dir / "updsts.sock"
+    for p in sock_dir.iterdir():
+        p.unlink()
+    sock_dir.rmdir()
+
+
+@pytest.fixture(scope="function")
+def running_daemon(socket_path):
+    """Fixture running the daemon in a background thread."""
+    thread = threading.Thread(target=run_daemon, args=(socket_path,), daemon=True)
+    thread.start()
+    for _ in range(100):
+        if socket_path.exists() and send_request({"command": "ping"}, socket_path=socket_path):
+            break
+        time.sleep(0.05)
+    yield socket_path
+    stop_daemon(socket_path)
+    thread.join(timeout=5)
+
+
+@pytest.mark.unit
+class TestNormalizeArgv:
+    """Test cases for normalize_argv function."""
+
+    def test_relative_credential_file(self):
+        """Test that the credential file path is resolved against the client cwd."""
+        argv = normalize_argv(['list', '-c', 'creds'], '/work')
+        assert argv == ['list', '-c', os.path.join('/work', 'creds')]
+
+    def test_long_option_with_equal(self):
+        """Test the --credential_file=PATH form."""
+        argv = normalize_argv(['list', '--credential_file=creds'], '/work')
+        assert argv == ['list', f"--credential_file={os.path.join('/work', 'creds')}"]
+
+    def test_absolute_path_unchanged(self):
+        """Test that absolute paths are kept."""
+        argv = normalize_argv(['get', '-n', 'p', '-c', '/abs/creds'], '/work')
+        assert argv == ['get', '-n', 'p', '-c', '/abs/creds']
+
+
+@pytest.mark.unit
+class TestForwardCommand:
+    """Test cases for forwarding commands to the daemon."""
+
+    def test_not_running(self, socket_path):
+        """Test that None is returned when no daemon is running."""
+        assert forward_command(['list'], socket_path=socket_path) is None
+
+    def test_stale_socket_file(self, socket_path):
+        """Test that a stale socket file falls back to in-process execution."""
+        socket_path.touch()
+        assert forward_command(['list'], socket_path=socket_path) is None
+
+    def test_not_forwardable_command(self, socket_path):
+        """Test that only get/list are forwarded."""
+        assert forward_command(['mcp'], socket_path=socket_path) is None
+        assert forward_command([], socket_path=socket_path) is None
+
+    def test_disabled_by_environment(self, running_daemon):
+        """Test that UPDSTS_NO_DAEMON disables forwarding."""
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setenv("UPDSTS_NO_DAEMON", "1")
+            assert forward_command(['list'], socket_path=running_daemon) is None
+
+
+@pytest.mark.integration
+class TestDaemon:
+    """Test cases for the resident daemon."""
+
+    def test_list_forwarded(self, running_daemon, credentials_file):
+        """Test that the list command is executed by the daemon."""
+        response = forward_command(['list', '-c', str(credentials_file)], socket_path=running_daemon)
+
+        assert response is not None
+        assert response['status'] == 'ok'
+        assert response['exit_code'] == 0
+        assert 'Profile Name: default' in response['stdout']
+        assert 'Profile Name: test_profile' in response['stdout']
+        # secrets are masked
+        assert 'wJalrXUtnFEMI/K7MDENG/bPxRfiCYEXAMPLEKEY' not in response['stdout']
+
+    def test_file_modification_is_visible(self, running_daemon, credentials_file):
+        """Test that the cached parse is refreshed when the file changes."""
+        forward_command(['list', '-c', str(credentials_file)], socket_path=running_daemon)
+        content = credentials_file.read_text(encoding='utf-8')
+        credentials_file.write_text(content + "\n[added_profile]\naws_access_key_id=AKIAADDED\n", encoding='utf-8')
+
+        response = forward_command(['list', '-c', str(credentials_file)], socket_path=running_daemon)
+        assert 'Profile Name: added_profile' in response['stdout']
+
+    def test_different_environment(self, running_daemon, credentials_file, monkeypatch):
+        """Test that a command whose environment differs from the one of the daemon is not run by the daemon."""
+        monkeypatch.delenv("UPDSTS_STS_ENDPOINT_URL", raising=False)
+        request = {"command": "run", "argv": ['list', '-c', str(credentials_file)],
+                   "env": {"UPDSTS_STS_ENDPOINT_URL": "http://fake"}}
+        response = send_request(request, socket_path=running_daemon)
+        assert response['status'] == 'fallback'
+        assert 'UPDSTS_STS_ENDPOINT_URL' in response['message']
+
+        with patch("updsts.daemon.send_request", return_value=response):
+            assert forward_command(['list', '-c', str(credentials_file)], socket_path=running_daemon) is None
+
+    def test_argument_error(self, running_daemon):
+        """Test that argparse errors are returned with the exit code."""
+        response = forward_command(['get'], socket_path=running_daemon)
+        assert response['exit_code'] == 2
+        assert 'usage:' in response['stderr']
+
+    def test_already_running(self, running_daemon):
+        """Test that a second daemon on the same socket is rejected."""
+        with pytest.raises(RuntimeError, match="already running"):
+            run_daemon(running_daemon)
+
+    def test_stop(self, socket_path):
+        """Test stopping the daemon removes the socket."""
+        thread = threading.Thread(target=run_daemon, args=(socket_path,), daemon=True)
+        thread.start()
+        for _ in range(100):
+            if socket_path.exists():
+                break
+            time.sleep(0.05)
+
+        assert stop_daemon(socket_path) is True
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+        assert not socket_path.exists()
+        assert stop_daemon(socket_path) is False
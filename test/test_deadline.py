@@ -0,0 +1,132 @@
+# encoding: utf-8-sig
+
+import pytest
+import asyncio
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+from updsts.deadline import Deadline, DeadlineExceeded, current_deadline, deadline_scope
+
+
+@pytest.mark.unit
+class TestDeadline:
+    """Test cases for the call deadline."""
+
+    def test_scope(self):
+        """Test that the deadline is visible only in the scope."""
+        with deadline_scope(10) as deadline:
+            assert current_deadline() is deadline
+            assert 9 < deadline.remaining() <= 10
+        assert current_deadline() is None
+
+    @pytest.mark.parametrize("seconds", [None, 0, -1])
+    def test_no_deadline(self, seconds):
+        """Test that no deadline is set for None or non-positive seconds."""
+        with deadline_scope(seconds) as deadline:
+            assert deadline is None
+            assert current_deadline() is None
+
+    def test_check(self):
+        """Test that the check raises after the deadline or the cancellation."""
+        deadline = Deadline(10)
+        deadline.check("the STS request")
+        deadline.cancel()
+        with pytest.raises(DeadlineExceeded, match="cancelled"):
+            deadline.check("the STS request")
+        with pytest.raises(TimeoutError, match="exceeded"):
+            Deadline(0).check("the STS request")
+
+    @pytest.mark.parametrize("seconds, timeout, attempts", [
+        (61, 20.0, 3),
+        (10.5, 3.0, 3),
+        (5, 2.0, 2),
+        (2, 1.0, 1),
+        (0.1, 0.5, 1),
+    ])
+    def test_botocore_options(self, seconds, timeout, attempts):
+        """Test that the remaining time is mapped onto the timeouts and the retry budget."""
+        deadline = Deadline(seconds)
+        assert deadline.max_attempts() == attempts
+        options = deadline.botocore_options(attempts)
+        assert options["connect_timeout"] == timeout
+        assert options["read_timeout"] == timeout
+
+
+@pytest.mark.unit
+class TestDeadlinePropagation:
+    """Test cases for the propagation of the deadline into the STS request."""
+
+    @patch('updsts.awsutil.boto3.Session')
+    def test_sts_client_config(self, mock_session, credentials_file):
+        """Test that the STS client is built with the botocore timeouts of the deadline."""
+        from updsts.awsutil import get_sts_token
+        mock_client = mock_session.return_value.client.return_value
+        mock_client.get_session_token.side_effect = AssertionError("stop")
+
+        with deadline_scope(61):
+            with pytest.raises(AssertionError):
+                get_sts_token("default", "123456", credential_file=str(credentials_file))
+
+        config = mock_session.return_value.client.call_args.kwargs['config']
+        assert config.connect_timeout == 20.0
+        # the retries are done by updsts, not by botocore
+        assert config.retries["total_max_attempts"] == 1
+
+    def test_expired_before_request(self, credentials_file):
+        """Test that the STS request is not sent after the deadline."""
+        from updsts.awsutil import get_sts_token
+        with patch('updsts.awsutil.get_sts_client') as mock_get_client:
+            with deadline_scope(0.001):
+                time.sleep(0.01)
+                with pytest.raises(DeadlineExceeded):
+                    get_sts_token("default", "123456", credential_file=str(credentials_file))
+        mock_get_client.assert_not_called()
+
+    def test_tool_deadline(self):
+        """Test that the tool call fails when the deadline passes, and the worker is cancelled."""
+        import updsts.mcp_impl
+        from updsts.mcp_impl import updsts_update_sts_credential_impl
+        started = threading.Event()
+        finished = threading.Event()
+        seen = {}
+
+        def slow_update(**kwargs):
+            seen['deadline'] = current_deadline()
+            started.set()
+            # the worker sees the cancellation of the client side
+            until = time.monotonic() + 5
+            while not seen['deadline'].cancelled and time.monotonic() < until:
+                time.sleep(0.01)
+            seen['cancelled'] = seen['deadline'].cancelled
+            finished.set()
+
+        await_within_deadline = updsts.mcp_impl._await_within_deadline
+
+        async def deadline_after_start(work, call_deadline, deadline):
+            # let the deadline pass only once the worker has started, whatever the load of the machine
+            work = asyncio.ensure_future(work)
+            assert await asyncio.to_thread(started.wait, 5)
+            seen['call_deadline'] = call_deadline
+            return await await_within_deadline(work, call_deadline, deadline)
+
+        with patch('updsts.mcp_impl.update_credentials', side_effect=slow_update), \
+             patch('updsts.mcp_impl._await_within_deadline', side_effect=deadline_after_start):
+            with pytest.raises(ValueError, match="deadline of 0.05 seconds"):
+                asyncio.run(updsts_update_sts_credential_impl("default", "123456", deadline=0.05))
+        assert finished.wait(5)
+        assert seen['deadline'] is seen['call_deadline']
+        assert seen['call_deadline'].cancelled
+        assert seen['cancelled'] is True
+
+    def test_cli_deadline(self, credentials_file):
+        """Test that the --deadline option sets the deadline of the get command."""
+        from updsts.__main__ import main
+        seen = {}
+
+        def fake_update(**kwargs):
+            seen['deadline'] = current_deadline()
+
+        with patch('updsts.cmd_handler.update_credentials', side_effect=fake_update):
+            main(['get', '-n', 'default', '-t', '123456', '-c', str(credentials_file), '--deadline', '5'])
+        assert seen['deadline'].seconds == 5
@@ -0,0 +1,120 @@
+# encoding: utf-8-sig
+
+import pytest
+from configparser import ConfigParser
+
+from updsts.fakests import FakeStsServer, LatencyModel
+from updsts.awsutil import get_sts_token, get_sts_endpoint_url, update_credentials
+
+
+@pytest.fixture(scope="function")
+def fake_sts():
+    """Fixture running the fake STS server in a background thread."""
+    server = FakeStsServer(seed=1)
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.mark.unit
+class TestLatencyModel:
+    """Test cases for LatencyModel class."""
+
+    def test_fixed(self):
+        """Test fixed latency in seconds."""
+        assert LatencyModel("fixed:50").sample() == pytest.approx(0.05)
+
+    def test_uniform_range(self):
+        """Test uniform latency stays in the range."""
+        model = LatencyModel("uniform:10:20")
+        for _ in range(100):
+            assert 0.01 <= model.sample() <= 0.02
+
+    def test_never_negative(self):
+        """Test that the normal distribution is clipped at zero."""
+        model = LatencyModel("normal:0:100")
+        assert all(model.sample() >= 0 for _ in range(100))
+
+    @pytest.mark.parametrize("spec", ["", "fixed", "fixed:a", "uniform:1", "gamma:1:2"])
+    def test_invalid_spec(self, spec):
+        """Test invalid latency specs."""
+        with pytest.raises(ValueError, match="Invalid latency spec"):
+            LatencyModel(spec)
+
+
+@pytest.mark.unit
+class TestEndpointUrl:
+    """Test cases for the STS endpoint resolution."""
+
+    def test_resolution_order(self, monkeypatch):
+        """Test explicit argument > profile key > environment variable."""
+        config = ConfigParser()
+        config.read_string("[p]\nsts_endpoint_url = http://profile:1\n[q]\naws_access_key_id=x\n")
+        monkeypatch.setenv("UPDSTS_STS_ENDPOINT_URL", "http://env:1")
+
+        assert get_sts_endpoint_url(config, "p", "http://arg:1") == "http://arg:1"
+        assert get_sts_endpoint_url(config, "p") == "http://profile:1"
+        assert get_sts_endpoint_url(config, "q") == "http://env:1"
+
+        monkeypatch.delenv("UPDSTS_STS_ENDPOINT_URL")
+        assert get_sts_endpoint_url(config, "q") is None
+
+
+@pytest.mark.integration
+class TestFakeSts:
+    """End-to-end test cases against the fake STS server."""
+
+    def test_get_session_token(self, fake_sts, credentials_file):
+        """Test GetSessionToken through boto3."""
+        result = get_sts_token(profile_name='test_profile',
+                               totp_token='123456',
+                               credential_file=str(credentials_file),
+                               endpoint_url=fake_sts.endpoint_url)
+
+        assert result is not None
+        assert result['AccessKeyId'].startswith('ASIA')
+        assert result['SessionToken']
+        assert fake_sts.stats['succeeded'] == 1
+
+    def test_reused_mfa_code(self, fake_sts, credentials_file):
+        """Test that the same TOTP code is rejected for the second time."""
+        kwargs = dict(profile_name='test_profile',
+                      totp_token='123456',
+                      credential_file=str(credentials_file),
+                      endpoint_url=fake_sts.endpoint_url)
+        assert get_sts_token(**kwargs) is not None
+        assert get_sts_token(**kwargs) is None
+        assert fake_sts.stats['mfa_failed'] == 1
+
+    def test_throttling(self, credentials_file, monkeypatch):
+        """Test throttling errors."""
+        monkeypatch.setenv("AWS_MAX_ATTEMPTS", "1")
+        server = FakeStsServer(throttle_rate=1.0)
+        server.start()
+        try:
+            result = get_sts_token(profile_name='test_profile',
+                                   totp_token='123456',
+                                   credential_file=str(credentials_file),
+                                   endpoint_url=server.endpoint_url)
+        finally:
+            server.stop()
+        assert result is None
+        assert server.stats['throttled'] == 1
+
+    def test_update_credentials_with_profile_endpoint(self, fake_sts, temp_file_factory):
+        """Test the whole refresh with the endpoint configured in the profile."""
+        credentials_file = temp_file_factory(f"""[dev]
+aws_access_key_id=AKIAI44QH8DHBEXAMPLE
+aws_secret_access_key=je7MtGbClwBF/2Zp9Utk/h3yCo8nvbEXAMPLEKEY
+mfa_device_arn=arn:aws:iam::123456789012:mfa/dev
+sts_endpoint_url={fake_sts.endpoint_url}
+""", "credentials")
+
+        result = update_credentials(profile_name='dev',
+                                    totp_token='654321',
+                                    cred_file=str(credentials_file))
+
+        assert result['updated_profile_name'] == 'dev_sts'
+        content = credentials_file.read_text(encoding='utf-8')
+        assert '[dev_sts]' in content
+        assert result['aws_access_key_id'] in content
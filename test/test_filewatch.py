@@ -0,0 +1,179 @@
+# encoding: utf-8-sig
+
+import io
+import os
+import sys
+import threading
+import time
+import pytest
+
+from updsts.awsutil import read_credential_config, set_cache_enabled
+from updsts.filewatch import FileWatcher, start_file_watcher, stop_file_watcher
+from updsts.watchview import TableRenderer, build_table, format_remaining, run_watch
+
+requires_inotify = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux only")
+
+
+def wait_until(predicate, timeout: float = 3.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+@pytest.mark.unit
+class TestFileWatcher:
+    """Test cases for FileWatcher class."""
+
+    def test_poll_backend(self, credentials_file):
+        """Test that the polling backend finds a modified file."""
+        watcher = FileWatcher(poll_interval=0.05, use_inotify=False)
+        changed = []
+        watcher.add_listener(changed.append)
+        path = watcher.watch(credentials_file)
+        watcher.start()
+        try:
+            assert watcher.backend == "poll"
+            # the changes are not delivered promptly, so the callers must check the file by themselves
+            assert watcher.generation(credentials_file) is None
+            credentials_file.write_text("[new]\n", encoding="utf-8")
+            assert wait_until(lambda: path in changed)
+        finally:
+            watcher.stop()
+
+    @requires_inotify
+    def test_inotify_replace(self, credentials_file):
+        """Test that a file replaced by renaming bumps the generation and notifies the listeners."""
+        watcher = FileWatcher(poll_interval=10)
+        changed = []
+        watcher.add_listener(changed.append)
+        watcher.start()
+        try:
+            assert watcher.backend == "inotify"
+            before = watcher.generation(credentials_file)
+            tmp = credentials_file.with_name("credentials.tmp")
+            tmp.write_text("[replaced]\n", encoding="utf-8")
+            tmp.rename(credentials_file)
+            assert wait_until(lambda: watcher.generation(credentials_file) > before)
+            assert credentials_file.resolve() in changed
+            # the other files of the directory are ignored
+            assert tmp.resolve() not in changed
+        finally:
+            watcher.stop()
+
+    @requires_inotify
+    def test_read_after_write(self, credentials_file):
+        """Test that a change is seen by the next generation() call, before the watcher thread reads it."""
+        watcher = FileWatcher(poll_interval=10)
+        watcher.start()
+        try:
+            for _ in range(50):
+                before = watcher.generation(credentials_file)
+                with credentials_file.open("a", encoding="utf-8") as f:
+                    f.write("#\n")
+                assert watcher.generation(credentials_file) > before
+        finally:
+            watcher.stop()
+
+    @requires_inotify
+    def test_directory_created_later(self, temp_dir):
+        """Test that a file in a directory created after the watch started is detected."""
+        target = temp_dir / "later" / "credentials"
+        watcher = FileWatcher(poll_interval=0.05)
+        changed = []
+        watcher.add_listener(changed.append)
+        watcher.start()
+        try:
+            watcher.watch(target)
+            target.parent.mkdir()
+            target.write_text("[p]\n", encoding="utf-8")
+            assert wait_until(lambda: target.resolve() in changed)
+        finally:
+            watcher.stop()
+
+
+@pytest.mark.unit
+@requires_inotify
+class TestWatchedCredentialCache:
+    """Test cases for the parse cache invalidated by the file watcher."""
+
+    @pytest.fixture(autouse=True)
+    def watched_cache(self):
+        """Enable the cache and the file watcher only while the test is running."""
+        set_cache_enabled(True)
+        watcher = start_file_watcher(poll_interval=10)
+        yield watcher
+        stop_file_watcher()
+        set_cache_enabled(False)
+
+    def test_same_mtime_and_size(self, credentials_file, watched_cache):
+        """Test that a change keeping the mtime and the size (missed by stat) invalidates the cache."""
+        first = read_credential_config(credentials_file)
+        assert read_credential_config(credentials_file) is first
+
+        st = credentials_file.stat()
+        content = credentials_file.read_text(encoding="utf-8")
+        generation = watched_cache.generation(credentials_file)
+        credentials_file.write_text(content.replace("[default]", "[defauLT]"), encoding="utf-8")
+        os.utime(credentials_file, ns=(st.st_atime_ns, st.st_mtime_ns))
+        assert credentials_file.stat().st_mtime_ns == st.st_mtime_ns
+        assert credentials_file.stat().st_size == st.st_size
+
+        assert wait_until(lambda: watched_cache.generation(credentials_file) > generation)
+        second = read_credential_config(credentials_file)
+        assert second is not first
+        assert second.has_section("defauLT")
+
+
+@pytest.mark.unit
+class TestWatchView:
+    """Test cases for the live profile table."""
+
+    @pytest.mark.parametrize("expiry, text", [
+        ({"expired": None, "expires_in_seconds": None}, "-"),
+        ({"expired": True, "expires_in_seconds": 0}, "expired"),
+        ({"expired": False, "expires_in_seconds": 7260}, "2h01m"),
+        ({"expired": False, "expires_in_seconds": 65}, "1m05s"),
+    ])
+    def test_format_remaining(self, expiry, text):
+        """Test the format of the remaining time."""
+        assert format_remaining(expiry) == text
+
+    def test_build_table(self):
+        """Test that the columns are aligned."""
+        lines = build_table([{"profile_name": "default", "aws_access_key_id": "AKIA****",
+                              "expiration_datetime": None, "totp_secret_name": "totp"}])
+        assert lines[0].startswith("PROFILE  ")
+        assert lines[1].startswith("default  AKIA****")
+        assert lines[0].index("ACCESS KEY ID") == lines[1].index("AKIA****")
+
+    def test_incremental_render(self):
+        """Test that only the changed lines are rewritten on a terminal."""
+        out = io.StringIO()
+        renderer = TableRenderer(out, interactive=True)
+        assert renderer.render(["title", "a", "b"]) == 3
+        assert renderer.render(["title", "a", "b"]) == 0
+        out.truncate(0)
+        assert renderer.render(["title", "a", "c"]) == 1
+        assert "\x1b[3;1H\x1b[2Kc" in out.getvalue()
+        assert "title" not in out.getvalue()
+
+    @pytest.mark.integration
+    def test_run_watch(self, credentials_file):
+        """Test that the table is written again when the file changes."""
+        out = io.StringIO()
+        stop_event = threading.Event()
+        thread = threading.Thread(target=run_watch,
+                                  kwargs=dict(credential_file=str(credentials_file), interval=0.05,
+                                              out=out, stop_event=stop_event))
+        thread.start()
+        try:
+            assert wait_until(lambda: "sts_profile" in out.getvalue())
+            with credentials_file.open("a", encoding="utf-8") as f:
+                f.write("\n[added_profile]\naws_access_key_id = AKIAADDED\n")
+            assert wait_until(lambda: "added_profile" in out.getvalue())
+        finally:
+            stop_event.set()
+            thread.join()
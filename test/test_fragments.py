@@ -0,0 +1,147 @@
+# encoding: utf-8-sig
+
+import configparser
+import pytest
+
+from updsts.fragments import compile_fragments, get_fragment_dir, list_fragments
+from updsts.upcred import CredentialUpdater
+
+
+@pytest.fixture
+def fragment_dir(credentials_file):
+    """Fixture providing the empty fragment directory of the credentials file."""
+    directory = credentials_file.with_name("credentials.d")
+    directory.mkdir()
+    return directory
+
+
+def read_sections(path):
+    config = configparser.ConfigParser(interpolation=None)
+    config.read(path, encoding="utf-8")
+    return config.sections()
+
+
+@pytest.mark.unit
+class TestFragmentDir:
+    """Test cases for the location and the files of the fragment directory."""
+
+    def test_default_dir(self, credentials_file, monkeypatch):
+        """Test that the directory is next to the credentials file unless specified."""
+        monkeypatch.delenv("UPDSTS_FRAGMENT_DIR", raising=False)
+        assert get_fragment_dir(credentials_file) == credentials_file.with_name("credentials.d")
+        monkeypatch.setenv("UPDSTS_FRAGMENT_DIR", "/tmp/frags")
+        assert str(get_fragment_dir(credentials_file)) == "/tmp/frags"
+        assert str(get_fragment_dir(credentials_file, "/tmp/explicit")) == "/tmp/explicit"
+
+    def test_ignored_files(self, fragment_dir):
+        """Test that the hidden, backup and temporary files are not fragments."""
+        for name in ("20-b", "10-a.ini", ".hidden", "x.tmp", "y.swp", "z~"):
+            (fragment_dir / name).write_text("[s]\n", encoding="utf-8")
+        assert [p.name for p in list_fragments(fragment_dir)] == ["10-a.ini", "20-b"]
+
+
+@pytest.mark.integration
+class TestCompileFragments:
+    """Test cases for compile_fragments function."""
+
+    def test_add_update_remove(self, credentials_file, fragment_dir):
+        """Test that the changed fragments are compiled and the removed ones dropped."""
+        (fragment_dir / "10-team-a").write_text("[team_a]\naws_access_key_id = TA\n", encoding="utf-8")
+        (fragment_dir / "20-team-b").write_text("[team_b]\naws_access_key_id = TB", encoding="utf-8")
+        result = compile_fragments(credentials_file, fragment_dir)
+        assert result["added"] == ["10-team-a", "20-team-b"]
+        assert result["written"]
+        assert read_sections(credentials_file) == ["default", "test_profile", "sts_profile", "team_a", "team_b"]
+
+        (fragment_dir / "10-team-a").write_text("[team_a]\naws_access_key_id = TA2\n", encoding="utf-8")
+        (fragment_dir / "20-team-b").unlink()
+        result = compile_fragments(credentials_file, fragment_dir)
+        assert (result["updated"], result["removed"], result["unchanged"]) == (["10-team-a"], ["20-team-b"], [])
+        content = credentials_file.read_text(encoding="utf-8")
+        assert "TA2" in content
+        assert "team_b" not in content
+
+    def test_unchanged_not_written(self, credentials_file, fragment_dir):
+        """Test that the file is not rewritten when no fragment changed."""
+        (fragment_dir / "team").write_text("[team]\naws_access_key_id = T\n", encoding="utf-8")
+        compile_fragments(credentials_file, fragment_dir)
+        mtime = credentials_file.stat().st_mtime_ns
+        result = compile_fragments(credentials_file, fragment_dir)
+        assert result["unchanged"] == ["team"]
+        assert not result["written"]
+        assert credentials_file.stat().st_mtime_ns == mtime
+
+    def test_rejected_fragment_keeps_last_block(self, credentials_file, fragment_dir):
+        """Test that a broken or conflicting fragment does not replace the compiled block."""
+        (fragment_dir / "team").write_text("[team]\naws_access_key_id = T\n", encoding="utf-8")
+        (fragment_dir / "dup").write_text("[default]\naws_access_key_id = D\n", encoding="utf-8")
+        result = compile_fragments(credentials_file, fragment_dir)
+        assert "already defined" in result["errors"]["dup"]
+
+        (fragment_dir / "team").write_text("[team\nbroken", encoding="utf-8")
+        result = compile_fragments(credentials_file, fragment_dir)
+        assert "cannot be parsed" in result["errors"]["team"]
+        assert not result["written"]
+        assert "team" in read_sections(credentials_file)
+
+    def test_rejected_fragment_keeps_its_sections(self, credentials_file, fragment_dir):
+        """Test that the sections of the block kept for a rejected fragment cannot be taken by another fragment."""
+        (fragment_dir / "a").write_text("[foo]\naws_access_key_id = A\n", encoding="utf-8")
+        compile_fragments(credentials_file, fragment_dir)
+
+        (fragment_dir / "a").write_text("[foo\nbroken", encoding="utf-8")
+        (fragment_dir / "b").write_text("[foo]\naws_access_key_id = B\n", encoding="utf-8")
+        result = compile_fragments(credentials_file, fragment_dir)
+        assert "cannot be parsed" in result["errors"]["a"]
+        assert "already defined" in result["errors"]["b"]
+        # strict parse: a duplicated section raises DuplicateSectionError
+        assert read_sections(credentials_file).count("foo") == 1
+
+    def test_conflicting_fragment_keeps_its_sections(self, credentials_file, fragment_dir):
+        """Test that a fragment accepted before another one is rejected by a conflict is checked again."""
+        (fragment_dir / "b").write_text("[bar]\naws_access_key_id = B\n", encoding="utf-8")
+        compile_fragments(credentials_file, fragment_dir)
+
+        # "a" is checked first, then "b" is rejected and keeps its block of [bar]
+        (fragment_dir / "a").write_text("[bar]\naws_access_key_id = A\n", encoding="utf-8")
+        (fragment_dir / "b").write_text("[default]\naws_access_key_id = B\n", encoding="utf-8")
+        result = compile_fragments(credentials_file, fragment_dir)
+        assert set(result["errors"]) == {"a", "b"}
+        assert not result["written"]
+        assert read_sections(credentials_file).count("bar") == 1
+
+    def test_managed_blocks_kept(self, credentials_file, fragment_dir, sample_credentials):
+        """Test that the blocks updated by `get` and the compiled blocks do not disturb each other."""
+        (fragment_dir / "team").write_text("[team]\naws_access_key_id = T\n", encoding="utf-8")
+        compile_fragments(credentials_file, fragment_dir)
+        updater = CredentialUpdater(credentials_file)
+        updater.set_target_tag_name("test_profile")
+        updater.set_credentials(sample_credentials)
+        updater.update_credential_file()
+
+        (fragment_dir / "team").write_text("[team]\naws_access_key_id = T2\n", encoding="utf-8")
+        assert compile_fragments(credentials_file, fragment_dir)["updated"] == ["team"]
+        content = credentials_file.read_text(encoding="utf-8")
+        assert content.count("key=test_profile") == 1
+        assert sample_credentials["SessionToken"] in content
+        assert "test_profile_sts" in read_sections(credentials_file)
+
+    def test_missing_dir(self, credentials_file, fragment_dir):
+        """Test that a missing fragment directory is an error, and the compiled blocks are kept."""
+        (fragment_dir / "10-team-a").write_text("[team_a]\naws_access_key_id = TA\n", encoding="utf-8")
+        compile_fragments(credentials_file)
+        content = credentials_file.read_text(encoding="utf-8")
+
+        with pytest.raises(ValueError, match="does not exist"):
+            compile_fragments(credentials_file, fragment_dir=fragment_dir.with_name("credentials.d.typo"))
+        assert credentials_file.read_text(encoding="utf-8") == content
+        assert "team_a" in read_sections(credentials_file)
+
+    def test_dry_run(self, credentials_file, fragment_dir):
+        """Test that the dry run reports the changes without writing."""
+        (fragment_dir / "team").write_text("[team]\n", encoding="utf-8")
+        before = credentials_file.read_text(encoding="utf-8")
+        result = compile_fragments(credentials_file, fragment_dir, dry_run=True)
+        assert result["added"] == ["team"]
+        assert not result["written"]
+        assert credentials_file.read_text(encoding="utf-8") == before
@@ -93,13 +93,17 @@ class TestSTSIntegration:
         assert result is not None
         
         # Verify client was created with proxy configuration
-        mock_session_instance.client.assert_called_once_with(
-            'sts',
-            proxies={
-                'http': 'http://proxy.example.com:8080',
-                'https': 'https://proxy.example.com:8080'
-            }
-        )
+        mock_session_instance.client.assert_called_once()
+        args, kwargs = mock_session_instance.client.call_args
+        assert args == ('sts',)
+        # the proxies are set by botocore.config.Config (Session.client has no proxies argument)
+        assert 'proxies' not in kwargs
+        assert kwargs['config'].proxies == {
+            'http': 'http://proxy.example.com:8080',
+            'https': 'https://proxy.example.com:8080'
+        }
+        # the retries are done by updsts, not by botocore
+        assert kwargs['config'].retries['total_max_attempts'] == 1
     
     def test_get_sts_token_no_totp_token(self):
         """Test STS token retrieval without TOTP token."""
@@ -0,0 +1,79 @@
+# encoding: utf-8-sig
+
+import pytest
+import logging
+
+from updsts import logutil
+
+
+@pytest.fixture(scope="function")
+def restore_logger():
+    """Fixture restoring the default logger configuration after the test."""
+    yield
+    logutil.set_file_logging(True)
+    logutil.get_with_init(force=True)
+
+
+@pytest.mark.unit
+class TestLogUtil:
+    """Test cases for the logging pipeline."""
+
+    def test_records_written_through_queue(self, temp_dir, restore_logger):
+        """Test that the queued records are written by the listener."""
+        log_file = temp_dir / "log" / "test.log"
+        logger = logutil.get_with_init(str(log_file), force=True)
+        logger.warning("queued message %s", 42)
+
+        logutil.shutdown_logging()
+        assert "queued message 42" in log_file.read_text(encoding="utf-8")
+
+    def test_rotation(self, temp_dir, restore_logger):
+        """Test that the log file is rotated by size."""
+        log_file = temp_dir / "test.log"
+        logger = logutil.get_with_init(str(log_file), max_bytes=200, backup_count=2, force=True)
+        for i in range(20):
+            logger.warning("message number %d with some padding", i)
+
+        logutil.shutdown_logging()
+        assert (temp_dir / "test.log.1").exists()
+        assert not (temp_dir / "test.log.3").exists()
+
+    def test_file_logging_disabled(self, temp_dir, restore_logger):
+        """Test that no log file is written when file logging is disabled."""
+        log_file = temp_dir / "disabled.log"
+        logutil.set_file_logging(False)
+        logger = logutil.get_with_init(str(log_file), force=True)
+        logger.warning("not written")
+
+        logutil.shutdown_logging()
+        assert not log_file.exists()
+
+    def test_file_logging_disabled_by_environment(self, temp_dir, restore_logger, monkeypatch):
+        """Test UPDSTS_LOG_FILE=off."""
+        monkeypatch.setenv("UPDSTS_LOG_FILE", "off")
+        log_file = temp_dir / "env.log"
+        logutil.get_with_init(str(log_file), force=True).warning("not written")
+
+        logutil.shutdown_logging()
+        assert not log_file.exists()
+
+    def test_log_file_from_environment(self, temp_dir, restore_logger, monkeypatch):
+        """Test UPDSTS_LOG_FILE=<path>."""
+        log_file = temp_dir / "env" / "updsts.log"
+        monkeypatch.setenv("UPDSTS_LOG_FILE", str(log_file))
+        logutil.get_with_init(force=True).warning("written")
+
+        logutil.shutdown_logging()
+        assert "written" in log_file.read_text(encoding="utf-8")
+
+    def test_lazy_formatting(self, temp_dir, restore_logger):
+        """Test that arguments are not formatted when the level is disabled."""
+        class Expensive:
+            formatted = False
+            def __str__(self):
+                Expensive.formatted = True
+                return "expensive"
+
+        logger = logutil.get_with_init(str(temp_dir / "lazy.log"), level=logging.WARNING, force=True)
+        logger.debug("value: %s", Expensive())
+        assert Expensive.formatted is False
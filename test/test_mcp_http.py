@@ -0,0 +1,89 @@
+# encoding: utf-8-sig
+
+import pytest
+import asyncio
+from argparse import Namespace
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from updsts.mcp_middleware import ClientConcurrencyLimiter
+from updsts.mcp_server import parse_bind
+from updsts.upcred import get_file_lock
+
+
+def make_context(session_id):
+    """Create a middleware context of the client session."""
+    return SimpleNamespace(fastmcp_context=SimpleNamespace(session_id=session_id))
+
+
+@pytest.mark.unit
+class TestParseBind:
+    """Test cases for the bind address of the http transport."""
+
+    def test_host_and_port(self):
+        """Test HOST:PORT."""
+        assert parse_bind("127.0.0.1:9000") == ("127.0.0.1", 9000)
+        assert parse_bind("[::1]:9000") == ("::1", 9000)
+
+    def test_port_only(self):
+        """Test :PORT and the default address."""
+        assert parse_bind(":9000") == ("127.0.0.1", 9000)
+        assert parse_bind(None) == ("127.0.0.1", 8701)
+
+    @pytest.mark.parametrize("bind", ["localhost", "127.0.0.1:http", "127.0.0.1:70000"])
+    def test_invalid(self, bind):
+        """Test invalid addresses."""
+        with pytest.raises(ValueError):
+            parse_bind(bind)
+
+
+@pytest.mark.unit
+class TestClientConcurrencyLimiter:
+    """Test cases for the per-client concurrency limit."""
+
+    def test_limit_per_client(self):
+        """Test that each client session is limited independently."""
+        limiter = ClientConcurrencyLimiter(max_concurrency=2)
+        running = {"a": 0, "b": 0}
+        peak = {"a": 0, "b": 0}
+
+        def make_call_next(client):
+            async def call_next(context):
+                running[client] += 1
+                peak[client] = max(peak[client], running[client])
+                await asyncio.sleep(0.01)
+                running[client] -= 1
+                return client
+            return call_next
+
+        async def run():
+            calls = [limiter.on_call_tool(make_context(c), make_call_next(c)) for c in "aaaaabb"]
+            return await asyncio.gather(*calls)
+
+        assert asyncio.run(run()) == list("aaaaabb")
+        assert peak == {"a": 2, "b": 2}
+        assert limiter.in_flight("a") == 0
+
+    def test_invalid_limit(self):
+        """Test that the limit must be positive."""
+        with pytest.raises(ValueError):
+            ClientConcurrencyLimiter(max_concurrency=0)
+
+
+@pytest.mark.unit
+class TestSharedServer:
+    """Test cases for the shared state of the http server."""
+
+    def test_file_lock(self, credentials_file, temp_dir):
+        """Test that the rewrites of the same file share one lock."""
+        assert get_file_lock(credentials_file) is get_file_lock(str(credentials_file))
+        assert get_file_lock(credentials_file) is not get_file_lock(temp_dir / "other")
+
+    def test_handle_mcp_http(self):
+        """Test that the transport options are passed to the server."""
+        from updsts.cmd_handler import handle_mcp
+        args = Namespace(mcp_server=True, credential_file=None, transport="http",
+                         bind="127.0.0.1:9000", max_concurrency=3)
+        with patch('updsts.cmd_handler.run_as_mcp_server') as mock_run_server:
+            handle_mcp(args)
+        mock_run_server.assert_called_once_with(None, transport="http", bind="127.0.0.1:9000", max_concurrency=3)
@@ -0,0 +1,203 @@
+# encoding: utf-8-sig
+
+import pytest
+import asyncio
+import json
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from fastmcp import Client
+from fastmcp.client.transports import FastMCPTransport
+
+from updsts.awsutil import set_cache_enabled
+from updsts.filewatch import start_file_watcher, stop_file_watcher
+from updsts.mcp_resources import PROFILES_URI, ResourceHub, get_expiry_status, get_resource_hub
+from updsts.mcp_server import mcp
+
+
+class FakeSession:
+    """Session recording the resource-updated notifications."""
+
+    def __init__(self):
+        self.updated = []
+
+    async def send_resource_updated(self, uri):
+        self.updated.append(str(uri))
+
+
+@pytest.fixture
+def served_file(credentials_file):
+    """Publish the temporary credentials file as the resources of the server."""
+    hub = get_resource_hub()
+    hub.credential_file = str(credentials_file)
+    yield credentials_file
+    hub.stop()
+    hub.credential_file = None
+
+
+@pytest.mark.unit
+class TestExpiryStatus:
+    """Test cases for the expiry status of the profile resources."""
+
+    def test_future(self):
+        """Test a session which is still valid."""
+        expiration = (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat()
+        status = get_expiry_status(expiration)
+        assert status["expired"] is False
+        assert 3500 < status["expires_in_seconds"] <= 3600
+
+    def test_past(self):
+        """Test an expired session."""
+        status = get_expiry_status("2024-01-01T12:00:00+00:00")
+        assert status == {"expired": True, "expires_in_seconds": 0}
+
+    def test_not_defined(self):
+        """Test a profile without expiration."""
+        assert get_expiry_status("(not defined)") == {"expired": None, "expires_in_seconds": None}
+
+
+@pytest.mark.integration
+class TestResources:
+    """Test cases for reading the resources through the MCP client."""
+
+    def test_read_resources(self, served_file):
+        """Test that the profiles are published with masked secrets."""
+        async def run():
+            async with Client(FastMCPTransport(mcp)) as client:
+                resources = await client.list_resources()
+                templates = await client.list_resource_templates()
+                profiles = await client.read_resource(PROFILES_URI)
+                profile = await client.read_resource(f"{PROFILES_URI}/test_profile")
+                return resources, templates, profiles, profile
+
+        resources, templates, profiles, profile = asyncio.run(run())
+        assert PROFILES_URI in [str(r.uri) for r in resources]
+        assert f"{PROFILES_URI}/{{profile_name}}" in [t.uri_template for t in templates]
+        assert [p["profile_name"] for p in json.loads(profiles[0].text)] == ["default", "test_profile", "sts_profile"]
+        info = json.loads(profile[0].text)
+        assert info["aws_secret_access_key"].startswith("je7M")
+        assert "*" in info["aws_secret_access_key"]
+        assert info["expired"] is True
+
+    def test_listen_through_client(self, served_file, sample_credentials):
+        """Test that a client subscribed with a real MCP session receives the update of the profile."""
+        subscriptions = pytest.importorskip("mcp.client.subscriptions")
+        from updsts.upcred import CredentialUpdater
+
+        async def run():
+            async with Client(FastMCPTransport(mcp)) as client:
+                uri = f"{PROFILES_URI}/test_profile_sts"
+                async with subscriptions.listen(client.session, resource_subscriptions=[uri]) as subscription:
+                    assert get_resource_hub().subscribed_uris() == {uri}
+                    updater = CredentialUpdater(served_file)
+                    updater.set_target_tag_name("test_profile")
+                    updater.set_credentials(sample_credentials)
+                    with patch('builtins.print'):
+                        await asyncio.to_thread(updater.update_credential_file)
+                    event = await asyncio.wait_for(subscription.__anext__(), 5)
+                # the subscription ends with the stream
+                await asyncio.sleep(0.05)
+                return event, get_resource_hub().subscribed_uris()
+
+        event, remaining = asyncio.run(run())
+        assert event.uri == f"{PROFILES_URI}/test_profile_sts"
+        assert remaining == set()
+
+
+@pytest.mark.unit
+class TestResourceHub:
+    """Test cases for the resource-updated notifications."""
+
+    def test_notify_on_update(self, served_file, sample_credentials):
+        """Test that a rewrite by CredentialUpdater notifies only the changed resources."""
+        from updsts.upcred import CredentialUpdater
+        hub = get_resource_hub()
+        session = FakeSession()
+
+        async def run():
+            hub.subscribe(session, f"{PROFILES_URI}/test_profile_sts")
+            hub.subscribe(session, f"{PROFILES_URI}/default")
+            hub.subscribe(session, PROFILES_URI)
+            updater = CredentialUpdater(served_file)
+            updater.set_target_tag_name("test_profile")
+            updater.set_credentials(sample_credentials)
+            with patch('builtins.print'):
+                await asyncio.to_thread(updater.update_credential_file)
+            await asyncio.sleep(0.05)
+
+        asyncio.run(run())
+        assert sorted(session.updated) == [PROFILES_URI, f"{PROFILES_URI}/test_profile_sts"]
+
+    def test_external_change(self, temp_file_factory, sample_credentials_file_content):
+        """Test that a change by another process is detected by the fingerprint of the file."""
+        path = temp_file_factory(sample_credentials_file_content, "credentials")
+        hub = ResourceHub(str(path), poll_interval=3600)
+        session = FakeSession()
+
+        async def run():
+            hub.subscribe(session, f"{PROFILES_URI}/default")
+            assert hub.check_changes() == set()
+            path.write_text(sample_credentials_file_content.replace("default_secret", "new_secret"))
+            changed = hub.check_changes(force=True)
+            await asyncio.sleep(0.05)
+            return changed
+
+        try:
+            changed = asyncio.run(run())
+        finally:
+            hub.stop()
+        assert changed == {PROFILES_URI, f"{PROFILES_URI}/default"}
+        assert session.updated == [f"{PROFILES_URI}/default"]
+
+    @pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux only")
+    def test_rewrites_with_file_watcher(self, credentials_file, sample_credentials):
+        """Test that the rewrites notified both by the updater and by the file watcher do not deadlock."""
+        from updsts.upcred import CredentialUpdater
+        hub = ResourceHub(str(credentials_file), poll_interval=3600)
+        session = FakeSession()
+        set_cache_enabled(True)
+        start_file_watcher(poll_interval=10)
+
+        def rewrite():
+            updater = CredentialUpdater(credentials_file)
+            updater.set_target_tag_name("test_profile")
+            for i in range(20):
+                updater.set_credentials(dict(sample_credentials, SessionToken=f"token{i}"))
+                with patch('builtins.print'):
+                    updater.update_credential_file()
+
+        async def run():
+            hub.subscribe(session, PROFILES_URI)
+            writer = threading.Thread(target=rewrite, daemon=True)
+            writer.start()
+            await asyncio.to_thread(writer.join, 10)
+            await asyncio.sleep(0.05)
+            return writer
+
+        writer = asyncio.run(run())
+        try:
+            assert not writer.is_alive(), "the writer thread is deadlocked"
+            assert PROFILES_URI in session.updated
+        finally:
+            if not writer.is_alive():
+                stop_file_watcher()
+                hub.stop()
+            set_cache_enabled(False)
+
+    def test_unsubscribe(self, temp_file_factory, sample_credentials_file_content):
+        """Test that an unsubscribed session is not notified."""
+        path = temp_file_factory(sample_credentials_file_content, "credentials")
+        hub = ResourceHub(str(path), poll_interval=3600)
+        session = FakeSession()
+
+        async def run():
+            hub.subscribe(session, PROFILES_URI)
+            hub.unsubscribe(session, PROFILES_URI)
+            assert hub.subscribed_uris() == set()
+
+        try:
+            asyncio.run(run())
+        finally:
+            hub.stop()
@@ -0,0 +1,96 @@
+# encoding: utf-8-sig
+
+import pytest
+import asyncio
+import tracemalloc
+from unittest.mock import MagicMock, patch
+
+from updsts.memwatch import (
+    MemoryWatchdog, get_memory_report, get_rss_bytes,
+    start_watchdog, stop_watchdog,
+)
+
+
+@pytest.mark.unit
+class TestMemoryWatchdog:
+    """Test cases for the memory watchdog."""
+
+    def test_rss(self):
+        """Test that the RSS of the process is measured."""
+        rss = get_rss_bytes()
+        assert rss is None or rss > 0
+
+    def test_sample_below_ceiling(self):
+        """Test that nothing is evicted below the ceiling."""
+        on_ceiling = MagicMock()
+        watchdog = MemoryWatchdog(ceiling_bytes=1 << 50, on_ceiling=on_ceiling)
+        sample = watchdog.sample()
+
+        assert sample["evicted"] is False
+        on_ceiling.assert_not_called()
+        assert watchdog.report()["last_sample"] is sample
+
+    def test_eviction_above_ceiling(self):
+        """Test that the caches are evicted when the ceiling is crossed."""
+        on_ceiling = MagicMock()
+        watchdog = MemoryWatchdog(ceiling_bytes=1, on_ceiling=on_ceiling)
+        with patch('updsts.memwatch.get_rss_bytes', return_value=1024):
+            sample = watchdog.sample()
+
+        assert sample["evicted"] is True
+        on_ceiling.assert_called_once_with()
+        assert watchdog.report()["evictions"] == 1
+
+    def test_eviction_hysteresis(self):
+        """Test that the RSS staying above the ceiling evicts once, until it falls well below the ceiling."""
+        on_ceiling = MagicMock()
+        watchdog = MemoryWatchdog(ceiling_bytes=1000, on_ceiling=on_ceiling)
+        with patch('updsts.memwatch.get_rss_bytes', return_value=1500):
+            samples = [watchdog.sample() for _ in range(5)]
+        assert [sample["evicted"] for sample in samples] == [True, False, False, False, False]
+        # just below the ceiling is not enough to arm the eviction again
+        with patch('updsts.memwatch.get_rss_bytes', return_value=950):
+            watchdog.sample()
+        with patch('updsts.memwatch.get_rss_bytes', return_value=1500):
+            assert watchdog.sample()["evicted"] is False
+        with patch('updsts.memwatch.get_rss_bytes', return_value=800):
+            watchdog.sample()
+        with patch('updsts.memwatch.get_rss_bytes', return_value=1500):
+            assert watchdog.sample()["evicted"] is True
+        assert on_ceiling.call_count == 2
+
+    def test_top_allocations(self):
+        """Test the allocation sites reported by tracemalloc."""
+        watchdog = MemoryWatchdog(interval=3600, use_tracemalloc=True, top_n=3)
+        watchdog.start()
+        try:
+            data = [bytearray(1024) for _ in range(100)]
+            sample = watchdog.sample()
+            assert watchdog.running
+            assert sample["tracemalloc_current_bytes"] > 0
+            assert 0 < len(sample["top_allocations"]) <= 3
+            assert ":" in sample["top_allocations"][0]["site"]
+            del data
+        finally:
+            watchdog.stop()
+        assert not watchdog.running
+        assert not tracemalloc.is_tracing()
+
+    def test_global_watchdog(self):
+        """Test the process-wide watchdog and the report of the MCP tool."""
+        from updsts.mcp_impl import updsts_get_memory_stats_impl
+
+        report = asyncio.run(updsts_get_memory_stats_impl())
+        assert report["running"] is False
+        assert report["last_sample"]["rss_bytes"] is None or report["last_sample"]["rss_bytes"] > 0
+        assert "cache" in report
+
+        start_watchdog(interval=3600)
+        try:
+            report = get_memory_report()
+            assert report["running"] is True
+            assert report["interval"] == 3600
+            assert report["last_sample"] is not None
+        finally:
+            stop_watchdog()
+        assert get_memory_report()["running"] is False
@@ -0,0 +1,115 @@
+# encoding: utf-8-sig
+
+import pytest
+import asyncio
+import json
+from unittest.mock import patch
+
+from updsts.metrics import Counter, Gauge, Histogram, MetricsRegistry, get_registry
+
+
+@pytest.fixture
+def clean_registry():
+    """Reset the global metrics registry around the test."""
+    get_registry().reset()
+    yield get_registry()
+    get_registry().reset()
+
+
+@pytest.mark.unit
+class TestMetrics:
+    """Test cases for the metric types."""
+
+    def test_counter(self):
+        """Test the counter."""
+        counter = Counter("requests_total")
+        counter.inc()
+        counter.inc(2)
+        assert counter.value == 3
+        assert counter.snapshot() == {"type": "counter", "value": 3}
+
+    def test_gauge(self):
+        """Test the gauge."""
+        gauge = Gauge("file_bytes")
+        gauge.set(100)
+        gauge.set(42)
+        assert gauge.snapshot() == {"type": "gauge", "value": 42}
+
+    def test_histogram_buckets(self):
+        """Test that the histogram buckets are cumulative."""
+        histogram = Histogram("latency_seconds", buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+
+        snapshot = histogram.snapshot()
+        assert snapshot["count"] == 4
+        assert snapshot["sum"] == pytest.approx(2.65)
+        assert snapshot["max"] == 2.0
+        assert snapshot["buckets"] == {"le_0.1": 2, "le_1": 3, "le_inf": 4}
+
+    def test_empty_histogram(self):
+        """Test the snapshot of a histogram without observations."""
+        snapshot = Histogram("latency_seconds").snapshot()
+        assert snapshot["count"] == 0
+        assert snapshot["mean"] == 0.0
+
+    def test_registry(self):
+        """Test that the registry returns the same metric for the same name."""
+        registry = MetricsRegistry()
+        registry.counter("a_total").inc()
+        registry.counter("a_total").inc()
+        registry.histogram("b_seconds").observe(0.01)
+
+        snapshot = registry.snapshot()
+        assert snapshot["uptime_seconds"] >= 0
+        assert list(snapshot["metrics"]) == ["a_total", "b_seconds"]
+        assert snapshot["metrics"]["a_total"]["value"] == 2
+
+        registry.reset()
+        assert registry.snapshot()["metrics"] == {}
+
+
+@pytest.mark.unit
+class TestInstrumentation:
+    """Test cases for the metrics of the credential file engine."""
+
+    def test_engine_metrics(self, clean_registry, credentials_file, sample_credentials):
+        """Test that reads, parses, rewrites and phase latencies are recorded."""
+        from updsts.awsutil import get_profile_list
+        from updsts.upcred import CredentialUpdater
+
+        get_profile_list(str(credentials_file))
+        updater = CredentialUpdater(credentials_file)
+        updater.set_target_tag_name("test_profile")
+        updater.set_credentials(sample_credentials)
+        with patch('builtins.print'):
+            updater.update_credential_file()
+
+        metrics = clean_registry.snapshot()["metrics"]
+        assert metrics["credential_file_reads_total"]["value"] == 1
+        assert metrics["credential_file_parses_total"]["value"] == 1
+        assert metrics["credential_file_rewrites_total"]["value"] == 1
+        assert metrics["credential_file_bytes"]["value"] == credentials_file.stat().st_size
+        assert metrics["parse_seconds"]["count"] == 1
+        assert metrics["rewrite_seconds"]["count"] == 1
+
+    def test_get_stats_tool(self, clean_registry, credentials_file):
+        """Test the updsts_get_stats MCP tool implementation."""
+        from updsts.awsutil import get_profile_list
+        from updsts.mcp_impl import updsts_get_stats_impl
+
+        get_profile_list(str(credentials_file))
+        stats = asyncio.run(updsts_get_stats_impl())
+
+        assert stats["metrics"]["credential_file_reads_total"]["value"] == 1
+        assert stats["cache"]["enabled"] is False
+        assert "sts_clients" in stats["cache"]
+
+    def test_stats_option(self, clean_registry, credentials_file, capsys):
+        """Test that --stats dumps the metrics to stderr."""
+        from updsts.__main__ import main
+        main(['--stats', 'list', '-c', str(credentials_file)])
+
+        captured = capsys.readouterr()
+        stats = json.loads(captured.err[captured.err.index('{'):])
+        assert stats["metrics"]["credential_file_parses_total"]["value"] == 1
@@ -0,0 +1,202 @@
+# encoding: utf-8-sig
+
+import pytest
+import random
+import socket
+from botocore.exceptions import ClientError, EndpointConnectionError, ReadTimeoutError, NoCredentialsError
+
+from updsts.fakests import FakeStsServer
+from updsts.awsutil import get_last_sts_error, get_sts_token, update_credentials
+from updsts.retry import (CircuitBreaker, CircuitOpenError, RetryPolicy, StsRequestError,
+                          call_with_retry, classify_error, get_circuit_states, reset_circuit_breakers)
+
+
+def client_error(code: str, status: int) -> ClientError:
+    return ClientError({'Error': {'Code': code, 'Message': code},
+                        'ResponseMetadata': {'HTTPStatusCode': status}}, 'GetSessionToken')
+
+
+@pytest.fixture(autouse=True)
+def clean_breakers():
+    """Fixture starting every test with closed circuits."""
+    reset_circuit_breakers()
+    yield
+    reset_circuit_breakers()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.unit
+class TestClassifyError:
+    """Test cases for the classification of the STS errors."""
+
+    @pytest.mark.parametrize("error, kind", [
+        (client_error('Throttling', 400), 'throttling'),
+        (client_error('SomethingElse', 429), 'throttling'),
+        (client_error('InternalFailure', 500), 'server'),
+        (client_error('ServiceUnavailable', 503), 'server'),
+        (client_error('AccessDenied', 403), 'auth'),
+        (client_error('InvalidUserCode.Expired', 0), 'auth'),
+        (client_error('ValidationError', 400), 'request'),
+        (EndpointConnectionError(endpoint_url='https://sts.example.com'), 'network'),
+        (ReadTimeoutError(endpoint_url='https://sts.example.com'), 'network'),
+        (NoCredentialsError(), 'client'),
+    ])
+    def test_kinds(self, error, kind):
+        """Test the kind of each error."""
+        assert classify_error(error) == kind
+
+
+@pytest.mark.unit
+class TestRetryPolicy:
+    """Test cases for the decorrelated jitter backoff."""
+
+    def test_delays_bounded(self):
+        """Test that the delays stay between the base and the max delay, and grow from the previous one."""
+        policy = RetryPolicy(max_attempts=5, base_delay=0.5, max_delay=8.0, rng=random.Random(1))
+        delay = policy.base_delay
+        for _ in range(100):
+            previous = delay
+            delay = policy.next_delay(previous)
+            assert 0.5 <= delay <= min(8.0, previous * 3)
+
+    def test_max_attempts_from_env(self, monkeypatch):
+        """Test that $AWS_MAX_ATTEMPTS sets the default attempts."""
+        monkeypatch.setenv("AWS_MAX_ATTEMPTS", "5")
+        assert RetryPolicy().max_attempts == 5
+        monkeypatch.setenv("AWS_MAX_ATTEMPTS", "x")
+        assert RetryPolicy().max_attempts == 3
+
+
+@pytest.mark.unit
+class TestCircuitBreaker:
+    """Test cases for the circuit breaker."""
+
+    def test_open_and_recover(self):
+        """Test the closed -> open -> half open -> closed transitions."""
+        clock = FakeClock()
+        breaker = CircuitBreaker("sts", failure_threshold=2, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        assert breaker.state == "closed"
+        breaker.record_failure()
+        assert breaker.state == "open"
+        assert not breaker.allow()
+
+        clock.now = 10
+        assert breaker.state == "half_open"
+        assert breaker.allow()
+        # only one probe at a time
+        assert not breaker.allow()
+        breaker.record_success()
+        assert breaker.state == "closed"
+        assert breaker.allow()
+
+    def test_failed_probe_reopens(self):
+        """Test that a failed probe opens the circuit again."""
+        clock = FakeClock()
+        breaker = CircuitBreaker("sts", failure_threshold=1, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        clock.now = 10
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == "open"
+        assert breaker.snapshot()["retry_after"] == 10
+
+
+@pytest.mark.unit
+class TestCallWithRetry:
+    """Test cases for call_with_retry function."""
+
+    def test_retry_then_success(self):
+        """Test that the throttled request is retried after the backoff."""
+        errors = [client_error('Throttling', 400), client_error('Throttling', 400)]
+        calls = []
+        delays = []
+
+        def request(attempts_left):
+            calls.append(attempts_left)
+            if errors:
+                raise errors.pop(0)
+            return "ok"
+
+        result = call_with_retry(request, CircuitBreaker("sts"), RetryPolicy(max_attempts=3), sleep=delays.append)
+        assert result == "ok"
+        assert calls == [3, 2, 1]
+        assert len(delays) == 2
+
+    def test_auth_not_retried(self):
+        """Test that a rejected MFA code is not retried."""
+        calls = []
+
+        def request(attempts_left):
+            calls.append(attempts_left)
+            raise client_error('AccessDenied', 403)
+
+        with pytest.raises(StsRequestError, match="auth") as exc_info:
+            call_with_retry(request, CircuitBreaker("sts"), RetryPolicy(max_attempts=3), sleep=lambda _: None)
+        assert exc_info.value.kind == "auth"
+        assert not exc_info.value.retryable
+        assert len(calls) == 1
+
+    def test_fail_fast_when_open(self):
+        """Test that the requests are not sent while the circuit is open."""
+        breaker = CircuitBreaker("sts", failure_threshold=2)
+        calls = []
+
+        def request(attempts_left):
+            calls.append(attempts_left)
+            raise EndpointConnectionError(endpoint_url='https://sts.example.com')
+
+        with pytest.raises(CircuitOpenError) as exc_info:
+            call_with_retry(request, breaker, RetryPolicy(max_attempts=3), sleep=lambda _: None)
+        assert len(calls) == 2
+        assert exc_info.value.circuit["state"] == "open"
+
+        with pytest.raises(CircuitOpenError, match="circuit is open"):
+            call_with_retry(request, breaker, RetryPolicy(max_attempts=3), sleep=lambda _: None)
+        assert len(calls) == 2
+
+
+@pytest.mark.integration
+class TestStsRetry:
+    """Test cases for the retries of the STS request against the fake STS server."""
+
+    def test_throttled_error_surfaces(self, credentials_file, monkeypatch):
+        """Test that a throttled refresh is retried and fails with the classified error."""
+        monkeypatch.setenv("AWS_MAX_ATTEMPTS", "2")
+        server = FakeStsServer(throttle_rate=1.0)
+        server.start()
+        try:
+            with pytest.raises(Exception, match="Failed to retrieve STS credentials: STS throttled"):
+                update_credentials('test_profile', '123456',
+                                   cred_file=str(credentials_file),
+                                   endpoint_url=server.endpoint_url)
+        finally:
+            server.stop()
+        assert server.stats['throttled'] == 2
+        assert get_last_sts_error().kind == "throttling"
+
+    def test_unreachable_endpoint_opens_circuit(self, credentials_file, monkeypatch):
+        """Test that the refreshes fail fast after the endpoint failed repeatedly."""
+        monkeypatch.setenv("AWS_MAX_ATTEMPTS", "1")
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            endpoint_url = f"http://127.0.0.1:{s.getsockname()[1]}"
+        kwargs = dict(profile_name='test_profile', totp_token='123456',
+                      credential_file=str(credentials_file), endpoint_url=endpoint_url)
+
+        for _ in range(3):
+            assert get_sts_token(**kwargs) is None
+            assert get_last_sts_error().kind == "network"
+        assert get_sts_token(**kwargs) is None
+        assert get_last_sts_error().kind == "circuit_open"
+        assert get_circuit_states() == [
+            {"endpoint": endpoint_url, "state": "open", "failures": 3,
+             "retry_after": pytest.approx(30, abs=1)},
+        ]
@@ -0,0 +1,231 @@
+# encoding: utf-8-sig
+
+import asyncio
+import time
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import pytest
+
+from updsts.awsutil import get_last_sts_error, get_sts_token, get_sts_token_async, update_credentials
+from updsts.fakests import FakeStsServer, LatencyModel
+from updsts.metrics import get_registry
+from updsts.retry import classify_error, reset_circuit_breakers
+from updsts.stsclient import (AsyncNativeStsClient, NativeStsClient, StsConnectionError, StsServiceError, close_connections,
+                              parse_response, sign_request, unsupported_reason)
+
+SUCCESS_XML = b"""<GetSessionTokenResponse xmlns="https://sts.amazonaws.com/doc/2011-06-15/">
+  <GetSessionTokenResult>
+    <Credentials>
+      <AccessKeyId>ASIAEXAMPLE</AccessKeyId>
+      <SecretAccessKey>secret</SecretAccessKey>
+      <SessionToken>token</SessionToken>
+      <Expiration>2026-10-19T12:00:00Z</Expiration>
+    </Credentials>
+  </GetSessionTokenResult>
+  <ResponseMetadata><RequestId>req-1</RequestId></ResponseMetadata>
+</GetSessionTokenResponse>"""
+
+ERROR_XML = b"""<ErrorResponse xmlns="https://sts.amazonaws.com/doc/2011-06-15/">
+  <Error><Type>Sender</Type><Code>Throttling</Code><Message>Rate exceeded</Message></Error>
+  <RequestId>req-2</RequestId>
+</ErrorResponse>"""
+
+
+@pytest.fixture(scope="function")
+def fake_sts():
+    """Fixture running the fake STS server, with the pooled connections and the breakers reset."""
+    reset_circuit_breakers()
+    close_connections()
+    server = FakeStsServer(seed=1)
+    server.start()
+    yield server
+    close_connections()
+    server.stop()
+    reset_circuit_breakers()
+
+
+def native_client(server, client_class=NativeStsClient):
+    return client_class("AKIAEXAMPLE", "secret", endpoint_url=server.endpoint_url)
+
+
+@pytest.mark.unit
+class TestSigV4:
+    """Test cases for the request signing."""
+
+    def test_matches_botocore(self):
+        """Test that the signature is the same as the one of botocore for the same request and time."""
+        from botocore.auth import SigV4Auth
+        from botocore.awsrequest import AWSRequest
+        from botocore.credentials import Credentials
+
+        now = datetime(2026, 10, 19, 1, 2, 3, tzinfo=timezone.utc)
+        url = "https://sts.ap-northeast-1.amazonaws.com/"
+        body = b"Action=GetSessionToken&Version=2011-06-15&TokenCode=123456"
+        content_type = "application/x-www-form-urlencoded; charset=utf-8"
+        headers = sign_request("POST", url, {"Content-Type": content_type}, body,
+                               "AKIAEXAMPLE", "secret", "ap-northeast-1", session_token="session", now=now)
+
+        request = AWSRequest(method="POST", url=url, data=body, headers={"Content-Type": content_type})
+        with patch("botocore.auth.get_current_datetime", return_value=now):
+            SigV4Auth(Credentials("AKIAEXAMPLE", "secret", "session"), "sts", "ap-northeast-1").add_auth(request)
+        assert headers["X-Amz-Date"] == request.headers["X-Amz-Date"]
+        assert headers["Authorization"] == request.headers["Authorization"]
+
+    @pytest.mark.parametrize("endpoint_url, proxies, supported", [
+        (None, None, True),
+        ("http://127.0.0.1:8765", {"http": "http://proxy:3128"}, True),
+        ("https://sts.amazonaws.com", {"https": "socks5://proxy:1080"}, False),
+        ("ftp://sts.example.com", None, False),
+    ])
+    def test_unsupported_reason(self, endpoint_url, proxies, supported):
+        """Test the requests the native client cannot make (they fall back to boto3)."""
+        assert (unsupported_reason(endpoint_url, proxies) is None) == supported
+
+
+@pytest.mark.unit
+class TestParseResponse:
+    """Test cases for the XML response parsing."""
+
+    def test_success(self):
+        """Test that the response has the shape of the boto3 response."""
+        response = parse_response("GetSessionToken", 200, SUCCESS_XML)
+        credentials = response["Credentials"]
+        assert credentials["AccessKeyId"] == "ASIAEXAMPLE"
+        assert credentials["Expiration"] == datetime(2026, 10, 19, 12, 0, tzinfo=timezone.utc)
+        assert response["ResponseMetadata"]["RequestId"] == "req-1"
+
+    def test_error(self):
+        """Test that the error response raises StsServiceError classified like the botocore errors."""
+        with pytest.raises(StsServiceError) as exc_info:
+            parse_response("GetSessionToken", 400, ERROR_XML)
+        assert exc_info.value.code == "Throttling"
+        assert exc_info.value.request_id == "req-2"
+        assert classify_error(exc_info.value) == "throttling"
+
+
+@pytest.mark.integration
+class TestNativeClient:
+    """Test cases of the native clients against the fake STS server."""
+
+    def test_connection_reuse(self, fake_sts):
+        """Test that the blocking client reuses the pooled keep-alive connection."""
+        reused = get_registry().counter("sts_connections_reused_total")
+        before = reused.value
+        client = native_client(fake_sts)
+        for code in ("111111", "222222", "333333"):
+            response = client.get_session_token(DurationSeconds=900, SerialNumber="arn:mfa", TokenCode=code)
+            assert response["Credentials"]["AccessKeyId"].startswith("ASIA")
+        assert reused.value - before == 2
+        assert fake_sts.stats["succeeded"] == 3
+
+    def test_reused_connection_read_timeout(self, fake_sts):
+        """Test that a pooled connection is reused with the read timeout of the client, not the one it was opened with."""
+        native_client(fake_sts).get_session_token(SerialNumber="arn:mfa", TokenCode="111111")
+        reused = get_registry().counter("sts_connections_reused_total")
+        before = reused.value
+        fake_sts.latency = LatencyModel("fixed:1000")
+        # e.g. the read timeout derived from the deadline of the call
+        client = NativeStsClient("AKIAEXAMPLE", "secret", endpoint_url=fake_sts.endpoint_url, read_timeout=0.1)
+        start = time.perf_counter()
+        with pytest.raises(StsConnectionError, match="timed out"):
+            client.get_session_token(SerialNumber="arn:mfa", TokenCode="222222")
+        assert time.perf_counter() - start < 0.8
+        assert reused.value - before == 1
+
+    def test_service_error(self, fake_sts):
+        """Test that an error of the server is raised as StsServiceError."""
+        client = native_client(fake_sts)
+        client.get_session_token(SerialNumber="arn:mfa", TokenCode="111111")
+        with pytest.raises(StsServiceError) as exc_info:
+            client.get_session_token(SerialNumber="arn:mfa", TokenCode="111111")
+        assert classify_error(exc_info.value) == "auth"
+
+    def test_async_client(self, fake_sts):
+        """Test that the asyncio client gets the tokens concurrently on one event loop."""
+        client = native_client(fake_sts, AsyncNativeStsClient)
+
+        async def run():
+            return await asyncio.gather(*(client.get_session_token(SerialNumber="arn:mfa", TokenCode=code)
+                                          for code in ("111111", "222222", "333333")))
+
+        responses = asyncio.run(run())
+        assert len({response["Credentials"]["AccessKeyId"] for response in responses}) == 3
+        assert fake_sts.stats["succeeded"] == 3
+
+
+@pytest.mark.integration
+class TestNativeBackend:
+    """Test cases of the `native` STS backend of awsutil."""
+
+    def test_get_sts_token(self, fake_sts, credentials_file):
+        """Test that the native backend does not use boto3."""
+        with patch("updsts.awsutil.boto3.Session") as mock_session:
+            result = get_sts_token(profile_name='test_profile',
+                                   totp_token='123456',
+                                   credential_file=str(credentials_file),
+                                   endpoint_url=fake_sts.endpoint_url,
+                                   connection_options={'sts_backend': 'native'})
+        mock_session.assert_not_called()
+        assert result['AccessKeyId'].startswith('ASIA')
+
+    def test_backend_from_profile(self, fake_sts, credentials_file, capsys):
+        """Test the `sts_backend` key of the profile and the update of the credentials file."""
+        content = credentials_file.read_text(encoding="utf-8")
+        credentials_file.write_text(content.replace("[test_profile]\n", "[test_profile]\nsts_backend = native\n"),
+                                    encoding="utf-8")
+        with patch("updsts.awsutil.boto3.Session") as mock_session:
+            ret = update_credentials(profile_name='test_profile',
+                                     totp_token='123456',
+                                     cred_file=str(credentials_file),
+                                     endpoint_url=fake_sts.endpoint_url)
+        mock_session.assert_not_called()
+        assert ret is not None
+        assert "key=test_profile" in credentials_file.read_text(encoding="utf-8")
+
+    def test_async_throttling(self, credentials_file, monkeypatch):
+        """Test that a throttled request of the asyncio client fails with the classified error."""
+        monkeypatch.setenv("AWS_MAX_ATTEMPTS", "2")
+        reset_circuit_breakers()
+        server = FakeStsServer(throttle_rate=1.0, seed=1)
+        server.start()
+
+        async def run():
+            result = await get_sts_token_async(profile_name='test_profile',
+                                               totp_token='123456',
+                                               credential_file=str(credentials_file),
+                                               endpoint_url=server.endpoint_url,
+                                               connection_options={'sts_backend': 'native'})
+            return result, get_last_sts_error()
+
+        try:
+            result, error = asyncio.run(run())
+        finally:
+            close_connections()
+            server.stop()
+            reset_circuit_breakers()
+        assert result is None
+        assert error.kind == "throttling"
+        assert server.stats["throttled"] == 2
+
+    def test_fallback_to_boto3(self, credentials_file, monkeypatch):
+        """Test that a request through a SOCKS proxy falls back to boto3."""
+        monkeypatch.setenv("https_proxy", "socks5://127.0.0.1:1080")
+        with patch("updsts.awsutil.get_sts_client") as mock_client:
+            mock_client.return_value.get_session_token.return_value = {
+                'Credentials': {'AccessKeyId': 'ASIAX', 'SecretAccessKey': 's', 'SessionToken': 't',
+                                'Expiration': datetime(2026, 10, 19, tzinfo=timezone.utc)}}
+            result = get_sts_token(profile_name='test_profile',
+                                   totp_token='123456',
+                                   credential_file=str(credentials_file),
+                                   connection_options={'sts_backend': 'native'})
+        assert result['AccessKeyId'] == 'ASIAX'
+        assert mock_client.call_args.kwargs['backend'] == 'boto3'
+
+    def test_invalid_backend(self, credentials_file):
+        """Test that an unknown backend is rejected."""
+        with pytest.raises(ValueError, match="Invalid STS backend"):
+            get_sts_token(profile_name='test_profile',
+                          totp_token='123456',
+                          credential_file=str(credentials_file),
+                          connection_options={'sts_backend': 'curl'})
@@ -0,0 +1,84 @@
+# encoding: utf-8-sig
+
+import pytest
+from configparser import ConfigParser
+
+from updsts.awsutil import get_profile_info, get_sts_token
+from updsts.suggest import TrigramIndex, build_profile_index, edit_distance, suggest_profiles, trigrams
+
+
+@pytest.mark.unit
+class TestTrigramIndex:
+    """Test cases for the trigram index."""
+
+    def test_trigrams(self):
+        """Test that short names have padded trigrams."""
+        assert trigrams("ab") == {"  a", " ab", "ab "}
+        assert trigrams("AB") == trigrams("ab")
+
+    def test_edit_distance(self):
+        """Test the Levenshtein distance."""
+        assert edit_distance("production", "prodcution") == 2
+        assert edit_distance("dev", "Dev") == 0
+        assert edit_distance("", "abc") == 3
+
+    def test_search_ranking(self):
+        """Test that the closest name is suggested first."""
+        index = TrigramIndex()
+        for name in ["development", "dev-account", "production", "staging"]:
+            index.add(name)
+        assert index.search("dev-acount")[0] == "dev-account"
+        assert index.search("prodution") == ["production"]
+        assert index.search("zzzz") == []
+
+    def test_search_target(self):
+        """Test that a matched alias suggests its target once."""
+        index = TrigramIndex()
+        index.add("production")
+        index.add("prod-mfa", "production")
+        assert index.search("prod-mfa") == ["production"]
+        assert len(index) == 2
+
+    def test_limit(self):
+        """Test the number of suggestions."""
+        index = TrigramIndex()
+        for i in range(20):
+            index.add(f"profile_{i:02d}")
+        assert len(index.search("profile_0", limit=3)) == 3
+
+
+@pytest.mark.unit
+class TestProfileSuggestions:
+    """Test cases for the suggestions on the lookup misses."""
+
+    def test_profile_index(self, sample_credentials_file_content):
+        """Test that the totp secret names point to their profiles."""
+        config = ConfigParser()
+        config.read_string(sample_credentials_file_content)
+        index = build_profile_index(config)
+        assert index.search("test_secret")[0] == "test_profile"
+
+    def test_index_kept_with_parse(self, sample_credentials_file_content):
+        """Test that the index is built once per parsed file."""
+        config = ConfigParser()
+        config.read_string(sample_credentials_file_content)
+        suggest_profiles(config, "defualt")
+        index = config._updsts_profile_index
+        assert suggest_profiles(config, "defualt")[0] == "default"
+        assert config._updsts_profile_index is index
+
+    def test_get_profile_info_miss(self, credentials_file):
+        """Test that a miss returns the did-you-mean candidates."""
+        profile_info = get_profile_info("test_profil", str(credentials_file))
+        assert profile_info['did_you_mean'].split(", ")[0] == "test_profile"
+        assert profile_info['aws_access_key_id'] == '(not defined)'
+
+    def test_get_profile_info_hit(self, credentials_file):
+        """Test that a hit has no candidates."""
+        profile_info = get_profile_info("test_profile", str(credentials_file))
+        assert 'did_you_mean' not in profile_info
+
+    def test_get_sts_token_miss(self, credentials_file):
+        """Test that the STS error message contains the candidates."""
+        with pytest.raises(Exception, match=r"did you mean: sts_profile"):
+            get_sts_token("sts_profle", "123456", credential_file=str(credentials_file))
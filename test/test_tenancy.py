@@ -0,0 +1,154 @@
+# encoding: utf-8-sig
+
+import asyncio
+import threading
+import time
+from configparser import ConfigParser
+
+import pytest
+
+from updsts.awsutil import get_cache_stats, read_credential_config, set_cache_enabled
+from updsts.mcp_impl import updsts_update_sts_credentials_batch_impl
+from updsts.metrics import get_registry
+from updsts.tenancy import TenantRateLimited, TenantRegistry, TokenBucket, get_tenant_registry, set_tenant_options
+
+
+@pytest.fixture
+def registry():
+    """Fixture providing a registry of two tenants at most, closed after the test."""
+    tenants = TenantRegistry(max_tenants=2)
+    yield tenants
+    tenants.close()
+
+
+@pytest.mark.unit
+class TestTokenBucket:
+    """Test cases for the rate limit of a file."""
+
+    def test_burst_and_refill(self):
+        """Test that the burst is allowed at once, and the next refresh waits for the rate."""
+        bucket = TokenBucket(rate_per_minute=60, burst=2)
+        assert bucket.try_acquire() == 0
+        assert bucket.try_acquire() == 0
+        assert 0 < bucket.try_acquire() <= 1.0
+        # a refused request takes nothing
+        assert 0 < bucket.try_acquire(2) <= 2.0
+
+    def test_count_over_burst(self):
+        """Test that more refreshes than the burst are refused, instead of waiting forever."""
+        bucket = TokenBucket(rate_per_minute=60, burst=10)
+        with pytest.raises(ValueError, match="exceed the burst"):
+            bucket.try_acquire(20)
+        assert bucket.try_acquire(10) == 0
+
+
+@pytest.mark.unit
+class TestTenantRegistry:
+    """Test cases for the LRU of the resident files."""
+
+    def test_lru_eviction(self, registry, temp_dir):
+        """Test that the least recently used file is evicted, with its cached parse."""
+        files = []
+        for name in ("a", "b", "c"):
+            path = temp_dir / name
+            path.write_text(f"[{name}]\naws_access_key_id = AKIA{name.upper()}\n", encoding="utf-8")
+            files.append(path)
+        set_cache_enabled(True)
+        try:
+            first = registry.get(str(files[0]))
+            read_credential_config(files[0])
+            registry.get(str(files[1]))
+            # the first one is used again, so the second one is the least recently used
+            assert registry.get(str(files[0])) is first
+            assert get_cache_stats()["credential_files"] == 1
+            registry.get(str(files[2]))
+            assert set(registry.stats()["tenants"]) == {str(files[0].resolve()), str(files[2].resolve())}
+
+            registry.get(str(files[1]))
+            assert str(files[0].resolve()) not in registry.stats()["tenants"]
+            assert get_cache_stats()["credential_files"] == 0
+        finally:
+            set_cache_enabled(False)
+
+    def test_busy_tenant_kept(self, registry, temp_dir):
+        """Test that a tenant running a call is not evicted, even over the limit."""
+        busy = registry.get(str(temp_dir / "busy"))
+        busy.in_flight = 1
+        registry.get(str(temp_dir / "b"))
+        registry.get(str(temp_dir / "c"))
+        assert str((temp_dir / "busy").resolve()) in registry.stats()["tenants"]
+        assert len(registry) == 2
+        busy.in_flight = 0
+
+    def test_hot_file_does_not_block_cold(self, registry, temp_dir):
+        """Test that the calls of a file with all its workers busy do not delay the calls of another file."""
+        hot = registry.get(str(temp_dir / "hot"))
+        cold = registry.get(str(temp_dir / "cold"))
+        release = threading.Event()
+
+        async def run():
+            blocked = [asyncio.ensure_future(hot.run(release.wait, 5)) for _ in range(hot.executor._max_workers + 2)]
+            start = time.perf_counter()
+            assert await cold.run(lambda: "done") == "done"
+            elapsed = time.perf_counter() - start
+            release.set()
+            await asyncio.gather(*blocked)
+            return elapsed
+
+        assert asyncio.run(run()) < 1.0
+
+
+@pytest.mark.unit
+class TestWriteQueue:
+    """Test cases for the coalesced writes of a file."""
+
+    def test_coalesced_rewrite(self, registry, credentials_file, sample_credentials):
+        """Test that the blocks queued during a rewrite are written together by the next one."""
+        tenant = registry.get(str(credentials_file))
+        rewrites = get_registry().counter("credential_file_rewrites_total")
+        results = {}
+
+        def write(key):
+            results[key] = tenant.write(key, sample_credentials)
+
+        # hold the file as if it were being rewritten, and queue three blocks meanwhile
+        with tenant._write_lock:
+            before = rewrites.value
+            threads = [threading.Thread(target=write, args=(key,)) for key in ("k1", "k2", "k3")]
+            for thread in threads:
+                thread.start()
+            while len(tenant._pending) < 3:
+                time.sleep(0.01)
+        for thread in threads:
+            thread.join()
+
+        assert rewrites.value == before + 1
+        assert {result["updated_profile_name"] for result in results.values()} == {"k1_sts", "k2_sts", "k3_sts"}
+        config = ConfigParser()
+        config.read(credentials_file)
+        assert config.get("k2_sts", "aws_session_token") == sample_credentials["SessionToken"]
+
+
+@pytest.mark.integration
+class TestTenantRateLimit:
+    """Test cases for the rate limit of the MCP tools."""
+
+    @pytest.fixture(autouse=True)
+    def limited(self):
+        """Limit the refreshes of each file only while the test is running."""
+        set_tenant_options(rate_per_minute=1, burst=1)
+        yield
+        set_tenant_options()
+
+    def test_batch_over_limit(self, credentials_file):
+        """Test that a batch over the rate limit of the file is refused before any request."""
+        items = [{"profile_name": "default", "totp_token": "111111"},
+                 {"profile_name": "test_profile", "totp_token": "222222"}]
+        with pytest.raises(ValueError, match="exceed the burst"):
+            asyncio.run(updsts_update_sts_credentials_batch_impl(items, cred_file=str(credentials_file)))
+        tenant = get_tenant_registry().get(str(credentials_file))
+        tenant.check_rate(1)
+        with pytest.raises(ValueError, match="retry after"):
+            asyncio.run(updsts_update_sts_credentials_batch_impl(items[:1], cred_file=str(credentials_file)))
+        with pytest.raises(TenantRateLimited):
+            tenant.check_rate(1)
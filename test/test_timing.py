@@ -0,0 +1,87 @@
+# encoding: utf-8-sig
+
+import pytest
+import logging
+import pstats
+import sys
+from unittest.mock import patch, MagicMock
+
+from updsts.timing import phase, record_phase, timing_session, format_summary
+
+
+@pytest.mark.unit
+class TestTiming:
+    """Test cases for the phase timing."""
+
+    def test_phases_are_collected(self):
+        """Test that phases are accumulated in the session."""
+        logger = MagicMock()
+        with timing_session("get", logger) as phases:
+            with phase("parse"):
+                pass
+            record_phase("sts_request", 0.25)
+            record_phase("sts_request", 0.25)
+
+        assert 'parse' in phases
+        assert phases['sts_request'] == pytest.approx(0.5)
+        summary = logger.info.call_args[0][0]
+        assert summary.startswith("timing: command=get total_ms=")
+        assert "sts_request_ms=500.000" in summary
+
+    def test_no_session(self):
+        """Test that phases outside of a session are ignored."""
+        with phase("parse"):
+            pass
+        record_phase("parse", 1.0)
+
+    def test_summary_not_emitted_when_info_disabled(self):
+        """Test that the summary is logged only at verbose levels."""
+        logger = logging.getLogger("updsts_test_timing")
+        logger.setLevel(logging.WARNING)
+        with patch.object(logger, 'info') as mock_info:
+            with timing_session("list", logger):
+                record_phase("parse", 0.1)
+            mock_info.assert_not_called()
+
+    def test_import_phase(self):
+        """Test the import phase."""
+        with timing_session("list", MagicMock(), include_import=True) as phases:
+            pass
+        assert phases['import'] > 0
+
+    def test_format_summary(self):
+        """Test the structured summary line."""
+        line = format_summary("get", {"parse": 0.001, "rewrite": 0.002}, 0.01)
+        assert line == "timing: command=get total_ms=10.000 parse_ms=1.000 rewrite_ms=2.000"
+
+    def test_instrumented_functions(self, credentials_file, sample_credentials):
+        """Test that the credential file engine reports its phases."""
+        from updsts.awsutil import get_profile_list
+        from updsts.upcred import CredentialUpdater
+
+        with timing_session("list", MagicMock()) as phases:
+            get_profile_list(str(credentials_file))
+            updater = CredentialUpdater(credentials_file)
+            updater.set_target_tag_name("test_profile")
+            updater.set_credentials(sample_credentials)
+            with patch('builtins.print'):
+                updater.update_credential_file()
+
+        assert 'parse' in phases
+        assert 'rewrite' in phases
+
+
+@pytest.mark.unit
+class TestProfileOption:
+    """Test cases for the global --profile option."""
+
+    def test_profile_written(self, temp_dir, credentials_file):
+        """Test that cProfile statistics are written for the command."""
+        profile_path = temp_dir / "updsts.prof"
+        from updsts.__main__ import main
+        with patch('builtins.print'):
+            main(['--profile', str(profile_path), 'list', '-c', str(credentials_file)])
+
+        assert profile_path.exists()
+        stats = pstats.Stats(str(profile_path))
+        assert any('handle_list' in func[2] for func in stats.stats)
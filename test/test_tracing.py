@@ -0,0 +1,121 @@
+# encoding: utf-8-sig
+
+import pytest
+import asyncio
+import json
+import logging
+from unittest.mock import patch
+
+from updsts.tracing import (
+    TraceContextFilter, current_span, set_trace_file, span, start_trace, traced,
+)
+from updsts.timing import phase
+
+
+@pytest.fixture
+def trace_file(temp_dir):
+    """Export the traces to a temporary file during the test."""
+    path = temp_dir / "traces.jsonl"
+    set_trace_file(path)
+    yield path
+    set_trace_file(None)
+
+
+def read_spans(path):
+    """Read the exported spans of each trace."""
+    traces = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        request = json.loads(line)
+        traces.append(request["resourceSpans"][0]["scopeSpans"][0]["spans"])
+    return traces
+
+
+@pytest.mark.unit
+class TestTracing:
+    """Test cases for the trace spans."""
+
+    def test_span_tree(self, trace_file):
+        """Test that the child spans are exported with the root span."""
+        with start_trace("updsts_update_sts_credential", profile="default") as root:
+            with phase("parse"):
+                pass
+            with span("sts_request") as child:
+                child.set_attribute("sts.attempts", 2)
+                with span("nested"):
+                    pass
+
+        traces = read_spans(trace_file)
+        assert len(traces) == 1
+        spans = {s["name"]: s for s in traces[0]}
+        assert set(spans) == {"updsts_update_sts_credential", "parse", "sts_request", "nested"}
+        assert all(s["traceId"] == root.trace_id for s in spans.values())
+        assert "parentSpanId" not in spans["updsts_update_sts_credential"]
+        assert spans["parse"]["parentSpanId"] == root.span_id
+        assert spans["nested"]["parentSpanId"] == spans["sts_request"]["spanId"]
+        assert {"key": "sts.attempts", "value": {"intValue": "2"}} in spans["sts_request"]["attributes"]
+        assert {"key": "profile", "value": {"stringValue": "default"}} in spans["updsts_update_sts_credential"]["attributes"]
+        assert int(spans["parse"]["endTimeUnixNano"]) >= int(spans["parse"]["startTimeUnixNano"])
+
+    def test_error_status(self, trace_file):
+        """Test that an exception marks the span as an error."""
+        with pytest.raises(RuntimeError):
+            with start_trace("tool"):
+                with span("rewrite"):
+                    raise RuntimeError("disk full")
+
+        spans = {s["name"]: s for s in read_spans(trace_file)[0]}
+        assert spans["rewrite"]["status"] == {"code": 2, "message": "disk full"}
+        assert spans["rewrite"]["events"][0]["name"] == "exception"
+        assert spans["tool"]["status"]["code"] == 2
+
+    def test_disabled(self, temp_dir):
+        """Test that nothing is recorded when tracing is disabled."""
+        set_trace_file(None)
+        with start_trace("tool") as root:
+            with span("parse") as child:
+                assert current_span() is None
+        assert root is None
+        assert child is None
+
+    def test_span_outside_trace(self, trace_file):
+        """Test that a span outside of a trace is not recorded."""
+        with span("parse") as child:
+            pass
+        assert child is None
+        assert not trace_file.exists()
+
+    def test_traced_async(self, trace_file):
+        """Test the decorator on a coroutine function."""
+        @traced("updsts_get_credential_info")
+        async def tool():
+            with span("parse"):
+                return current_span().name
+
+        assert asyncio.run(tool()) == "parse"
+        names = [s["name"] for s in read_spans(trace_file)[0]]
+        assert names == ["parse", "updsts_get_credential_info"]
+
+    def test_log_filter(self, trace_file):
+        """Test that the trace ids are added to the log records."""
+        log_filter = TraceContextFilter()
+        record = logging.LogRecord("awssts", logging.INFO, __file__, 1, "message", None, None)
+        log_filter.filter(record)
+        assert record.trace_ctx == ""
+
+        with start_trace("tool") as root:
+            log_filter.filter(record)
+        assert record.trace_ctx == f" [trace_id={root.trace_id} span_id={root.span_id}]"
+
+    def test_update_credential_file(self, trace_file, credentials_file, sample_credentials):
+        """Test that the rewrite of the credential file reports the fsync span."""
+        from updsts.upcred import CredentialUpdater
+
+        with start_trace("tool"):
+            updater = CredentialUpdater(credentials_file)
+            updater.set_target_tag_name("test_profile")
+            updater.set_credentials(sample_credentials)
+            with patch('builtins.print'):
+                updater.update_credential_file()
+
+        spans = {s["name"]: s for s in read_spans(trace_file)[0]}
+        assert spans["fsync"]["parentSpanId"] == spans["rewrite"]["spanId"]
@@ -0,0 +1,156 @@
+# encoding: utf-8-sig
+
+import json
+import stat
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import pytest
+
+from updsts.awsutil import get_cache_stats, get_sts_token, set_cache_enabled
+from updsts.deadline import deadline_scope
+from updsts.warmstart import (PREWARM_DEADLINE, WarmState, get_warm_state, record_profile_use, start_warm_start,
+                              stop_warm_start)
+
+CREDENTIALS = """[default]
+aws_access_key_id = AKIADEFAULT
+aws_secret_access_key = defaultSecretKey
+mfa_device_arn = arn:aws:iam::123456789012:mfa/default
+
+[work]
+aws_access_key_id = AKIAWORK
+aws_secret_access_key = workSecretKey
+mfa_device_arn = arn:aws:iam::123456789012:mfa/work
+
+[plain]
+aws_access_key_id = AKIAPLAIN
+aws_secret_access_key = plainSecretKey
+
+# ${{{ key=default [auto update by updsts]
+[default_sts]
+aws_access_key_id = ASIADEFAULT
+aws_secret_access_key = defaultTempKey
+aws_session_token = defaultSessionToken
+expiration_datetime = 2025-06-01T12:00:00+00:00
+# $}}} [auto update by updsts]
+# ${{{ key=work [auto update by updsts]
+[work_sts]
+aws_access_key_id = ASIAWORK
+aws_secret_access_key = workTempKey
+aws_session_token = workSessionToken
+expiration_datetime = 2025-05-01T12:00:00+00:00
+# $}}} [auto update by updsts]
+"""
+
+SECRETS = ("defaultSecretKey", "workSecretKey", "plainSecretKey", "defaultTempKey", "workTempKey",
+           "defaultSessionToken", "workSessionToken")
+
+
+@pytest.fixture
+def warm_credentials(temp_file_factory):
+    """Fixture providing a credentials file with two MFA profiles and their STS blocks."""
+    return temp_file_factory(CREDENTIALS, "credentials")
+
+
+@pytest.fixture
+def snapshot_path(temp_dir):
+    """Fixture providing the path of the snapshot."""
+    return temp_dir / "cache" / "mcp-state.json"
+
+
+@pytest.mark.unit
+class TestWarmState:
+    """Test cases for the snapshot of the derived state."""
+
+    def test_snapshot_has_no_secrets(self, warm_credentials, snapshot_path):
+        """Test that the saved snapshot holds no key nor token, and is readable by the user only."""
+        state = WarmState(snapshot_path)
+        state.record_use(warm_credentials, "work")
+        state.save()
+        text = snapshot_path.read_text(encoding="utf-8")
+        assert not [secret for secret in SECRETS + ("AKIADEFAULT", "ASIAWORK") if secret in text]
+        assert stat.S_IMODE(snapshot_path.stat().st_mode) == 0o600
+        assert json.loads(text)["files"][str(warm_credentials.resolve())]["recent"] == ["work"]
+
+    def test_restored_lists(self, warm_credentials, snapshot_path):
+        """Test that the restored lists drive the targets, without the profiles no longer in the file."""
+        snapshot_path.parent.mkdir(parents=True)
+        snapshot_path.write_text(json.dumps({"version": 2, "files": {str(warm_credentials.resolve()): {
+            "recent": ["removed", "work"], "prewarm": ["plain", "default"]}}}), encoding="utf-8")
+        restored = WarmState(snapshot_path)
+        assert restored.load()
+        assert restored.prewarm_targets(warm_credentials) == ["work", "default"]
+
+    def test_older_snapshot(self, warm_credentials, snapshot_path):
+        """Test that a snapshot of an older version is ignored."""
+        snapshot_path.parent.mkdir(parents=True)
+        snapshot_path.write_text(json.dumps({"version": 1, "files": {}}), encoding="utf-8")
+        assert not WarmState(snapshot_path).load()
+
+    def test_broken_snapshot(self, snapshot_path):
+        """Test that a broken snapshot is ignored."""
+        snapshot_path.parent.mkdir(parents=True)
+        snapshot_path.write_text("{not json", encoding="utf-8")
+        assert not WarmState(snapshot_path).load()
+
+    def test_prewarm_targets(self, warm_credentials, snapshot_path):
+        """Test that the recent profiles come first, then the MFA profiles in the order of the file."""
+        state = WarmState(snapshot_path)
+        assert state.prewarm_targets(warm_credentials) == ["default", "work"]
+        state.record_use(warm_credentials, "work")
+        state.record_use(warm_credentials, "plain")
+        assert state.prewarm_targets(warm_credentials) == ["work", "default"]
+        assert state.prewarm_targets(warm_credentials, limit=1) == ["work"]
+
+    def test_prewarm_targets_from_config(self, warm_credentials, snapshot_path, temp_file_factory, monkeypatch):
+        """Test that a profile whose MFA device is set in the AWS config file is prewarmed too."""
+        monkeypatch.delenv("AWS_CONFIG_FILE", raising=False)
+        temp_file_factory("[profile plain]\nmfa_serial = arn:aws:iam::123456789012:mfa/plain\n", "config")
+        assert WarmState(snapshot_path).prewarm_targets(warm_credentials) == ["default", "work", "plain"]
+
+
+@pytest.mark.integration
+class TestPrewarm:
+    """Test cases for the prewarmed STS clients."""
+
+    @pytest.fixture(autouse=True)
+    def enabled_cache(self):
+        """Enable the caches only while the test is running."""
+        set_cache_enabled(True)
+        yield
+        set_cache_enabled(False)
+
+    def test_first_call_uses_prewarmed_client(self, warm_credentials, snapshot_path):
+        """Test that the first call under the default deadline takes the client built by the prewarm."""
+        with patch("updsts.awsutil.boto3.Session") as mock_session:
+            mock_session.return_value.client.return_value.get_session_token.return_value = {
+                'Credentials': {'AccessKeyId': 'ASIANEW', 'SecretAccessKey': 's', 'SessionToken': 't',
+                                'Expiration': datetime(2025, 6, 1, tzinfo=timezone.utc)}}
+            state = WarmState(snapshot_path)
+            state.record_use(warm_credentials, "work")
+            assert state.prewarm(warm_credentials, limit=1) == ["work"]
+            assert mock_session.call_count == 1
+            assert get_cache_stats()["sts_clients"] == 1
+
+            with deadline_scope(PREWARM_DEADLINE):
+                result = get_sts_token(profile_name="work", totp_token="123456",
+                                       credential_file=str(warm_credentials))
+        assert result["AccessKeyId"] == "ASIANEW"
+        assert mock_session.call_count == 1
+
+    def test_start_and_stop(self, warm_credentials, snapshot_path):
+        """Test that the server state is restored at the start and saved with the used profiles."""
+        with patch("updsts.awsutil.boto3.Session"):
+            start_warm_start(str(warm_credentials), path=snapshot_path)
+            try:
+                assert get_warm_state() is not None
+                record_profile_use(str(warm_credentials), "default")
+            finally:
+                stop_warm_start()
+        assert get_warm_state() is None
+
+        restored = WarmState(snapshot_path)
+        assert restored.load()
+        assert restored.prewarm_targets(warm_credentials)[0] == "default"
+        entry = json.loads(snapshot_path.read_text(encoding="utf-8"))["files"][str(warm_credentials.resolve())]
+        assert entry["prewarm"] == ["default", "work"]